@@ -13,7 +13,8 @@ from alembic import context
 from app.models import (
     Agent, Team, TeamMember, Company, User, UnassignedUser, Task,
     Comment, Activity, CannedReply, Workspace, MicrosoftIntegration,
-    MicrosoftToken, EmailTicketMapping, EmailSyncConfig, TicketAttachment,
+    MicrosoftToken, EmailTicketMapping, EmailSyncConfig, TicketAttachment, StoredBlob,
+    TicketReportRollup, TicketEvent, OutboxEvent,
     GlobalSignature, NotificationTemplate, NotificationSetting,
     Workflow, Automation, AutomationCondition, AutomationAction
 )
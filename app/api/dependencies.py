@@ -3,18 +3,20 @@ import time
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import noload
 from sqlalchemy import select
 
 from app.core.config import settings
+from app.core.principal import AgentPrincipal
+from app.core.security import decode_access_token
 from app.database.session import get_db
 from app.models.agent import Agent
 from app.models.workspace import Workspace
 from app.schemas.token import TokenPayload
 from app.services.cache_service import cache_service
+from app.services.principal_cache import principal_cache
 
 # OAuth2 bearer token for authentication
 oauth2_scheme = OAuth2PasswordBearer(
@@ -22,17 +24,20 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 
-async def get_current_user(
-    db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> Agent:
+async def resolve_principal(token: str, db: AsyncSession) -> AgentPrincipal:
     """
-    Get the current authenticated user from the token.
-    Implements Redis caching to avoid repetitive DB queries.
+    Authenticate an access token.
+
+    Tokens verified recently are answered from the process-local principal
+    cache; otherwise the JWT is verified and the agent loaded from Redis (or
+    the database on a miss). Raises HTTPException when the token is invalid.
     """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
-        )
+        payload = decode_access_token(token)
         token_data = TokenPayload(**payload)
     except (JWTError, ValidationError) as e:
         raise HTTPException(
@@ -47,54 +52,51 @@ async def get_current_user(
         )
 
     user_id = token_data.sub
+    generation = principal_cache.generation(user_id)
     cache_key = f"user_agent:{user_id}"
 
     # Try to get from Redis cache first
     cached_user = await cache_service.get(cache_key)
     if cached_user:
-        # Reconstruct the Agent object from cached dictionary
-        agent = Agent(**cached_user)
-        return agent
-
-    # If not in cache, query the database
-    result = await db.execute(
-        select(Agent).filter(Agent.id == user_id).options(
-            noload(Agent.assigned_tasks),
-            noload(Agent.sent_tasks),
-            noload(Agent.teams),
-            noload(Agent.comments),
-            noload(Agent.activities),
-            noload(Agent.created_mailboxes),
-            noload(Agent.microsoft_tokens),
-            noload(Agent.created_canned_replies)
+        principal = AgentPrincipal.from_mapping(cached_user)
+    else:
+        # If not in cache, query the database (only the columns the principal needs)
+        result = await db.execute(
+            select(
+                Agent.id, Agent.name, Agent.email, Agent.role,
+                Agent.workspace_id, Agent.is_active, Agent.avatar_url
+            ).filter(Agent.id == user_id)
         )
-    )
-    user = result.scalars().first()
+        row = result.first()
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
 
-    # Save to cache for subsequent requests
-    user_data_for_cache = {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "role": user.role,
-        "workspace_id": user.workspace_id,
-        "is_active": user.is_active,
-        "avatar_url": user.avatar_url
-    }
-    await cache_service.set(cache_key, user_data_for_cache, ttl=300)  # Cache for 5 minutes
+        principal = AgentPrincipal.from_mapping(row._mapping)
+        # Save to cache for subsequent requests
+        await cache_service.set(cache_key, principal.to_dict(), ttl=300)  # Cache for 5 minutes
 
-    return user
+    principal_cache.put(token, principal, payload.get("exp"), generation)
+    return principal
+
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> AgentPrincipal:
+    """
+    Get the current authenticated user from the token, as an immutable
+    ``AgentPrincipal`` (not an ORM instance; use ``get_current_agent_model``
+    for the full row).
+    """
+    return await resolve_principal(token, db)
 
 
 async def get_current_active_user(
-    current_user: Agent = Depends(get_current_user),
-) -> Agent:
+    current_user: AgentPrincipal = Depends(get_current_user),
+) -> AgentPrincipal:
     """
     Get the current active user
     """
@@ -103,9 +105,26 @@ async def get_current_active_user(
     return current_user
 
 
-async def get_current_active_admin(
-    current_user: Agent = Depends(get_current_active_user),
+async def get_current_agent_model(
+    db: AsyncSession = Depends(get_db),
+    current_user: AgentPrincipal = Depends(get_current_active_user),
 ) -> Agent:
+    """
+    Get the current active user as a full ``Agent`` ORM instance, attached to
+    the request's session. For endpoints that return or modify the agent row.
+    """
+    agent = await db.get(Agent, current_user.id)
+    if not agent:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+    return agent
+
+
+async def get_current_active_admin(
+    current_user: AgentPrincipal = Depends(get_current_active_user),
+) -> AgentPrincipal:
     """
     Get the current active admin user
     """
@@ -118,8 +137,8 @@ async def get_current_active_admin(
 
 
 async def get_current_active_admin_or_manager(
-    current_user: Agent = Depends(get_current_active_user),
-) -> Agent:
+    current_user: AgentPrincipal = Depends(get_current_active_user),
+) -> AgentPrincipal:
     """
     Get the current active user, ensuring they are an admin or manager.
     """
@@ -133,7 +152,7 @@ async def get_current_active_admin_or_manager(
 
 async def get_current_workspace(
     db: AsyncSession = Depends(get_db),
-    current_user: Agent = Depends(get_current_active_user)
+    current_user: AgentPrincipal = Depends(get_current_active_user)
 ) -> Workspace:
     """
     Dependency function that returns the current workspace based on the user's workspace_id
@@ -148,7 +167,7 @@ async def get_current_workspace(
     
     return workspace
 
-def check_workspace_access(user: Agent, workspace_id: int) -> None:
+def check_workspace_access(user: AgentPrincipal, workspace_id: int) -> None:
     """
     Check if a user has access to a specific workspace.
     """
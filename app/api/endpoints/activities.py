@@ -1,11 +1,11 @@
 from typing import Any, List, Dict
-from datetime import datetime, timedelta
 from sqlalchemy import select, delete
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_current_active_user, get_current_active_admin
+from app.core.config import settings
 from app.database.session import get_db
 from sqlalchemy.orm import joinedload
 from app.models.agent import Agent
@@ -13,6 +13,7 @@ from app.models.activity import Activity
 from app.models.task import Task
 from app.models.user import User 
 from app.schemas.activity import Activity as ActivitySchema, ActivityCreate, ActivityWithDetails
+from app.services.notification_feed import notification_feed
 from app.utils.logger import logger 
 
 router = APIRouter()
@@ -33,19 +34,22 @@ async def read_activities(
     )
     activities = result.scalars().all()
     return activities
+
+
 @router.get("/notifications", response_model=List[ActivityWithDetails])
 async def read_notifications(
     db: AsyncSession = Depends(get_db),
     limit: int = 10,
     current_user: Agent = Depends(get_current_active_user),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ) -> Any:
     """
     Retrieve recent activities relevant for notifications.
     Only shows:
     1. New tickets created by external users (not agents)
     2. Comments from external users (replied via email)
-    Filters by the current user's workspace.
+    Filters by the current user's workspace. Which activities qualify, and
+    their creator, is stored on each row when it is written (see
+    app.services.notification_feed), so this is one indexed range read.
     """
     result = await db.execute(
         select(Activity).options(
@@ -53,72 +57,12 @@ async def read_notifications(
             joinedload(Activity.workspace)
         ).filter(
             Activity.workspace_id == current_user.workspace_id,
-            Activity.source_type.in_(['Ticket', 'Comment']),
+            Activity.is_notification == True,
         ).order_by(
             Activity.created_at.desc()
-        ).limit(limit * 2)  # Get more to filter
+        ).limit(limit)
     )
-    notifications = result.scalars().all()
-
-    results = []
-    for activity in notifications:
-        include_activity = False
-        activity_detail = ActivityWithDetails.from_orm(activity)
-        activity_detail.creator_user_name = None
-        activity_detail.creator_user_email = None
-        activity_detail.creator_user_id = None
-
-        if activity.source_type == 'Ticket':
-            task_result = await db.execute(
-                select(Task).options(
-                    joinedload(Task.user)
-                ).filter(Task.id == activity.source_id)
-            )
-            task = task_result.scalars().first()
-            if task and task.user and task.email_sender:
-                activity_detail.creator_user_name = task.user.name
-                activity_detail.creator_user_email = task.user.email
-                activity_detail.creator_user_id = task.user.id
-                include_activity = True
-
-        elif activity.source_type == 'Comment':
-            if activity.action and (" replied via email" in activity.action or " commented on ticket" in activity.action):
-                user_name_part = activity.action.replace(" replied via email", "").replace(" commented on ticket", "")
-                activity_detail.creator_user_name = user_name_part
-                include_activity = True
-
-        if include_activity:
-            results.append(activity_detail)
-        
-        if len(results) >= limit:
-            break
-    
-    background_tasks.add_task(clean_old_notifications, db)
-    return results
-
-
-async def clean_old_notifications(db: AsyncSession) -> None:
-    """
-    Helper function to delete notifications older than 2 days.
-    This runs in the background to avoid impacting API response time.
-    """
-    try:
-        cutoff_date = datetime.utcnow() - timedelta(days=2)
-        
-        # This is a background task, so we can't pass the session from the request.
-        # We need to create a new session.
-        from app.database.session import AsyncSessionLocal
-        async with AsyncSessionLocal() as async_db:
-            stmt = delete(Activity).where(
-                Activity.created_at < cutoff_date,
-                Activity.source_type.in_(['Ticket', 'Comment'])
-            )
-            result = await async_db.execute(stmt)
-            await async_db.commit()
-            logger.info(f"Cleaned {result.rowcount} notifications older than 2 days")
-
-    except Exception as e:
-        logger.error(f"Error cleaning old notifications: {str(e)}")
+    return [ActivityWithDetails.from_orm(activity) for activity in result.scalars().all()]
 
 
 @router.delete("/clean-old-notifications", response_model=Dict[str, Any])
@@ -127,20 +71,15 @@ async def manual_clean_old_notifications(
     current_user: Agent = Depends(get_current_active_admin),
 ) -> Dict[str, Any]:
     """
-    Manually trigger cleanup of old notifications (older than 2 days).
+    Manually trigger cleanup of old notifications (older than
+    NOTIFICATION_RETENTION_DAYS; the retention job normally does this).
     Admin access only.
     """
     try:
-        cutoff_date = datetime.utcnow() - timedelta(days=2)
-        stmt = delete(Activity).where(
-            Activity.created_at < cutoff_date,
-            Activity.source_type.in_(['Ticket', 'Comment'])
+        deleted_count = await notification_feed.purge(
+            db, settings.NOTIFICATION_RETENTION_DAYS, settings.NOTIFICATION_RETENTION_BATCH_SIZE
         )
-        result = await db.execute(stmt)
-        await db.commit()
-        
-        deleted_count = result.rowcount
-        logger.info(f"Manually cleaned {deleted_count} notifications older than 2 days by admin {current_user.id}")
+        logger.info(f"Manually cleaned {deleted_count} notifications older than {settings.NOTIFICATION_RETENTION_DAYS} days by admin {current_user.id}")
         return {"success": True, "deleted_count": deleted_count, "message": f"Successfully deleted {deleted_count} old notifications"}
         
     except Exception as e:
@@ -20,10 +20,11 @@ from app.schemas.agent import Agent as AgentSchema, AgentCreate, AgentUpdate, Ag
 from pydantic import BaseModel
 from app.schemas.team import Team as TeamSchema
 from app.schemas.token import Token 
-from app.core.security import get_password_hash, create_access_token 
+from app.core.security import get_password_hash_async, create_access_token 
 from app.utils.logger import logger
 from app.core.config import settings 
 from app.services.email_service import send_agent_invitation_email
+from app.services.principal_cache import principal_cache
 from app.services.microsoft_service import MicrosoftGraphService 
 
 router = APIRouter()
@@ -74,7 +75,7 @@ async def create_agent(
     agent = Agent(
         name=agent_in.name,
         email=agent_in.email,
-        password=get_password_hash(agent_in.password),
+        password=await get_password_hash_async(agent_in.password),
         role=agent_in.role,
         workspace_id=current_workspace.id,
         is_active=True,
@@ -160,7 +161,7 @@ async def update_agent(
 
     # Hash password if it's being updated
     if "password" in update_data and update_data["password"]:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await get_password_hash_async(update_data["password"])
     elif "password" in update_data:
          del update_data["password"]
 
@@ -170,6 +171,8 @@ async def update_agent(
 
     await db.commit()
     await db.refresh(agent)
+    # Role, activation or profile changes must apply to tokens already in use
+    await principal_cache.revoke_agent(agent.id)
 
     return agent
 
@@ -203,6 +206,7 @@ async def delete_agent(
 
     await db.delete(agent)
     await db.commit()
+    await principal_cache.revoke_agent(agent_id)
 
     return agent
 
@@ -546,7 +550,7 @@ async def accept_agent_invitation(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invitation token has expired.",
         )
-    agent.password = get_password_hash(invitation_data.password)
+    agent.password = await get_password_hash_async(invitation_data.password)
     agent.is_active = True
     agent.invitation_token = None 
     agent.invitation_token_expires_at = None 
@@ -1,70 +1,194 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from fastapi.responses import RedirectResponse # Para redireccionar a S3 URLs
+from fastapi import APIRouter, Depends, HTTPException, Request, status, File, UploadFile, Form
+from fastapi.responses import RedirectResponse, StreamingResponse # Para redireccionar a S3 URLs
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select
+from email.utils import formatdate
 import urllib.parse # Para codificar el nombre del archivo para Content-Disposition
 import unicodedata # Para normalizar y crear un nombre de archivo ASCII
 from typing import List
 
 from app.api import dependencies # Para get_db
+from app.core.config import settings
+from app.core.http_cache import etag_matches, if_range_matches, not_modified_response, parse_byte_range
 from app.models.ticket_attachment import TicketAttachment
 from app.schemas.ticket_attachment import TicketAttachmentSchema
+from app.schemas.upload import DirectUploadAbort, DirectUploadComplete, DirectUploadRequest, DirectUploadResponse
 from app.utils.logger import logger
-from app.services.s3_service import get_s3_service, S3Service
+from app.services.blob_store import blob_store
+from app.services.direct_upload_service import abort_direct_upload, decode_upload_token, finish_direct_upload, start_direct_upload
+from app.services.storage import AsyncStorage, get_storage
 
 router = APIRouter()
 
+MAX_ATTACHMENT_SIZE = 50 * 1024 * 1024  # 50MB limit for attachments
+LEGACY_STREAM_CHUNK_SIZE = 512 * 1024  # Window read per query when streaming DB-stored attachments
+
+
+def _content_disposition(file_name: str) -> str:
+    # Crear una versión ASCII segura del nombre de archivo para el parámetro 'filename'
+    ascii_filename = (
+        unicodedata.normalize('NFKD', file_name)
+        .encode('ascii', 'ignore')
+        .decode('ascii')
+    )
+    if not ascii_filename: # Si el nombre se vuelve vacío, usar un fallback genérico
+        ascii_filename = "downloaded_file"
+
+    # Codificar el nombre de archivo original para el parámetro 'filename*' (UTF-8)
+    utf8_filename_encoded = urllib.parse.quote(file_name)
+    return f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{utf8_filename_encoded}"
+
+
+async def _get_placeholder_comment(db: AsyncSession, current_agent):
+    """
+    Find or create the private placeholder comment that holds an agent's
+    attachments until they are attached to a real comment.
+    """
+    from app.models.comment import Comment
+    stmt = select(Comment).where(
+        Comment.agent_id == current_agent.id,
+        Comment.is_private == True,
+        Comment.content == "TEMP_ATTACHMENT_PLACEHOLDER"
+    )
+    query_result = await db.execute(stmt)
+    placeholder_comment = query_result.scalar_one_or_none()
+
+    if not placeholder_comment:
+        from app.models.task import Task
+        # Find any task to associate with this placeholder (it doesn't matter which one)
+        # This is just to satisfy the database constraints
+        stmt = select(Task)
+        query_result = await db.execute(stmt)
+        any_task = query_result.scalars().first()
+        if not any_task:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot create placeholder for attachments - no tasks in system"
+            )
+
+        placeholder_comment = Comment(
+            ticket_id=any_task.id,
+            agent_id=current_agent.id,
+            workspace_id=current_agent.workspace_id,
+            content="TEMP_ATTACHMENT_PLACEHOLDER",
+            is_private=True
+        )
+        db.add(placeholder_comment)
+        await db.flush()  # Get the ID before creating attachments
+    return placeholder_comment
+
+async def _stream_legacy_content(attachment_id: int, start: int, end: int):
+    """
+    Yield bytes ``start..end`` (inclusive) of a DB-stored attachment in
+    SUBSTRING windows, so only one chunk is ever held in memory.
+    """
+    from app.database.session import AsyncSessionLocal
+
+    # Own session: the request's session is closed once the endpoint returns.
+    # A single transaction also gives every window the same snapshot.
+    async with AsyncSessionLocal() as stream_db:
+        position = start
+        while position <= end:
+            length = min(LEGACY_STREAM_CHUNK_SIZE, end - position + 1)
+            chunk = (await stream_db.execute(
+                select(func.substring(TicketAttachment.content_bytes, position + 1, length))
+                .where(TicketAttachment.id == attachment_id)
+            )).scalar_one_or_none()
+            if not chunk:
+                logger.error(f"Attachment {attachment_id} content vanished while streaming at byte {position}")
+                return
+            yield bytes(chunk)
+            position += len(chunk)
+
+
 @router.get("/attachments/{attachment_id}")
 async def download_attachment(
     attachment_id: int,
-    db: AsyncSession = Depends(dependencies.get_db)
+    request: Request,
+    db: AsyncSession = Depends(dependencies.get_db),
+    current_agent = Depends(dependencies.get_current_active_user),
+    storage: AsyncStorage = Depends(get_storage)
 ):
     """
-    Downloads a ticket attachment by its ID by redirecting to S3 URL.
+    Downloads a ticket attachment by its ID by redirecting to a short-lived
+    presigned S3 URL. Legacy attachments still stored in the database are
+    streamed in chunks, with support for Range requests and conditional GET.
     """
+    from app.models.comment import Comment
+
     logger.info(f"Attempting to download attachment with ID: {attachment_id}")
-    stmt = select(TicketAttachment).where(TicketAttachment.id == attachment_id)
-    result = await db.execute(stmt)
-    db_attachment = result.scalar_one_or_none()
+    # Never load content_bytes here: only its length
+    stmt = (
+        select(
+            TicketAttachment.file_name,
+            TicketAttachment.content_type,
+            TicketAttachment.s3_url,
+            TicketAttachment.created_at,
+            func.length(TicketAttachment.content_bytes).label("stored_size"),
+        )
+        .join(Comment, Comment.id == TicketAttachment.comment_id)
+        .where(TicketAttachment.id == attachment_id, Comment.workspace_id == current_agent.workspace_id)
+    )
+    db_attachment = (await db.execute(stmt)).first()
 
     if not db_attachment:
         logger.warning(f"Attachment with ID: {attachment_id} not found.")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
 
     # Check if we have an S3 URL (new system) or content_bytes (old system)
-    if hasattr(db_attachment, 's3_url') and db_attachment.s3_url:
-        # New S3 system - redirect to S3 URL
+    if db_attachment.s3_url:
+        # New S3 system - redirect to a presigned URL (S3 sends the bytes, not us)
         logger.info(f"Redirecting to S3 URL for attachment ID: {attachment_id}")
-        return RedirectResponse(url=db_attachment.s3_url)
-    elif db_attachment.content_bytes:
-        # Old system - serve from database (legacy support)
-        logger.info(f"Serving from database for attachment ID: {attachment_id}")
-        from fastapi.responses import StreamingResponse
-        import io
-        
-        stream = io.BytesIO(db_attachment.content_bytes)
-        
-        # Preparar el nombre de archivo para la cabecera Content-Disposition
-        file_name = db_attachment.file_name
-        
-        # Crear una versión ASCII segura del nombre de archivo para el parámetro 'filename'
-        ascii_filename = (
-            unicodedata.normalize('NFKD', file_name)
-            .encode('ascii', 'ignore')
-            .decode('ascii')
+        s3_key = storage.key_from_url(db_attachment.s3_url)
+        if not s3_key:
+            return RedirectResponse(url=db_attachment.s3_url)
+        presigned_url = storage.generate_presigned_get(
+            s3_key,
+            expires_in=settings.DOWNLOAD_URL_EXPIRE_SECONDS,
+            content_disposition=_content_disposition(db_attachment.file_name)
         )
-        if not ascii_filename: # Si el nombre se vuelve vacío, usar un fallback genérico
-            ascii_filename = "downloaded_file"
-
-        # Codificar el nombre de archivo original para el parámetro 'filename*' (UTF-8)
-        utf8_filename_encoded = urllib.parse.quote(file_name)
-
+        return RedirectResponse(url=presigned_url)
+    elif db_attachment.stored_size:
+        # Old system - stream from database (legacy support)
+        size = int(db_attachment.stored_size)
+        # Attachment content never changes, so id + size + creation time identify it
+        created = int(db_attachment.created_at.timestamp()) if db_attachment.created_at else 0
+        etag = f'"att-{attachment_id}-{size}-{created}"'
+        last_modified = formatdate(created, usegmt=True) if created else None
         headers = {
-            "Content-Disposition": f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{utf8_filename_encoded}"
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, no-cache",
+            "Content-Disposition": _content_disposition(db_attachment.file_name),
         }
-        
+        if last_modified:
+            headers["Last-Modified"] = last_modified
+
+        if etag_matches(request, etag):
+            return not_modified_response(etag, {"Accept-Ranges": "bytes"})
+
+        byte_range = None
+        if if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_byte_range(request.headers.get("range"), size)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    detail="Requested range not satisfiable",
+                    headers={"Content-Range": f"bytes */{size}"}
+                )
+
+        start, end = byte_range or (0, size - 1)
+        headers["Content-Length"] = str(end - start + 1)
+        status_code = status.HTTP_200_OK
+        if byte_range:
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        logger.info(f"Streaming bytes {start}-{end}/{size} from database for attachment ID: {attachment_id}")
         return StreamingResponse(
-            stream, 
+            _stream_legacy_content(attachment_id, start, end),
+            status_code=status_code,
             media_type=db_attachment.content_type,
             headers=headers
         )
@@ -77,7 +201,7 @@ async def upload_multiple_attachments(
     files: List[UploadFile] = File(...),
     db: AsyncSession = Depends(dependencies.get_db),
     current_agent = Depends(dependencies.get_current_active_user),
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ):
     """
     Upload multiple attachments to S3 and return their info.
@@ -89,56 +213,25 @@ async def upload_multiple_attachments(
     result = []
     for file in files:
         try:
-            # Get file size BEFORE uploading to S3
-            file_content = await file.read()
+            file_content = await storage.read_upload(file, max_size=MAX_ATTACHMENT_SIZE)
             file_size = len(file_content)
-            await file.seek(0)  # Reset file pointer for S3 upload
             
             logger.info(f"Processing file: {file.filename}, size: {file_size} bytes, content_type: {file.content_type}")
             
-            # Upload to S3
-            s3_url = await s3_service.upload_from_upload_file(
-                upload_file=file,
-                folder="attachments",
-                max_size=50 * 1024 * 1024  # 50MB limit for attachments
+            # Store in the content-addressed blob store (re-uploaded files are deduplicated)
+            blob = await blob_store.put(
+                db,
+                file_content,
+                filename=file.filename or "unnamed_file",
+                content_type=file.content_type
             )
+            s3_url = blob_store.url_for(blob)
             
-            logger.info(f"Successfully uploaded {file.filename} to S3: {s3_url}")
+            logger.info(f"Successfully stored {file.filename} as blob {blob.id}: {s3_url}")
             
             # Create temporary attachment record (without comment_id for now)
             # Use a placeholder comment_id (will be updated when comment is created)
-            from app.models.comment import Comment
-            # Find or create a placeholder comment for temporary attachments
-            stmt = select(Comment).where(
-                Comment.agent_id == current_agent.id,
-                Comment.is_private == True,
-                Comment.content == "TEMP_ATTACHMENT_PLACEHOLDER"
-            )
-            query_result = await db.execute(stmt)
-            placeholder_comment = query_result.scalar_one_or_none()
-            
-            if not placeholder_comment:
-                from app.models.task import Task
-                # Find any task to associate with this placeholder (it doesn't matter which one)
-                # This is just to satisfy the database constraints
-                stmt = select(Task)
-                query_result = await db.execute(stmt)
-                any_task = query_result.scalars().first()
-                if not any_task:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Cannot create placeholder for attachments - no tasks in system"
-                    )
-                
-                placeholder_comment = Comment(
-                    ticket_id=any_task.id,
-                    agent_id=current_agent.id,
-                    workspace_id=current_agent.workspace_id,
-                    content="TEMP_ATTACHMENT_PLACEHOLDER",
-                    is_private=True
-                )
-                db.add(placeholder_comment)
-                await db.flush()  # Get the ID before creating attachments
+            placeholder_comment = await _get_placeholder_comment(db, current_agent)
             
             # Create attachment record with S3 URL
             db_attachment = TicketAttachment(
@@ -146,7 +239,8 @@ async def upload_multiple_attachments(
                 file_name=file.filename,
                 content_type=file.content_type or "application/octet-stream",
                 file_size=file_size,
-                s3_url=s3_url  # Store S3 URL instead of content_bytes
+                s3_url=s3_url,  # Store S3 URL instead of content_bytes
+                blob_id=blob.id
             )
             db.add(db_attachment)
             await db.flush()  # To get ID
@@ -167,12 +261,88 @@ async def upload_multiple_attachments(
     await db.commit()
     return result
 
+@router.post("/attachments/presign", response_model=DirectUploadResponse)
+async def presign_attachment_upload(
+    upload_in: DirectUploadRequest,
+    current_agent = Depends(dependencies.get_current_active_user),
+    storage: AsyncStorage = Depends(get_storage)
+):
+    """
+    Presign an attachment upload straight to S3 (multipart above the
+    configured threshold). Call /attachments/complete once the upload is done.
+    """
+    return await start_direct_upload(
+        storage, upload_in, current_agent,
+        purpose="attachment", folder="attachments", max_size=MAX_ATTACHMENT_SIZE
+    )
+
+@router.post("/attachments/complete", response_model=TicketAttachmentSchema)
+async def complete_attachment_upload(
+    complete_in: DirectUploadComplete,
+    db: AsyncSession = Depends(dependencies.get_db),
+    current_agent = Depends(dependencies.get_current_active_user),
+    storage: AsyncStorage = Depends(get_storage)
+):
+    """
+    Register a presigned attachment upload as a temporary TicketAttachment,
+    exactly like /attachments/upload-multiple does for proxied uploads.
+    """
+    uploaded = await finish_direct_upload(
+        storage, complete_in.upload_token, current_agent,
+        purpose="attachment", parts=complete_in.parts
+    )
+
+    # Completing twice must not register the same object twice
+    existing = await db.execute(
+        select(TicketAttachment).where(TicketAttachment.s3_url == uploaded["file_url"])
+    )
+    db_attachment = existing.scalar_one_or_none()
+    if db_attachment:
+        return TicketAttachmentSchema.model_validate(db_attachment)
+
+    placeholder_comment = await _get_placeholder_comment(db, current_agent)
+    db_attachment = TicketAttachment(
+        comment_id=placeholder_comment.id,
+        file_name=uploaded["file_name"],
+        content_type=uploaded["content_type"] or "application/octet-stream",
+        file_size=uploaded["file_size"],
+        s3_url=uploaded["file_url"]
+    )
+    db.add(db_attachment)
+    await db.commit()
+    await db.refresh(db_attachment)
+
+    logger.info(f"Created attachment record from direct upload: ID={db_attachment.id}, size={db_attachment.file_size}")
+    return TicketAttachmentSchema.model_validate(db_attachment)
+
+@router.post("/attachments/abort")
+async def abort_attachment_upload(
+    abort_in: DirectUploadAbort,
+    db: AsyncSession = Depends(dependencies.get_db),
+    current_agent = Depends(dependencies.get_current_active_user),
+    storage: AsyncStorage = Depends(get_storage)
+):
+    """
+    Discard a presigned attachment upload that has not been completed.
+    """
+    claims = decode_upload_token(abort_in.upload_token, current_agent, "attachment")
+    registered = await db.execute(
+        select(TicketAttachment.id).where(TicketAttachment.s3_url == storage.get_file_url(claims["key"]))
+    )
+    if registered.first():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload already registered; delete the attachment instead"
+        )
+    await abort_direct_upload(storage, abort_in.upload_token, current_agent, purpose="attachment")
+    return {"success": True}
+
 @router.delete("/attachments/{attachment_id}")
 async def delete_attachment(
     attachment_id: int,
     db: AsyncSession = Depends(dependencies.get_db),
     current_agent = Depends(dependencies.get_current_active_user),
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ):
     """
     Delete a temporary attachment by ID (both from database and S3).
@@ -198,13 +368,14 @@ async def delete_attachment(
             detail="Can only delete temporary attachments"
         )
     
-    # Delete from S3 if it exists
-    if hasattr(db_attachment, 's3_url') and db_attachment.s3_url:
+    # Delete from S3 if it exists. Blob-backed attachments only give their
+    # reference back (on delete); the object is collected once unreferenced.
+    if db_attachment.blob_id is None and db_attachment.s3_url:
         try:
-            # Extract S3 key from URL
-            s3_key = db_attachment.s3_url.split('amazonaws.com/')[-1]
-            s3_service.delete_file(s3_key)
-            logger.info(f"Deleted attachment from S3: {s3_key}")
+            s3_key = storage.key_from_url(db_attachment.s3_url)
+            if s3_key:
+                await storage.delete_file(s3_key)
+                logger.info(f"Deleted attachment from S3: {s3_key}")
         except Exception as e:
             logger.warning(f"Failed to delete attachment from S3: {e}")
     
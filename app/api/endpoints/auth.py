@@ -9,7 +9,7 @@ from sqlalchemy import select
 from jose import jwt, JWTError
 from app.models.workspace import Workspace
 from app.core.config import settings
-from app.core.security import create_access_token, verify_password, get_password_hash
+from app.core.security import PasswordHasherBusy, create_access_token, get_password_hash_async, verify_and_update_password
 from app.database.session import get_db
 from app.models.agent import Agent
 from app.models.microsoft import MailboxConnection, MicrosoftToken 
@@ -17,7 +17,7 @@ from app.services.microsoft_service import MicrosoftGraphService
 import secrets 
 from app.schemas.token import Token
 from app.schemas.agent import Agent as AgentSchema, AgentCreate, AgentPasswordResetRequest, AgentResetPassword, AgentMicrosoftLogin, AgentMicrosoftLinkRequest 
-from app.api.dependencies import get_current_active_user
+from app.api.dependencies import get_current_agent_model
 from app.services.email_service import send_password_reset_email 
 import logging 
 import json 
@@ -97,16 +97,21 @@ async def login_access_token(
     
     # Verificar contraseña con manejo robusto de errores
     password_valid = False
+    new_password_hash = None
     try:
         if user:
             if not user.password:
                 logger.warning(f"⚠️ LOGIN WARNING - User {form_data.username} has no password set (auth_method: {user.auth_method})")
                 password_valid = False
             else:
-                password_valid = verify_password(form_data.password, user.password)
+                # bcrypt runs on the password hash executor, not the event loop
+                password_valid, new_password_hash = await verify_and_update_password(form_data.password, user.password)
                 logger.info(f"🔐 LOGIN DEBUG - Password verification result for {form_data.username}: {password_valid}")
         else:
             logger.debug(f"🔍 LOGIN DEBUG - Skipping password verification - user not found")
+    except PasswordHasherBusy:
+        logger.warning(f"🚦 LOGIN THROTTLED - Password hash queue full, rejecting login for {form_data.username}, IP: {client_ip}")
+        raise
     except Exception as pwd_error:
         logger.error(f"💥 LOGIN ERROR - Error during password verification for {form_data.username}: {pwd_error}")
         password_valid = False
@@ -123,6 +128,11 @@ async def login_access_token(
     logger.info(f"✅ LOGIN SUCCESS - User {user.email} (ID: {user.id}) authenticated successfully. Workspace: {user.workspace_id}, Auth method: {user.auth_method}")
     logger.info(f"🔐 LOGIN SUCCESS - User {user.email} successfully authenticated and authorized for workspace {user.workspace_id}")
     
+    if new_password_hash:
+        # Stored hash used an outdated bcrypt cost: upgrade it transparently
+        user.password = new_password_hash
+        logger.info(f"🔐 LOGIN DEBUG - Rehashed password for user {user.email} with the current bcrypt cost")
+
     user.last_login = datetime.utcnow()
     origin = None
 
@@ -198,7 +208,7 @@ async def login_access_token(
     }
 
 @router.get("/me", response_model=AgentSchema)
-async def get_current_user(current_user: Agent = Depends(get_current_active_user)) -> Any:
+async def get_current_user(current_user: Agent = Depends(get_current_agent_model)) -> Any:
     return current_user
 
 @router.post("/register/agent", response_model=AgentSchema)
@@ -222,7 +232,7 @@ async def register_agent(user_in: AgentCreate, db: AsyncSession = Depends(get_db
     try:
         user = Agent(
             name=user_in.name, email=user_in.email,
-            password=get_password_hash(user_in.password),
+            password=await get_password_hash_async(user_in.password),
             role=user_in.role, is_active=user_in.is_active,
             workspace_id=user_in.workspace_id
         )
@@ -364,7 +374,7 @@ async def reset_password(request: Request, reset_data: AgentResetPassword, db: A
         await db.commit()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password reset token has expired. Please request a new one.")
 
-    agent.password = get_password_hash(reset_data.new_password)
+    agent.password = await get_password_hash_async(reset_data.new_password)
     agent.password_reset_token = None
     agent.password_reset_token_expires_at = None
     db.add(agent)
@@ -548,7 +558,7 @@ async def microsoft_login(
 @router.post("/microsoft/link")
 async def link_microsoft_account(
     microsoft_data: AgentMicrosoftLinkRequest,
-    current_agent: Agent = Depends(get_current_active_user),
+    current_agent: Agent = Depends(get_current_agent_model),
     db: AsyncSession = Depends(get_db)
 ) -> Any:
     logger.info(f"Linking Microsoft account {microsoft_data.microsoft_email} to agent {current_agent.email}")
@@ -9,6 +9,7 @@ from app.api.dependencies import get_db, get_current_active_user
 from app.models.agent import Agent
 from app.models.notification import NotificationSetting
 from app.services.notification_service import get_notification_settings, toggle_notification_setting, get_notification_setting
+from app.services.workspace_config import workspace_config
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -52,39 +53,11 @@ async def get_workspace_automation_settings(
         )
     
     # Get automation settings
-    stmt_team = select(NotificationSetting).filter(
-        NotificationSetting.workspace_id == workspace_id,
-        NotificationSetting.category == "teams",
-        NotificationSetting.type == "new_ticket_created"
-    )
-    result_team = await db.execute(stmt_team)
-    team_notification_setting = result_team.scalars().first()
-
-    stmt_weekly = select(NotificationSetting).filter(
-        NotificationSetting.workspace_id == workspace_id,
-        NotificationSetting.category == "agents",
-        NotificationSetting.type == "weekly_agent_summary"
-    )
-    result_weekly = await db.execute(stmt_weekly)
-    weekly_summary_setting = result_weekly.scalars().first()
-
-    # 🔧 ADDED: Get daily outstanding tasks setting
-    stmt_daily = select(NotificationSetting).filter(
-        NotificationSetting.workspace_id == workspace_id,
-        NotificationSetting.category == "agents",
-        NotificationSetting.type == "daily_outstanding_tasks"
-    )
-    result_daily = await db.execute(stmt_daily)
-    daily_outstanding_setting = result_daily.scalars().first()
-
-    # 🔧 ADDED: Get weekly manager summary setting
-    stmt_manager = select(NotificationSetting).filter(
-        NotificationSetting.workspace_id == workspace_id,
-        NotificationSetting.category == "teams",
-        NotificationSetting.type == "weekly_manager_summary"
-    )
-    result_manager = await db.execute(stmt_manager)
-    weekly_manager_setting = result_manager.scalars().first()
+    config = await workspace_config.get(db, workspace_id)
+    team_notification_setting = config.first_setting("teams", "new_ticket_created")
+    weekly_summary_setting = config.first_setting("agents", "weekly_agent_summary")
+    daily_outstanding_setting = config.first_setting("agents", "daily_outstanding_tasks")  # 🔧 ADDED
+    weekly_manager_setting = config.first_setting("teams", "weekly_manager_summary")  # 🔧 ADDED
     
     # If no team notification setting exists, create a default one
     if not team_notification_setting:
@@ -4,7 +4,7 @@ import asyncio
 import base64
 import time
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select
 from pydantic import BaseModel
@@ -20,12 +20,13 @@ from app.models.user import User
 from app.schemas.comment import Comment as CommentSchema, CommentCreate, CommentUpdate
 from app.schemas.task import TaskStatus, Task as TaskSchema, TicketWithDetails
 from app.services.microsoft_service import get_microsoft_service, MicrosoftGraphService
-from app.services.task_service import send_assignment_notification
 from app.utils.logger import logger
 from app.core.config import settings
-from app.core.exceptions import MicrosoftAPIException, DatabaseException
+from app.core.exceptions import MicrosoftAPIException
 from app.services.workflow_service import WorkflowService
-from app.services.s3_service import get_s3_service
+from app.services.comment_html_hydrator import comment_html_hydrator
+from app.services.outbox import enqueue
+from app.services.storage import get_storage, get_storage_backend
 from app.utils.image_processor import extract_base64_images
 from app.models.ticket_attachment import TicketAttachment
 import re
@@ -106,8 +107,7 @@ async def get_scheduled_comments(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Scheduled comment not found",
             )
-    from app.services.s3_service import get_s3_service
-    s3_service = get_s3_service()
+    storage = get_storage()
     query_start = time.time()
     regex_matchS3 = re.escape("[MIGRATED_TO_S3] Content moved to S3: ")
     scheduled_comments_list: list = []
@@ -119,7 +119,7 @@ async def get_scheduled_comments(
         url = comment.content
         if re.match(regex_matchS3, url):
             url = re.sub(regex_matchS3,'', url, count=1)
-        s3_content:str = str(s3_service.get_comment_html(url))
+        s3_content:str = str(await storage.get_comment_html(url))
         agent_name = agent.name if agent else "Unknown"
         dateScheduled: str = comment.scheduled_send_at.strftime("%Y-%m-%d %H:%M:%S")
         scheduled_comments_list.append({
@@ -183,7 +183,6 @@ async def create_comment(
     task_id: int,
     comment_in: CommentCreate,
     request: Request,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: AgentModel = Depends(get_current_active_user), # Use alias AgentModel
 ) -> Any:
@@ -352,14 +351,12 @@ async def create_comment(
 
     try:
         if comment_in.content and comment_in.content.strip():
-            from app.services.s3_service import get_s3_service
-            s3_service = get_s3_service()
-
+            storage = get_storage()
 
             content_length = len(comment_in.content)
             should_migrate_to_s3 = (
                 content_length > 65000 or
-                s3_service.should_store_html_in_s3(comment_in.content)
+                storage.should_store_html_in_s3(comment_in.content)
             )
 
             if should_migrate_to_s3:
@@ -370,7 +367,7 @@ async def create_comment(
                 temp_id = str(uuid.uuid4())
 
                 # Almacenar en S3 con ID temporal
-                s3_url = s3_service.upload_html_content(
+                s3_url = await storage.upload_html_content(
                     html_content=comment_in.content,
                     filename=f"temp-comment-{temp_id}.html",
                     folder="comments"
@@ -480,9 +477,8 @@ async def create_comment(
         await db.refresh(comment)
     if s3_html_url and comment.id:
         try:
-            s3_service = get_s3_service()
             original_content = comment_in.content
-            final_s3_url = s3_service.store_comment_html(comment.id, original_content)
+            final_s3_url = await get_storage().store_comment_html(comment.id, original_content)
             comment.s3_html_url = final_s3_url
             comment.content = f"[MIGRATED_TO_S3] Content moved to S3: {final_s3_url}"
             db.add(comment)
@@ -563,108 +559,33 @@ async def create_comment(
         logger.info(f"Activity logged for comment creation: comment {comment.id} on task {task_id} by agent {current_user.id}")
     except Exception as e:
         logger.error(f"Error creating activity for comment {comment.id}: {e}")
-    await db.commit()
-    await db.refresh(task)
-    await db.refresh(comment)
-
-    try:
-        context = {'ticket': task, 'comment': comment, 'agent': current_user}
-        executed_workflows = await WorkflowService.execute_workflows(
-            db=db,
-            trigger='comment.added',
-            workspace_id=task.workspace_id,
-            context=context
-        )
-
-        if not comment_in.is_private:
-            if current_user:  # Es un agente
-                agent_workflows = await WorkflowService.execute_workflows(
-                    db=db,
-                    trigger='agent.replied',
-                    workspace_id=task.workspace_id,
-                    context=context
-                )
-                executed_workflows.extend(agent_workflows)
-            else:
-                customer_workflows = await WorkflowService.execute_workflows(
-                    db=db,
-                    trigger='customer.replied',
-                    workspace_id=task.workspace_id,
-                    context=context
-                )
-                executed_workflows.extend(customer_workflows)
-
-        if executed_workflows:
-            logger.info(f"Executed workflows for comment creation {comment.id}: {executed_workflows}")
-
-    except Exception as e:
-        logger.error(f"Error executing workflows for comment creation {comment.id}: {str(e)}")
+    # Workflows, notifications, the reply email and the Socket.IO event are
+    # published by the outbox relay once this commit lands
+    origin_url = (str(request.headers.get("origin", "")) if request else "") or settings.FRONTEND_URL
+    enqueue(db, "socketio.comment_updated", {"comment_id": comment.id}, workspace_id=current_user.workspace_id)
+    enqueue(db, "comment.created", {"comment_id": comment.id, "agent_id": current_user.id}, workspace_id=current_user.workspace_id)
     if assignee_changed and task.assignee_id != current_user.id:
-        try:
-            origin_url = None
-            if request:
-                origin_url = str(request.headers.get("origin", ""))
-            if not origin_url:
-                origin_url = settings.FRONTEND_URL
-            logger.info(f"Using {origin_url} for assignment notification")
-            assigned_agent_stmt = select(AgentModel).filter(AgentModel.id == task.assignee_id)
-            assigned_agent_result = await db.execute(assigned_agent_stmt)
-            assigned_agent = assigned_agent_result.scalar_one_or_none()
-            if assigned_agent:
-                task.assignee = assigned_agent
-                from app.services.task_service import send_assignment_notification
-                await send_assignment_notification(db, task, origin_url)
-                logger.info(f"Notification scheduled for new assignment from comment: task {task_id} to agent {task.assignee_id}")
-        except Exception as e:
-            logger.error(f"Error scheduling assignment notification from comment: {e}", exc_info=True)
-
-    try:
-        from app.services.notification_service import send_notification
-
-        if not comment_in.is_private and not comment_in.is_attachment_upload:
-
-            task_user = None
-            if task.user_id:
-                task_user_stmt = select(User).filter(User.id == task.user_id)
-                task_user_result = await db.execute(task_user_stmt)
-                task_user = task_user_result.scalar_one_or_none()
+        enqueue(db, "notification.ticket_assigned", {"ticket_id": task_id, "request_origin": origin_url}, workspace_id=current_user.workspace_id)
+    if comment_in.is_private:
+        enqueue(db, "notification.mentions", {
+            "comment_id": comment.id, "agent_id": current_user.id, "request_origin": origin_url,
+        }, workspace_id=current_user.workspace_id)
+    elif not comment_in.is_attachment_upload:
+        enqueue(db, "notification.new_response", {"comment_id": comment.id, "agent_id": current_user.id}, workspace_id=current_user.workspace_id)
+    if not comment_in.is_private:
+        enqueue(db, "comment.email", {
+            "task_id": task_id,
+            "comment_id": comment.id,
+            "agent_id": current_user.id,
+            "agent_email": current_user.email,
+            "agent_name": current_user.name,
+            "is_private": comment_in.is_private,
+            "to_recipients": to_recipients,
+            "cc_recipients": cc_recipients,
+            "bcc_recipients": bcc_recipients,
+            "processed_attachment_ids": processed_attachment_ids,
+        }, workspace_id=current_user.workspace_id)
 
-            agents_stmt = select(AgentModel).filter(
-                AgentModel.workspace_id == task.workspace_id,
-                AgentModel.is_active == True,
-                AgentModel.id != current_user.id  # Don't notify the commenting agent
-            )
-            agents_result = await db.execute(agents_stmt)
-            agents = agents_result.scalars().all()
-
-            for agent in agents:
-                if agent.email:
-                    template_vars = {
-                        "agent_name": agent.name,
-                        "ticket_id": task.id,
-                        "ticket_title": task.title,
-                        "commenter_name": current_user.name,
-                        "user_name": task_user.name if task_user else "Unknown User",
-                        "comment_content": comment.content
-                    }
-
-                    # Intentar enviar notificación a otros agentes
-                    await send_notification(
-                        db=db,
-                        workspace_id=task.workspace_id,
-                        category="agents",
-                        notification_type="new_response_agent",  # Corregir tipo para agentes
-                        recipient_email=agent.email,
-                        recipient_name=agent.name,
-                        template_vars=template_vars,
-                        task_id=task.id
-                    )
-
-    except Exception as notification_error:
-        logger.error(f"Error sending notifications for comment {comment.id} on task {task_id}: {str(notification_error)}", exc_info=True)
-    # --- End Send Notifications ---
-
-    # Final commit for any remaining changes
     try:
         await db.commit()
         await db.refresh(comment)
@@ -674,30 +595,6 @@ async def create_comment(
         await db.rollback()
         raise HTTPException(status_code=500, detail="Error saving comment")
 
-    if not comment_in.is_private:
-        try:
-            # Get the database path for background task
-            db_path = str(settings.DATABASE_URI)
-
-            background_tasks.add_task(
-                run_send_email_in_background,
-                task_id=task_id,
-                comment_id=comment.id,
-                comment_content=comment_in.content,
-                agent_id=current_user.id,
-                agent_email=current_user.email,
-                agent_name=current_user.name,
-                is_private=comment_in.is_private,
-                to_recipients=to_recipients,
-                cc_recipients=cc_recipients,
-                bcc_recipients=bcc_recipients,
-                processed_attachment_ids=processed_attachment_ids,
-                db_path=db_path
-            )
-            logger.info(f"Email background task queued for comment {comment.id} on task {task_id}")
-        except Exception as e:
-            logger.error(f"Error queuing email background task for comment {comment.id}: {e}")
-
     # Load the task with all necessary relationships to prevent lazy loading issues
     from sqlalchemy.orm import selectinload
 
@@ -733,92 +630,6 @@ async def create_comment(
         assignee_changed=assignee_changed
     )
 
-    def get_avatar_url(sender_type: str, agent=None, user=None):
-
-        if sender_type == "agent" and agent and agent.avatar_url:
-            return agent.avatar_url
-        elif sender_type == "user":
-            if user and user.avatar_url:
-                return user.avatar_url
-            elif user and user.company and user.company.logo_url:
-                return user.company.logo_url
-        return None
-
-    try:
-        task_user_result = await db.execute(
-            select(User).options(joinedload(User.company)).filter(User.id == task.user_id)
-        )
-        task_user = task_user_result.scalar_one_or_none()
-
-        comment_data = {
-            'id': comment.id,
-            'ticket_id': task_id,
-            'agent_id': current_user.id,
-            'agent_name': current_user.name,
-            'agent_email': current_user.email,
-            'agent_avatar': get_avatar_url("agent", agent=current_user),
-            'user_id': task.user_id,
-            'user_name': task_user.name if task_user else None,
-            'user_email': task_user.email if task_user else None,
-            'user_avatar': get_avatar_url("user", user=task_user),
-            'content': comment_in.content,
-            'other_destinaries': comment_in.other_destinaries,
-            'bcc_recipients': comment_in.bcc_recipients,
-            'is_private': comment_in.is_private,
-            'created_at': comment.created_at.isoformat() if comment.created_at else None,
-            'attachments': [
-                {
-                    'id': att.id,
-                    'file_name': att.file_name,
-                    'content_type': att.content_type,
-                    'file_size': att.file_size,
-                    'download_url': att.s3_url
-                } for att in comment_with_agent.attachments
-            ] if comment_with_agent.attachments else []
-        }
-
-        # Emitir evento de forma asíncrona
-        from app.core.socketio import emit_comment_update
-        await emit_comment_update(
-            workspace_id=current_user.workspace_id,
-            comment_data=comment_data
-        )
-
-        logger.info(f"📤 Socket.IO comment_updated event queued for workspace {current_user.workspace_id}")
-    except Exception as e:
-        logger.error(f"❌ Error emitting Socket.IO event for comment {comment.id}: {str(e)}")
-
-    # --- Process Mention Notifications for Private Notes ---
-    if comment_in.is_private and comment_in.content:
-        try:
-            # Obtener la URL de origen para usar el subdominio correcto
-            origin_url = None
-            if request:
-                origin_url = str(request.headers.get("origin", ""))
-            if not origin_url:
-                origin_url = settings.FRONTEND_URL
-
-            # Procesar menciones en background para no bloquear la respuesta
-            from app.services.email_service import process_mention_notifications
-            notified_agents = await process_mention_notifications(
-                db=db,
-                comment_content=comment_in.content,
-                workspace_id=current_user.workspace_id,
-                ticket_id=task_id,
-                ticket_title=task.title,
-                mentioning_agent_id=current_user.id,
-                request_origin=origin_url
-            )
-
-            if notified_agents:
-                logger.info(f"✅ Mention notifications sent for comment {comment.id} on ticket {task_id}: {notified_agents}")
-            else:
-                logger.info(f"📝 No mention notifications sent for comment {comment.id} on ticket {task_id}")
-
-        except Exception as e:
-            logger.error(f"❌ Error processing mention notifications for comment {comment.id}: {str(e)}", exc_info=True)
-    # --- End Process Mention Notifications ---
-
     # Add workflow results to response if any were executed
     if workflow_results:
         # Add to response as extra field (will be ignored by Pydantic but available in JSON)
@@ -929,12 +740,109 @@ async def delete_comment(
     db.commit()
 
     return comment
-def run_send_email_in_background(*args, **kwargs):
-    """Wrapper to run email function in background task."""
-    try:
-        send_email_in_background(*args, **kwargs)
-    except Exception as e:
-        logger.error(f"Error running background email task: {e}", exc_info=True)
+
+
+async def _load_comment(db: Session, comment_id: int, agent_id: int):
+    """The comment, its ticket and its agent, or None if any is gone."""
+    comment = (await db.execute(
+        select(CommentModel).options(joinedload(CommentModel.ticket)).filter(CommentModel.id == comment_id)
+    )).scalar_one_or_none()
+    agent = (await db.execute(select(AgentModel).filter(AgentModel.id == agent_id))).scalar_one_or_none()
+    if not comment or not comment.ticket or not agent:
+        return None
+    return comment, comment.ticket, agent
+
+
+async def run_comment_workflows(db: Session, comment_id: int, agent_id: int):
+    """Workflows of a new agent comment (a ``comment.created`` outbox event); errors propagate so the event is retried."""
+    loaded = await _load_comment(db, comment_id, agent_id)
+    if not loaded:
+        return
+    comment, task, agent = loaded
+
+    context = {'ticket': task, 'comment': comment, 'agent': agent}
+    executed_workflows = await WorkflowService.execute_workflows(
+        db=db,
+        trigger='comment.added',
+        workspace_id=task.workspace_id,
+        context=context
+    )
+    if not comment.is_private:
+        executed_workflows.extend(await WorkflowService.execute_workflows(
+            db=db,
+            trigger='agent.replied',
+            workspace_id=task.workspace_id,
+            context=context
+        ))
+    if executed_workflows:
+        logger.info(f"Executed workflows for comment creation {comment.id}: {executed_workflows}")
+        await db.commit()
+
+
+async def send_new_response_notifications(db: Session, comment_id: int, agent_id: int):
+    """Tell the other agents about a public reply (a ``notification.new_response`` outbox event)."""
+    from app.services.notification_service import NotificationRecipient, deliver_notifications
+
+    loaded = await _load_comment(db, comment_id, agent_id)
+    if not loaded:
+        return
+    comment, task, agent = loaded
+    content = await comment_html_hydrator.resolve(comment.content)
+
+    task_user = None
+    if task.user_id:
+        task_user = (await db.execute(select(User).filter(User.id == task.user_id))).scalar_one_or_none()
+
+    agents = (await db.execute(select(AgentModel).filter(
+        AgentModel.workspace_id == task.workspace_id,
+        AgentModel.is_active == True,
+        AgentModel.id != agent.id  # Don't notify the commenting agent
+    ))).scalars().all()
+
+    await deliver_notifications(
+        db=db,
+        workspace_id=task.workspace_id,
+        category="agents",
+        notification_type="new_response_agent",
+        recipients=[
+            NotificationRecipient(other.email, other.name, {
+                "agent_name": other.name,
+                "ticket_id": task.id,
+                "ticket_title": task.title,
+                "commenter_name": agent.name,
+                "user_name": task_user.name if task_user else "Unknown User",
+                "comment_content": content
+            })
+            for other in agents if other.email
+        ],
+        task_id=task.id
+    )
+
+
+async def send_comment_mention_notifications(db: Session, comment_id: int, agent_id: int, request_origin: Optional[str]):
+    """Email the agents mentioned in a private note (a ``notification.mentions`` outbox event)."""
+    from app.services.email_service import deliver_mention_notifications
+
+    loaded = await _load_comment(db, comment_id, agent_id)
+    if not loaded:
+        return
+    comment, task, agent = loaded
+    content = await comment_html_hydrator.resolve(comment.content)
+    if not content:
+        return
+
+    notified_agents = await deliver_mention_notifications(
+        db=db,
+        comment_content=content,
+        workspace_id=task.workspace_id,
+        ticket_id=task.id,
+        ticket_title=task.title,
+        mentioning_agent_id=agent.id,
+        request_origin=request_origin
+    )
+    if notified_agents:
+        logger.info(f"✅ Mention notifications sent for comment {comment.id} on ticket {task.id}: {notified_agents}")
+
 
 def send_email_in_background(
     task_id: int,
@@ -950,6 +858,10 @@ def send_email_in_background(
     processed_attachment_ids: list,
     db_path: str
 ):
+    """
+    Send a public comment as an email reply (a ``comment.email`` outbox
+    event). A failed send raises, so the event is retried.
+    """
     from sqlalchemy import create_engine
     from sqlalchemy.orm import sessionmaker, joinedload
     from sqlalchemy import select
@@ -960,10 +872,8 @@ def send_email_in_background(
     engine = create_engine(db_path)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     
-    with SessionLocal() as db:
-        task_with_user = None
-
-        try:
+    try:
+        with SessionLocal() as db:
             from app.services.microsoft_service import MicrosoftGraphService
             agent = db.query(AgentModel).filter(AgentModel.id == agent_id).first()
             if not agent:
@@ -983,7 +893,7 @@ def send_email_in_background(
             if task_with_user.mailbox_connection_id:
                 logger.info(f"Background email task: Sending reply for task {task_id} via connected mailbox {task_with_user.mailbox_connection_id}")
                 microsoft_service = MicrosoftGraphService(db)
-                microsoft_service.send_reply_email(
+                sent = microsoft_service.send_reply_email(
                     task_id=task_id,
                     reply_content=comment_content,
                     agent=agent,
@@ -1012,7 +922,7 @@ def send_email_in_background(
                 html_body = f"<p><strong>{agent_name} commented:</strong></p>{comment_content}"
 
                 microsoft_service = MicrosoftGraphService(db)
-                microsoft_service.send_new_email(
+                sent = microsoft_service.send_new_email(
                     mailbox_email=sender_mailbox,
                     recipient_email=recipient_email,
                     subject=subject,
@@ -1022,32 +932,12 @@ def send_email_in_background(
                     cc_recipients=cc_recipients,
                     bcc_recipients=bcc_recipients
                 )
+            if not sent:
+                raise MicrosoftAPIException(f"Sending the email for comment {comment_id} on task {task_id} failed")
             logger.info(f"✅ Successfully sent email for comment {comment_id} on task {task_id}")
+    finally:
+        engine.dispose()
 
-        except (MicrosoftAPIException, DatabaseException) as e:
-            workspace_id = task_with_user.workspace_id if task_with_user else None
-            logger.error(
-                f"Error sending email in background for comment {comment_id}: {e}",
-                extra={
-                    "comment_id": comment_id,
-                    "task_id": task_id,
-                    "workspace_id": workspace_id,
-                    "error_type": type(e).__name__
-                },
-                exc_info=True
-            )
-        except Exception as e:
-            workspace_id = task_with_user.workspace_id if task_with_user else None
-            logger.error(
-                f"An unexpected error occurred in send_email_in_background for comment {comment_id}: {e}",
-                extra={
-                    "comment_id": comment_id,
-                    "task_id": task_id,
-                    "workspace_id": workspace_id,
-                    "error_type": type(e).__name__
-                },
-                exc_info=True
-            )
 
 @router.get("/comments/{comment_id}/s3-content")
 def get_comment_s3_content(
@@ -1071,8 +961,7 @@ def get_comment_s3_content(
                 "message": "Comment content is stored in database, not S3"
             }
 
-        s3_service = get_s3_service()
-        s3_content = s3_service.get_comment_html(comment.s3_html_url)
+        s3_content = get_storage_backend().get_comment_html(comment.s3_html_url)
 
         if not s3_content:
             logger.warning(f"Failed to retrieve content from S3 for comment {comment_id}, falling back to database")
@@ -1122,7 +1011,7 @@ def get_comment_s3_content(
                         )
                         logger.info(f"Processed CID images for S3 comment {comment_id}")
 
-                final_content, extracted_images = extract_base64_images(processed_content, ticket.id)
+                final_content, extracted_images = extract_base64_images(processed_content, ticket.id, db)
 
                 if extracted_images:
                     logger.info(f"Extracted {len(extracted_images)} base64 images from S3 content for comment {comment_id}")
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy import select, func, case, and_
 from app.api.dependencies import get_current_active_user
 from app.database.session import get_db
+from app.services.response_cache import cached_json_response
 from app.models.task import Task
 from app.models.agent import Agent
 from app.models.team import Team, TeamMember
-from app.schemas.task import TaskWithDetails
-from typing import Any, List, Dict
+from app.models.user import User
+from typing import Any
 from datetime import datetime
 import logging
 
@@ -14,99 +17,140 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+RECENT_TICKETS_LIMIT = 10
+
+
 @router.get("/stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user),
 ) -> Any:
-    user_id = current_user.id
-    workspace_id = current_user.workspace_id
-
-    user_info = db.query(Agent).filter(
-        Agent.id == user_id,
-        Agent.workspace_id == workspace_id
-    ).first()
-
-    if not user_info:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+    """
+    Dashboard statistics computed with grouped aggregates in two round-trips:
+    one for the per-team counters and one for the recent assigned tickets
+    (which also carries the assigned/completed totals as scalar subqueries).
+    No ORM entities are materialised. The response goes through the response
+    cache, keyed on the workspace generation, so a polling client whose ETag
+    still matches gets a 304 without any of these queries running.
+    """
+    async def build():
+        user_id = current_user.id
+        workspace_id = current_user.workspace_id
+
+        team_stats_stmt = select(
+            Team.id,
+            Team.name,
+            Team.description,
+            func.count(Task.id).label("tickets_assigned"),
+            func.coalesce(func.sum(case((Task.status.in_(['Open', 'Unread']), 1), else_=0)), 0).label("tickets_open"),
+            func.coalesce(func.sum(case((Task.user_id == user_id, 1), else_=0)), 0).label("tickets_with_user"),
+        ).join(
+            TeamMember, TeamMember.team_id == Team.id
+        ).outerjoin(
+            Task, and_(
+                Task.team_id == Team.id,
+                Task.workspace_id == workspace_id,
+                Task.is_deleted == False
+            )
+        ).where(
+            TeamMember.agent_id == user_id,
+            Team.workspace_id == workspace_id
+        ).group_by(Team.id).order_by(Team.id)
+
+        team_rows = (await db.execute(team_stats_stmt)).all()
+
+        # Totals are correlated against an alias so they are computed once over the
+        # whole assigned set, not per row of the recent-tickets page
+        counted = aliased(Task)
+        assigned_filter = (
+            counted.assignee_id == user_id,
+            counted.workspace_id == workspace_id,
+            counted.is_deleted == False
         )
-
-    assigned_tickets = db.query(Task).options(
-        joinedload(Task.user),
-        joinedload(Task.category)
-    ).filter(
-        Task.assignee_id == user_id,
-        Task.workspace_id == workspace_id,
-        Task.is_deleted == False
-    ).order_by(Task.created_at.desc()).limit(50).all()
-
-    user_teams = db.query(Team).join(TeamMember).filter(
-        TeamMember.agent_id == user_id,
-        Team.workspace_id == workspace_id
-    ).all()
-
-    team_stats = []
-    for team in user_teams:
-        team_tasks = db.query(Task).filter(
-            Task.team_id == team.id,
+        assigned_count_sq = select(func.count(counted.id)).where(*assigned_filter).scalar_subquery()
+        completed_count_sq = select(func.count(counted.id)).where(
+            *assigned_filter, counted.status == 'Closed'
+        ).scalar_subquery()
+
+        recent_stmt = select(
+            assigned_count_sq.label("assigned_count"),
+            completed_count_sq.label("completed_count"),
+            Task.id,
+            Task.title,
+            Task.status,
+            Task.priority,
+            Task.created_at,
+            User.id.label("user_id"),
+            User.name.label("user_name"),
+            User.email.label("user_email"),
+        ).outerjoin(
+            User, Task.user_id == User.id
+        ).where(
+            Task.assignee_id == user_id,
             Task.workspace_id == workspace_id,
             Task.is_deleted == False
-        ).all()
-
-        tickets_open = len([t for t in team_tasks if t.status in ['Open', 'Unread']])
-        tickets_with_user = len([t for t in team_tasks if t.user_id == user_id])
-        tickets_assigned = len(team_tasks)
-
-        team_stats.append({
-            "id": team.id,
-            "name": team.name,
-            "description": team.description,
-            "ticketsOpen": tickets_open,
-            "ticketsWithUser": tickets_with_user,
-            "ticketsAssigned": tickets_assigned,
-        })
-
-    tickets_assigned_count = len(assigned_tickets)
-    tickets_completed_count = len([t for t in assigned_tickets if t.status == 'Closed'])
-    teams_count = len(user_teams)
-
-    recent_tickets = []
-    for ticket in assigned_tickets[:10]:
-        recent_tickets.append({
-            "id": ticket.id,
-            "title": ticket.title,
-            "status": ticket.status,
-            "priority": ticket.priority,
-            "created_at": ticket.created_at.isoformat() if ticket.created_at else None,
+        ).order_by(Task.created_at.desc()).limit(RECENT_TICKETS_LIMIT)
+
+        recent_rows = (await db.execute(recent_stmt)).all()
+
+        tickets_assigned_count = recent_rows[0].assigned_count if recent_rows else 0
+        tickets_completed_count = recent_rows[0].completed_count if recent_rows else 0
+
+        team_stats = [
+            {
+                "id": row.id,
+                "name": row.name,
+                "description": row.description,
+                "ticketsOpen": int(row.tickets_open),
+                "ticketsWithUser": int(row.tickets_with_user),
+                "ticketsAssigned": row.tickets_assigned,
+            }
+            for row in team_rows
+        ]
+
+        recent_tickets = [
+            {
+                "id": row.id,
+                "title": row.title,
+                "status": row.status,
+                "priority": row.priority,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "user": {
+                    "id": row.user_id,
+                    "name": row.user_name,
+                    "email": row.user_email,
+                } if row.user_id else None
+            }
+            for row in recent_rows
+        ]
+
+        return {
             "user": {
-                "id": ticket.user.id if ticket.user else None,
-                "name": ticket.user.name if ticket.user else None,
-                "email": ticket.user.email if ticket.user else None,
-            } if ticket.user else None
-        })
+                "id": current_user.id,
+                "name": current_user.name,
+                "email": current_user.email,
+                "role": current_user.role,
+            },
+            "stats": {
+                "ticketsAssignedCount": tickets_assigned_count,
+                "ticketsCompletedCount": tickets_completed_count,
+                "teamsCount": len(team_rows),
+            },
+            "recentTickets": recent_tickets,
+            "teamsStats": team_stats,
+        }
 
-    return {
-        "user": {
-            "id": user_info.id,
-            "name": user_info.name,
-            "email": user_info.email,
-            "role": user_info.role,
-        },
-        "stats": {
-            "ticketsAssignedCount": tickets_assigned_count,
-            "ticketsCompletedCount": tickets_completed_count,
-            "teamsCount": teams_count,
-        },
-        "recentTickets": recent_tickets,
-        "teamsStats": team_stats,
-    }
+    # Team membership and profile changes show up within RESPONSE_CACHE_TTL
+    return await cached_json_response(
+        request, scope="dashboard:stats", workspace_id=current_user.workspace_id,
+        params={"agent_id": current_user.id}, build=build
+    )
 
 
 @router.post("/emergency/reset-email-sync")
 async def emergency_reset_email_sync(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user)
 ) -> Any:
     """🚑 EMERGENCY: Reset email sync circuit breaker"""
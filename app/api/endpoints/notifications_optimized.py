@@ -1,6 +1,6 @@
 import logging
 import time
-from typing import List, Optional, Any, Dict
+from typing import List, Mapping, Optional, Any, Dict
 from fastapi import APIRouter, Depends, HTTPException, Path, Body, Request
 from sqlalchemy.orm import Session, noload
 from pydantic import BaseModel
@@ -14,7 +14,7 @@ from app.schemas.notification import (
     NotificationTeamsConnectRequest,
     NotificationTemplateUpdateRequest,
 )
-from app.core.notification_cache import notification_cache
+from app.services.workspace_config import NotificationSettingSnapshot, NotificationTemplateSnapshot, workspace_config
 from app.services.notification_service import (
     get_notification_templates,
     get_notification_settings,
@@ -48,42 +48,13 @@ async def get_workspace_notification_settings_fast(
             detail="No tienes permisos para acceder a las notificaciones de este workspace",
         )
     
-    # Intentar obtener del cache primero
-    cached_settings = notification_cache.get_notification_settings(workspace_id)
-    if cached_settings:
-        duration_ms = (time.time() - start_time) * 1000
-        logger.info(f"[NOTIFY_FAST] Settings obtenidas del cache en {duration_ms:.2f}ms para workspace {workspace_id}")
-        return NotificationSettingsResponse(**cached_settings)
-    
-    # Cache miss - obtener de la base de datos con consultas optimizadas
-    logger.info(f"[NOTIFY_FAST] Cache miss, consultando DB para workspace {workspace_id}")
-    
-    # Consultas optimizadas sin cargar relaciones automáticamente
-    settings = db.query(NotificationSetting)\
-        .options(noload(NotificationSetting.workspace))\
-        .options(noload(NotificationSetting.template))\
-        .filter(NotificationSetting.workspace_id == workspace_id)\
-        .all()
-    
-    # Obtener templates solo si son necesarios
-    template_ids = [s.template_id for s in settings if s.template_id]
-    templates_dict = {}
-    if template_ids:
-        templates = db.query(NotificationTemplate)\
-            .options(noload(NotificationTemplate.workspace))\
-            .options(noload(NotificationTemplate.notification_settings))\
-            .filter(NotificationTemplate.id.in_(template_ids))\
-            .all()
-        templates_dict = {t.id: t for t in templates}
-    
-    # Formatear respuesta manualmente para evitar consultas adicionales
-    response_data = _format_notification_settings_optimized(settings, templates_dict)
-    
-    # Guardar en cache
-    notification_cache.set_notification_settings(workspace_id, response_data)
+    # Snapshot versionado del workspace: settings y templates en una sola carga
+    config = await workspace_config.get(db, workspace_id)
+    settings = [setting for group in config.notification_settings.values() for setting in group]
+    response_data = _format_notification_settings_optimized(settings, config.templates)
     
     duration_ms = (time.time() - start_time) * 1000
-    logger.info(f"[NOTIFY_FAST] Settings obtenidas de DB en {duration_ms:.2f}ms para workspace {workspace_id}")
+    logger.info(f"[NOTIFY_FAST] Settings obtenidas en {duration_ms:.2f}ms para workspace {workspace_id} (config v{config.version})")
     
     return NotificationSettingsResponse(**response_data)
 
@@ -221,9 +192,8 @@ async def update_notification_template_fast(
             detail="Falló la actualización del template",
         )
     
-    # Invalidar cache
-    notification_cache.invalidate_template(template_id)
-    notification_cache.invalidate_workspace_settings(workspace_id)
+    # Invalidar el snapshot en todos los workers
+    await workspace_config.bump(workspace_id)
     
     duration_ms = (time.time() - start_time) * 1000
     logger.info(f"[NOTIFY_FAST] Template {template_id} actualizado en {duration_ms:.2f}ms")
@@ -276,8 +246,8 @@ async def toggle_notification_setting_fast(
             detail="Falló la actualización de la configuración",
         )
     
-    # Invalidar cache
-    notification_cache.invalidate_workspace_settings(workspace_id)
+    # Invalidar el snapshot en todos los workers
+    await workspace_config.bump(workspace_id)
     
     duration_ms = (time.time() - start_time) * 1000
     logger.info(f"[NOTIFY_FAST] Setting {setting_id} alternado en {duration_ms:.2f}ms")
@@ -299,7 +269,7 @@ async def get_notification_cache_stats(
             detail="Solo admins pueden ver estadísticas del cache"
         )
     
-    return notification_cache.get_stats()
+    return workspace_config.get_stats()
 
 
 @router.post("/cache/clear")
@@ -316,13 +286,13 @@ async def clear_notification_cache(
             detail="Solo superadmins pueden limpiar el cache"
         )
     
-    notification_cache.clear()
+    workspace_config.clear()
     return {"message": "Cache de notificaciones limpiado exitosamente"}
 
 
 def _format_notification_settings_optimized(
-    settings: List[NotificationSetting], 
-    templates_dict: Dict[int, NotificationTemplate]
+    settings: List[NotificationSettingSnapshot], 
+    templates_dict: Mapping[int, NotificationTemplateSnapshot]
 ) -> Dict[str, Any]:
     """
     Formatear configuraciones de notificación de forma optimizada.
@@ -4,12 +4,12 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.api.dependencies import get_current_active_user
+from app.api.dependencies import get_current_agent_model
 from app.database.session import get_db
 from app.models.agent import Agent
 from app.schemas.agent import Agent as AgentSchema, AgentUpdate
-from app.core.security import get_password_hash
-from app.services.cache_service import cache_service
+from app.core.security import get_password_hash_async
+from app.services.principal_cache import principal_cache
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +18,7 @@ router = APIRouter()
 
 @router.get("/me", response_model=AgentSchema)
 async def read_user_me(
-    current_user: Agent = Depends(get_current_active_user),
+    current_user: Agent = Depends(get_current_agent_model),
 ) -> Any:
     """
     Get current user profile
@@ -30,7 +30,7 @@ async def read_user_me(
 async def update_user_me(
     user_in: AgentUpdate,
     db: Session = Depends(get_db),
-    current_user: Agent = Depends(get_current_active_user),
+    current_user: Agent = Depends(get_current_agent_model),
 ) -> Any:
     """
     Update current user profile
@@ -47,7 +47,7 @@ async def update_user_me(
     
     # Hash de la contraseña si se está actualizando
     if "password" in update_data and update_data["password"]:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await get_password_hash_async(update_data["password"])
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
@@ -56,9 +56,8 @@ async def update_user_me(
     db.commit()
     db.refresh(current_user)
     
-    # Invalidate the user's cache in Redis
-    cache_key = f"user_agent:{current_user.id}"
-    await cache_service.delete(cache_key)
+    # Invalidate the user's cached auth principal (Redis and every worker)
+    await principal_cache.revoke_agent(current_user.id)
     logger.info(f"PROFILE UPDATE: User {current_user.id} ({current_user.email}) updated and cache invalidated.")
     
     return current_user
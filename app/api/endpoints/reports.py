@@ -1,93 +1,120 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, case, select
+from sqlalchemy import func, select
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from app.api import dependencies
 from app.database.session import get_db
 from app.models.agent import Agent
-from app.models.task import Task
+from app.models.report_rollup import TicketReportRollup
 from app.schemas.task import TaskStatus, TaskPriority
 from app.schemas import report as report_schema
+from app.services.report_rollups import hour_floor, team_filter
 
 router = APIRouter()
 
-@router.get("/summary", response_model=report_schema.ReportSummary, status_code=status.HTTP_200_OK)
-async def get_report_summary(
-    *,
-    db: AsyncSession = Depends(dependencies.get_db),
-    current_user: Agent = Depends(dependencies.get_current_active_user),
-    start_date: Optional[datetime] = Query(None, description="Start date for filtering (ISO format)"),
-    end_date: Optional[datetime] = Query(None, description="End date for filtering (ISO format)"),
-    team_id: Optional[int] = Query(None, description="Filter by team ID")
-):
-    if not start_date:
-        start_date = datetime.utcnow() - timedelta(days=7)
-    if not end_date:
-        end_date = datetime.utcnow()
 
-    # Build filters
+def _rollup_filters(workspace_id: int, start_date: datetime, end_date: datetime, team_id: Optional[int]) -> list:
+    """
+    Filters on the hourly rollup buckets (see ``app.services.report_rollups``).
+    Ranges are resolved to whole hours: a bucket counts when its hour starts
+    within ``[start_date, end_date]``, including the hour ``start_date`` falls in.
+    """
     filters = [
-        Task.workspace_id == current_user.workspace_id,
-        Task.created_at >= start_date,
-        Task.created_at <= end_date
+        TicketReportRollup.workspace_id == workspace_id,
+        TicketReportRollup.bucket_start >= hour_floor(start_date),
+        TicketReportRollup.bucket_start <= end_date
     ]
 
     # Add team filter if provided
     if team_id is not None:
         from app.models.microsoft import mailbox_team_assignments
-        from sqlalchemy import or_, and_
 
         mailbox_subquery = select(mailbox_team_assignments.c.mailbox_connection_id).where(
             mailbox_team_assignments.c.team_id == team_id
         ).scalar_subquery()
+        filters.append(team_filter(team_id, mailbox_subquery))
+
+    return filters
+
+
+def _format_duration(total_seconds: int, count: int) -> str:
+    """Average of ``total_seconds`` over ``count`` tickets, e.g. "1d 4h", "2h 15m", "12m"."""
+    if not count:
+        return "N/A"
+    minutes = int(round(total_seconds / count / 60))
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def _default_range(start_date: Optional[datetime], end_date: Optional[datetime]):
+    if not start_date:
+        start_date = datetime.utcnow() - timedelta(days=7)
+    if not end_date:
+        end_date = datetime.utcnow()
+    return start_date, end_date
 
-        filters.append(
-            or_(
-                Task.team_id == team_id,
-                and_(
-                    Task.team_id.is_(None),
-                    Task.mailbox_connection_id.isnot(None),
-                    Task.mailbox_connection_id.in_(mailbox_subquery)
-                )
-            )
-        )
-
-    # Build aggregate query
+
+@router.get("/summary", response_model=report_schema.ReportSummary, status_code=status.HTTP_200_OK)
+async def get_report_summary(
+    *,
+    db: AsyncSession = Depends(dependencies.get_db),
+    current_user: Agent = Depends(dependencies.get_current_active_user),
+    start_date: Optional[datetime] = Query(None, description="Start date for filtering (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="End date for filtering (ISO format)"),
+    team_id: Optional[int] = Query(None, description="Filter by team ID")
+):
+    start_date, end_date = _default_range(start_date, end_date)
+
+    # One row per (status, priority): at most 20, whatever the range
     stmt = select(
-        func.count(Task.id).label("created_tickets"),
-        func.sum(case((Task.status == TaskStatus.CLOSED, 1), else_=0)).label("resolved_tickets"),
-        func.sum(case((Task.status != TaskStatus.CLOSED, 1), else_=0)).label("unresolved_tickets"),
-        # Group by status
-        func.count(case((Task.status == TaskStatus.OPEN, Task.id))).label("open_count"),
-        func.count(case((Task.status == TaskStatus.CLOSED, Task.id))).label("closed_count"),
-        func.count(case((Task.status == TaskStatus.UNREAD, Task.id))).label("unread_count"),
-         # Group by priority
-        func.count(case((Task.priority == TaskPriority.LOW, Task.id))).label("low_priority_count"),
-        func.count(case((Task.priority == TaskPriority.MEDIUM, Task.id))).label("medium_priority_count"),
-        func.count(case((Task.priority == TaskPriority.HIGH, Task.id))).label("high_priority_count")
-    ).where(*filters)
+        TicketReportRollup.status,
+        TicketReportRollup.priority,
+        func.sum(TicketReportRollup.ticket_count).label("count"),
+        func.sum(TicketReportRollup.first_response_count).label("first_response_count"),
+        func.sum(TicketReportRollup.first_response_seconds).label("first_response_seconds"),
+        func.sum(TicketReportRollup.resolved_count).label("resolved_count"),
+        func.sum(TicketReportRollup.resolution_seconds).label("resolution_seconds")
+    ).where(
+        *_rollup_filters(current_user.workspace_id, start_date, end_date, team_id)
+    ).group_by(TicketReportRollup.status, TicketReportRollup.priority)
 
     result = await db.execute(stmt)
-    counts = result.first()
-
-    # TODO: Calculate Avg Response Times (more complex, requires joining comments/activities)
+    status_totals: Dict[str, int] = {}
+    priority_totals: Dict[str, int] = {}
+    first_response_count = first_response_seconds = resolved_count = resolution_seconds = 0
+    for row in result.all():
+        first_response_count += int(row.first_response_count or 0)
+        first_response_seconds += int(row.first_response_seconds or 0)
+        resolved_count += int(row.resolved_count or 0)
+        resolution_seconds += int(row.resolution_seconds or 0)
+        count = int(row.count or 0)
+        status_totals[row.status] = status_totals.get(row.status, 0) + count
+        priority_totals[row.priority] = priority_totals.get(row.priority, 0) + count
+    created_tickets = sum(status_totals.values())
+    resolved_tickets = status_totals.get(TaskStatus.CLOSED.value, 0)
 
     summary_data = {
-        "created_tickets": counts.created_tickets or 0,
-        "resolved_tickets": counts.resolved_tickets or 0,
-        "unresolved_tickets": counts.unresolved_tickets or 0,
-        "average_response_time": "N/A", # Placeholder
-        "avg_first_response_time": "N/A", # Placeholder
+        "created_tickets": created_tickets,
+        "resolved_tickets": resolved_tickets,
+        "unresolved_tickets": created_tickets - resolved_tickets,
+        # From the SLA timestamps summed into the rollups (see app.services.ticket_lifecycle)
+        "average_response_time": _format_duration(resolution_seconds, resolved_count),
+        "avg_first_response_time": _format_duration(first_response_seconds, first_response_count),
         "status_counts": {
-            TaskStatus.OPEN: counts.open_count or 0,
-            TaskStatus.CLOSED: counts.closed_count or 0,
-            TaskStatus.UNREAD: counts.unread_count or 0,
+            TaskStatus.OPEN: status_totals.get(TaskStatus.OPEN.value, 0),
+            TaskStatus.CLOSED: status_totals.get(TaskStatus.CLOSED.value, 0),
+            TaskStatus.UNREAD: status_totals.get(TaskStatus.UNREAD.value, 0),
         },
         "priority_counts": {
-            TaskPriority.LOW: counts.low_priority_count or 0,
-            TaskPriority.MEDIUM: counts.medium_priority_count or 0,
-            TaskPriority.HIGH: counts.high_priority_count or 0,
+            TaskPriority.LOW: priority_totals.get(TaskPriority.LOW.value, 0),
+            TaskPriority.MEDIUM: priority_totals.get(TaskPriority.MEDIUM.value, 0),
+            TaskPriority.HIGH: priority_totals.get(TaskPriority.HIGH.value, 0),
         }
     }
     return report_schema.ReportSummary(**summary_data)
@@ -102,55 +129,23 @@ async def get_tickets_created_by_hour(
     end_date: Optional[datetime] = Query(None, description="End date for filtering (ISO format)"),
     team_id: Optional[int] = Query(None, description="Filter by team ID")
 ):
-    if not start_date:
-        start_date = datetime.utcnow() - timedelta(days=7)
-    if not end_date:
-        end_date = datetime.utcnow()
-
-    # Build filters
-    filters = [
-        Task.workspace_id == current_user.workspace_id,
-        Task.created_at >= start_date,
-        Task.created_at <= end_date
-    ]
-
-    if team_id is not None:
-        from app.models.microsoft import mailbox_team_assignments
-        from sqlalchemy import or_, and_
-
-        mailbox_subquery = select(mailbox_team_assignments.c.mailbox_connection_id).where(
-            mailbox_team_assignments.c.team_id == team_id
-        ).scalar_subquery()
-
-        filters.append(
-            or_(
-                Task.team_id == team_id,
-                and_(
-                    Task.team_id.is_(None),
-                    Task.mailbox_connection_id.isnot(None),
-                    Task.mailbox_connection_id.in_(mailbox_subquery)
-                )
-            )
-        )
+    start_date, end_date = _default_range(start_date, end_date)
 
     # Build query
+    hour = func.hour(TicketReportRollup.bucket_start)
     stmt = select(
-        func.extract('hour', Task.created_at).label('hour'),
-        func.count(Task.id).label('count')
+        hour.label('hour'),
+        func.sum(TicketReportRollup.ticket_count).label('count')
     ).where(
-        *filters
-    ).group_by(
-        func.extract('hour', Task.created_at)
-    ).order_by(
-        func.extract('hour', Task.created_at)
-    )
+        *_rollup_filters(current_user.workspace_id, start_date, end_date, team_id)
+    ).group_by(hour).order_by(hour)
 
     result = await db.execute(stmt)
     results = result.all()
     hourly_counts = {f"{h:02d}": 0 for h in range(24)}
     for row in results:
         hour_str = f"{int(row.hour):02d}" 
-        hourly_counts[hour_str] = row.count
+        hourly_counts[hour_str] = int(row.count or 0)
     formatted_results = [
         report_schema.TimeSeriesDataPoint(time_unit=hour, count=count)
         for hour, count in hourly_counts.items()
@@ -168,49 +163,16 @@ async def get_tickets_created_by_day(
     end_date: Optional[datetime] = Query(None, description="End date for filtering (ISO format)"),
     team_id: Optional[int] = Query(None, description="Filter by team ID")
 ):
-    if not start_date:
-        start_date = datetime.utcnow() - timedelta(days=7)
-    if not end_date:
-        end_date = datetime.utcnow()
-
-    # Build filters
-    filters = [
-        Task.workspace_id == current_user.workspace_id,
-        Task.created_at >= start_date,
-        Task.created_at <= end_date
-    ]
-
-    # Add team filter if provided
-    if team_id is not None:
-        from app.models.microsoft import mailbox_team_assignments
-        from sqlalchemy import or_, and_
-
-        mailbox_subquery = select(mailbox_team_assignments.c.mailbox_connection_id).where(
-            mailbox_team_assignments.c.team_id == team_id
-        ).scalar_subquery()
-
-        filters.append(
-            or_(
-                Task.team_id == team_id,
-                and_(
-                    Task.team_id.is_(None),
-                    Task.mailbox_connection_id.isnot(None),
-                    Task.mailbox_connection_id.in_(mailbox_subquery)
-                )
-            )
-        )
+    start_date, end_date = _default_range(start_date, end_date)
 
     # Build query
+    weekday = func.weekday(TicketReportRollup.bucket_start)
     stmt = select(
-        func.weekday(Task.created_at).label('weekday'),
-        func.count(Task.id).label('count')
+        weekday.label('weekday'),
+        func.sum(TicketReportRollup.ticket_count).label('count')
     ).where(
-        *filters
-    ).group_by(
-        func.weekday(Task.created_at)
-    ).order_by(
-        func.weekday(Task.created_at)
-    )
+        *_rollup_filters(current_user.workspace_id, start_date, end_date, team_id)
+    ).group_by(weekday).order_by(weekday)
 
     # Execute query
     result = await db.execute(stmt)
@@ -222,11 +184,49 @@ async def get_tickets_created_by_day(
         day_index = int(row.weekday)
         if 0 <= day_index < len(days_of_week):
             day_name = days_of_week[day_index] 
-            daily_counts[day_name] = row.count
+            daily_counts[day_name] = int(row.count or 0)
         else:
             print(f"Warning: Unexpected weekday index {day_index} encountered.")
     formatted_results = [
         report_schema.TimeSeriesDataPoint(time_unit=day, count=daily_counts[day])
         for day in days_of_week
     ]
-    return formatted_results
\ No newline at end of file
+    return formatted_results
+
+@router.get("/advanced", response_model=report_schema.AdvancedReport, status_code=status.HTTP_200_OK)
+async def get_advanced_report(
+    *,
+    db: AsyncSession = Depends(dependencies.get_db),
+    current_user: Agent = Depends(dependencies.get_current_active_user),
+    report: report_schema.AdvancedReportType = Query(..., description="Report to run"),
+    start_date: Optional[datetime] = Query(None, description="Start date for filtering (ISO format)"),
+    end_date: Optional[datetime] = Query(None, description="End date for filtering (ISO format)"),
+    team_id: Optional[int] = Query(None, description="Filter by team ID")
+):
+    """
+    Multi-month trend reports. They run on DuckDB over the workspace's
+    columnar export (see app.services.analytics_warehouse), never on the live
+    tables, so results lag the database by up to one export interval.
+    """
+    from app.services.analytics_warehouse import analytics_warehouse
+
+    if not analytics_warehouse.available:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Advanced reports are not enabled")
+
+    if not start_date:
+        start_date = datetime.utcnow() - timedelta(days=180)
+    if not end_date:
+        end_date = datetime.utcnow()
+
+    mailbox_ids: List[int] = []
+    if team_id is not None:
+        from app.models.microsoft import mailbox_team_assignments
+
+        mailbox_ids = list((await db.execute(
+            select(mailbox_team_assignments.c.mailbox_connection_id).where(mailbox_team_assignments.c.team_id == team_id)
+        )).scalars().all())
+
+    result = await analytics_warehouse.run_report(
+        report.value, current_user.workspace_id, start_date, end_date, team_id=team_id, mailbox_ids=mailbox_ids
+    )
+    return report_schema.AdvancedReport(**result)
@@ -518,8 +518,8 @@ def get_task_initial_content(
                 "content": initial_comment.content or "",
                 "message": "Initial content loaded from comment in database"
             }
-        from app.services.s3_service import get_s3_service
-        s3_service = get_s3_service()
+        from app.services.storage import get_storage_backend
+        s3_service = get_storage_backend()
         s3_content = s3_service.get_comment_html(initial_comment.s3_html_url)
         if not s3_content:
             logger.warning(f"Failed to retrieve initial content from S3 for ticket {task_id}, falling back to database")
@@ -539,7 +539,7 @@ def get_task_initial_content(
             from app.utils.image_processor import extract_base64_images
             ms_service = MicrosoftGraphService(db)
             processed_content = s3_content
-            final_content, extracted_images = extract_base64_images(processed_content, task.id)
+            final_content, extracted_images = extract_base64_images(processed_content, task.id, db)
             if extracted_images:
                 logger.info(f"Extracted {len(extracted_images)} base64 images from initial S3 content for ticket {task_id}")
                 processed_content = final_content
@@ -576,7 +576,7 @@ def get_ticket_html_content(
                 detail="Ticket not found"
             )
         from app.models.comment import Comment as CommentModel
-        from app.services.s3_service import get_s3_service
+        from app.services.storage import get_storage_backend
 
         
         def get_avatar_url(sender_type: str, agent=None, user=None):
@@ -589,7 +589,7 @@ def get_ticket_html_content(
                     return user.company.logo_url
             return None
         
-        s3_service = get_s3_service()
+        s3_service = get_storage_backend()
         comments = db.query(CommentModel).options(
             selectinload(CommentModel.agent),
             selectinload(CommentModel.attachments)
@@ -691,7 +691,7 @@ def get_ticket_html_content(
                 if content and 'data:image/' in content:
                     try:
                         from app.utils.image_processor import extract_base64_images
-                        processed_content, extracted_images = extract_base64_images(content, task.id)
+                        processed_content, extracted_images = extract_base64_images(content, task.id, db)
                         content = processed_content
                         # Base64 images processed silently
                     except Exception as e:
@@ -16,14 +16,18 @@ from app.models.task import Task, TicketBody
 from app.models.agent import Agent
 from app.models.user import User
 from app.models.comment import Comment as CommentModel
-from app.schemas.task import Task as TaskSchema, TaskWithDetails, TicketUpdate, TicketCreate, TicketMergeRequest, TicketMergeResponse
+from app.schemas.task import Task as TaskSchema, TaskListItem, TaskWithDetails, TicketUpdate, TicketCreate, TicketMergeRequest, TicketMergeResponse, TicketBulkUpdate, TicketBulkResult
 from app.models.microsoft import mailbox_team_assignments
 from app.models.activity import Activity
 from app.utils.logger import logger
 from app.services.ticket_merge_service import TicketMergeService
 from app.services.automation_service import execute_automations_for_ticket
 from app.core.socketio import emit_new_ticket, emit_ticket_deleted
-from app.services.s3_service import get_s3_service
+from app.services.comment_html_hydrator import comment_html_hydrator, extract_s3_url, is_s3_pointer
+from app.services.response_cache import cached_json_response
+from app.services.ticket_archive import ticket_archive
+from app.services.task_serializer import TASK_LIST_ENCODER, select_task_list
+from app.core.serialization import ORJSONBytesResponse, encode_model
 from app.services.microsoft_service import MicrosoftGraphService
 from app.utils.image_processor import extract_base64_images
 
@@ -183,8 +187,9 @@ async def delete_task(
 
     return {"message": "Task deleted successfully"}
 
-@router.get("/", response_model=List[TaskSchema])
+@router.get("/", response_model=List[TaskListItem])
 async def read_tasks_optimized_default(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
@@ -208,7 +213,7 @@ async def read_tasks_optimized_default(
     team_ids: Optional[str] = Query(None),
 ) -> Any:
     return await read_tasks_optimized(
-        db=db, skip=skip, limit=limit, current_user=current_user,
+        request=request, db=db, skip=skip, limit=limit, current_user=current_user,
         subject=subject, status=status, team_id=team_id,
         assignee_id=assignee_id, priority=priority, category_id=category_id,
         user_id=user_id, company_id=company_id,
@@ -218,8 +223,9 @@ async def read_tasks_optimized_default(
         team_ids=team_ids
     )
 
-@router.get("/fast", response_model=List[TaskSchema])
+@router.get("/fast", response_model=List[TaskListItem])
 async def read_tasks_optimized(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
@@ -242,82 +248,43 @@ async def read_tasks_optimized(
     category_ids: Optional[str] = Query(None),
     team_ids: Optional[str] = Query(None),
 ) -> Any:
-    query = select(Task).filter(
-        Task.workspace_id == current_user.workspace_id,
-        Task.is_deleted == False
-    ).options(
-        noload("*")
-    )
-
-    # Text search filter
-    if subject:
-        query = query.filter(Task.title.ilike(f"%{subject}%"))
+    params = {
+        "skip": skip, "limit": limit, "subject": subject, "status": status,
+        "team_id": team_id, "assignee_id": assignee_id, "priority": priority,
+        "category_id": category_id, "user_id": user_id, "company_id": company_id,
+        "sort_by": sort_by, "order": order, "statuses": statuses,
+        "assignee_ids": assignee_ids, "priorities": priorities, "user_ids": user_ids,
+        "company_ids": company_ids, "category_ids": category_ids, "team_ids": team_ids,
+    }
 
-    # Single value filters (backward compatibility)
-    if status:
-        query = query.filter(Task.status == status)
-    if assignee_id:
-        query = query.filter(Task.assignee_id == assignee_id)
-    if priority:
-        query = query.filter(Task.priority == priority)
-    if category_id:
-        query = query.filter(Task.category_id == category_id)
-    if user_id:
-        query = query.filter(Task.user_id == user_id)
-    if team_id:
-        subquery = select(mailbox_team_assignments.c.mailbox_connection_id).filter(
-            mailbox_team_assignments.c.team_id == team_id
-        )
-        query = query.filter(
-            or_(
-                Task.team_id == team_id,
-                and_(
-                    Task.team_id.is_(None),
-                    Task.mailbox_connection_id.isnot(None),
-                    Task.mailbox_connection_id.in_(subquery)
-                )
-            )
+    async def build():
+        query = select_task_list().filter(
+            Task.workspace_id == current_user.workspace_id,
+            Task.is_deleted == False
         )
 
-    # Company filter (needs join with User)
-    if company_id:
-        query = query.join(User, Task.user_id == User.id).filter(User.company_id == company_id)
-
-    # Multi-value filters (comma-separated)
-    if statuses:
-        status_list = [s.strip() for s in statuses.split(',') if s.strip()]
-        if status_list:
-            query = query.filter(Task.status.in_(status_list))
-
-    if assignee_ids:
-        assignee_id_list = [int(a.strip()) for a in assignee_ids.split(',') if a.strip().isdigit()]
-        if assignee_id_list:
-            query = query.filter(Task.assignee_id.in_(assignee_id_list))
-
-    if priorities:
-        priority_list = [p.strip() for p in priorities.split(',') if p.strip()]
-        if priority_list:
-            query = query.filter(Task.priority.in_(priority_list))
-
-    if user_ids:
-        user_id_list = [int(u.strip()) for u in user_ids.split(',') if u.strip().isdigit()]
-        if user_id_list:
-            query = query.filter(Task.user_id.in_(user_id_list))
-
-    if category_ids:
-        category_id_list = [int(c.strip()) for c in category_ids.split(',') if c.strip().isdigit()]
-        if category_id_list:
-            query = query.filter(Task.category_id.in_(category_id_list))
-
-    if team_ids:
-        team_id_list = [int(t.strip()) for t in team_ids.split(',') if t.strip().isdigit()]
-        if team_id_list:
+        # Text search filter
+        if subject:
+            query = query.filter(Task.title.ilike(f"%{subject}%"))
+
+        # Single value filters (backward compatibility)
+        if status:
+            query = query.filter(Task.status == status)
+        if assignee_id:
+            query = query.filter(Task.assignee_id == assignee_id)
+        if priority:
+            query = query.filter(Task.priority == priority)
+        if category_id:
+            query = query.filter(Task.category_id == category_id)
+        if user_id:
+            query = query.filter(Task.user_id == user_id)
+        if team_id:
             subquery = select(mailbox_team_assignments.c.mailbox_connection_id).filter(
-                mailbox_team_assignments.c.team_id.in_(team_id_list)
+                mailbox_team_assignments.c.team_id == team_id
             )
             query = query.filter(
                 or_(
-                    Task.team_id.in_(team_id_list),
+                    Task.team_id == team_id,
                     and_(
                         Task.team_id.is_(None),
                         Task.mailbox_connection_id.isnot(None),
@@ -326,44 +293,95 @@ async def read_tasks_optimized(
                 )
             )
 
-    if company_ids:
-        company_id_list = [int(c.strip()) for c in company_ids.split(',') if c.strip().isdigit()]
-        if company_id_list:
-            query = query.join(User, Task.user_id == User.id).filter(User.company_id.in_(company_id_list))
+        # Company filter (needs join with User)
+        if company_id:
+            query = query.join(User, Task.user_id == User.id).filter(User.company_id == company_id)
+
+        # Multi-value filters (comma-separated)
+        if statuses:
+            status_list = [s.strip() for s in statuses.split(',') if s.strip()]
+            if status_list:
+                query = query.filter(Task.status.in_(status_list))
+
+        if assignee_ids:
+            assignee_id_list = [int(a.strip()) for a in assignee_ids.split(',') if a.strip().isdigit()]
+            if assignee_id_list:
+                query = query.filter(Task.assignee_id.in_(assignee_id_list))
+
+        if priorities:
+            priority_list = [p.strip() for p in priorities.split(',') if p.strip()]
+            if priority_list:
+                query = query.filter(Task.priority.in_(priority_list))
+
+        if user_ids:
+            user_id_list = [int(u.strip()) for u in user_ids.split(',') if u.strip().isdigit()]
+            if user_id_list:
+                query = query.filter(Task.user_id.in_(user_id_list))
+
+        if category_ids:
+            category_id_list = [int(c.strip()) for c in category_ids.split(',') if c.strip().isdigit()]
+            if category_id_list:
+                query = query.filter(Task.category_id.in_(category_id_list))
+
+        if team_ids:
+            team_id_list = [int(t.strip()) for t in team_ids.split(',') if t.strip().isdigit()]
+            if team_id_list:
+                subquery = select(mailbox_team_assignments.c.mailbox_connection_id).filter(
+                    mailbox_team_assignments.c.team_id.in_(team_id_list)
+                )
+                query = query.filter(
+                    or_(
+                        Task.team_id.in_(team_id_list),
+                        and_(
+                            Task.team_id.is_(None),
+                            Task.mailbox_connection_id.isnot(None),
+                            Task.mailbox_connection_id.in_(subquery)
+                        )
+                    )
+                )
 
-    # Dynamic sorting
-    sort_column = Task.created_at  # Default
-    if sort_by == 'status':
-        sort_column = Task.status
-    elif sort_by == 'priority':
-        # Custom priority order: Critical > High > Medium > Low
-        priority_case = func.case(
-            (Task.priority == 'Critical', 4),
-            (Task.priority == 'High', 3),
-            (Task.priority == 'Medium', 2),
-            (Task.priority == 'Low', 1),
-            else_=0
-        )
-        sort_column = priority_case
-    elif sort_by == 'updated_at':
-        sort_column = Task.updated_at
-    elif sort_by == 'last_update':
-        sort_column = Task.last_update
-    elif sort_by == 'created_at':
-        sort_column = Task.created_at
+        if company_ids:
+            company_id_list = [int(c.strip()) for c in company_ids.split(',') if c.strip().isdigit()]
+            if company_id_list:
+                query = query.join(User, Task.user_id == User.id).filter(User.company_id.in_(company_id_list))
+
+        # Dynamic sorting
+        sort_column = Task.created_at  # Default
+        if sort_by == 'status':
+            sort_column = Task.status
+        elif sort_by == 'priority':
+            # Custom priority order: Critical > High > Medium > Low
+            priority_case = func.case(
+                (Task.priority == 'Critical', 4),
+                (Task.priority == 'High', 3),
+                (Task.priority == 'Medium', 2),
+                (Task.priority == 'Low', 1),
+                else_=0
+            )
+            sort_column = priority_case
+        elif sort_by == 'updated_at':
+            sort_column = Task.updated_at
+        elif sort_by == 'last_update':
+            sort_column = Task.last_update
+        elif sort_by == 'created_at':
+            sort_column = Task.created_at
+
+        # Apply order direction
+        if order == 'asc':
+            query = query.order_by(sort_column.asc())
+        else:
+            query = query.order_by(sort_column.desc())
 
-    # Apply order direction
-    if order == 'asc':
-        query = query.order_by(sort_column.asc())
-    else:
-        query = query.order_by(sort_column.desc())
+        result = await db.execute(query.offset(skip).limit(limit))
+        return TASK_LIST_ENCODER.encode_many(result.all())
 
-    result = await db.execute(query.offset(skip).limit(limit))
-    tasks = result.scalars().all()
-    return tasks
+    return await cached_json_response(
+        request, scope="tasks:list", workspace_id=current_user.workspace_id,
+        params=params, build=build
+    )
 
 
-@router.get("/assignee/{agent_id}/fast", response_model=List[TaskSchema])
+@router.get("/assignee/{agent_id}/fast", response_model=List[TaskListItem])
 async def read_assigned_tasks_optimized(
     agent_id: int,
     db: AsyncSession = Depends(get_db),
@@ -382,12 +400,10 @@ async def read_assigned_tasks_optimized(
     user_ids: Optional[str] = Query(None),
     team_ids: Optional[str] = Query(None),
 ) -> Any:
-    query = select(Task).filter(
+    query = select_task_list().filter(
         Task.assignee_id == agent_id,
         Task.workspace_id == current_user.workspace_id,
         Task.is_deleted == False
-    ).options(
-        noload("*")
     )
 
     # Text search filter
@@ -452,11 +468,10 @@ async def read_assigned_tasks_optimized(
         query = query.order_by(sort_column.desc())
 
     result = await db.execute(query.offset(skip).limit(limit))
-    tasks = result.scalars().all()
-    return tasks
+    return ORJSONBytesResponse(TASK_LIST_ENCODER.encode_many(result.all()))
 
 
-@router.get("/assignee/{agent_id}", response_model=List[TaskSchema])
+@router.get("/assignee/{agent_id}", response_model=List[TaskListItem])
 async def read_assignee_tasks_optimized(
     agent_id: int,
     db: AsyncSession = Depends(get_db),
@@ -483,7 +498,7 @@ async def read_assignee_tasks_optimized(
     )
 
 
-@router.get("/team/{team_id}", response_model=List[TaskSchema])
+@router.get("/team/{team_id}", response_model=List[TaskListItem])
 async def read_team_tasks_optimized(
     team_id: int,
     db: AsyncSession = Depends(get_db),
@@ -494,11 +509,9 @@ async def read_team_tasks_optimized(
     """
     ENDPOINT OPTIMIZADO: Tasks asignadas a un equipo específico
     """
-    query = select(Task).filter(
+    query = select_task_list().filter(
         Task.workspace_id == current_user.workspace_id,
         Task.is_deleted == False
-    ).options(
-        noload("*")
     )
 
     from app.models.team import TeamMember
@@ -507,8 +520,7 @@ async def read_team_tasks_optimized(
     )
     
     result = await db.execute(query.offset(skip).limit(limit))
-    tasks = result.scalars().all()
-    return tasks
+    return ORJSONBytesResponse(TASK_LIST_ENCODER.encode_many(result.all()))
 
 
 @router.get("/search", response_model=List[TaskWithDetails])
@@ -576,88 +588,109 @@ async def search_tickets(
 
 @router.get("/count")
 async def get_tasks_count(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user),
     status: Optional[str] = Query(None),
     assignee_id: Optional[int] = Query(None),
 ) -> dict:
-    query = select(func.count(Task.id)).filter(
-        Task.workspace_id == current_user.workspace_id,
-        Task.is_deleted == False
-    )
+    async def build():
+        query = select(func.count(Task.id)).filter(
+            Task.workspace_id == current_user.workspace_id,
+            Task.is_deleted == False
+        )
     
-    if status:
-        query = query.filter(Task.status == status)
-    if assignee_id:
-        query = query.filter(Task.assignee_id == assignee_id)
+        if status:
+            query = query.filter(Task.status == status)
+        if assignee_id:
+            query = query.filter(Task.assignee_id == assignee_id)
     
-    count = (await db.execute(query)).scalar_one()
-    return {"count": count}
+        count = (await db.execute(query)).scalar_one()
+        return {"count": count}
+
+    return await cached_json_response(
+        request, scope="tasks:count", workspace_id=current_user.workspace_id,
+        params={"status": status, "assignee_id": assignee_id}, build=build
+    )
 
 
 @router.get("/count/my-tickets")
 async def get_my_tickets_count(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user),
 ) -> dict:
     """
     Cuenta los tickets asignados directamente al usuario actual.
     """
-    query = select(func.count(Task.id)).filter(
-        Task.assignee_id == current_user.id,
-        Task.workspace_id == current_user.workspace_id,
-        Task.status != 'Closed',
-        Task.is_deleted == False
+    async def build():
+        query = select(func.count(Task.id)).filter(
+            Task.assignee_id == current_user.id,
+            Task.workspace_id == current_user.workspace_id,
+            Task.status != 'Closed',
+            Task.is_deleted == False
+        )
+        count = (await db.execute(query)).scalar_one()
+        return {"count": count or 0}
+
+    return await cached_json_response(
+        request, scope="tasks:count:my-tickets", workspace_id=current_user.workspace_id,
+        params={"agent_id": current_user.id}, build=build
     )
-    count = (await db.execute(query)).scalar_one()
-    return {"count": count or 0}
 
 
 @router.get("/count/my-teams")
 async def get_my_teams_tasks_count(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user),
 ) -> dict:
-    from app.models.team import Team, TeamMember
-    is_admin_or_manager = current_user.role in ['admin', 'manager']
+    async def build():
+        from app.models.team import Team, TeamMember
+        is_admin_or_manager = current_user.role in ['admin', 'manager']
     
-    if is_admin_or_manager:
-        query = select(func.count(Task.id)).filter(
-            Task.workspace_id == current_user.workspace_id,
-            Task.status != 'Closed',
-            Task.is_deleted == False
-        )
-        total_count = (await db.execute(query)).scalar_one()
-    else:
-        user_teams_stmt = select(Team).join(TeamMember).filter(
-            TeamMember.agent_id == current_user.id,
-            Team.workspace_id == current_user.workspace_id
-        )
-        user_teams = (await db.execute(user_teams_stmt)).scalars().all()
+        if is_admin_or_manager:
+            query = select(func.count(Task.id)).filter(
+                Task.workspace_id == current_user.workspace_id,
+                Task.status != 'Closed',
+                Task.is_deleted == False
+            )
+            total_count = (await db.execute(query)).scalar_one()
+        else:
+            user_teams_stmt = select(Team).join(TeamMember).filter(
+                TeamMember.agent_id == current_user.id,
+                Team.workspace_id == current_user.workspace_id
+            )
+            user_teams = (await db.execute(user_teams_stmt)).scalars().all()
         
-        total_count = 0
-        for team in user_teams:
-            team_ticket_count_stmt = select(func.count(Task.id.distinct())).filter(
-                or_(
-                    Task.team_id == team.id,
-                    and_(
-                        Task.team_id.is_(None),
-                        Task.mailbox_connection_id.isnot(None),
-                        Task.mailbox_connection_id.in_(
-                            select(mailbox_team_assignments.c.mailbox_connection_id).filter(
-                                mailbox_team_assignments.c.team_id == team.id
+            total_count = 0
+            for team in user_teams:
+                team_ticket_count_stmt = select(func.count(Task.id.distinct())).filter(
+                    or_(
+                        Task.team_id == team.id,
+                        and_(
+                            Task.team_id.is_(None),
+                            Task.mailbox_connection_id.isnot(None),
+                            Task.mailbox_connection_id.in_(
+                                select(mailbox_team_assignments.c.mailbox_connection_id).filter(
+                                    mailbox_team_assignments.c.team_id == team.id
+                                )
                             )
                         )
-                    )
-                ),
-                Task.status != 'Closed',
-                Task.is_deleted == False,
-                Task.workspace_id == current_user.workspace_id
-            )
-            team_ticket_count = (await db.execute(team_ticket_count_stmt)).scalar_one()
-            total_count += team_ticket_count
+                    ),
+                    Task.status != 'Closed',
+                    Task.is_deleted == False,
+                    Task.workspace_id == current_user.workspace_id
+                )
+                team_ticket_count = (await db.execute(team_ticket_count_stmt)).scalar_one()
+                total_count += team_ticket_count
     
-    return {"count": total_count or 0}
+        return {"count": total_count or 0}
+
+    return await cached_json_response(
+        request, scope="tasks:count:my-teams", workspace_id=current_user.workspace_id,
+        params={"agent_id": current_user.id, "role": current_user.role}, build=build
+    )
 
 
 @router.get("/stats")
@@ -682,6 +715,7 @@ async def get_tasks_stats(
 @router.get("/{task_id}", response_model=TaskWithDetails)
 async def read_task(
     task_id: int,
+    request: Request,
     current_user: Agent = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ) -> Any:
@@ -693,25 +727,31 @@ async def read_task(
 
     Memory savings: ~500KB-2MB per request
     """
-    query = select(Task).filter(
-        Task.id == task_id,
-        Task.workspace_id == current_user.workspace_id,
-        Task.is_deleted == False
-    ).options(
-        joinedload(Task.assignee),
-        joinedload(Task.user),
-        joinedload(Task.category),
-        joinedload(Task.workspace),
-        joinedload(Task.sent_from),
-        noload(Task.body),  # 🚀 OPTIMIZED: Don't load body (can be 500KB-2MB)
-        joinedload(Task.team),
-        joinedload(Task.company),
-        joinedload(Task.email_mappings)
+    async def build():
+        query = select(Task).filter(
+            Task.id == task_id,
+            Task.workspace_id == current_user.workspace_id,
+            Task.is_deleted == False
+        ).options(
+            joinedload(Task.assignee),
+            joinedload(Task.user),
+            joinedload(Task.category),
+            joinedload(Task.workspace),
+            joinedload(Task.sent_from),
+            noload(Task.body),  # 🚀 OPTIMIZED: Don't load body (can be 500KB-2MB)
+            joinedload(Task.team),
+            joinedload(Task.company),
+            joinedload(Task.email_mappings)
+        )
+        task = (await db.execute(query)).scalars().first()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return encode_model(TaskWithDetails.model_validate(task))
+
+    return await cached_json_response(
+        request, scope="tasks:detail", workspace_id=current_user.workspace_id,
+        ticket_id=task_id, params={"task_id": task_id}, build=build
     )
-    task = (await db.execute(query)).scalars().first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return TaskWithDetails.from_orm(task)
 
 
 @router.get("/{task_id}/body")
@@ -804,27 +844,9 @@ async def update_task_optimized_for_refresh(
         )
     )
     updated_task = updated_task_result.scalars().first()
-    
-    try:
-        task_data = {
-            'id': updated_task.id,
-            'title': updated_task.title,
-            'status': updated_task.status,
-            'priority': updated_task.priority,
-            'workspace_id': updated_task.workspace_id,
-            'assignee_id': updated_task.assignee_id,
-            'team_id': updated_task.team_id,
-            'user_id': updated_task.user_id,
-            'updated_at': updated_task.updated_at.isoformat() if updated_task.updated_at else None
-        }
-        
-        from app.core.socketio import emit_ticket_update
-        await emit_ticket_update(updated_task.workspace_id, task_data)
-        
-    except Exception as e:
-        logger.warning(f"Socket.IO error in refresh optimizado: {e}")
-    
-    return TaskWithDetails.from_orm(updated_task)
+
+    # update_task queued the Socket.IO ticket_updated event in its commit
+    return ORJSONBytesResponse(encode_model(TaskWithDetails.model_validate(updated_task)))
 
 
 @router.get("/{task_id}/initial-content")
@@ -866,121 +888,180 @@ async def get_task_initial_content(
 @router.get("/{task_id}/html-content")
 async def get_ticket_html_content(
     task_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Agent = Depends(get_current_active_user)
 ):
-    try:
-        task_stmt = select(Task).options(
-            joinedload(Task.user).joinedload(User.company)
-        ).filter(
-            Task.id == task_id,
-            Task.workspace_id == current_user.workspace_id,
-            Task.is_deleted == False
-        )
-        task = (await db.execute(task_stmt)).scalars().first()
-
-        if not task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Ticket not found"
+    async def build():
+        try:
+            task_stmt = select(Task).options(
+                joinedload(Task.user).joinedload(User.company)
+            ).filter(
+                Task.id == task_id,
+                Task.workspace_id == current_user.workspace_id,
+                Task.is_deleted == False
             )
+            task = (await db.execute(task_stmt)).scalars().first()
 
-        from app.services.s3_service import get_s3_service
-
-        def get_avatar_url(sender_type: str, agent=None, user=None):
-            if sender_type == "agent" and agent and agent.avatar_url:
-                return agent.avatar_url
-            elif sender_type == "user":
-                if user and user.avatar_url:
-                    return user.avatar_url
-                elif user and user.company and user.company.logo_url:
-                    return user.company.logo_url
-            return None
-        
-        s3_service = get_s3_service()
-
-        comments_stmt = select(CommentModel).options(
-            joinedload(CommentModel.agent),
-            joinedload(CommentModel.attachments)
-        ).filter(
-            CommentModel.ticket_id == task_id
-        ).order_by(CommentModel.created_at.asc())
+            if not task:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Ticket not found"
+                )
+
+            def get_avatar_url(sender_type: str, agent=None, user=None):
+                if sender_type == "agent" and agent and agent.avatar_url:
+                    return agent.avatar_url
+                elif sender_type == "user":
+                    if user and user.avatar_url:
+                        return user.avatar_url
+                    elif user and user.company and user.company.logo_url:
+                        return user.company.logo_url
+                return None
+
+            comments_stmt = select(CommentModel).options(
+                joinedload(CommentModel.agent),
+                joinedload(CommentModel.attachments)
+            ).filter(
+                CommentModel.ticket_id == task_id
+            ).order_by(CommentModel.created_at.asc())
         
-        comments = (await db.execute(comments_stmt)).unique().scalars().all()
-
-        html_contents = []
-        # This part of the original code had complex synchronous logic.
-        # Let's make it fully async.
-        for comment in comments:
-            content = comment.content or ""
-            if content.startswith("[MIGRATED_TO_S3]"):
-                try:
-                    s3_url = content.split("Content moved to S3: ")[1]
-                    retrieved_content = s3_service.get_comment_html(s3_url)
-                    if retrieved_content:
-                        content = retrieved_content
+            comments = (await db.execute(comments_stmt)).unique().scalars().all()
+
+            # Long-closed tickets keep most of their conversation in the archive store
+            archived_comments = await ticket_archive.load_comments(db, task)
+            if archived_comments:
+                live_ids = {comment.id for comment in comments}
+                comments = sorted(
+                    [*comments, *(comment for comment in archived_comments if comment.id not in live_ids)],
+                    key=lambda comment: comment.created_at or datetime.min
+                )
+
+            # Hydrate every S3-backed body on the page in one concurrent batch
+            s3_urls = {comment.id: extract_s3_url(comment.content) for comment in comments}
+            s3_contents = await comment_html_hydrator.fetch_many(url for url in s3_urls.values() if url)
+
+            html_contents = []
+            for comment in comments:
+                content = comment.content or ""
+                if is_s3_pointer(content):
+                    s3_url = s3_urls[comment.id]
+                    if not s3_url:
+                        logger.error(f"Error processing S3 content for comment {comment.id}: malformed pointer")
+                        content = "<p><i>Error loading message content.</i></p>"
+                    elif s3_contents.get(s3_url):
+                        content = s3_contents[s3_url]
                     else:
                         logger.warning(f"Could not retrieve S3 content for comment {comment.id} at {s3_url}")
                         content = "<p><i>Message content could not be loaded from storage.</i></p>"
-                except Exception as e:
-                    logger.error(f"Error processing S3 content for comment {comment.id}: {e}")
-                    content = "<p><i>Error loading message content.</i></p>"
-
-            sender = { "type": "unknown", "name": "Unknown", "email": "unknown", "created_at": comment.created_at, "avatar_url": None }
-
-            if comment.agent:
-                sender = {
-                    "type": "agent",
-                    "name": comment.agent.name,
-                    "email": comment.agent.email,
-                    "created_at": comment.created_at,
-                    "avatar_url": get_avatar_url("agent", agent=comment.agent)
-                }
-            else:
-                # If no agent, it might be a user. Let's try to find the user from the task.
-                if task.user:
-                     sender = {
-                        "type": "user",
-                        "name": task.user.name,
-                        "email": task.user.email,
+
+                sender = { "type": "unknown", "name": "Unknown", "email": "unknown", "created_at": comment.created_at, "avatar_url": None }
+
+                if comment.agent:
+                    sender = {
+                        "type": "agent",
+                        "name": comment.agent.name,
+                        "email": comment.agent.email,
                         "created_at": comment.created_at,
-                        "avatar_url": get_avatar_url("user", user=task.user)
+                        "avatar_url": get_avatar_url("agent", agent=comment.agent)
                     }
+                else:
+                    # If no agent, it might be a user. Let's try to find the user from the task.
+                    if task.user:
+                         sender = {
+                            "type": "user",
+                            "name": task.user.name,
+                            "email": task.user.email,
+                            "created_at": comment.created_at,
+                            "avatar_url": get_avatar_url("user", user=task.user)
+                        }
+
+                attachments = []
+                if comment.attachments:
+                    for att in comment.attachments:
+                        download_url = att.s3_url if att.s3_url else f"/api/v1/attachments/{att.id}"
+                        attachments.append({
+                            "id": att.id,
+                            "file_name": att.file_name,
+                            "content_type": att.content_type,
+                            "file_size": att.file_size,
+                            "s3_url": getattr(att, 's3_url', None),
+                            "download_url": download_url
+                        })
+
+                html_contents.append({
+                    "id": comment.id,
+                    "content": content,
+                    "sender": sender,
+                    "is_private": comment.is_private,
+                    "attachments": attachments,
+                    "created_at": comment.created_at
+                })
+
+            return {
+                "status": "success",
+                "ticket_id": task_id,
+                "ticket_title": task.title,
+                "total_items": len(html_contents),
+                "contents": html_contents,
+                "message": f"Ticket HTML content retrieved with {len(html_contents)} items"
+            }
+        
+        except Exception as e:
+            logger.error(f"❌ Error getting HTML content for ticket {task_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to get ticket HTML content: {str(e)}")
 
-            attachments = []
-            if comment.attachments:
-                for att in comment.attachments:
-                    download_url = att.s3_url if att.s3_url else f"/api/v1/attachments/{att.id}"
-                    attachments.append({
-                        "id": att.id,
-                        "file_name": att.file_name,
-                        "content_type": att.content_type,
-                        "file_size": att.file_size,
-                        "s3_url": getattr(att, 's3_url', None),
-                        "download_url": download_url
-                    })
-
-            html_contents.append({
-                "id": comment.id,
-                "content": content,
-                "sender": sender,
-                "is_private": comment.is_private,
-                "attachments": attachments,
-                "created_at": comment.created_at
-            })
+    return await cached_json_response(
+        request, scope="tasks:html-content", workspace_id=current_user.workspace_id,
+        ticket_id=task_id, params={"task_id": task_id}, build=build
+    )
+
+@router.post("/bulk", response_model=TicketBulkResult)
+async def bulk_update_tasks(
+    bulk_in: TicketBulkUpdate,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Agent = Depends(get_current_active_user),
+) -> Any:
+    """
+    Assign, change the status, priority or team of, or delete many tickets at
+    once, in a single transaction. Workflows, notifications (one per
+    recipient) and the Socket.IO updates follow through the outbox.
+    """
+    from app.core.config import settings
+    from app.models.team import Team
+    from app.services.task_service import bulk_delete_tasks, bulk_update_tasks as apply_bulk_update
+
+    update_data = bulk_in.model_dump(exclude_unset=True, exclude={"ticket_ids", "delete"})
+    if bulk_in.delete == bool(update_data):
+        raise HTTPException(status_code=400, detail="Send either delete or the fields to change")
+    for field in ("status", "priority"):
+        if field in update_data and update_data[field] is None:
+            raise HTTPException(status_code=400, detail=f"{field} cannot be empty")
+
+    if update_data.get("assignee_id") is not None:
+        assignee = (await db.execute(select(Agent.id).filter(
+            Agent.id == update_data["assignee_id"], Agent.workspace_id == current_user.workspace_id
+        ))).scalar_one_or_none()
+        if assignee is None:
+            raise HTTPException(status_code=400, detail="Assignee not found")
+    if update_data.get("team_id") is not None:
+        team = (await db.execute(select(Team.id).filter(
+            Team.id == update_data["team_id"], Team.workspace_id == current_user.workspace_id
+        ))).scalar_one_or_none()
+        if team is None:
+            raise HTTPException(status_code=400, detail="Team not found")
+
+    ticket_ids = list(dict.fromkeys(bulk_in.ticket_ids))
+    if bulk_in.delete:
+        updated_ids = await bulk_delete_tasks(db, current_user.workspace_id, ticket_ids)
+    else:
+        origin = request.headers.get("origin") or settings.FRONTEND_URL
+        updated_ids = await apply_bulk_update(db, current_user.workspace_id, ticket_ids, update_data, request_origin=origin)
+
+    updated = set(updated_ids)
+    return TicketBulkResult(updated_ids=updated_ids, skipped_ids=[ticket_id for ticket_id in ticket_ids if ticket_id not in updated])
 
-        return {
-            "status": "success",
-            "ticket_id": task_id,
-            "ticket_title": task.title,
-            "total_items": len(html_contents),
-            "contents": html_contents,
-            "message": f"Ticket HTML content retrieved with {len(html_contents)} items"
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ Error getting HTML content for ticket {task_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to get ticket HTML content: {str(e)}")
 
 # The merge-related endpoints call a service. Assuming the service is synchronous.
 # To fix the API, we should make the endpoints async but the service call might need to be run in a threadpool.
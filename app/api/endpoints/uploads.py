@@ -3,7 +3,11 @@ from typing import Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Request
 
-from app.services.s3_service import get_s3_service, S3Service
+from app.api.dependencies import get_current_active_user
+from app.models.agent import Agent
+from app.schemas.upload import DirectUploadAbort, DirectUploadComplete, DirectUploadRequest, DirectUploadResponse
+from app.services.direct_upload_service import abort_direct_upload, finish_direct_upload, start_direct_upload
+from app.services.storage import AsyncStorage, get_storage
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -23,7 +27,7 @@ ALL_ALLOWED_TYPES = ALLOWED_IMAGE_TYPES + ALLOWED_DOCUMENT_TYPES
 @router.post("/image", response_model=Dict[str, str])
 async def upload_image(
     file: UploadFile = File(...),
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> Dict[str, str]:
     """
     Upload an image file to S3 and return its public URL.
@@ -40,7 +44,7 @@ async def upload_image(
 
     try:
         # Upload to S3 in images folder
-        file_url = await s3_service.upload_from_upload_file(
+        file_url = await storage.upload_from_upload_file(
             upload_file=file,
             folder="images",
             max_size=MAX_FILE_SIZE
@@ -61,7 +65,7 @@ async def upload_image(
 @router.post("/file", response_model=Dict[str, str])
 async def upload_file(
     file: UploadFile = File(...),
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> Dict[str, str]:
     """
     Upload any allowed file type to S3 and return its public URL.
@@ -82,7 +86,7 @@ async def upload_file(
         logger.info(f"📁 Using folder: {folder}")
         
         # Upload to S3
-        file_url = await s3_service.upload_from_upload_file(
+        file_url = await storage.upload_from_upload_file(
             upload_file=file,
             folder=folder,
             max_size=MAX_FILE_SIZE
@@ -103,7 +107,7 @@ async def upload_file(
 @router.post("/multiple", response_model=List[Dict[str, str]])
 async def upload_multiple_files(
     files: List[UploadFile] = File(...),
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> List[Dict[str, str]]:
     """
     Upload multiple files to S3 and return their public URLs.
@@ -135,7 +139,7 @@ async def upload_multiple_files(
             folder = "images" if file.content_type in ALLOWED_IMAGE_TYPES else "documents"
             
             # Upload to S3
-            file_url = await s3_service.upload_from_upload_file(
+            file_url = await storage.upload_from_upload_file(
                 upload_file=file,
                 folder=folder,
                 max_size=MAX_FILE_SIZE
@@ -162,7 +166,7 @@ async def upload_multiple_files(
 async def upload_conversation_html(
     html_content: str,
     filename: str,
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> Dict[str, str]:
     """
     Upload HTML content (like ticket conversations) to S3.
@@ -170,7 +174,7 @@ async def upload_conversation_html(
     logger.info(f"📄 HTML upload endpoint called: {filename}")
     
     try:
-        file_url = s3_service.upload_html_content(
+        file_url = await storage.upload_html_content(
             html_content=html_content,
             filename=filename,
             folder="conversations"
@@ -190,7 +194,7 @@ async def upload_conversation_html(
 async def list_files(
     folder: str,
     limit: int = 100,
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> Dict[str, List[Dict]]:
     """
     List files in a specific S3 folder.
@@ -198,7 +202,7 @@ async def list_files(
     logger.info(f"📋 List files endpoint called: folder={folder}, limit={limit}")
     
     try:
-        files = s3_service.list_files(folder=folder, limit=limit)
+        files = await storage.list_files(folder=folder, limit=limit)
         logger.info(f"✅ Listed {len(files)} files from folder: {folder}")
         return {"files": files}
         
@@ -213,7 +217,7 @@ async def list_files(
 async def delete_file(
     folder: str,
     filename: str,
-    s3_service: S3Service = Depends(get_s3_service)
+    storage: AsyncStorage = Depends(get_storage)
 ) -> Dict[str, str]:
     """
     Delete a file from S3.
@@ -222,7 +226,7 @@ async def delete_file(
     
     try:
         s3_key = f"{folder}/{filename}"
-        success = s3_service.delete_file(s3_key)
+        success = await storage.delete_file(s3_key)
         
         if success:
             logger.info(f"✅ File deleted successfully: {s3_key}")
@@ -242,3 +246,51 @@ async def delete_file(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting file: {str(e)}"
         )
+
+@router.post("/presign", response_model=DirectUploadResponse)
+async def presign_upload(
+    upload_in: DirectUploadRequest,
+    storage: AsyncStorage = Depends(get_storage),
+    current_user: Agent = Depends(get_current_active_user)
+) -> DirectUploadResponse:
+    """
+    Presign an image/file upload straight to S3, so the bytes never pass
+    through the API. Call /uploads/complete afterwards.
+    """
+    if upload_in.content_type not in ALL_ALLOWED_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALL_ALLOWED_TYPES)}"
+        )
+    folder = "images" if upload_in.content_type in ALLOWED_IMAGE_TYPES else "documents"
+    return await start_direct_upload(
+        storage, upload_in, current_user,
+        purpose="upload", folder=folder, max_size=MAX_FILE_SIZE
+    )
+
+@router.post("/complete", response_model=Dict[str, str])
+async def complete_upload(
+    complete_in: DirectUploadComplete,
+    storage: AsyncStorage = Depends(get_storage),
+    current_user: Agent = Depends(get_current_active_user)
+) -> Dict[str, str]:
+    """
+    Confirm a presigned upload and return its public URL.
+    """
+    uploaded = await finish_direct_upload(
+        storage, complete_in.upload_token, current_user,
+        purpose="upload", parts=complete_in.parts
+    )
+    return {"url": uploaded["file_url"], "type": uploaded["key"].split("/", 1)[0]}
+
+@router.post("/abort")
+async def abort_upload(
+    abort_in: DirectUploadAbort,
+    storage: AsyncStorage = Depends(get_storage),
+    current_user: Agent = Depends(get_current_active_user)
+) -> Dict[str, bool]:
+    """
+    Discard a presigned upload that will not be completed.
+    """
+    await abort_direct_upload(storage, abort_in.upload_token, current_user, purpose="upload")
+    return {"success": True}
@@ -4,7 +4,6 @@ from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
 
 from app.api.dependencies import get_current_active_user, get_current_workspace
 from app.database.session import get_db
@@ -90,12 +89,11 @@ async def create_user(
         user_email_domain = user.email.split('@')[-1].lower() if '@' in user.email else None
         if user_email_domain:
             print(f"Attempting to auto-assign user {user.email} with domain {user_email_domain}")
-            # Search for company with matching email_domain (case-insensitive)
-            # Ensure email_domain in DB is also compared in lowercase if it's not guaranteed
+            # Search for company with matching email_domain (normalized, indexed column)
             stmt = select(Company).filter(
                 Company.workspace_id == current_workspace.id,
-                func.lower(Company.email_domain) == user_email_domain 
-            )
+                Company.email_domain_normalized == user_email_domain
+            ).order_by(Company.id)
             result = await db.execute(stmt)
             company_to_assign = result.scalars().first() # Consider what to do if multiple companies have the same domain
 
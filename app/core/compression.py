@@ -1,7 +1,7 @@
-import gzip
-import io
+import asyncio
 import logging
-from typing import Optional, Set
+import zlib
+from typing import Optional, Set, Tuple
 
 try:
     import brotli
@@ -9,16 +9,44 @@ try:
 except ImportError:
     BROTLI_AVAILABLE = False
 
+from cachetools import LRUCache
 from starlette.datastructures import Headers, MutableHeaders
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response, StreamingResponse
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
 
-class SmartCompressionMiddleware(BaseHTTPMiddleware):
+class _StreamCompressor:
+    """Incremental brotli/gzip compressor; every ``compress`` call ends in a flush."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int, brotli_mode):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality, mode=brotli_mode)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Flushing every frame keeps streamed responses flowing to the client
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class SmartCompressionMiddleware:
+    """
+    Pure ASGI compression middleware.
+
+    Responses whose body arrives in one message are compressed in one go
+    (off the event loop above ``offload_threshold`` bytes, and cached by
+    ETag when they carry one). Streamed responses are compressed frame by
+    frame, so the first bytes reach the client immediately.
+    """
 
     # Content types que DEBEN comprimirse (texto y JSON)
     COMPRESSIBLE_TYPES: Set[str] = {
@@ -57,6 +85,8 @@ class SmartCompressionMiddleware(BaseHTTPMiddleware):
         gzip_level: int = 6,       # Nivel de compresión gzip (1-9)
         brotli_quality: int = 4,   # Nivel de compresión brotli (0-11)
         brotli_mode: str = "text", # Modo brotli: text, font, generic
+        offload_threshold: int = 64 * 1024,  # Bodies mayores se comprimen en un thread
+        cache_max_bytes: int = 0,  # Caché de bodies comprimidos por ETag (0 = desactivada)
     ):
         """
         Args:
@@ -65,11 +95,17 @@ class SmartCompressionMiddleware(BaseHTTPMiddleware):
             gzip_level: Nivel de compresión gzip (1=rápido, 9=mejor ratio)
             brotli_quality: Calidad brotli (0=rápido, 11=mejor ratio)
             brotli_mode: Modo de compresión brotli
+            offload_threshold: Bytes a partir de los cuales se comprime fuera del event loop
+            cache_max_bytes: Tamaño máximo de la caché de respuestas comprimidas por ETag
         """
-        super().__init__(app)
+        self.app = app
         self.minimum_size = minimum_size
         self.gzip_level = gzip_level
         self.brotli_quality = brotli_quality
+        self.offload_threshold = offload_threshold
+        self._cache: Optional[LRUCache] = (
+            LRUCache(maxsize=cache_max_bytes, getsizeof=len) if cache_max_bytes > 0 else None
+        )
 
         # Convertir modo brotli a constante
         if BROTLI_AVAILABLE:
@@ -90,140 +126,195 @@ class SmartCompressionMiddleware(BaseHTTPMiddleware):
         logger.info(f"   • Brotli: {'enabled' if BROTLI_AVAILABLE else 'disabled'}")
         logger.info(f"   • Gzip level: {gzip_level}")
         logger.info(f"   • Minimum size: {minimum_size} bytes")
-
-    async def dispatch(self, request: Request, call_next):
-        """Procesa la request y comprime la response si es apropiado."""
-        response = await call_next(request)
-
-        # Solo comprimir si el cliente lo acepta
-        accept_encoding = request.headers.get("accept-encoding", "").lower()
-
-        # Determinar método de compresión
-        should_brotli = BROTLI_AVAILABLE and "br" in accept_encoding
-        should_gzip = "gzip" in accept_encoding
-
-        if not (should_brotli or should_gzip):
-            return response
-
-        # Verificar si la response ya está comprimida
-        if "content-encoding" in response.headers:
-            return response
-
-        # Verificar content-type
-        content_type = response.headers.get("content-type", "").lower().split(";")[0].strip()
+        logger.info(f"   • Precompressed cache: {cache_max_bytes:,} bytes")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            token, _, params = part.partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(token.strip())
+        if BROTLI_AVAILABLE and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _is_compressible(self, headers: Headers) -> bool:
+        # Verificar si la response ya está comprimida, o si es un rango parcial
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+
+        content_type = headers.get("content-type", "").lower().split(";")[0].strip()
 
         # No comprimir si es un tipo excluido
         if any(excluded in content_type for excluded in self.EXCLUDED_TYPES):
-            return response
+            return False
 
         # Solo comprimir tipos compresibles
         if not any(compressible in content_type for compressible in self.COMPRESSIBLE_TYPES):
             # Si no coincide exactamente, verificar si es texto genérico
             if not content_type.startswith("text/") and not content_type.startswith("application/"):
-                return response
+                return False
+        return True
 
-        # Obtener el body de la response
-        response_body = b""
-        async for chunk in response.body_iterator:
-            response_body += chunk
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        compressor = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality, self.brotli_mode)
+        return compressor.compress(body) + compressor.finish()
 
-        # No comprimir si es muy pequeño
-        original_size = len(response_body)
-        if original_size < self.minimum_size:
-            return Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type,
-            )
+    async def compress_body(self, body: bytes, encoding: str, etag: Optional[str]) -> Tuple[bytes, bool]:
+        """
+        Compress a complete body. Returns (compressed, served_from_cache).
+        Only strong ETags are used as cache keys: they identify the exact bytes.
+        """
+        cache_key = (etag, encoding) if self._cache is not None and etag and not etag.startswith("W/") else None
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached, True
+
+        if len(body) > self.offload_threshold:
+            compressed = await asyncio.to_thread(self._compress, body, encoding)
+        else:
+            compressed = self._compress(body, encoding)
 
-        # Comprimir
-        compressed_body, encoding_used, compression_ratio = self._compress(
-            response_body,
-            use_brotli=should_brotli,
-            use_gzip=should_gzip
-        )
+        if cache_key is not None:
+            try:
+                self._cache[cache_key] = compressed
+            except ValueError:
+                # Larger than the whole cache
+                pass
+        return compressed, False
+
+    async def compress_frame(self, compressor: _StreamCompressor, data: bytes) -> bytes:
+        if len(data) > self.offload_threshold:
+            return await asyncio.to_thread(compressor.compress, data)
+        return compressor.compress(data)
+
+
+class _CompressionResponder:
+    """Per-request ``send`` wrapper that decides how (and whether) to compress."""
+
+    def __init__(self, middleware: SmartCompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_StreamCompressor] = None
+        self.original_size = 0
+        self.compressed_size = 0
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            status = message["status"]
+            # Nothing to compress on bodiless statuses
+            if status < 200 or status in (204, 304) or not self.middleware._is_compressible(headers):
+                self.passthrough = True
+                await self._send(message)
+            else:
+                # Hold the headers until the first body frame shows what we're dealing with
+                self.start_message = message
+            return
 
-        # Si la compresión no redujo el tamaño, enviar sin comprimir
-        if len(compressed_body) >= original_size:
-            return Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type,
-            )
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if not more_body:
+                await self._send_complete(start_message, body)
+            else:
+                await self._start_stream(start_message, body)
+            return
+
+        # Subsequent frames of a streamed response
+        self.original_size += len(body)
+        data = await self.middleware.compress_frame(self.compressor, body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+            self.compressed_size += len(data)
+            compression_stats.record(self.original_size, self.compressed_size, self.encoding)
+        else:
+            self.compressed_size += len(data)
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
 
-        # Crear headers de la response comprimida
-        headers = MutableHeaders(response.headers)
-        headers["content-encoding"] = encoding_used
-        headers["content-length"] = str(len(compressed_body))
+    async def _send_complete(self, start_message: Message, body: bytes) -> None:
+        original_size = len(body)
+        # No comprimir si es muy pequeño
+        if original_size < self.middleware.minimum_size:
+            compression_stats.record(original_size, original_size, "identity")
+            await self._send(start_message)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        compressed, cache_hit = await self.middleware.compress_body(body, self.encoding, headers.get("etag"))
 
+        # Si la compresión no redujo el tamaño, enviar sin comprimir
+        if len(compressed) >= original_size:
+            compression_stats.record(original_size, original_size, "identity")
+            await self._send(start_message)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        compression_ratio = ((original_size - len(compressed)) / original_size) * 100
+        self._set_encoding_headers(headers)
+        headers["content-length"] = str(len(compressed))
         # Agregar header informativo (útil para debugging)
         headers["x-compression-ratio"] = f"{compression_ratio:.2f}"
         headers["x-original-size"] = str(original_size)
 
-        # Vary header para indicar que la response varía según Accept-Encoding
-        vary = headers.get("vary", "")
-        if vary:
-            headers["vary"] = f"{vary}, Accept-Encoding"
-        else:
-            headers["vary"] = "Accept-Encoding"
-
         # Log de métricas (solo para responses grandes)
         if original_size > 10000:  # > 10 KB
             logger.debug(
-                f"📊 Compressed {original_size:,} → {len(compressed_body):,} bytes "
-                f"({compression_ratio:.1f}% reduction) using {encoding_used}"
+                f"📊 Compressed {original_size:,} → {len(compressed):,} bytes "
+                f"({compression_ratio:.1f}% reduction) using {self.encoding}"
+                f"{' (cached)' if cache_hit else ''}"
             )
 
-        return Response(
-            content=compressed_body,
-            status_code=response.status_code,
-            headers=dict(headers),
-            media_type=response.media_type,
-        )
-
-    def _compress(
-        self,
-        body: bytes,
-        use_brotli: bool,
-        use_gzip: bool
-    ) -> tuple[bytes, str, float]:
-        """
-        Comprime el body con el mejor algoritmo disponible.
-
-        Returns:
-            tuple[bytes, str, float]: (compressed_body, encoding, compression_ratio_percent)
-        """
-        original_size = len(body)
-
-        # Intentar Brotli primero (mejor compresión)
-        if use_brotli and BROTLI_AVAILABLE:
-            try:
-                compressed = brotli.compress(
-                    body,
-                    quality=self.brotli_quality,
-                    mode=self.brotli_mode
-                )
-                ratio = ((original_size - len(compressed)) / original_size) * 100
-                return compressed, "br", ratio
-            except Exception as e:
-                logger.warning(f"Brotli compression failed: {e}, falling back to gzip")
-
-        # Fallback a Gzip
-        if use_gzip:
-            try:
-                buffer = io.BytesIO()
-                with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=self.gzip_level) as gz:
-                    gz.write(body)
-                compressed = buffer.getvalue()
-                ratio = ((original_size - len(compressed)) / original_size) * 100
-                return compressed, "gzip", ratio
-            except Exception as e:
-                logger.error(f"Gzip compression failed: {e}")
-
-        # Si todo falla, retornar sin comprimir
-        return body, "identity", 0.0
+        compression_stats.record(original_size, len(compressed), self.encoding)
+        await self._send({**start_message, "headers": headers.raw})
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def _start_stream(self, start_message: Message, body: bytes) -> None:
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        self._set_encoding_headers(headers)
+        # The final size is unknown: fall back to chunked transfer encoding
+        del headers["content-length"]
+        await self._send({**start_message, "headers": headers.raw})
+
+        m = self.middleware
+        self.compressor = _StreamCompressor(self.encoding, m.gzip_level, m.brotli_quality, m.brotli_mode)
+        self.original_size = len(body)
+        data = await m.compress_frame(self.compressor, body) if body else b""
+        self.compressed_size = len(data)
+        await self._send({"type": "http.response.body", "body": data, "more_body": True})
+
+    def _set_encoding_headers(self, headers: MutableHeaders) -> None:
+        headers["content-encoding"] = self.encoding
+        # Vary header para indicar que la response varía según Accept-Encoding
+        headers.add_vary_header("Accept-Encoding")
 
 
 # ============================================================================
@@ -27,6 +27,11 @@ class Settings(BaseSettings):
     ENCRYPTION_KEY: str  # Required for encrypting sensitive data in the DB
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000  # Verified tokens kept per worker
+    AUTH_PRINCIPAL_CACHE_TTL: int = 60  # Seconds a verified token is trusted without re-checking the agent
+    BCRYPT_ROUNDS: int = 12  # bcrypt cost; existing hashes are rehashed on login when it changes
+    PASSWORD_HASH_WORKERS: int = 2  # Threads dedicated to bcrypt per worker process
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Waiting hash operations before logins get 503
     AGENT_INVITATION_TOKEN_EXPIRE_HOURS: int = 72 # Agent invitation token validity in hours
     PASSWORD_RESET_TOKEN_EXPIRE_HOURS: int = 2 # Password reset token validity in hours
 
@@ -101,6 +106,80 @@ class Settings(BaseSettings):
     CACHE_EXPIRE_MAILBOX_LIST: int = 600  # Mailbox list cache (10 minutes)
     CACHE_EXPIRE_FOLDERS: int = 1800  # Folder list cache (30 minutes)
     
+    # HTTP response cache for polled ticket endpoints (ETag / 304)
+    ENABLE_RESPONSE_CACHE: bool = True
+    RESPONSE_CACHE_TTL: int = 60  # Upper bound on staleness for changes that bypass Socket.IO events
+    RESPONSE_CACHE_MAX_BODY_BYTES: int = 2 * 1024 * 1024  # Larger bodies are served with ETag but not stored
+
+    # Socket.IO emit coalescing
+    SOCKETIO_COALESCE_WINDOW_MS: int = 75  # Updates within this window are merged into one emit per room
+    SOCKETIO_BATCH_FRAMES: bool = False  # Send coalesced events as one "events_batch" frame (clients must support it)
+    SOCKETIO_REQUIRE_AUTH: bool = True  # Refuse socket connections without a valid access token
+
+    # Per-workspace configuration snapshots (notification settings, templates, mailboxes, categories)
+    WORKSPACE_CONFIG_CACHE_SIZE: int = 1000  # Workspaces kept per worker
+    WORKSPACE_CONFIG_CHECK_SECONDS: float = 5  # How often a worker re-reads the version counter in Redis
+    WORKSPACE_CONFIG_MAX_AGE_SECONDS: int = 300  # Reload regardless, for writes that bypass the ORM
+
+    # Object storage
+    STORAGE_BACKEND: str = "s3"  # "s3" or "local" (filesystem, for tests / development)
+    STORAGE_MAX_CONCURRENCY: int = 16  # Max parallel object-store requests from the event loop
+    LOCAL_STORAGE_PATH: str = "./storage"
+    LOCAL_STORAGE_BASE_URL: Optional[str] = None  # Defaults to file://<LOCAL_STORAGE_PATH>
+    DIRECT_UPLOAD_EXPIRE_SECONDS: int = 900  # Validity of presigned upload URLs and upload tokens
+    DOWNLOAD_URL_EXPIRE_SECONDS: int = 300  # Validity of presigned attachment download redirects
+    MULTIPART_UPLOAD_THRESHOLD: int = 16 * 1024 * 1024  # Files above this size upload in parts
+    MULTIPART_PART_SIZE: int = 8 * 1024 * 1024  # S3 minimum is 5 MB (except the last part)
+    ENABLE_BLOB_MAINTENANCE: bool = True  # Legacy content_bytes migration + unreferenced blob cleanup
+    BLOB_MAINTENANCE_INTERVAL_MINUTES: int = 10
+    BLOB_MIGRATION_BATCH_SIZE: int = 25  # Legacy attachments moved out of MySQL per run
+    BLOB_GC_GRACE_HOURS: int = 24  # How long an unreferenced blob is kept before deletion
+    COMMENT_HTML_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # In-memory LRU of immutable comment HTML
+
+    # Contact resolution during email ingest
+    CONTACT_CACHE_SIZE: int = 50000  # email -> user and domain -> company entries per worker
+    CONTACT_CACHE_TTL: int = 600  # Seconds; bounds how long other workers miss a new company domain
+
+    # Reporting rollups (hourly ticket buckets read by /reports)
+    ENABLE_REPORT_ROLLUP_JOB: bool = True
+    REPORT_ROLLUP_INTERVAL_MINUTES: int = 15
+    REPORT_ROLLUP_RECONCILE_HOURS: int = 48  # Recent buckets recounted every run (writes that bypass the ORM)
+    REPORT_ROLLUP_BACKFILL_DAYS_PER_RUN: int = 30  # Older history rebuilt per run until it is all covered
+
+    # Columnar analytics export + /reports/advanced (needs pyarrow and duckdb)
+    ENABLE_ANALYTICS_EXPORT: bool = False
+    ANALYTICS_EXPORT_INTERVAL_MINUTES: int = 60
+    ANALYTICS_EXPORT_BATCH_SIZE: int = 50000  # Rows per keyset batch (one Parquet file per workspace)
+    ANALYTICS_EXPORT_MAX_BATCHES_PER_RUN: int = 20
+    ANALYTICS_EXPORT_LAG_SECONDS: int = 120  # Rows younger than this wait for the next run (in-flight transactions)
+    ANALYTICS_EXPORT_PREFIX: str = "analytics"  # Object-store prefix of the Parquet files
+    ANALYTICS_EXPORT_COMPACT_MIN_FILES: int = 50  # Files in a workspace partition before they are merged into one
+    ANALYTICS_CACHE_DIR: str = "./analytics_cache"  # Local copy of S3 partitions read by DuckDB
+    ANALYTICS_QUERY_CONCURRENCY: int = 2
+    ANALYTICS_DUCKDB_THREADS: int = 2  # Per query; keeps analytics from starving the API workers
+
+    # Notification feed retention (ticket and comment activities)
+    NOTIFICATION_RETENTION_DAYS: int = 2
+    NOTIFICATION_RETENTION_INTERVAL_MINUTES: int = 30
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = 5000  # Rows deleted per transaction
+    RETENTION_BATCH_PAUSE_SECONDS: float = 0.2  # Pause between retention delete batches
+
+    # Ticket archive: conversations of long-closed tickets move to compressed files in storage
+    ENABLE_TICKET_ARCHIVE: bool = False
+    TICKET_ARCHIVE_INTERVAL_MINUTES: int = 30
+    TICKET_ARCHIVE_AFTER_DAYS: int = 90  # Days since the ticket was closed
+    TICKET_ARCHIVE_TICKETS_PER_RUN: int = 200
+    TICKET_ARCHIVE_PREFIX: str = "archive/tickets"
+
+    # Transactional outbox: side effects published by the relay after commit
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 2.0  # Fallback when no commit wakes the relay
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BASE_SECONDS: int = 5  # Doubled after each failed attempt
+    OUTBOX_HANDLER_TIMEOUT_SECONDS: float = 60.0  # A handler still running by then counts as a failed attempt
+    OUTBOX_RETENTION_HOURS: int = 24  # Processed events kept for inspection
+    OUTBOX_RETENTION_INTERVAL_MINUTES: int = 60
+
     # Database Connection Pool - EMERGENCY INCREASE for email processing
     DB_POOL_SIZE: int = 40  # Increased from 25 to 40 for email sync stability
     DB_MAX_OVERFLOW: int = 80  # Increased from 50 to 80 to handle peak loads
@@ -122,6 +201,8 @@ class Settings(BaseSettings):
     COMPRESSION_MINIMUM_SIZE: int = 500  # Minimum bytes to compress (500 bytes = 0.5 KB)
     COMPRESSION_GZIP_LEVEL: int = 6  # Gzip level 1-9 (1=fast, 9=best compression, 6=balanced)
     COMPRESSION_BROTLI_QUALITY: int = 4  # Brotli quality 0-11 (0=fast, 11=best, 4=balanced)
+    COMPRESSION_OFFLOAD_THRESHOLD: int = 64 * 1024  # Bodies above this are compressed in a worker thread
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Compressed bodies cached by ETag (0 disables)
 
     class Config:
         # Leer variables de entorno directamente, sin depender de archivos .env
@@ -0,0 +1,108 @@
+import hashlib
+import re
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+from app.core.serialization import ORJSON_OPTIONS, ORJSONBytesResponse
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialize a payload to JSON bytes with orjson (pre-encoded bytes pass through)."""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    return orjson.dumps(payload, option=ORJSON_OPTIONS)
+
+
+def compute_etag(body: bytes) -> str:
+    """Return a strong ETag for the given response body."""
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against an ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Clients may send back the weak form (W/"...") after a proxy rewrote it
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+_BYTE_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range ``Range: bytes=...`` header into an inclusive
+    ``(start, end)`` for a body of ``size`` bytes. Returns None when the
+    header is absent, invalid (``bytes=5-2``) or asks for several ranges, as
+    RFC 9110 has such headers ignored and the full body served. Raises
+    ValueError when a valid range is not satisfiable.
+    """
+    if not range_header:
+        return None
+    match = _BYTE_RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def if_range_matches(request: Request, etag: str, last_modified: Optional[str] = None) -> bool:
+    """Whether a Range request may be honoured given its If-Range validator (if any)."""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    return if_range == etag or (last_modified is not None and if_range == last_modified)
+
+
+def not_modified_response(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Build an empty 304 response carrying the validator headers."""
+    response_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if headers:
+        response_headers.update(headers)
+    return Response(status_code=304, headers=response_headers)
+
+
+def json_response_with_etag(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Return pre-encoded JSON bytes with a strong ETag, or 304 when the client
+    already holds the same representation.
+    """
+    etag = etag or compute_etag(body)
+    if etag_matches(request, etag):
+        return not_modified_response(etag, headers)
+
+    response_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if headers:
+        response_headers.update(headers)
+    return ORJSONBytesResponse(
+        content=body,
+        status_code=status_code,
+        headers=response_headers,
+    )
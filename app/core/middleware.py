@@ -0,0 +1,23 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class HealthMiddleware:
+    """
+    Answers /health before routing, without touching the rest of the stack,
+    so load balancer probes stay cheap even when the app is busy.
+    """
+
+    def __init__(self, app: ASGIApp, path: str = "/health"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] == self.path:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", b"2")],
+            })
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+        await self.app(scope, receive, send)
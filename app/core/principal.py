@@ -0,0 +1,50 @@
+from typing import Any, Dict, Optional
+
+
+class AgentPrincipal:
+    """
+    The authenticated agent as seen by request handlers: the handful of
+    fields authorization and auditing need, without an ORM instance behind
+    it. Immutable, so a single instance can be shared by every request made
+    with the same token.
+
+    Endpoints that need the full ``Agent`` row (or want to modify it) depend
+    on ``dependencies.get_current_agent_model`` instead.
+    """
+
+    __slots__ = ("id", "name", "email", "role", "workspace_id", "is_active", "avatar_url")
+
+    def __init__(
+        self,
+        id: int,
+        name: Optional[str],
+        email: Optional[str],
+        role: Optional[str],
+        workspace_id: Optional[int],
+        is_active: bool,
+        avatar_url: Optional[str] = None,
+    ):
+        set_field = object.__setattr__
+        set_field(self, "id", id)
+        set_field(self, "name", name)
+        set_field(self, "email", email)
+        set_field(self, "role", role)
+        set_field(self, "workspace_id", workspace_id)
+        set_field(self, "is_active", bool(is_active))
+        set_field(self, "avatar_url", avatar_url)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"AgentPrincipal(id={self.id}, workspace_id={self.workspace_id}, role={self.role!r})"
+
+    @classmethod
+    def from_mapping(cls, data: Dict[str, Any]) -> "AgentPrincipal":
+        return cls(**{field: data.get(field) for field in cls.__slots__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
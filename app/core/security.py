@@ -1,17 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Union, Dict, Optional
+from typing import Any, Callable, Union, Dict, Optional, Tuple
+import asyncio
+import base64
 import hashlib
+import hmac
+import time
 
-from jose import jwt
+import orjson
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
 # Password context for hashing - configuración más robusta
+# Hashes with any other cost than BCRYPT_ROUNDS are flagged for update, so
+# verify_and_update_password rehashes them on the next successful login.
 pwd_context = CryptContext(
     schemes=["bcrypt"], 
     deprecated="auto",
-    bcrypt__default_ident="2b"  # Especificar explícitamente el identificador bcrypt
+    bcrypt__default_ident="2b",  # Especificar explícitamente el identificador bcrypt
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
 )
 
 def _prepare_password(password: str) -> bytes:
@@ -58,6 +69,98 @@ def get_password_hash(password: str) -> str:
         logger.error(f"Error hashing password: {e}")
         raise ValueError("Failed to hash password")
 
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hash operations are already waiting."""
+
+
+class PasswordHashExecutor:
+    """
+    Runs bcrypt on a small dedicated thread pool so hashing never blocks the
+    event loop, and sheds load once ``max_queue`` operations are waiting:
+    a login storm gets fast 503s instead of starving every other request.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0  # queued + running
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, fn: Callable, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.total_wait_seconds += started - submitted
+                self.total_run_seconds += time.perf_counter() - started
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        completed = max(self.completed, 1)
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self.pending, self.max_workers),
+            "queued": max(self.pending - self.max_workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / completed * 1000, 2),
+            "avg_run_ms": round(self.total_run_seconds / completed * 1000, 2),
+        }
+
+
+password_hasher = PasswordHashExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context.verify_and_update(_prepare_password(plain_password), hashed_password)
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Error verifying password: {e}")
+        return False, None
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """``verify_password`` on the password hash executor."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the password hash executor. Returns (valid, new_hash):
+    new_hash is set when the stored hash uses an outdated bcrypt cost and
+    should be replaced.
+    """
+    return await password_hasher.run(_verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """``get_password_hash`` on the password hash executor."""
+    return await password_hasher.run(get_password_hash, password)
+
+
 # Create access token
 def create_access_token(
     subject: Union[str, Any], 
@@ -79,4 +182,44 @@ def create_access_token(
         to_encode.update(extra_data)
     
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    Verify and decode an access token. Tokens signed with the configured HMAC
+    algorithm are checked directly with hmac/orjson, which is several times
+    cheaper than python-jose; anything else goes through jose. Raises
+    JWTError when the token is malformed, forged or expired.
+    """
+    digest = _HMAC_DIGESTS.get(settings.JWT_ALGORITHM)
+    if digest is None:
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+
+    try:
+        signing_input, _, signature = token.rpartition(".")
+        header_segment, _, payload_segment = signing_input.partition(".")
+        header = orjson.loads(_b64url_decode(header_segment))
+        expected = hmac.new(settings.JWT_SECRET.encode("utf-8"), signing_input.encode("ascii"), digest).digest()
+        signature_ok = hmac.compare_digest(expected, _b64url_decode(signature))
+        payload = orjson.loads(_b64url_decode(payload_segment)) if signature_ok else None
+    except (ValueError, UnicodeError, orjson.JSONDecodeError):
+        raise JWTError("Malformed token")
+
+    if not isinstance(header, dict) or header.get("alg") != settings.JWT_ALGORITHM:
+        raise JWTError("Unexpected token algorithm")
+    if not signature_ok:
+        raise JWTError("Signature verification failed")
+    if not isinstance(payload, dict):
+        raise JWTError("Invalid token payload")
+    exp = payload.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+        raise JWTError("Signature has expired")
+    return payload
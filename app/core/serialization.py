@@ -0,0 +1,91 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+# Pydantic emits "Z" for UTC datetimes; OPT_UTC_Z keeps orjson byte-compatible
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+class ORJSONBytesResponse(ORJSONResponse):
+    """ORJSONResponse that passes already-encoded JSON bytes through untouched."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def encode_model(model: BaseModel) -> bytes:
+    """Encode a Pydantic model with orjson, skipping the JSON-mode dump pass."""
+    return orjson.dumps(model.model_dump(), option=ORJSON_OPTIONS)
+
+
+class RowEncoder:
+    """
+    Encodes SQLAlchemy Row tuples straight to JSON bytes following a Pydantic
+    schema's field order, without instantiating the schema.
+
+    The field -> column mapping is resolved once at construction: schema
+    fields backed by a column become part of ``columns`` (select them in that
+    order), the rest must be listed in ``constants``. Non-optional fields that
+    come back NULL fall back to the schema default, as validation would.
+    """
+
+    def __init__(
+        self,
+        schema: Type[BaseModel],
+        entity: Any,
+        constants: Optional[Dict[str, Any]] = None,
+        column_overrides: Optional[Dict[str, Any]] = None,
+    ):
+        constants = constants or {}
+        column_overrides = column_overrides or {}
+        self.schema = schema
+        self.keys: List[str] = []
+        self.columns: List[Any] = []
+        self._constants: Dict[str, Any] = {}
+        self._fallbacks: List[Tuple[str, Any]] = []
+        constants_seen = False
+        self._ordered = True
+
+        for name, field in schema.model_fields.items():
+            if name in constants:
+                self._constants[name] = constants[name]
+                constants_seen = True
+                continue
+            column = column_overrides.get(name)
+            if column is None:
+                column = getattr(entity, name, None)
+            if column is None:
+                raise ValueError(f"No column or constant for {schema.__name__}.{name}")
+            if constants_seen:
+                self._ordered = False
+            self.keys.append(name)
+            self.columns.append(column.label(name) if hasattr(column, "label") else column)
+            if field.default is not PydanticUndefined and field.default is not None:
+                self._fallbacks.append((name, field.default))
+
+        self._field_order = list(schema.model_fields.keys())
+
+    def to_dict(self, row: Sequence[Any]) -> Dict[str, Any]:
+        item = dict(zip(self.keys, row))
+        for name, default in self._fallbacks:
+            if item[name] is None:
+                item[name] = default
+        if self._constants:
+            item.update(self._constants)
+            if not self._ordered:
+                item = {name: item[name] for name in self._field_order}
+        return item
+
+    def to_dicts(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        return [self.to_dict(row) for row in rows]
+
+    def encode_one(self, row: Sequence[Any]) -> bytes:
+        return orjson.dumps(self.to_dict(row), option=ORJSON_OPTIONS)
+
+    def encode_many(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        return orjson.dumps(self.to_dicts(rows), option=ORJSON_OPTIONS)
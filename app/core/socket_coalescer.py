@@ -0,0 +1,216 @@
+"""
+Coalescing of Socket.IO emits.
+
+Events are held per room for a short window (``SOCKETIO_COALESCE_WINDOW_MS``).
+Within the window, repeated updates to the same ticket, comment or team are
+merged into their latest state, and a deletion drops the updates it makes
+moot, in whichever room the update was queued. At the end of the window each room gets a single emit: either one
+``events_batch`` frame carrying every event (``SOCKETIO_BATCH_FRAMES``), or
+the surviving events one by one for clients that don't understand batches.
+Either way a burst of N changes costs one Redis publish and one payload
+serialisation per room instead of N.
+"""
+
+import asyncio
+import atexit
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.utils.logger import logger
+
+BATCH_EVENT = "events_batch"
+
+# event -> (payload field identifying the entity, whether later payloads merge into earlier ones)
+COALESCE_KEYS: Dict[str, Tuple[str, bool]] = {
+    "ticket_updated": ("id", True),
+    "new_ticket": ("id", True),
+    "comment_updated": ("id", True),
+    "team_updated": ("id", True),
+    "ticket_deleted": ("ticket_id", False),
+}
+# A deleted ticket's pending updates are no longer worth sending
+SUPERSEDED_BY_DELETE = ("ticket_updated", "comment_updated")
+
+
+def _entity_id(event: str, data: Any) -> Optional[Hashable]:
+    spec = COALESCE_KEYS.get(event)
+    if spec is None:
+        return None
+    if not isinstance(data, dict):
+        # e.g. emit_ticket_update_sync(workspace_id, ticket_id)
+        return data if isinstance(data, (int, str)) else None
+    return data.get(spec[0])
+
+
+def _ticket_of(event: str, data: Any) -> Optional[Hashable]:
+    if not isinstance(data, dict):
+        return data if event == "ticket_updated" else None
+    return data.get("ticket_id") if event == "comment_updated" else data.get("id")
+
+
+class PendingEvents:
+    """Events waiting to be sent to one room, in first-seen order."""
+
+    def __init__(self):
+        self._events: Dict[Hashable, Tuple[str, Any]] = {}
+        self._sequence = 0
+        self.received = 0
+
+    def add(self, event: str, data: Any) -> None:
+        self.received += 1
+        entity_id = _entity_id(event, data)
+        if entity_id is None:
+            self._sequence += 1
+            self._events[("seq", self._sequence)] = (event, data)
+            return
+
+        if event == "ticket_deleted":
+            self.discard_ticket(entity_id)
+
+        key = (event, entity_id)
+        previous = self._events.get(key)
+        if previous is not None and COALESCE_KEYS[event][1] and isinstance(previous[1], dict) and isinstance(data, dict):
+            # Payloads may be partial: keep every field at its latest value
+            data = {**previous[1], **data}
+        self._events[key] = (event, data)
+
+    def discard_ticket(self, ticket_id: Hashable) -> None:
+        """Drop the pending updates a deletion of ``ticket_id`` makes moot."""
+        for key in [k for k, (e, d) in self._events.items() if e in SUPERSEDED_BY_DELETE and _ticket_of(e, d) == ticket_id]:
+            del self._events[key]
+
+    def drain(self) -> List[Tuple[str, Any]]:
+        events = list(self._events.values())
+        self._events.clear()
+        self.received = 0
+        return events
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+def queue_event(pending: Dict[str, PendingEvents], room: str, event: str, data: Any) -> None:
+    """Add an event to its room; a deletion also clears the ticket's updates queued for other rooms."""
+    if event == "ticket_deleted":
+        ticket_id = _entity_id(event, data)
+        if ticket_id is not None:
+            for events in pending.values():
+                events.discard_ticket(ticket_id)
+    pending.setdefault(room, PendingEvents()).add(event, data)
+
+
+def build_frames(events: List[Tuple[str, Any]], batch_frames: bool) -> List[Tuple[str, Any]]:
+    """The (event, data) emits for a drained room."""
+    if not batch_frames or len(events) == 1:
+        return events
+    return [(BATCH_EVENT, {"events": [{"event": event, "data": data} for event, data in events]})]
+
+
+class AsyncEmitCoalescer:
+    """Coalesces emits made from the event loop; flushed by a timer task."""
+
+    def __init__(self, emit: Callable, window_seconds: float, batch_frames: bool):
+        self._emit = emit
+        self.window_seconds = window_seconds
+        self.batch_frames = batch_frames
+        self._pending: Dict[str, PendingEvents] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.events_received = 0
+        self.frames_sent = 0
+
+    def enqueue(self, room: str, event: str, data: Any) -> None:
+        self.events_received += 1
+        queue_event(self._pending, room, event, data)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.window_seconds, lambda: loop.create_task(self.flush()))
+
+    async def flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for room, events in pending.items():
+            received = events.received
+            drained = events.drain()
+            if not drained:
+                continue
+            for event, data in build_frames(drained, self.batch_frames):
+                try:
+                    await self._emit(event, data, room=room)
+                    self.frames_sent += 1
+                except Exception as e:
+                    logger.error(f"❌ Error emitting {event} to {room}: {e}")
+            logger.info(f"📤 Flushed {len(drained)} events ({received} received) to {room}")
+
+    async def emit_now(self, events: List[Tuple[str, str, Any]]) -> None:
+        """
+        Coalesce ``(room, event, data)`` events among themselves and emit them
+        right away, letting a failed emit raise: for callers that retry, such
+        as the outbox, which already batches its events. A deletion also drops
+        the ticket's updates still waiting in the window.
+        """
+        pending: Dict[str, PendingEvents] = {}
+        for room, event, data in events:
+            self.events_received += 1
+            if event == "ticket_deleted":
+                ticket_id = _entity_id(event, data)
+                if ticket_id is not None:
+                    for waiting in self._pending.values():
+                        waiting.discard_ticket(ticket_id)
+            queue_event(pending, room, event, data)
+        for room, room_events in pending.items():
+            for event, data in build_frames(room_events.drain(), self.batch_frames):
+                await self._emit(event, data, room=room)
+                self.frames_sent += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "events_received": self.events_received,
+            "frames_sent": self.frames_sent,
+            "pending_rooms": len(self._pending),
+        }
+
+
+class SyncEmitCoalescer:
+    """
+    Coalesces emits made from synchronous code; flushed by a timer thread.
+    The timer is a daemon, so whatever is still queued is flushed at exit.
+    """
+
+    def __init__(self, emit: Callable, window_seconds: float, batch_frames: bool):
+        self._emit = emit
+        self.window_seconds = window_seconds
+        self.batch_frames = batch_frames
+        self._pending: Dict[str, PendingEvents] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.close)
+
+    def enqueue(self, room: str, event: str, data: Any) -> None:
+        with self._lock:
+            queue_event(self._pending, room, event, data)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            pending, self._pending = self._pending, {}
+        for room, events in pending.items():
+            drained = events.drain()
+            if not drained:
+                continue
+            for event, data in build_frames(drained, self.batch_frames):
+                try:
+                    self._emit(event, data, room=room)
+                except Exception as e:
+                    logger.error(f"Error in sync emit {event} to {room}: {e}", exc_info=True)
+            logger.info(f"📤 Flushed {len(drained)} queued sync events to {room}")
+
+    def close(self) -> None:
+        """Send what is queued now instead of waiting for the timer."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self.flush()
@@ -1,9 +1,12 @@
 import socketio
-from typing import Dict, Set
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs
 import logging
 import json
 from app.utils.logger import logger
 from app.core.config import settings
+from app.services.response_cache import response_cache
+from app.core.socket_coalescer import AsyncEmitCoalescer, SyncEmitCoalescer
 async_mgr = None
 sync_mgr = None
 if settings.REDIS_URL:
@@ -23,77 +26,223 @@ sio = socketio.AsyncServer(
     ping_interval=10
 )
 
+def workspace_room(workspace_id: int) -> str:
+    return f'workspace_{workspace_id}'
+
+def all_tickets_room(workspace_id: int) -> str:
+    # Sockets that don't subscribe to tickets get every ticket-scoped event (pre-subscription behaviour)
+    return f'workspace_{workspace_id}_all'
+
+def ticket_room(ticket_id: int) -> str:
+    return f'ticket_{ticket_id}'
+
+def team_room(team_id: int) -> str:
+    return f'team_{team_id}'
+
+def agent_room(agent_id: int) -> str:
+    return f'agent_{agent_id}'
+
+
+async def _authenticate(token: str):
+    """Resolve a socket's access token to an AgentPrincipal, or None if invalid."""
+    from fastapi import HTTPException
+    from app.api.dependencies import resolve_principal
+    from app.database.session import AsyncSessionLocal
+
+    if token.lower().startswith('bearer '):
+        token = token[7:]
+    try:
+        # The session only opens a connection on a principal cache and Redis miss
+        async with AsyncSessionLocal() as db:
+            principal = await resolve_principal(token, db)
+    except HTTPException:
+        return None
+    return principal if principal.is_active else None
+
+
+async def _agent_team_ids(agent_id: int) -> List[int]:
+    from sqlalchemy import select
+    from app.database.session import AsyncSessionLocal
+    from app.models.team import TeamMember
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(TeamMember.team_id).where(TeamMember.agent_id == agent_id))
+        return list(result.scalars().all())
+
+
+def _legacy_workspace_id(environ, auth: dict) -> Optional[int]:
+    workspace_id = auth.get('workspace_id') or (parse_qs(environ.get('QUERY_STRING', '')).get('workspace_id') or [None])[0]
+    try:
+        return int(workspace_id) if workspace_id else None
+    except (TypeError, ValueError):
+        return None
+
+
 @sio.event
 async def connect(sid, environ, auth):
-    """Handle new connection and assign to workspace room."""
-    try:
-        workspace_id = None
-        if auth and isinstance(auth, dict):
-            workspace_id = auth.get('workspace_id')
-        
-        if not workspace_id and 'QUERY_STRING' in environ:
-            query_string = environ['QUERY_STRING']
-            if 'workspace_id=' in query_string:
-                try:
-                    workspace_id = int(query_string.split('workspace_id=')[1].split('&')[0])
-                except (ValueError, IndexError):
-                    pass
-        
-        if workspace_id:
-            sio.enter_room(sid, f'workspace_{workspace_id}')
-            logger.debug(f"Socket {sid} connected and joined workspace {workspace_id}")
-        else:
+    """
+    Authenticate the socket with its access token (``auth.token`` or the
+    ``token`` query parameter) and join its workspace, agent and team rooms.
+    Clients that send ``auth.subscriptions = true`` then pick the tickets they
+    want with ``subscribe_ticket``; others keep receiving every ticket-scoped
+    event of the workspace.
+    """
+    auth = auth if isinstance(auth, dict) else {}
+    token = auth.get('token') or (parse_qs(environ.get('QUERY_STRING', '')).get('token') or [None])[0]
+    principal = await _authenticate(token) if token else None
+
+    if principal is None:
+        if settings.SOCKETIO_REQUIRE_AUTH:
+            logger.warning(f"Socket {sid} refused: missing or invalid access token")
+            raise ConnectionRefusedError('authentication failed')
+        workspace_id = _legacy_workspace_id(environ, auth)
+        if not workspace_id:
             logger.warning(f"Socket {sid} connected without a workspace_id.")
-            
+            return
+        sio.enter_room(sid, workspace_room(workspace_id))
+        sio.enter_room(sid, all_tickets_room(workspace_id))
+        logger.debug(f"Socket {sid} connected unauthenticated and joined workspace {workspace_id}")
+        return
+
+    try:
+        sio.enter_room(sid, workspace_room(principal.workspace_id))
+        sio.enter_room(sid, agent_room(principal.id))
+        for team_id in await _agent_team_ids(principal.id):
+            sio.enter_room(sid, team_room(team_id))
+        if not auth.get('subscriptions'):
+            sio.enter_room(sid, all_tickets_room(principal.workspace_id))
+        await sio.save_session(sid, {'agent_id': principal.id, 'workspace_id': principal.workspace_id})
+        logger.debug(f"Socket {sid} connected as agent {principal.id} in workspace {principal.workspace_id}")
     except Exception as e:
         logger.error(f"Error in socket connect: {e}", exc_info=True)
+        raise ConnectionRefusedError('connection setup failed')
+
+@sio.event
+async def subscribe_ticket(sid, data):
+    """Start receiving the ticket-scoped events (comments) of one ticket."""
+    from sqlalchemy import select
+    from app.database.session import AsyncSessionLocal
+    from app.models.task import Task
+
+    session = await sio.get_session(sid)
+    try:
+        ticket_id = int((data or {}).get('ticket_id'))
+    except (TypeError, ValueError):
+        return {'ok': False, 'error': 'ticket_id required'}
+    if not session.get('workspace_id'):
+        return {'ok': False, 'error': 'not authenticated'}
+
+    async with AsyncSessionLocal() as db:
+        workspace_id = (await db.execute(select(Task.workspace_id).where(Task.id == ticket_id))).scalar_one_or_none()
+    if workspace_id != session['workspace_id']:
+        return {'ok': False, 'error': 'ticket not found'}
+    sio.enter_room(sid, ticket_room(ticket_id))
+    return {'ok': True}
+
+@sio.event
+async def unsubscribe_ticket(sid, data):
+    try:
+        ticket_id = int((data or {}).get('ticket_id'))
+    except (TypeError, ValueError):
+        return {'ok': False, 'error': 'ticket_id required'}
+    sio.leave_room(sid, ticket_room(ticket_id))
+    return {'ok': True}
 
 @sio.event
 async def disconnect(sid):
     """Handle disconnection."""
     logger.debug(f"Socket {sid} disconnected.")
+
+_window_seconds = settings.SOCKETIO_COALESCE_WINDOW_MS / 1000
+emit_coalescer = AsyncEmitCoalescer(sio.emit, _window_seconds, settings.SOCKETIO_BATCH_FRAMES)
+sync_emit_coalescer = (
+    SyncEmitCoalescer(sync_mgr.emit, _window_seconds, settings.SOCKETIO_BATCH_FRAMES) if sync_mgr else None
+)
+
+def _ticket_scoped_rooms(workspace_id: int, ticket_id: Optional[int]) -> List[str]:
+    """Viewers of the ticket, plus the sockets that haven't opted into subscriptions."""
+    rooms = [all_tickets_room(workspace_id)]
+    if ticket_id:
+        rooms.insert(0, ticket_room(ticket_id))
+    return rooms
+
+async def emit_to_agent(agent_id: int, event: str, data: dict):
+    """Emit an event to every socket of a single agent."""
+    try:
+        emit_coalescer.enqueue(agent_room(agent_id), event, data)
+    except Exception as e:
+        logger.error(f"❌ Error emitting {event} to agent {agent_id}: {str(e)}")
+
+async def broadcast_new_tickets(workspace_id: int, tickets: List[dict]):
+    """Emitir varios tickets nuevos ya; los errores se propagan (el outbox reintenta)"""
+    await response_cache.invalidate_workspace(workspace_id)
+    await emit_coalescer.emit_now([(workspace_room(workspace_id), 'new_ticket', ticket_data) for ticket_data in tickets])
+
+async def broadcast_new_ticket(workspace_id: int, ticket_data: dict):
+    """Emitir evento de nuevo ticket ya; los errores se propagan (el outbox reintenta)"""
+    await broadcast_new_tickets(workspace_id, [ticket_data])
+
 async def emit_new_ticket(workspace_id: int, ticket_data: dict):
     """Emitir evento de nuevo ticket"""
     try:
-        room = f'workspace_{workspace_id}'
-        await sio.emit('new_ticket', ticket_data, room=room)
-
+        await broadcast_new_ticket(workspace_id, ticket_data)
     except Exception as e:
         logger.error(f"❌ Error emitting new_ticket: {str(e)}")
 
 async def emit_ticket_update(workspace_id: int, ticket_data: dict):
     """Emitir evento de actualización de ticket"""
     try:
-        room = f'workspace_{workspace_id}'
-        await sio.emit('ticket_updated', ticket_data, room=room)
-        logger.info(f"📤 Emitted ticket_updated to workspace {workspace_id}")
+        await response_cache.invalidate_ticket(workspace_id, ticket_data.get('id'))
+        emit_coalescer.enqueue(workspace_room(workspace_id), 'ticket_updated', ticket_data)
     except Exception as e:
         logger.error(f"❌ Error emitting ticket_updated: {str(e)}")
 
 async def emit_ticket_deleted(workspace_id: int, ticket_id: int):
     """Emitir evento de ticket eliminado"""
     try:
-        room = f'workspace_{workspace_id}'
-        await sio.emit('ticket_deleted', {'ticket_id': ticket_id}, room=room)
-        logger.info(f"📤 Emitted ticket_deleted to workspace {workspace_id}")
+        await response_cache.invalidate_ticket(workspace_id, ticket_id)
+        emit_coalescer.enqueue(workspace_room(workspace_id), 'ticket_deleted', {'ticket_id': ticket_id})
     except Exception as e:
         logger.error(f"❌ Error emitting ticket_deleted: {str(e)}")
 
+async def broadcast_ticket_updates(workspace_id: int, tickets: List[dict]):
+    """Emitir las actualizaciones de varios tickets ya; los errores se propagan (el outbox reintenta)"""
+    await response_cache.invalidate_tickets(workspace_id, [ticket['id'] for ticket in tickets])
+    await emit_coalescer.emit_now([(workspace_room(workspace_id), 'ticket_updated', ticket_data) for ticket_data in tickets])
+
+async def broadcast_tickets_deleted(workspace_id: int, ticket_ids: List[int]):
+    """Emitir la eliminación de varios tickets ya; los errores se propagan (el outbox reintenta)"""
+    await response_cache.invalidate_tickets(workspace_id, ticket_ids)
+    await emit_coalescer.emit_now([
+        (workspace_room(workspace_id), 'ticket_deleted', {'ticket_id': ticket_id}) for ticket_id in ticket_ids
+    ])
+
+async def broadcast_comment_updates(workspace_id: int, comments: List[dict]):
+    """Emitir las actualizaciones de varios comentarios ya; los errores se propagan (el outbox reintenta)"""
+    ticket_ids = list(dict.fromkeys(comment_data.get('ticket_id') for comment_data in comments))
+    await response_cache.invalidate_tickets(workspace_id, [ticket_id for ticket_id in ticket_ids if ticket_id is not None])
+    await emit_coalescer.emit_now([
+        (room, 'comment_updated', comment_data)
+        for comment_data in comments
+        for room in _ticket_scoped_rooms(workspace_id, comment_data.get('ticket_id'))
+    ])
+
+async def broadcast_comment_update(workspace_id: int, comment_data: dict):
+    """Emitir evento de actualización de comentario ya; los errores se propagan (el outbox reintenta)"""
+    await broadcast_comment_updates(workspace_id, [comment_data])
+
 async def emit_comment_update(workspace_id: int, comment_data: dict):
     """Emitir evento de actualización de comentario"""
     try:
-        room = f'workspace_{workspace_id}'
-        await sio.emit('comment_updated', comment_data, room=room)
-        logger.info(f"📤 Emitted comment_updated to workspace {workspace_id}")
+        await broadcast_comment_update(workspace_id, comment_data)
     except Exception as e:
         logger.error(f"❌ Error emitting comment_updated: {str(e)}")
 
 async def emit_team_update(workspace_id: int, team_data: dict):
     """Emitir evento de actualización de equipo"""
     try:
-        room = f'workspace_{workspace_id}'
-        await sio.emit('team_updated', team_data, room=room)
-        logger.info(f"📤 Emitted team_updated to workspace {workspace_id}")
+        emit_coalescer.enqueue(team_room(team_data.get('id')), 'team_updated', team_data)
+        emit_coalescer.enqueue(all_tickets_room(workspace_id), 'team_updated', team_data)
     except Exception as e:
         logger.error(f"❌ Error emitting team_updated: {str(e)}")
 @sio.event
@@ -103,36 +252,35 @@ async def ping(sid, data):
 
 def emit_comment_update_sync(workspace_id: int, comment_data: dict):
     """Emit comment update event from a synchronous context."""
+    response_cache.invalidate_ticket_sync(workspace_id, comment_data.get('ticket_id'))
     if not sync_mgr:
         logger.warning("Cannot emit sync event: RedisManager not configured.")
         return
     try:
-        room = f'workspace_{workspace_id}'
-        sync_mgr.emit('comment_updated', comment_data, room=room)
-        logger.info(f"📤 Queued sync emit 'comment_updated' to workspace {workspace_id}")
+        for room in _ticket_scoped_rooms(workspace_id, comment_data.get('ticket_id')):
+            sync_emit_coalescer.enqueue(room, 'comment_updated', comment_data)
     except Exception as e:
         logger.error(f"Error in sync emit comment_updated: {e}", exc_info=True)
 
 def emit_new_ticket_sync(workspace_id: int, ticket_data: dict):
     """Emit new ticket event from a synchronous context."""
+    response_cache.invalidate_ticket_sync(workspace_id, None)
     if not sync_mgr:
         logger.warning("Cannot emit sync event: RedisManager not configured.")
         return
     try:
-        room = f'workspace_{workspace_id}'
-        sync_mgr.emit('new_ticket', ticket_data, room=room)
-        logger.info(f"📤 Queued sync emit 'new_ticket' to workspace {workspace_id}")
+        sync_emit_coalescer.enqueue(workspace_room(workspace_id), 'new_ticket', ticket_data)
     except Exception as e:
         logger.error(f"Error in sync emit new_ticket: {e}", exc_info=True)
 
 def emit_ticket_update_sync(workspace_id: int, ticket_data: dict):
     """Emit ticket update event from a synchronous context."""
+    ticket_id = ticket_data.get('id') if isinstance(ticket_data, dict) else ticket_data
+    response_cache.invalidate_ticket_sync(workspace_id, ticket_id)
     if not sync_mgr:
         logger.warning("Cannot emit sync event: RedisManager not configured.")
         return
     try:
-        room = f'workspace_{workspace_id}'
-        sync_mgr.emit('ticket_updated', ticket_data, room=room)
-        logger.info(f"📤 Queued sync emit 'ticket_updated' to workspace {workspace_id}")
+        sync_emit_coalescer.enqueue(workspace_room(workspace_id), 'ticket_updated', ticket_data)
     except Exception as e:
         logger.error(f"Error in sync emit ticket_updated: {e}", exc_info=True)
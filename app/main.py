@@ -4,17 +4,23 @@ import socketio
 import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.core.rate_limiter import limiter
 
 from app.api.api import api_router
 from app.core.config import settings
-from app.core.socketio import sio
+from app.core.security import PasswordHasherBusy, password_hasher
+from app.core.socketio import emit_coalescer, sio, sync_emit_coalescer
 from app.core.compression import SmartCompressionMiddleware, compression_stats
+from app.core.middleware import HealthMiddleware
+from app.services.contact_resolver import contact_resolver
+from app.services.report_rollups import report_rollups
+from app.services.notification_feed import notification_feed
+from app.services.workspace_config import workspace_config
 
 logging.basicConfig(
     level=logging.INFO,
@@ -68,6 +74,14 @@ async def lifespan(app: FastAPI):
     # Warm up cache before accepting traffic
     await warm_up_cache()
 
+    # Listen for auth revocations published by other workers
+    from app.services.principal_cache import principal_cache
+    principal_cache.start_listener()
+
+    # Publish side effects committed to the outbox
+    from app.services.outbox import outbox_relay
+    outbox_relay.start()
+
     # Initialize email sync scheduler in a thread-safe way
     try:
         from app.services.email_sync_task import start_scheduler
@@ -83,6 +97,12 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown logic
     logger.info("Application shutdown...")
+    await principal_cache.stop_listener()
+    await outbox_relay.stop()
+    # Don't lose the emits still held in the coalescing window
+    await emit_coalescer.flush()
+    if sync_emit_coalescer:
+        sync_emit_coalescer.close()
     await close_redis_pool()
 
 app = FastAPI(
@@ -93,15 +113,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-class HealthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path == "/health":
-            return Response("OK", status_code=200)
-        return await call_next(request)
-
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+async def _password_hasher_busy_handler(request, exc):
+    # Too many bcrypt operations queued (login storm): shed load quickly
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service is busy, please retry shortly"},
+        headers={"Retry-After": "2"},
+    )
+
+app.add_exception_handler(PasswordHasherBusy, _password_hasher_busy_handler)
+
 origins = settings.BACKEND_CORS_ORIGINS
 regex_parts = [o.replace('.', r'\.').replace('*', r'[a-zA-Z0-9-]+') for o in origins]
 origin_regex = r"|".join(regex_parts)
@@ -121,6 +146,8 @@ if settings.ENABLE_COMPRESSION:
         minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
         gzip_level=settings.COMPRESSION_GZIP_LEVEL,
         brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        offload_threshold=settings.COMPRESSION_OFFLOAD_THRESHOLD,
+        cache_max_bytes=settings.COMPRESSION_CACHE_MAX_BYTES,
     )
     logger.info(f"✅ HTTP Compression enabled (min size: {settings.COMPRESSION_MINIMUM_SIZE} bytes)")
 else:
@@ -146,6 +173,18 @@ async def health_check_detailed():
     except Exception as db_error:
         health_status["database"] = {"pool_healthy": False, "error": str(db_error)}
         health_status["status"] = "degraded"
+    health_status["password_hashing"] = password_hasher.get_stats()
+    health_status["socketio_emits"] = emit_coalescer.get_stats()
+    health_status["workspace_config"] = workspace_config.get_stats()
+    health_status["contact_resolution"] = contact_resolver.get_stats()
+    health_status["report_rollups"] = report_rollups.get_stats()
+    health_status["notification_feed"] = notification_feed.get_stats()
+    from app.services.outbox import outbox_relay
+    health_status["outbox"] = outbox_relay.get_stats()
+    from app.services.ticket_archive import ticket_archive
+    health_status["ticket_archive"] = ticket_archive.get_stats()
+    from app.services.analytics_warehouse import analytics_warehouse
+    health_status["analytics"] = analytics_warehouse.get_stats()
     return health_status
 
 @app.get("/compression-stats")
@@ -169,6 +208,8 @@ async def compression_statistics():
             "minimum_size": settings.COMPRESSION_MINIMUM_SIZE,
             "gzip_level": settings.COMPRESSION_GZIP_LEVEL,
             "brotli_quality": settings.COMPRESSION_BROTLI_QUALITY,
+            "offload_threshold": settings.COMPRESSION_OFFLOAD_THRESHOLD,
+            "cache_max_bytes": settings.COMPRESSION_CACHE_MAX_BYTES,
         },
         "statistics": stats,
         "cost_analysis": {
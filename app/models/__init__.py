@@ -11,6 +11,10 @@ from app.models.activity import Activity
 from app.models.canned_reply import CannedReply
 from app.models.microsoft import MicrosoftIntegration, MicrosoftToken, EmailTicketMapping, EmailSyncConfig 
 from .ticket_attachment import TicketAttachment 
+from app.models.stored_blob import StoredBlob
+from app.models.report_rollup import TicketReportRollup
+from app.models.ticket_event import TicketEvent
+from app.models.outbox_event import OutboxEvent
 from app.models.global_signature import GlobalSignature 
 from app.models.notification import NotificationTemplate, NotificationSetting 
 from app.models.workflow import Workflow 
@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, func
 from sqlalchemy.orm import relationship
 from app.database.base_class import Base
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        # Notification feed: one range read per workspace, newest first
+        Index("ix_activities_feed", "workspace_id", "is_notification", "created_at"),
+        # Retention purge by age
+        Index("ix_activities_source_created", "source_type", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     agent_id = Column(Integer, ForeignKey("agents.id", ondelete="SET NULL"), nullable=True)
@@ -12,7 +18,13 @@ class Activity(Base):
     source_id = Column(Integer, nullable=False)
     workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=False)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)  # Analytics export watermark
+
+    # Notification feed, decided and denormalised at write time (app.services.notification_feed)
+    is_notification = Column(Boolean, nullable=True)  # NULL: written before the feed existed
+    creator_user_id = Column(Integer, nullable=True)
+    creator_user_name = Column(String(255), nullable=True)
+    creator_user_email = Column(String(255), nullable=True)
     
     # Relationships
     agent = relationship("Agent", back_populates="activities")
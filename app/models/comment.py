@@ -17,7 +17,7 @@ class Comment(Base):
     s3_html_url = Column(Text, nullable=True)  # URL del HTML almacenado en S3
     is_private = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)  # Analytics export watermark
 
     # Relationships
     ticket = relationship("Task", back_populates="comments")
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, ForeignKey
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, ForeignKey, Index, event
 from sqlalchemy.orm import relationship
 from app.database.base_class import Base
 # Import related models for foreign_keys argument
@@ -12,6 +14,8 @@ class Company(Base):
     name = Column(String(255), nullable=False)
     description = Column(String(1024), nullable=True)
     email_domain = Column(String(255), nullable=True)
+    # Lowercased, trimmed email_domain kept in sync below, so domain lookups can use an index
+    email_domain_normalized = Column(String(255), nullable=True)
     logo_url = Column(String(255), nullable=True)
     workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=False)
     primary_contact_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Added
@@ -26,3 +30,18 @@ class Company(Base):
     tasks = relationship("Task", back_populates="company")
     primary_contact = relationship("User", foreign_keys=[primary_contact_id])
     account_manager = relationship("Agent", foreign_keys=[account_manager_id]) # Added relationship
+
+    __table_args__ = (
+        Index("ix_companies_workspace_domain", "workspace_id", "email_domain_normalized"),
+    )
+
+
+def normalize_email_domain(domain: Optional[str]) -> Optional[str]:
+    domain = (domain or "").strip().lower()
+    return domain or None
+
+
+@event.listens_for(Company, "before_insert")
+@event.listens_for(Company, "before_update")
+def _normalize_email_domain(mapper, connection, target):
+    target.email_domain_normalized = normalize_email_domain(target.email_domain)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, JSON, Index, func
+from app.database.base_class import Base
+
+class OutboxEvent(Base):
+    """
+    A side effect (Socket.IO event, notification, workflow run) recorded in
+    the same transaction as the change that causes it, and carried out
+    afterwards by the outbox relay (see ``app.services.outbox``).
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # The relay reads pending rows in order: processed_at IS NULL AND available_at <= now
+        Index("ix_outbox_events_pending", "processed_at", "available_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    event_type = Column(String(64), nullable=False)
+    workspace_id = Column(Integer, nullable=True)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=func.now())
+    available_at = Column(DateTime, nullable=False, default=func.now())  # Pushed back after a failed attempt
+    processed_at = Column(DateTime, nullable=True)  # Published, or given up after OUTBOX_MAX_ATTEMPTS
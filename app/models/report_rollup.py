@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Enum, ForeignKey, UniqueConstraint
+from app.database.base_class import Base
+
+class TicketReportRollup(Base):
+    """
+    Number of tickets created in one hour, per workspace, team, status and
+    priority, as of now, with their first-response and resolution time sums.
+    Maintained from the deltas every ticket flush sends through the outbox
+    and rebuilt from
+    ``tickets`` by the report rollup job (see ``app.services.report_rollups``);
+    the reports endpoints read only these rows.
+    """
+    __tablename__ = "ticket_report_rollups"
+    __table_args__ = (
+        # Leading (workspace_id, bucket_start) serves the report range scans
+        UniqueConstraint(
+            "workspace_id", "bucket_start", "team_id", "mailbox_connection_id", "status", "priority",
+            name="uq_ticket_report_rollups_bucket",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)  # created_at truncated to the hour
+    # 0 instead of NULL so the unique key also covers team-less tickets
+    team_id = Column(Integer, nullable=False, default=0)
+    # Only set for team-less tickets: reports attribute them to the teams assigned to their mailbox
+    mailbox_connection_id = Column(Integer, nullable=False, default=0)
+    status = Column(Enum('Unread', 'Open', 'With User', 'In Progress', 'Closed', name='ticket_status'), nullable=False)
+    priority = Column(Enum('Low', 'Medium', 'High', 'Critical', name='ticket_priority'), nullable=False)
+    ticket_count = Column(Integer, nullable=False, default=0)
+    # Sums behind the average response times: seconds from creation to tickets.first_response_at / resolved_at
+    first_response_count = Column(Integer, nullable=False, default=0)
+    first_response_seconds = Column(BigInteger, nullable=False, default=0)
+    resolved_count = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, case, func
+from app.database.base_class import Base
+
+class StoredBlob(Base):
+    """
+    Content-addressed object in storage, shared by every attachment or inline
+    image with the same bytes. ``ref_count`` tracks the rows pointing at it;
+    unreferenced blobs are removed by the blob maintenance job, counting the
+    grace period from ``released_at``.
+    """
+    __tablename__ = "stored_blobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(255), nullable=False)
+    storage_key = Column(String(255), nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=func.now())
+    last_referenced_at = Column(DateTime, default=func.now(), index=True)
+    # When ref_count last dropped to 0; NULL while referenced
+    released_at = Column(DateTime, nullable=True, index=True)
+
+
+def release_assignments():
+    """
+    SET clause giving back one reference, for ``update().ordered_values()``.
+    MySQL applies assignments left to right, so ``released_at`` is computed
+    from the count before it is decremented.
+    """
+    return (
+        (StoredBlob.released_at, case((StoredBlob.ref_count == 1, func.now()), else_=StoredBlob.released_at)),
+        (StoredBlob.ref_count, StoredBlob.ref_count - 1),
+    )
@@ -25,8 +25,8 @@ class Task(Base):
     assignee_id = Column(Integer, ForeignKey("agents.id", ondelete="SET NULL"), nullable=True)
     team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), nullable=True)
     due_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=func.now(), nullable=False)
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False, index=True)  # Report rollup rebuilds scan by range
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False, index=True)  # Analytics export watermark
     last_update = Column(DateTime, nullable=True)
     sent_from_id = Column(Integer, ForeignKey("agents.id"), nullable=True)
     sent_to_id = Column(Integer, ForeignKey("agents.id"), nullable=True)
@@ -39,6 +39,13 @@ class Task(Base):
     mailbox_connection_id = Column(Integer, ForeignKey("mailbox_connections.id", ondelete="SET NULL"), nullable=True, index=True) 
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True, index=True) 
 
+    # SLA timestamps, kept by app.services.ticket_lifecycle
+    first_response_at = Column(DateTime, nullable=True)  # First public agent reply
+    resolved_at = Column(DateTime, nullable=True, index=True)  # Last move to Closed; cleared on reopen
+    archived_at = Column(DateTime, nullable=True)  # Comments moved to the archive store (app.services.ticket_archive)
+    # Set by the SLA backfill and the archive job, which keep updated_at as it was, so the analytics export sees their writes
+    sla_updated_at = Column(DateTime, nullable=True, index=True)
+
     # Email-related columns
     email_message_id = Column(String(255), nullable=True, index=True)
     email_internet_message_id = Column(String(255), nullable=True, index=True)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, ForeignKey, func, Text
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, ForeignKey, func, Text, event, update
 from sqlalchemy.orm import relationship
 from app.database.base_class import Base
+from app.models.stored_blob import StoredBlob, release_assignments
 
 class TicketAttachment(Base):
     __tablename__ = "ticket_attachments"
@@ -12,7 +13,19 @@ class TicketAttachment(Base):
     file_size = Column(Integer, nullable=False)
     content_bytes = Column(LargeBinary, nullable=True)
     s3_url = Column(Text, nullable=True)
+    blob_id = Column(Integer, ForeignKey("stored_blobs.id", ondelete="SET NULL"), nullable=True, index=True)
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
-    comment = relationship("Comment", back_populates="attachments") 
\ No newline at end of file
+    comment = relationship("Comment", back_populates="attachments")
+
+
+@event.listens_for(TicketAttachment, "after_delete")
+def release_attachment_blob(mapper, connection, target):
+    # Also fires for comment cascades, so blob reference counts stay honest
+    if target.blob_id:
+        connection.execute(
+            update(StoredBlob)
+            .where(StoredBlob.id == target.blob_id, StoredBlob.ref_count > 0)
+            .ordered_values(*release_assignments())
+        ) 
\ No newline at end of file
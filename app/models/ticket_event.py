@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import relationship
+from app.database.base_class import Base
+
+class TicketEvent(Base):
+    """
+    Append-only ticket lifecycle log: created, first_response, status_changed,
+    closed and reopened. Written by ``app.services.ticket_lifecycle`` in the
+    same flush as the change it records.
+    """
+    __tablename__ = "ticket_events"
+    __table_args__ = (
+        Index("ix_ticket_events_ticket_occurred", "ticket_id", "occurred_at"),
+        Index("ix_ticket_events_workspace_occurred", "workspace_id", "occurred_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False)
+    event_type = Column(String(32), nullable=False)
+    from_status = Column(String(32), nullable=True)
+    to_status = Column(String(32), nullable=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="SET NULL"), nullable=True)
+    occurred_at = Column(DateTime, nullable=False, default=func.now())
+
+    # Lets events for a ticket that is being inserted in the same flush get its id
+    ticket = relationship("Task")
@@ -1,5 +1,6 @@
+from enum import Enum
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 
 from .task import TaskStatus, TaskPriority # Import enums
 
@@ -8,8 +9,8 @@ class ReportSummary(BaseModel):
     created_tickets: int
     resolved_tickets: int
     unresolved_tickets: int
-    average_response_time: Optional[str] # Placeholder for now
-    avg_first_response_time: Optional[str] # Placeholder for now
+    average_response_time: Optional[str] # Average time to resolution (creation -> Closed), "N/A" without data
+    avg_first_response_time: Optional[str] # Average time to the first public agent reply
     # Add counts for charts
     status_counts: Dict[TaskStatus, int] = {}
     priority_counts: Dict[TaskPriority, int] = {}
@@ -24,6 +25,19 @@ class CategoryDataPoint(BaseModel):
     category_name: str # e.g., "Open", "Closed", "High", "Medium"
     count: int
 
+# Reports served from the columnar export (/reports/advanced)
+class AdvancedReportType(str, Enum):
+    TICKET_VOLUME = "ticket_volume"
+    RESPONSE_TIMES = "response_times"
+    TEAM_VOLUME = "team_volume"
+    AGENT_REPLIES = "agent_replies"
+
+class AdvancedReport(BaseModel):
+    report: AdvancedReportType
+    columns: List[str]
+    rows: List[List[Any]]
+    data_as_of: Optional[str] = None # Export watermark: changes after this are not included yet
+
 # Potentially a combined schema if one endpoint returns all data
 # We might not need this if we fetch data per chart/section
 # class FullReportData(BaseModel):
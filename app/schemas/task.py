@@ -1,5 +1,5 @@
 from typing import Optional, List, ForwardRef, Dict, Any
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
 from enum import Enum as PyEnum
 WorkspaceRef = ForwardRef("Workspace")
@@ -98,6 +98,23 @@ class TicketUpdate(BaseModel):
                  raise ValueError(f"Priority must be one of {list(TaskPriority.__members__.values())}")
         return v
 
+# Schemas for bulk operations
+BULK_MAX_TICKETS = 500
+
+class TicketBulkUpdate(BaseModel):
+    """One change set applied to many tickets; only the fields sent are changed"""
+    ticket_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_TICKETS)
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    assignee_id: Optional[int] = None
+    team_id: Optional[int] = None
+    delete: bool = False  # Soft delete the tickets instead; no other field may be sent
+
+class TicketBulkResult(BaseModel):
+    """Response schema for bulk operations"""
+    updated_ids: List[int]
+    skipped_ids: List[int]  # Not found, deleted, or already matching the change set
+
 # Schemas for merge functionality
 class TicketMergeRequest(BaseModel):
     """Schema for merging tickets"""
@@ -171,6 +188,45 @@ class Ticket(TicketInDBBase):
     email_info: Optional[EmailInfo] = None
     merge_info: Optional[MergedTicketInfo] = None
 
+class TicketListItem(BaseModel):
+    """
+    Ticket row as shown in list views: the ``Ticket`` fields without the
+    heavy text columns (description, to/cc/bcc recipients), plus the names of
+    the related entities.
+    """
+    id: int
+    title: str
+    status: TaskStatus
+    priority: TaskPriority
+    assignee_id: Optional[int] = None
+    due_date: Optional[datetime] = None
+    user_id: Optional[int] = None
+    workspace_id: int
+    team_id: Optional[int] = None
+    company_id: Optional[int] = None
+    sent_from_id: Optional[int] = None
+    sent_to_id: Optional[int] = None
+    category_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+    last_update: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+    merged_to_ticket_id: Optional[int] = None
+    is_merged: bool = False
+    merged_at: Optional[datetime] = None
+    merged_by_agent_id: Optional[int] = None
+    assignee_name: Optional[str] = None
+    user_name: Optional[str] = None
+    user_email: Optional[str] = None
+    team_name: Optional[str] = None
+    category_name: Optional[str] = None
+    is_from_email: bool = False
+    email_info: Optional[EmailInfo] = None
+    merge_info: Optional[MergedTicketInfo] = None
+
+    class Config:
+        from_attributes = True
+
 class TicketBodySchema(BaseModel):
     email_body: Optional[str] = None
     
@@ -205,3 +261,4 @@ TicketWithDetails.update_forward_refs()
 TicketBodySchema.update_forward_refs() 
 Task = Ticket 
 TaskWithDetails = TicketWithDetails
+TaskListItem = TicketListItem
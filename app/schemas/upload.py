@@ -0,0 +1,40 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class DirectUploadRequest(BaseModel):
+    file_name: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    file_size: int = Field(..., gt=0)
+
+
+class DirectUploadResponse(BaseModel):
+    """
+    How to send the file straight to storage. Single uploads POST ``fields``
+    plus the file to ``post_url``; multipart uploads PUT each chunk of
+    ``part_size`` bytes to ``part_urls[i]`` and report the returned ETags.
+    """
+    method: str  # "POST" or "MULTIPART"
+    key: str
+    file_url: str
+    upload_token: str
+    expires_in: int
+    post_url: Optional[str] = None
+    fields: Optional[Dict[str, Any]] = None
+    part_size: Optional[int] = None
+    part_urls: Optional[List[str]] = None
+
+
+class UploadedPart(BaseModel):
+    part_number: int = Field(..., ge=1, le=10000)
+    etag: str
+
+
+class DirectUploadComplete(BaseModel):
+    upload_token: str
+    parts: Optional[List[UploadedPart]] = None  # Required for multipart uploads
+
+
+class DirectUploadAbort(BaseModel):
+    upload_token: str
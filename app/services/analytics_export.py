@@ -0,0 +1,300 @@
+"""
+Columnar export of ticket history for offline analytics.
+
+``tickets``, ``comments`` and ``activities`` are copied incrementally into
+Parquet files in the object store, so multi-month reports (see
+``app.services.analytics_warehouse``) never scan the live tables. Each table
+is read in keyset batches ordered by ``(updated_at, id)`` from its watermark,
+and every batch is written as one file per workspace:
+
+    analytics/<table>/workspace_id=<id>/part-<updated_at>-<id>.parquet
+
+A row changed after it was exported is exported again in a later file;
+readers keep the newest version of each id. Rows are only exported once they
+are ``ANALYTICS_EXPORT_LAG_SECONDS`` old, so transactions still in flight at
+the watermark are not skipped. Hard deletes are not captured (tickets are
+soft-deleted).
+
+Writes that keep ``updated_at`` as it was (the SLA backfill, the archive job)
+set ``tickets.sla_updated_at`` instead; it is a second change marker with its
+own keyset pass and watermark, and those files are named
+``part-sla_updated_at-<ts>-<id>.parquet``. A row's version is the latest of
+its markers.
+
+Every batch adds files, so once a workspace partition holds
+``ANALYTICS_EXPORT_COMPACT_MIN_FILES`` of them they are merged into one
+``compact-<ts>.parquet`` holding the newest version of each row, and the
+merged files are deleted.
+
+The watermarks live in ``analytics/_manifest.json`` next to the data, which
+keeps the export self-contained in the store. Needs ``pyarrow``.
+"""
+
+import asyncio
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+    ARROW_AVAILABLE = False
+
+from app.core.config import settings
+from app.database.session import get_async_driver
+from app.models.activity import Activity
+from app.models.comment import Comment
+from app.models.task import Task
+from app.services.storage import get_storage
+from app.utils.logger import logger
+
+MANIFEST_NAME = "_manifest.json"
+EPOCH = datetime(1970, 1, 1)
+MAX_LISTED_FILES = 100000
+
+# A long first export may still be running when the next run is due
+_export_running = False
+
+# (table name, model, [(column, arrow type)]). Large text (bodies, HTML) stays out.
+EXPORTED_TABLES: Tuple[Tuple[str, Any, Sequence[Tuple[str, str]]], ...] = (
+    ("tickets", Task, (
+        ("id", "int"), ("workspace_id", "int"), ("status", "str"), ("priority", "str"),
+        ("assignee_id", "int"), ("team_id", "int"), ("user_id", "int"), ("company_id", "int"),
+        ("category_id", "int"), ("mailbox_connection_id", "int"), ("is_deleted", "bool"), ("is_merged", "bool"),
+        ("created_at", "ts"), ("updated_at", "ts"), ("first_response_at", "ts"), ("resolved_at", "ts"),
+        ("sla_updated_at", "ts"),
+    )),
+    ("comments", Comment, (
+        ("id", "int"), ("workspace_id", "int"), ("ticket_id", "int"), ("agent_id", "int"), ("user_id", "int"),
+        ("is_private", "bool"), ("created_at", "ts"), ("updated_at", "ts"),
+    )),
+    ("activities", Activity, (
+        ("id", "int"), ("workspace_id", "int"), ("agent_id", "int"), ("source_type", "str"), ("source_id", "int"),
+        ("action", "str"), ("created_at", "ts"), ("updated_at", "ts"),
+    )),
+)
+
+
+# Columns whose changes make a row due for export, besides updated_at
+EXTRA_CHANGE_MARKERS: Dict[str, Tuple[str, ...]] = {
+    "tickets": ("sla_updated_at",),
+}
+
+
+def change_markers(table: str) -> Tuple[str, ...]:
+    return ("updated_at",) + EXTRA_CHANGE_MARKERS.get(table, ())
+
+
+def table_prefix(table: str, workspace_id: Optional[int] = None) -> str:
+    prefix = f"{settings.ANALYTICS_EXPORT_PREFIX.rstrip('/')}/{table}"
+    return prefix if workspace_id is None else f"{prefix}/workspace_id={workspace_id}"
+
+
+def manifest_key() -> str:
+    return f"{settings.ANALYTICS_EXPORT_PREFIX.rstrip('/')}/{MANIFEST_NAME}"
+
+
+def _arrow_schema(columns: Sequence[Tuple[str, str]]):
+    types = {"int": pa.int64(), "str": pa.string(), "bool": pa.bool_(), "ts": pa.timestamp("s")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _to_parquet(rows: List[Any], columns: Sequence[Tuple[str, str]]) -> bytes:
+    """CPU-bound: run on a worker thread."""
+    data = {name: [row[index] for row in rows] for index, (name, _) in enumerate(columns)}
+    table = pa.Table.from_pydict(data, schema=_arrow_schema(columns))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def _compact(bodies: List[bytes], columns: Sequence[Tuple[str, str]], markers: Sequence[str]) -> bytes:
+    """
+    CPU-bound: run on a worker thread. Merge Parquet files (in export order)
+    into one holding the newest version of each row; files written before a
+    column existed read it as NULL. Works on Arrow columns throughout, and
+    ``bodies`` is emptied as the files are decoded.
+    """
+    schema = _arrow_schema(columns)
+    tables = []
+    while bodies:
+        table = pq.read_table(pa.BufferReader(bodies.pop(0)))
+        tables.append(pa.table([
+            table[name].cast(field.type) if name in table.column_names else pa.nulls(table.num_rows, field.type)
+            for name, field in zip(schema.names, schema)
+        ], schema=schema))
+    table = pa.concat_tables(tables)
+    del tables
+
+    version = table[markers[0]]
+    if len(markers) > 1:
+        version = pc.max_element_wise(*(table[marker] for marker in markers), skip_nulls=True)
+    # Newest version first within each id; on a tie the later file wins
+    ordered = (
+        table.append_column("_version", version)
+        .append_column("_order", pa.array(range(table.num_rows), pa.int64()))
+        .sort_by([("id", "ascending"), ("_version", "descending"), ("_order", "descending")])
+    )
+    del table
+    ids = ordered["id"].combine_chunks()
+    previous = pa.concat_arrays([pa.nulls(1, ids.type), ids.slice(0, max(len(ids) - 1, 0))])
+    keep = pc.fill_null(pc.not_equal(ids, previous.slice(0, len(ids))), True)
+    newest = ordered.filter(keep).select(schema.names)
+    buffer = io.BytesIO()
+    pq.write_table(newest, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+async def load_manifest() -> Dict[str, Any]:
+    body = await get_storage().get_object(manifest_key())
+    if not body:
+        return {"tables": {}}
+    return json.loads(body)
+
+
+async def _save_manifest(manifest: Dict[str, Any]) -> None:
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    await get_storage().put_object(manifest_key(), json.dumps(manifest).encode("utf-8"), "application/json")
+
+
+def _watermark_name(table: str, marker: str) -> str:
+    # updated_at keeps the plain table name, which readers report as "data as of"
+    return table if marker == "updated_at" else f"{table}.{marker}"
+
+
+async def export_table(
+    db: AsyncSession,
+    manifest: Dict[str, Any],
+    table: str,
+    model: Any,
+    columns: Sequence[Tuple[str, str]],
+    cutoff: datetime,
+    marker: str = "updated_at",
+) -> int:
+    """Export rows of one table whose ``marker`` moved past its watermark. Returns how many."""
+    state = manifest["tables"].setdefault(_watermark_name(table, marker), {"updated_at": EPOCH.isoformat(), "id": 0})
+    watermark_at, watermark_id = datetime.fromisoformat(state["updated_at"]), state["id"]
+    selected = [getattr(model, name) for name, _ in columns]
+    names = [name for name, _ in columns]
+    workspace_index, marker_index = names.index("workspace_id"), names.index(marker)
+    changed_at = getattr(model, marker)
+    part_prefix = "part" if marker == "updated_at" else f"part-{marker}"
+    storage = get_storage()
+
+    exported = 0
+    for _ in range(settings.ANALYTICS_EXPORT_MAX_BATCHES_PER_RUN):
+        rows = (await db.execute(
+            select(*selected)
+            .where(
+                changed_at < cutoff,
+                or_(changed_at > watermark_at, and_(changed_at == watermark_at, model.id > watermark_id)),
+            )
+            .order_by(changed_at, model.id)
+            .limit(settings.ANALYTICS_EXPORT_BATCH_SIZE)
+        )).all()
+        if not rows:
+            break
+
+        by_workspace: Dict[int, List[Any]] = {}
+        for row in rows:
+            by_workspace.setdefault(row[workspace_index], []).append(row)
+        last = rows[-1]
+        last_at = last[marker_index]
+        part = f"{part_prefix}-{last_at:%Y%m%dT%H%M%S}-{last.id}.parquet"
+        for workspace_id, workspace_rows in by_workspace.items():
+            body = await asyncio.to_thread(_to_parquet, workspace_rows, columns)
+            key = f"{table_prefix(table, workspace_id)}/{part}"
+            await storage.put_object(key, body, "application/vnd.apache.parquet")
+
+        # Files first, then the watermark: a crash in between only re-exports the batch
+        watermark_at, watermark_id = last_at, last.id
+        state["updated_at"], state["id"] = watermark_at.isoformat(), watermark_id
+        await _save_manifest(manifest)
+        exported += len(rows)
+        if len(rows) < settings.ANALYTICS_EXPORT_BATCH_SIZE:
+            break
+    return exported
+
+
+async def compact_partitions(table: str, columns: Sequence[Tuple[str, str]]) -> int:
+    """
+    Merge the files of every workspace partition of ``table`` that has
+    ``ANALYTICS_EXPORT_COMPACT_MIN_FILES`` or more. The merged file is written
+    before the old ones are deleted, so readers see every row throughout
+    (twice at most, which the newest-version rule absorbs). Returns how many
+    files were removed.
+    """
+    storage = get_storage()
+    objects = await storage.list_files(f"{table_prefix(table)}/", MAX_LISTED_FILES)
+    by_partition: Dict[str, List[str]] = {}
+    for obj in objects:
+        key = obj["key"]
+        if key.endswith(".parquet"):
+            by_partition.setdefault(key.rsplit("/", 1)[0], []).append(key)
+
+    removed = 0
+    for partition, keys in by_partition.items():
+        if len(keys) < settings.ANALYTICS_EXPORT_COMPACT_MIN_FILES:
+            continue
+        # Oldest first: an earlier compaction, then the parts in export order
+        keys.sort(key=lambda key: (not key.rsplit("/", 1)[1].startswith("compact-"), key))
+        bodies = [body for body in [await storage.get_object(key) for key in keys] if body]
+        if not bodies:
+            continue
+        merged = await asyncio.to_thread(_compact, bodies, columns, change_markers(table))
+        await storage.put_object(
+            f"{partition}/compact-{datetime.utcnow():%Y%m%dT%H%M%S}.parquet", merged, "application/vnd.apache.parquet"
+        )
+        for key in keys:
+            await storage.delete_file(key)
+        removed += len(keys)
+    if removed:
+        # Cached listings would still name the deleted files and miss the new one
+        from app.services.analytics_warehouse import analytics_warehouse
+        analytics_warehouse.invalidate_listing(table)
+    return removed
+
+
+async def analytics_export_job():
+    global _export_running
+    if not ARROW_AVAILABLE:
+        logger.warning("⚠️ Analytics export skipped: pyarrow is not installed")
+        return
+    if _export_running:
+        logger.info("⏭️ Analytics export still running, skipping this run")
+        return
+    _export_running = True
+
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            manifest = await load_manifest()
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.ANALYTICS_EXPORT_LAG_SECONDS)
+            for table, model, columns in EXPORTED_TABLES:
+                for marker in change_markers(table):
+                    exported = await export_table(db, manifest, table, model, columns, cutoff, marker)
+                    # Plain reads only; end the snapshot so the next pass sees fresh data
+                    await db.rollback()
+                    if exported:
+                        logger.info(f"📦 Exported {exported} {table} rows changed by {marker} to {table_prefix(table)}")
+                removed = await compact_partitions(table, columns)
+                if removed:
+                    logger.info(f"🗜️ Compacted {removed} {table} Parquet files")
+        except Exception as e:
+            logger.error(f"Error in analytics export job: {e}", exc_info=True)
+        finally:
+            _export_running = False
+            await local_engine.dispose()
@@ -0,0 +1,255 @@
+"""
+Embedded analytics over the Parquet export (``app.services.analytics_export``).
+
+Heavy reports (multi-month trends) run on DuckDB over a workspace's exported
+files instead of the live MySQL tables. Each query opens an in-memory DuckDB
+connection on a worker thread and defines ``tickets``, ``comments`` and
+``activities`` views over that workspace's partition only, keeping the newest
+version of every row. With S3 storage, partition files (immutable once
+written) are first copied to ``ANALYTICS_CACHE_DIR``, and copies of files a
+compaction has removed are evicted when the partition is listed again; with
+local storage they are read in place.
+
+Only the predefined reports in ``REPORTS`` can run: the SQL is fixed and
+every value is bound as a parameter. Needs ``duckdb``.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from cachetools import TTLCache
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    duckdb = None
+    DUCKDB_AVAILABLE = False
+
+from app.core.config import settings
+from app.services.analytics_export import (
+    ARROW_AVAILABLE, EXPORTED_TABLES, change_markers, load_manifest, table_prefix,
+)
+from app.services.storage import LocalStorageBackend, get_storage
+from app.utils.logger import logger
+
+MAX_PARTITION_FILES = 100000
+_DUCKDB_TYPES = {"int": "BIGINT", "str": "VARCHAR", "bool": "BOOLEAN", "ts": "TIMESTAMP"}
+
+_MONTH = "strftime(date_trunc('month', {column}), '%Y-%m')"
+_TICKET_RANGE = "t.created_at >= $start AND t.created_at < $end AND NOT coalesce(t.is_deleted, false)"
+# Same attribution as the live reports: the team's tickets plus team-less ones from its mailboxes
+_TEAM_FILTER = " AND (t.team_id = $team_id OR (t.team_id IS NULL AND list_contains($mailbox_ids, t.mailbox_connection_id)))"
+
+REPORTS: Dict[str, str] = {
+    # Tickets created per month and current status
+    "ticket_volume": (
+        f"SELECT {_MONTH.format(column='t.created_at')} AS month, t.status, count(*) AS tickets "
+        f"FROM tickets t WHERE {_TICKET_RANGE}{{team}} GROUP BY 1, 2 ORDER BY 1, 2"
+    ),
+    # Average first-response and resolution times (hours) of the tickets created each month
+    "response_times": (
+        f"SELECT {_MONTH.format(column='t.created_at')} AS month, count(*) AS tickets, "
+        "round(avg(date_diff('second', t.created_at, t.first_response_at)) / 3600, 2) AS avg_first_response_hours, "
+        "round(avg(CASE WHEN t.status = 'Closed' THEN date_diff('second', t.created_at, t.resolved_at) END) / 3600, 2) "
+        "AS avg_resolution_hours "
+        f"FROM tickets t WHERE {_TICKET_RANGE}{{team}} GROUP BY 1 ORDER BY 1"
+    ),
+    # Tickets created per month and team (NULL = no team)
+    "team_volume": (
+        f"SELECT {_MONTH.format(column='t.created_at')} AS month, t.team_id, count(*) AS tickets "
+        f"FROM tickets t WHERE {_TICKET_RANGE}{{team}} GROUP BY 1, 2 ORDER BY 1, 2"
+    ),
+    # Public agent replies per month and agent, on tickets in range
+    "agent_replies": (
+        f"SELECT {_MONTH.format(column='c.created_at')} AS month, c.agent_id, count(*) AS replies, "
+        "count(DISTINCT c.ticket_id) AS tickets "
+        "FROM comments c JOIN tickets t ON t.id = c.ticket_id "
+        "WHERE c.agent_id IS NOT NULL AND NOT coalesce(c.is_private, false) "
+        f"AND c.created_at >= $start AND c.created_at < $end AND NOT coalesce(t.is_deleted, false){{team}} "
+        "GROUP BY 1, 2 ORDER BY 1, 2"
+    ),
+}
+
+
+def _sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _define_view(con, table: str, columns: Sequence[Tuple[str, str]], paths: List[str]) -> None:
+    typed = ", ".join(f"NULL::{_DUCKDB_TYPES[kind]} AS {name}" for name, kind in columns)
+    if not paths:
+        con.execute(f"CREATE VIEW {table} AS SELECT {typed} WHERE false")
+        return
+    # Rows changed after export appear in several files; the latest copy wins.
+    # Files written before a column was added read it as NULL.
+    file_list = "[" + ", ".join(_sql_string(path) for path in paths) + "]"
+    markers = change_markers(table)
+    version = markers[0]
+    if len(markers) > 1:
+        version = f"greatest({', '.join([version] + [f'coalesce({m}, {version})' for m in markers[1:]])})"
+    con.execute(
+        f"CREATE VIEW {table} AS SELECT * FROM ("
+        f"SELECT {typed} WHERE false "
+        f"UNION ALL BY NAME SELECT * FROM read_parquet({file_list}, union_by_name = true)) "
+        f"QUALIFY row_number() OVER (PARTITION BY id ORDER BY {version} DESC) = 1"
+    )
+
+
+class AnalyticsWarehouse:
+    def __init__(self, cache_dir: str, max_concurrency: int, duckdb_threads: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.duckdb_threads = duckdb_threads
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # (table, workspace) -> object keys; new files show up within the TTL
+        self._listings: TTLCache = TTLCache(maxsize=1000, ttl=60)
+        # Cached files read by running queries, which eviction leaves alone
+        self._in_use: Counter = Counter()
+        self.queries = 0
+        self.files_downloaded = 0
+        self.files_evicted = 0
+
+    @property
+    def available(self) -> bool:
+        return DUCKDB_AVAILABLE and ARROW_AVAILABLE and settings.ENABLE_ANALYTICS_EXPORT
+
+    async def _partition_keys(self, table: str, workspace_id: int, refresh: bool = False) -> List[str]:
+        cache_key = (table, workspace_id)
+        keys = None if refresh else self._listings.get(cache_key)
+        if keys is None:
+            storage = get_storage()
+            objects = await storage.list_files(f"{table_prefix(table, workspace_id)}/", MAX_PARTITION_FILES)
+            keys = self._listings[cache_key] = [obj["key"] for obj in objects if obj["key"].endswith(".parquet")]
+            if not isinstance(storage.backend, LocalStorageBackend):
+                await asyncio.to_thread(self._evict, table, workspace_id, keys)
+        return keys
+
+    def invalidate_listing(self, table: str, workspace_id: Optional[int] = None) -> None:
+        """Forget the cached listings of ``table`` (one workspace's or all), e.g. after a compaction."""
+        for cache_key in [key for key in list(self._listings) if key[0] == table and workspace_id in (None, key[1])]:
+            self._listings.pop(cache_key, None)
+
+    def _evict(self, table: str, workspace_id: int, keys: List[str]) -> None:
+        """Blocking: delete cached copies of partition files that are no longer listed."""
+        directory = os.path.join(self.cache_dir, table_prefix(table, workspace_id))
+        listed = {os.path.join(self.cache_dir, key) for key in keys}
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(directory, name)
+            # .tmp files are downloads in progress
+            if not name.endswith(".parquet") or path in listed or self._in_use[path] > 0:
+                continue
+            try:
+                os.remove(path)
+                self.files_evicted += 1
+            except OSError as e:
+                logger.warning(f"⚠️ Could not evict cached analytics file {path}: {e}")
+
+    def _store_local(self, path: str, body: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    async def _local_paths(self, table: str, workspace_id: int) -> List[str]:
+        """
+        Paths DuckDB can read for one partition, downloading files not cached
+        yet. A cached listing naming a file that is gone (compacted by another
+        process) is refreshed once.
+        """
+        storage = get_storage()
+        for attempt in range(2):
+            keys = await self._partition_keys(table, workspace_id, refresh=attempt > 0)
+            if isinstance(storage.backend, LocalStorageBackend):
+                paths = [os.path.join(storage.backend.root, key) for key in keys]
+                if all(os.path.exists(path) for path in paths):
+                    return paths
+                continue
+
+            paths, missing = [], False
+            for key in keys:
+                path = os.path.join(self.cache_dir, key)
+                if not os.path.exists(path):
+                    body = await storage.get_object(key)
+                    if body is None:
+                        missing = True
+                        continue
+                    await asyncio.to_thread(self._store_local, path, body)
+                    self.files_downloaded += 1
+                paths.append(path)
+            if not missing:
+                return paths
+        # Still changing under us: read what exists
+        return [path for path in paths if os.path.exists(path)]
+
+    def _execute(self, sql: str, params: Dict[str, Any], views: Dict[str, List[str]]) -> Tuple[List[str], List[tuple]]:
+        """Blocking: runs on a worker thread."""
+        con = duckdb.connect(database=":memory:")
+        try:
+            con.execute(f"SET threads TO {int(self.duckdb_threads)}")
+            for table, _, columns in EXPORTED_TABLES:
+                _define_view(con, table, columns, views.get(table, []))
+            result = con.execute(sql, params)
+            return [column[0] for column in result.description], result.fetchall()
+        finally:
+            con.close()
+
+    async def run_report(
+        self,
+        report: str,
+        workspace_id: int,
+        start: datetime,
+        end: datetime,
+        team_id: Optional[int] = None,
+        mailbox_ids: Sequence[int] = (),
+    ) -> Dict[str, Any]:
+        """Run one of ``REPORTS`` over the workspace's exported data."""
+        sql = REPORTS[report]
+        params: Dict[str, Any] = {"start": start, "end": end}
+        if team_id is not None:
+            sql = sql.replace("{team}", _TEAM_FILTER)
+            # DuckDB cannot type an empty list parameter; 0 is never a mailbox id
+            params.update(team_id=team_id, mailbox_ids=list(mailbox_ids) or [0])
+        else:
+            sql = sql.replace("{team}", "")
+
+        views: Dict[str, List[str]] = {}
+        try:
+            for table, _, _ in EXPORTED_TABLES:
+                views[table] = await self._local_paths(table, workspace_id)
+                self._in_use.update(views[table])
+            async with self._semaphore:
+                columns, rows = await asyncio.to_thread(self._execute, sql, params, views)
+        finally:
+            for paths in views.values():
+                self._in_use.subtract(paths)
+            self._in_use = +self._in_use
+        self.queries += 1
+
+        manifest = await load_manifest()
+        data_as_of = manifest.get("tables", {}).get("tickets", {}).get("updated_at")
+        logger.info(f"📈 Advanced report {report} for workspace {workspace_id}: {len(rows)} rows")
+        return {"report": report, "columns": columns, "rows": [list(row) for row in rows], "data_as_of": data_as_of}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "queries": self.queries,
+            "files_downloaded": self.files_downloaded,
+            "files_evicted": self.files_evicted,
+        }
+
+
+analytics_warehouse = AnalyticsWarehouse(
+    cache_dir=settings.ANALYTICS_CACHE_DIR,
+    max_concurrency=settings.ANALYTICS_QUERY_CONCURRENCY,
+    duckdb_threads=settings.ANALYTICS_DUCKDB_THREADS,
+)
@@ -6,7 +6,7 @@ from app.schemas.automation import AutomationCreate, AutomationUpdate
 from app.models.task import Task
 from app.models.agent import Agent
 from app.models.team import Team
-from app.models.category import Category
+from app.services.workspace_config import workspace_config
 from app.utils.logger import logger
 import re
 
@@ -402,13 +402,8 @@ async def _execute_single_action(db: AsyncSession, action: AutomationAction, tic
             return f"Set status from '{old_status}' to '{action.action_value}'"
             
         elif action.action_type == ActionType.SET_CATEGORY:
-            result = await db.execute(
-                select(Category).filter(
-                    Category.name == action.action_value,
-                    Category.workspace_id == ticket.workspace_id
-                )
-            )
-            category = result.scalars().first()
+            config = await workspace_config.get(db, ticket.workspace_id)
+            category = config.category_by_name(action.action_value)
             
             if category:
                 old_category = ticket.category.name if ticket.category else "Unassigned"
@@ -0,0 +1,119 @@
+"""
+Background maintenance for the content-addressed blob store:
+
+- moves attachments still kept in ``ticket_attachments.content_bytes`` out of
+  MySQL and into deduplicated blobs, a small batch per run;
+- deletes blobs nobody references any more, after a grace period.
+"""
+
+from typing import Tuple
+
+from sqlalchemy import delete, func, literal_column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.database.session import get_async_driver
+from app.models.stored_blob import StoredBlob
+from app.models.ticket_attachment import TicketAttachment
+from app.services.blob_store import blob_store
+from app.services.storage import get_storage
+from app.utils.logger import logger
+
+# Set once a run finds nothing left to migrate, so later runs skip the scan
+_legacy_migration_done = False
+
+
+async def migrate_legacy_attachments(db: AsyncSession, batch_size: int) -> Tuple[int, int]:
+    """
+    Move up to ``batch_size`` attachments from content_bytes to blobs.
+    Returns (rows found, rows migrated).
+    """
+    ids = (await db.execute(
+        select(TicketAttachment.id)
+        .where(TicketAttachment.content_bytes.isnot(None), TicketAttachment.blob_id.is_(None))
+        .limit(batch_size)
+    )).scalars().all()
+
+    migrated = 0
+    for attachment_id in ids:
+        # One row (and one blob in memory) per transaction
+        row = (await db.execute(
+            select(TicketAttachment.content_bytes, TicketAttachment.file_name, TicketAttachment.content_type)
+            .where(TicketAttachment.id == attachment_id)
+        )).first()
+        if not row or row.content_bytes is None:
+            continue
+        try:
+            blob = await blob_store.put(db, row.content_bytes, filename=row.file_name, content_type=row.content_type)
+            await db.execute(
+                update(TicketAttachment)
+                .where(TicketAttachment.id == attachment_id)
+                .values(blob_id=blob.id, s3_url=blob_store.url_for(blob), content_bytes=None)
+            )
+            await db.commit()
+            migrated += 1
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"❌ Error migrating attachment {attachment_id} to blob storage: {e}")
+    return len(ids), migrated
+
+
+async def collect_unreferenced_blobs(db: AsyncSession, grace_hours: int, limit: int = 100) -> int:
+    """Delete blobs whose reference count has been zero for ``grace_hours``. Returns how many."""
+    # DB time on both sides: released_at is set by the database, not this host
+    cutoff = func.date_sub(func.now(), literal_column(f"INTERVAL {int(grace_hours)} HOUR"))
+    candidates = (await db.execute(
+        select(StoredBlob.id, StoredBlob.storage_key)
+        .where(
+            StoredBlob.ref_count == 0,
+            # Rows released before released_at existed fall back to their last reference
+            func.coalesce(StoredBlob.released_at, StoredBlob.last_referenced_at) < cutoff,
+        )
+        .limit(limit)
+    )).all()
+
+    storage = get_storage()
+    removed = 0
+    for blob_id, storage_key in candidates:
+        # Re-check the count in the DELETE itself: a concurrent upload may have revived it
+        result = await db.execute(
+            delete(StoredBlob).where(StoredBlob.id == blob_id, StoredBlob.ref_count == 0)
+        )
+        if not result.rowcount:
+            await db.rollback()
+            continue
+        # The object goes while the deleted row is still locked: an upload of the
+        # same content waits on that lock, so it re-puts the object after this
+        # commit instead of having it deleted from under its new row
+        if not await storage.delete_file(storage_key):
+            await db.rollback()
+            logger.warning(f"⚠️ Could not delete blob object {storage_key}, keeping its row for the next run")
+            continue
+        await db.commit()
+        removed += 1
+    return removed
+
+
+async def blob_maintenance_job():
+    global _legacy_migration_done
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            if not _legacy_migration_done:
+                found, migrated = await migrate_legacy_attachments(db, settings.BLOB_MIGRATION_BATCH_SIZE)
+                if migrated:
+                    logger.info(f"📦 Moved {migrated}/{found} legacy attachments out of the database into blob storage")
+                if not found:
+                    _legacy_migration_done = True
+                    logger.info("✅ No legacy attachments left in the database")
+
+            removed = await collect_unreferenced_blobs(db, settings.BLOB_GC_GRACE_HOURS)
+            if removed:
+                logger.info(f"🗑️ Removed {removed} unreferenced blobs")
+        except Exception as e:
+            logger.error(f"Error in blob maintenance job: {e}", exc_info=True)
+        finally:
+            await local_engine.dispose()
@@ -0,0 +1,236 @@
+"""
+Content-addressed, deduplicating blob layer on top of the object storage.
+
+Objects are keyed by the SHA-256 of their bytes (``blobs/ab/abcd…``), so the
+same logo, signature image or PDF re-attached across an email thread is
+stored once. ``StoredBlob.ref_count`` counts the attachments and comments
+pointing at each object: ``put`` short-circuits to the existing object and
+takes a reference, ``TicketAttachment`` deletions give it back (see
+``app.models.ticket_attachment``), and unreferenced blobs are removed by
+``app.services.blob_maintenance``.
+
+New content is registered unreferenced in its own committed transaction
+*before* it is uploaded, and only then referenced in the caller's
+transaction. If the caller rolls back, the row is left at zero references
+and the maintenance job removes the object after the grace period.
+"""
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.stored_blob import StoredBlob, release_assignments
+from app.services.storage import get_storage, get_storage_backend
+from app.utils.logger import logger
+
+BLOB_PREFIX = "blobs"
+# Hashing is CPU-bound; only bother with a thread for payloads above this
+INLINE_HASH_MAX_BYTES = 1024 * 1024
+
+
+def blob_key(digest: str, filename: Optional[str] = None) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest}{extension}"
+
+
+def _first_items(
+    digests: List[str], items: Sequence[Tuple[bytes, Optional[str], Optional[str]]]
+) -> Dict[str, Tuple[bytes, Optional[str], Optional[str]]]:
+    first_item: Dict[str, Tuple[bytes, Optional[str], Optional[str]]] = {}
+    for digest, item in zip(digests, items):
+        first_item.setdefault(digest, item)
+    return first_item
+
+
+def _claim_row(digest: str, data: bytes, filename: Optional[str], content_type: Optional[str]) -> StoredBlob:
+    if not content_type:
+        content_type = mimetypes.guess_type(filename or "")[0] or "application/octet-stream"
+    return StoredBlob(
+        sha256=digest, size=len(data), content_type=content_type,
+        storage_key=blob_key(digest, filename), ref_count=0, released_at=func.now()
+    )
+
+
+def _touch_claim(digest: str):
+    # An existing unreferenced row is being uploaded again: restart its grace period
+    return (
+        update(StoredBlob)
+        .where(StoredBlob.sha256 == digest, StoredBlob.ref_count == 0)
+        .values(released_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+class BlobStore:
+    async def _digest(self, data: bytes) -> str:
+        if len(data) <= INLINE_HASH_MAX_BYTES:
+            return hashlib.sha256(data).hexdigest()
+        return await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+
+    async def _acquire(self, db: AsyncSession, digest: str) -> Optional[StoredBlob]:
+        """Take a reference on an existing blob; None if there is none."""
+        result = await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == digest)
+            .values(ref_count=StoredBlob.ref_count + 1, last_referenced_at=func.now(), released_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            return None
+        return (await db.execute(select(StoredBlob).where(StoredBlob.sha256 == digest))).scalar_one()
+
+    async def _claim(self, db: AsyncSession, rows: List[StoredBlob]) -> Dict[str, str]:
+        """
+        Register content about to be uploaded, unreferenced, in a transaction
+        of its own that commits before the upload starts. Returns the storage
+        key of each digest (an existing row may use another extension).
+        """
+        async with AsyncSession(bind=db.bind, expire_on_commit=False) as claim_db:
+            for row in rows:
+                try:
+                    async with claim_db.begin_nested():
+                        claim_db.add(row)
+                except IntegrityError:
+                    await claim_db.execute(_touch_claim(row.sha256))
+            await claim_db.commit()
+            return dict((await claim_db.execute(
+                select(StoredBlob.sha256, StoredBlob.storage_key)
+                .where(StoredBlob.sha256.in_([row.sha256 for row in rows]))
+            )).all())
+
+    async def put(
+        self,
+        db: AsyncSession,
+        data: bytes,
+        *,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> StoredBlob:
+        """
+        Store ``data`` (once) and return its blob with one more reference.
+        The caller's transaction owns the reference: commit it together with
+        the row that points at the blob.
+        """
+        return (await self.put_many(db, [(data, filename, content_type)]))[0]
+
+    async def put_many(
+        self,
+        db: AsyncSession,
+        items: Sequence[Tuple[bytes, Optional[str], Optional[str]]],
+    ) -> List[StoredBlob]:
+        """
+        ``put`` for several ``(data, filename, content_type)`` items: new
+        content is uploaded concurrently, while the session is only used
+        sequentially. Returns one blob per item, in order.
+        """
+        digests = [await self._digest(data) for data, _, _ in items]
+        first_item = _first_items(digests, items)
+
+        # A plain read, so the caller's transaction holds no lock on rows the
+        # claim below may have to wait for
+        ref_counts = dict((await db.execute(
+            select(StoredBlob.sha256, StoredBlob.ref_count).where(StoredBlob.sha256.in_(list(first_item)))
+        )).all())
+
+        blobs: Dict[str, StoredBlob] = {}
+        for digest in first_item:
+            # Unreferenced rows may be claims whose upload never finished, so
+            # only a referenced blob is known to have its object
+            if ref_counts.get(digest, 0) > 0:
+                blob = await self._acquire(db, digest)
+                if blob is not None:
+                    logger.info(f"♻️ Blob dedup hit {digest[:12]} (refs={blob.ref_count})")
+                    blobs[digest] = blob
+
+        missing = [digest for digest in first_item if digest not in blobs]
+        if missing:
+            storage = get_storage()
+            rows = [_claim_row(digest, *first_item[digest]) for digest in missing]
+            keys = await self._claim(db, rows)
+            # Same bytes always land on the same key, so a concurrent upload is harmless
+            await asyncio.gather(*(
+                storage.put_object(keys[row.sha256], first_item[row.sha256][0], row.content_type)
+                for row in rows
+            ))
+            for digest in missing:
+                blob = await self._acquire(db, digest)
+                if blob is None:
+                    raise RuntimeError(f"Blob {digest[:12]} was collected while it was being stored")
+                blobs[digest] = blob
+
+        # Every further occurrence in the batch is one more reference
+        for digest, count in Counter(digests).items():
+            if count > 1:
+                await self.add_reference(db, blobs[digest].id, count - 1)
+
+        return [blobs[digest] for digest in digests]
+
+    def store_unreferenced_sync(
+        self,
+        db: Session,
+        items: Sequence[Tuple[bytes, Optional[str], Optional[str]]],
+    ) -> List[str]:
+        """
+        Store ``(data, filename, content_type)`` items without taking a
+        reference, for content rendered on read that no row points at. Known
+        content is reused; otherwise it stays unreferenced and is collected
+        ``BLOB_GC_GRACE_HOURS`` after it was last stored. Returns the URL of
+        each item, in order. Blocking: for sync endpoints and worker threads.
+        """
+        digests = [hashlib.sha256(data).hexdigest() for data, _, _ in items]
+        first_item = _first_items(digests, items)
+
+        keys = dict(db.execute(
+            select(StoredBlob.sha256, StoredBlob.storage_key)
+            .where(StoredBlob.sha256.in_(list(first_item)), StoredBlob.ref_count > 0)
+        ).all())
+
+        missing = [digest for digest in first_item if digest not in keys]
+        storage = get_storage_backend()
+        if missing:
+            rows = [_claim_row(digest, *first_item[digest]) for digest in missing]
+            with Session(bind=db.get_bind(), expire_on_commit=False) as claim_db:
+                for row in rows:
+                    try:
+                        with claim_db.begin_nested():
+                            claim_db.add(row)
+                    except IntegrityError:
+                        claim_db.execute(_touch_claim(row.sha256))
+                claim_db.commit()
+                keys.update(claim_db.execute(
+                    select(StoredBlob.sha256, StoredBlob.storage_key).where(StoredBlob.sha256.in_(missing))
+                ).all())
+            for row in rows:
+                storage.put_object(keys[row.sha256], first_item[row.sha256][0], row.content_type)
+
+        return [storage.get_file_url(keys[digest]) for digest in digests]
+
+    async def add_reference(self, db: AsyncSession, blob_id: int, count: int = 1) -> None:
+        await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.id == blob_id)
+            .values(ref_count=StoredBlob.ref_count + count, last_referenced_at=func.now(), released_at=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def release(self, db: AsyncSession, blob_id: int) -> None:
+        await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.id == blob_id, StoredBlob.ref_count > 0)
+            .ordered_values(*release_assignments())
+            .execution_options(synchronize_session=False)
+        )
+
+    def url_for(self, blob: StoredBlob) -> str:
+        return get_storage().get_file_url(blob.storage_key)
+
+
+blob_store = BlobStore()
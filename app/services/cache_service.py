@@ -81,10 +81,14 @@ class CacheService:
         # Fallback to memory cache
         return self.memory_cache.get(key)
     
-    async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
-        """Set value in cache (both Redis and memory)"""
-        # Always set in memory cache as backup
-        self.memory_cache[key] = value
+    async def set(self, key: str, value: Any, ttl: int = 300, memory: bool = True) -> bool:
+        """
+        Set value in cache (both Redis and memory). ``memory=False`` keeps the
+        value out of the 5 min fallback cache, for values that must not
+        outlive their own ``ttl`` or be read back once Redis is lost.
+        """
+        if memory:
+            self.memory_cache[key] = value
         
         if self.is_redis_connected and self.redis_client:
             try:
@@ -110,6 +114,22 @@ class CacheService:
             logger.warning(f"Cache delete error for key {key}: {e}")
             return False
     
+    async def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        """Atomically increment an integer counter (Redis first, then memory)"""
+        if self.is_redis_connected and self.redis_client:
+            try:
+                value = await self.redis_client.incr(key)
+                if ttl:
+                    await self.redis_client.expire(key, ttl)
+                return int(value)
+            except Exception as e:
+                logger.warning(f"Redis INCR error for key {key}: {e}. Falling back to memory cache.")
+                self.is_redis_connected = False # Assume connection is lost
+
+        value = int(self.memory_cache.get(key) or 0) + 1
+        self.memory_cache[key] = value
+        return value
+
     async def delete_pattern(self, pattern: str) -> int:
         """Delete keys matching pattern"""
         deleted_count = 0
@@ -0,0 +1,119 @@
+"""
+Hydration of comment bodies stored in S3.
+
+Comments migrated to S3 keep only a pointer in ``content``
+("[MIGRATED_TO_S3] Content moved to S3: <url>"). Every object is written once
+under a fresh key and never modified, so the fetched HTML is kept in a
+process-local LRU keyed by URL that never needs invalidating.
+"""
+
+import asyncio
+from functools import partial
+from typing import Dict, Iterable, Optional
+
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.services.storage import get_storage
+from app.utils.logger import logger
+
+S3_POINTER_PREFIX = "[MIGRATED_TO_S3]"
+S3_POINTER_MARKER = "Content moved to S3: "
+
+
+def is_s3_pointer(content: Optional[str]) -> bool:
+    return bool(content) and content.startswith(S3_POINTER_PREFIX)
+
+
+def extract_s3_url(content: Optional[str]) -> Optional[str]:
+    """Return the S3 URL of a migrated comment, or None if it is not a valid pointer."""
+    if not is_s3_pointer(content):
+        return None
+    _, marker, url = content.partition(S3_POINTER_MARKER)
+    url = url.strip()
+    return url if marker and url else None
+
+
+class CommentHtmlHydrator:
+    """
+    Fetches comment HTML from S3 for a whole page at once.
+
+    Cache hits are answered from memory; misses are fetched concurrently
+    through the async storage, whose thread pool bounds the number of GETs in
+    flight for the whole process. Concurrent requests for the same URL share
+    a single download. Must be used from the API event loop.
+    """
+
+    def __init__(self, max_cache_bytes: int):
+        self._cache: LRUCache = LRUCache(maxsize=max_cache_bytes, getsizeof=len)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _on_done(self, url: str, future: asyncio.Future) -> None:
+        self._inflight.pop(url, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        html = future.result()
+        if html is None:
+            return
+        try:
+            self._cache[url] = html
+        except ValueError:
+            # Larger than the whole cache: serve it but don't keep it
+            pass
+
+    async def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Return ``{url: html}`` for every URL; None where S3 had nothing or failed."""
+        results: Dict[str, Optional[str]] = {}
+        pending: Dict[str, asyncio.Future] = {}
+        storage = get_storage()
+
+        for url in dict.fromkeys(urls):
+            cached = self._cache.get(url)
+            if cached is not None:
+                self.hits += 1
+                results[url] = cached
+                continue
+            self.misses += 1
+            future = self._inflight.get(url)
+            if future is None:
+                future = asyncio.ensure_future(storage.get_comment_html(url))
+                future.add_done_callback(partial(self._on_done, url))
+                self._inflight[url] = future
+            pending[url] = future
+
+        if pending:
+            # shield: a cancelled request must not cancel downloads others share
+            values = await asyncio.gather(
+                *(asyncio.shield(future) for future in pending.values()),
+                return_exceptions=True,
+            )
+            for url, value in zip(pending, values):
+                if isinstance(value, BaseException):
+                    logger.error(f"❌ Error fetching comment HTML from S3 {url}: {value}")
+                    value = None
+                results[url] = value
+
+        return results
+
+    async def resolve(self, content: Optional[str]) -> Optional[str]:
+        """The HTML behind ``content`` if it is an S3 pointer, otherwise ``content`` itself."""
+        url = extract_s3_url(content)
+        if url is None:
+            return content
+        return (await self.fetch_many([url])).get(url)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._cache),
+            "cached_bytes": int(self._cache.currsize),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+comment_html_hydrator = CommentHtmlHydrator(
+    max_cache_bytes=settings.COMMENT_HTML_CACHE_MAX_BYTES,
+)
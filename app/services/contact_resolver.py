@@ -0,0 +1,216 @@
+"""
+Contact resolution for inbound email.
+
+Every synced message resolves its sender (and, for forwards and replies,
+other addresses) to a ``User``, and new users to the company owning their
+email domain. This component keeps per-worker TTL caches of
+``(workspace, email) -> user_id`` and ``(workspace, domain) -> company_id``,
+looks domains up through the indexed ``companies.email_domain_normalized``
+column, and can resolve every sender of a sync batch with one SELECT and one
+multi-row upsert.
+
+Cached ids are only hints: the ``User`` is always loaded through the session,
+and an id whose row is gone is dropped and resolved again.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from cachetools import TTLCache
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.company import Company, normalize_email_domain
+from app.models.user import UnassignedUser, User
+from app.utils.logger import logger
+
+_MISSING = object()
+
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+def email_domain(email: str) -> Optional[str]:
+    return normalize_email_domain(email.split("@")[-1]) if "@" in email else None
+
+
+class ContactResolver:
+    def __init__(self, maxsize: int, ttl: int):
+        self._users: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # None is cached too: most sender domains belong to no company
+        self._domains: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    # --- caches ---------------------------------------------------------------
+
+    def cached_user_id(self, workspace_id: int, email: str) -> Optional[int]:
+        user_id = self._users.get((workspace_id, normalize_email(email)))
+        if user_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user_id
+
+    def remember_user(self, user: User) -> None:
+        if user.id and user.email and user.workspace_id:
+            self._users[(user.workspace_id, normalize_email(user.email))] = user.id
+
+    def forget_user(self, workspace_id: int, email: str) -> None:
+        self._users.pop((workspace_id, normalize_email(email)), None)
+
+    def forget_domain(self, workspace_id: int, domain: Optional[str]) -> None:
+        self._domains.pop((workspace_id, normalize_email_domain(domain)), None)
+
+    # --- lookups --------------------------------------------------------------
+
+    async def companies_for_domains(
+        self, db: AsyncSession, workspace_id: int, domains: Iterable[str]
+    ) -> Dict[str, Optional[int]]:
+        """``{domain: company_id or None}``; uncached domains are read in one query."""
+        result: Dict[str, Optional[int]] = {}
+        missing = []
+        for domain in dict.fromkeys(d for d in domains if d):
+            company_id = self._domains.get((workspace_id, domain), _MISSING)
+            if company_id is _MISSING:
+                missing.append(domain)
+            else:
+                result[domain] = company_id
+
+        if missing:
+            rows = (await db.execute(
+                select(Company.email_domain_normalized, Company.id)
+                .where(Company.workspace_id == workspace_id, Company.email_domain_normalized.in_(missing))
+                .order_by(Company.id)
+            )).all()
+            found: Dict[str, int] = {}
+            for domain, company_id in rows:
+                found.setdefault(domain, company_id)  # Oldest company wins when a domain is shared
+            for domain in missing:
+                result[domain] = self._domains[(workspace_id, domain)] = found.get(domain)
+        return result
+
+    async def company_for_email(self, db: AsyncSession, workspace_id: int, email: str) -> Optional[int]:
+        domain = email_domain(normalize_email(email))
+        if not domain:
+            return None
+        return (await self.companies_for_domains(db, workspace_id, [domain]))[domain]
+
+    async def prefetch(self, db: AsyncSession, workspace_id: int, emails: Iterable[str]) -> Dict[str, int]:
+        """Look up existing users for many addresses in one query. Returns ``{email: user_id}``."""
+        result: Dict[str, int] = {}
+        missing = []
+        for email in dict.fromkeys(normalize_email(e) for e in emails if e):
+            user_id = self._users.get((workspace_id, email))
+            if user_id is None:
+                missing.append(email)
+            else:
+                result[email] = user_id
+
+        if missing:
+            rows = (await db.execute(
+                select(User.id, User.email).where(User.workspace_id == workspace_id, User.email.in_(missing))
+            )).all()
+            for user_id, email in rows:
+                email = normalize_email(email)
+                result[email] = self._users[(workspace_id, email)] = user_id
+        return result
+
+    # --- creation -------------------------------------------------------------
+
+    async def resolve_many(
+        self, db: AsyncSession, workspace_id: int, contacts: Iterable[Tuple[str, Optional[str]]]
+    ) -> Dict[str, int]:
+        """
+        Make sure a user exists for every ``(email, name)`` and return
+        ``{email: user_id}``. Missing users are inserted with a single multi-row
+        upsert (assigned to their domain's company, or listed as unassigned)
+        and committed. Addresses owned by another workspace are left out, as
+        ``get_or_create_user`` does.
+        """
+        # Normalised address -> (address as received, name)
+        names: Dict[str, Tuple[str, Optional[str]]] = {}
+        for email, name in contacts:
+            key = normalize_email(email)
+            if key and "@" in key:
+                names.setdefault(key, (email.strip(), name))
+        if not names:
+            return {}
+
+        result = await self.prefetch(db, workspace_id, names)
+        missing = [email for email in names if email not in result]
+        if not missing:
+            return result
+
+        companies = await self.companies_for_domains(db, workspace_id, (email_domain(email) for email in missing))
+        user_rows = []
+        unassigned_rows = []
+        for key in missing:
+            email, name = names[key]
+            name = name or email.split("@")[0]
+            company_id = companies.get(email_domain(key))
+            user_rows.append({"name": name, "email": email, "workspace_id": workspace_id, "company_id": company_id})
+            if company_id is None:
+                unassigned_rows.append({"name": name, "email": email, "workspace_id": workspace_id})
+
+        # Existing rows (a concurrent sync, or another workspace) are left untouched:
+        # the no-op assignment keeps their stored email casing
+        stmt = mysql_insert(User).values(user_rows)
+        await db.execute(stmt.on_duplicate_key_update(id=User.id))
+        if unassigned_rows:
+            stmt = mysql_insert(UnassignedUser).values(unassigned_rows)
+            await db.execute(stmt.on_duplicate_key_update(id=UnassignedUser.id))
+        await db.commit()
+
+        result.update(await self.prefetch(db, workspace_id, missing))
+        logger.info(f"👥 Resolved {len(names)} contacts for workspace {workspace_id} ({len(missing)} upserted)")
+        return result
+
+    async def load_user(self, db: AsyncSession, workspace_id: int, email: str) -> Optional[User]:
+        """The cached user for ``email``, or None if unknown or no longer there."""
+        user_id = self.cached_user_id(workspace_id, email)
+        if user_id is None:
+            return None
+        user = await db.get(User, user_id)
+        if user is None or user.workspace_id != workspace_id or normalize_email(user.email) != normalize_email(email):
+            self.forget_user(workspace_id, email)
+            return None
+        return user
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._users),
+            "domains": len(self._domains),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+async def backfill_company_domains(db: AsyncSession) -> int:
+    """Fill ``email_domain_normalized`` for companies written before the column existed."""
+    result = await db.execute(
+        update(Company)
+        .where(Company.email_domain.isnot(None), Company.email_domain_normalized.is_(None))
+        .values(email_domain_normalized=func.nullif(func.lower(func.trim(Company.email_domain)), ""))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount or 0
+
+
+contact_resolver = ContactResolver(
+    maxsize=settings.CONTACT_CACHE_SIZE,
+    ttl=settings.CONTACT_CACHE_TTL,
+)
+
+
+@event.listens_for(Company, "after_insert")
+@event.listens_for(Company, "after_update")
+@event.listens_for(Company, "after_delete")
+def _forget_company_domain(mapper, connection, target):
+    # Other workers pick the change up when their entry expires
+    contact_resolver.forget_domain(target.workspace_id, target.email_domain_normalized)
+    for domain in inspect(target).attrs.email_domain_normalized.history.deleted or ():
+        contact_resolver.forget_domain(target.workspace_id, domain)
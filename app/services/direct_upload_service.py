@@ -0,0 +1,166 @@
+"""
+Presigned direct-to-storage uploads.
+
+The API only signs requests: the browser sends the file bytes straight to S3
+(a form POST, or presigned part PUTs for large files) and then calls a
+completion endpoint. The upload token handed out with the presigned request
+is a short-lived JWT that binds the object key to the agent, workspace,
+purpose and declared file, so completion can only register objects this API
+issued.
+"""
+
+import math
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.models.agent import Agent
+from app.schemas.upload import DirectUploadRequest, DirectUploadResponse, UploadedPart
+from app.services.storage import AsyncStorage
+from app.utils.logger import logger
+
+UPLOAD_TOKEN_TYPE = "direct_upload"
+MAX_PARTS = 10000  # S3 limit per multipart upload
+# A multipart upload started just before its URLs expire can finish well after
+COMPLETION_GRACE_SECONDS = 3600
+
+
+def _encode_upload_token(claims: Dict[str, Any], expires_in: int) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(seconds=expires_in + COMPLETION_GRACE_SECONDS)
+    # No "sub": the token must never be accepted as an access token
+    return jwt.encode({**claims, "typ": UPLOAD_TOKEN_TYPE, "exp": expire}, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+
+def decode_upload_token(token: str, agent: Agent, purpose: Optional[str]) -> Dict[str, Any]:
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired upload token")
+
+    if (
+        claims.get("typ") != UPLOAD_TOKEN_TYPE
+        or claims.get("agent_id") != agent.id
+        or claims.get("workspace_id") != agent.workspace_id
+        or (purpose is not None and claims.get("purpose") != purpose)
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Upload token does not belong to this request")
+    return claims
+
+
+async def start_direct_upload(
+    storage: AsyncStorage,
+    upload_in: DirectUploadRequest,
+    agent: Agent,
+    *,
+    purpose: str,
+    folder: str,
+    max_size: int,
+) -> DirectUploadResponse:
+    """Reserve an object key and presign the upload for it."""
+    if not storage.supports_direct_upload:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Direct uploads are not supported by the configured storage backend"
+        )
+    if upload_in.file_size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum of {max_size / 1024 / 1024:.1f}MB"
+        )
+
+    key = f"{folder}/{uuid.uuid4()}{os.path.splitext(upload_in.file_name)[1]}"
+    expires_in = settings.DIRECT_UPLOAD_EXPIRE_SECONDS
+    claims = {
+        "purpose": purpose,
+        "key": key,
+        "agent_id": agent.id,
+        "workspace_id": agent.workspace_id,
+        "file_name": upload_in.file_name,
+        "content_type": upload_in.content_type,
+        "max_size": max_size,
+    }
+
+    if upload_in.file_size <= settings.MULTIPART_UPLOAD_THRESHOLD:
+        post = storage.generate_presigned_post(key, upload_in.content_type, max_size, expires_in)
+        return DirectUploadResponse(
+            method="POST",
+            key=key,
+            file_url=storage.get_file_url(key),
+            upload_token=_encode_upload_token(claims, expires_in),
+            expires_in=expires_in,
+            post_url=post["url"],
+            fields=post["fields"],
+        )
+
+    part_size = max(settings.MULTIPART_PART_SIZE, math.ceil(upload_in.file_size / MAX_PARTS))
+    part_count = math.ceil(upload_in.file_size / part_size)
+    upload_id = await storage.create_multipart_upload(key, upload_in.content_type)
+    claims["upload_id"] = upload_id
+    return DirectUploadResponse(
+        method="MULTIPART",
+        key=key,
+        file_url=storage.get_file_url(key),
+        upload_token=_encode_upload_token(claims, expires_in),
+        expires_in=expires_in,
+        part_size=part_size,
+        part_urls=storage.generate_presigned_part_urls(key, upload_id, part_count, expires_in),
+    )
+
+
+async def finish_direct_upload(
+    storage: AsyncStorage,
+    upload_token: str,
+    agent: Agent,
+    *,
+    purpose: str,
+    parts: Optional[List[UploadedPart]] = None,
+) -> Dict[str, Any]:
+    """
+    Complete the upload (assembling multipart uploads) and verify the object
+    landed in storage within the size limit. Returns the file's key, URL,
+    name, content type and actual size.
+    """
+    claims = decode_upload_token(upload_token, agent, purpose)
+    key = claims["key"]
+
+    if claims.get("upload_id"):
+        if not parts:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Multipart uploads require the list of uploaded parts")
+        try:
+            await storage.complete_multipart_upload(key, claims["upload_id"], [part.model_dump() for part in parts])
+        except Exception as e:
+            logger.error(f"❌ Error completing multipart upload {key}: {e}")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not complete multipart upload")
+
+    head = await storage.head_object(key)
+    if head is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File has not been uploaded to storage")
+    if head["size"] > claims["max_size"]:
+        await storage.delete_file(key)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Uploaded file exceeds the size limit")
+
+    logger.info(f"✅ Direct upload completed: {key} ({head['size']} bytes) by agent {agent.id}")
+    return {
+        "key": key,
+        "file_url": storage.get_file_url(key),
+        "file_name": claims["file_name"],
+        "content_type": claims["content_type"],
+        "file_size": head["size"],
+    }
+
+
+async def abort_direct_upload(storage: AsyncStorage, upload_token: str, agent: Agent, *, purpose: str) -> Dict[str, Any]:
+    """Discard an upload: abort pending multipart uploads, delete anything already stored."""
+    claims = decode_upload_token(upload_token, agent, purpose)
+    if claims.get("upload_id"):
+        try:
+            await storage.abort_multipart_upload(claims["key"], claims["upload_id"])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not abort multipart upload {claims['key']}: {e}")
+    await storage.delete_file(claims["key"])
+    return claims
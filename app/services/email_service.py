@@ -2,6 +2,7 @@ import re
 from app.core.config import settings
 from app.services.microsoft_service import MicrosoftGraphService # Assuming this service can send mail
 from app.utils.logger import logger
+from app.core.exceptions import MicrosoftAPIException
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -555,21 +556,15 @@ def create_team_ticket_notification_email_html(agent_name: str, team_name: str,
     return html_content
 
 
-async def send_team_ticket_notification_email(
-    db: AsyncSession,
-    to_email: str,
+def build_team_ticket_notification_email(
     agent_name: str,
     team_name: str,
     ticket_id: int,
     ticket_title: str,
-    sender_mailbox_email: str,
-    user_access_token: str,
     request_origin: Optional[str] = None,
     sender_mailbox_display_name: Optional[str] = None
-) -> bool:
-    """
-    Sends a notification email to a team member when a new ticket is assigned to their team.
-    """
+) -> Tuple[str, str]:
+    """(subject, html) of the email telling a team member about a new ticket for their team."""
     subject = f"[ID:{ticket_id}] New ticket for team {team_name}: {ticket_title}"
 
     # Use the origin URL if provided, otherwise fallback to settings.FRONTEND_URL
@@ -584,27 +579,183 @@ async def send_team_ticket_notification_email(
         ticket_link,
         sender_mailbox_display_name
     )
+    return subject, html_content
+
+
+async def send_team_ticket_notification_email(
+    db: AsyncSession,
+    to_email: str,
+    agent_name: str,
+    team_name: str,
+    ticket_id: int,
+    ticket_title: str,
+    sender_mailbox_email: str,
+    user_access_token: str,
+    request_origin: Optional[str] = None,
+    sender_mailbox_display_name: Optional[str] = None
+) -> bool:
+    """
+    Sends a notification email to a team member when a new ticket is assigned to their team.
+    """
+    results = await send_team_ticket_notification_emails(
+        db, [(to_email, agent_name)], team_name, ticket_id, ticket_title,
+        sender_mailbox_email, user_access_token, request_origin, sender_mailbox_display_name
+    )
+    return results[0]
+
+
+async def send_team_ticket_notification_emails(
+    db: AsyncSession,
+    members: List[Tuple[str, str]],
+    team_name: str,
+    ticket_id: int,
+    ticket_title: str,
+    sender_mailbox_email: str,
+    user_access_token: str,
+    request_origin: Optional[str] = None,
+    sender_mailbox_display_name: Optional[str] = None
+) -> List[bool]:
+    """
+    Sends the new-ticket email to every ``(email, name)`` team member in Graph
+    batches from one mailbox. Returns one flag per member.
+    """
+    messages = [
+        (to_email, *build_team_ticket_notification_email(
+            agent_name, team_name, ticket_id, ticket_title, request_origin, sender_mailbox_display_name
+        ))
+        for to_email, agent_name in members
+    ]
 
     try:
         graph_service = MicrosoftGraphService(db=db)
-
-        success = await graph_service.send_email_with_user_token(
+        results = await graph_service.send_emails_with_user_token(
             user_access_token=user_access_token,
             sender_mailbox_email=sender_mailbox_email,
-            recipient_email=to_email,
-            subject=subject,
-            html_body=html_content,
+            messages=messages,
             task_id=ticket_id
         )
-        if success:
-            logger.info(f"Team ticket notification email sent successfully to {to_email} from {sender_mailbox_email} ({sender_mailbox_display_name or 'No display name'})")
-            return True
-        else:
-            logger.error(f"Failed to send team ticket notification email to {to_email} using MicrosoftGraphService.send_email_with_user_token from {sender_mailbox_email}")
-            return False
+        logger.info(f"Team ticket notification emails sent to {sum(results)}/{len(messages)} members of '{team_name}' from {sender_mailbox_email} ({sender_mailbox_display_name or 'No display name'})")
+        return results
     except Exception as e:
-        logger.error(f"Exception in send_team_ticket_notification_email for {to_email}: {e}", exc_info=True)
-        return False
+        logger.error(f"Exception in send_team_ticket_notification_emails for ticket {ticket_id}: {e}", exc_info=True)
+        return [False] * len(messages)
+
+def create_ticket_digest_email_html(agent_name: str, intro: str, tickets: List[Tuple[int, str]], base_url: str, sender_name: Optional[str] = None) -> str:
+    """
+    Generates an HTML content listing several tickets, for notifications about a bulk change.
+    """
+    footer_sender = f"The {sender_name} Team" if sender_name else "The Enque Team"
+    rows = "".join(
+        f'<tr><td class="ticket-id">#{ticket_id}</td><td><a href="{base_url}/tickets/{ticket_id}">{ticket_title}</a></td></tr>'
+        for ticket_id, ticket_title in tickets
+    )
+
+    html_content = f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Tickets Updated</title>
+        <style>
+            body {{
+                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif, 'Apple Color Emoji', 'Segoe UI Emoji', 'Segoe UI Symbol';
+                margin: 0;
+                padding: 20px;
+                background-color: #f4f4f7;
+                color: #333;
+            }}
+            .container {{
+                background-color: #ffffff;
+                max-width: 600px;
+                margin: 20px auto;
+                padding: 30px;
+                border-radius: 8px;
+                box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+                text-align: left;
+            }}
+            p {{
+                font-size: 16px;
+                line-height: 1.6;
+                margin-bottom: 1em;
+            }}
+            table {{
+                width: 100%;
+                border-collapse: collapse;
+                border-left: 4px solid #007bff;
+                background-color: #f8f9fa;
+                margin: 15px 0;
+            }}
+            td {{
+                padding: 8px 12px;
+                font-size: 15px;
+                border-bottom: 1px solid #e9ecef;
+            }}
+            td.ticket-id {{
+                width: 80px;
+                color: #777;
+                white-space: nowrap;
+            }}
+            a {{
+                color: #007bff;
+                text-decoration: none;
+            }}
+            .footer {{
+                font-size: 14px;
+                color: #777;
+                margin-top: 25px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <p>Hello {agent_name},</p>
+            <p>{intro}</p>
+
+            <table>{rows}</table>
+
+            <p class="footer">
+                Best regards,<br>
+                {footer_sender}
+            </p>
+        </div>
+    </body>
+    </html>
+    """
+    return html_content
+
+
+async def send_ticket_digest_emails(
+    db: AsyncSession,
+    messages: List[Tuple[str, str, str, str, List[Tuple[int, str]]]],
+    sender_mailbox_email: str,
+    user_access_token: str,
+    request_origin: Optional[str] = None,
+    sender_mailbox_display_name: Optional[str] = None
+) -> List[bool]:
+    """
+    Sends one email per ``(to_email, agent_name, subject, intro, tickets)`` listing its
+    ``(ticket_id, ticket_title)`` tickets, in Graph batches from one mailbox.
+    Returns one flag per message.
+    """
+    base_url = request_origin if request_origin else settings.FRONTEND_URL
+    emails = [
+        (to_email, subject, create_ticket_digest_email_html(agent_name, intro, tickets, base_url, sender_mailbox_display_name))
+        for to_email, agent_name, subject, intro, tickets in messages
+    ]
+
+    try:
+        graph_service = MicrosoftGraphService(db=db)
+        results = await graph_service.send_emails_with_user_token(
+            user_access_token=user_access_token,
+            sender_mailbox_email=sender_mailbox_email,
+            messages=emails
+        )
+        logger.info(f"Ticket digest emails sent to {sum(results)}/{len(emails)} recipients from {sender_mailbox_email} ({sender_mailbox_display_name or 'No display name'})")
+        return results
+    except Exception as e:
+        logger.error(f"Exception in send_ticket_digest_emails: {e}", exc_info=True)
+        return [False] * len(emails)
 
 def clean_html_recipients(recipients_input: str) -> str:
     """
@@ -916,7 +1067,7 @@ async def send_mention_notification_email(
         return False
 
 
-async def process_mention_notifications(
+async def deliver_mention_notifications(
     db: AsyncSession,
     comment_content: str,
     workspace_id: int,
@@ -925,6 +1076,11 @@ async def process_mention_notifications(
     mentioning_agent_id: int,
     request_origin: Optional[str] = None
 ) -> List[str]:
+    """
+    Email the agents mentioned in a note. Raises when the sender token cannot
+    be refreshed or every email failed, so the outbox retries; a partial
+    failure is only logged, as a retry would email the others again.
+    """
     if not comment_content:
         return []
     
@@ -995,9 +1151,9 @@ async def process_mention_notifications(
             await ms_service.refresh_token_async(token)
             await db.refresh(token)
         except Exception as e:
-            logger.error(f"Error refreshing token for mention notifications: {str(e)}")
-            return []
+            raise MicrosoftAPIException(f"Error refreshing token for mention notifications: {str(e)}") from e
     
+    attempted = 0
     for mentioned_name in mentioned_names:
         try:
             result = await db.execute(
@@ -1025,6 +1181,7 @@ async def process_mention_notifications(
             mentioning_agent = result.scalars().first()
             mentioning_agent_name = mentioning_agent.name if mentioning_agent else "Unknown Agent"
             
+            attempted += 1
             success = await send_mention_notification_email(
                 db=db,
                 mentioned_agent_email=mentioned_agent.email,
@@ -1049,9 +1206,29 @@ async def process_mention_notifications(
             logger.error(f"Error processing mention for '{mentioned_name}': {str(e)}")
             continue
     
+    if attempted and not notified_agents:
+        raise MicrosoftAPIException(f"All {attempted} mention notifications failed for ticket {ticket_id}")
     return notified_agents
 
 
+async def process_mention_notifications(
+    db: AsyncSession,
+    comment_content: str,
+    workspace_id: int,
+    ticket_id: int,
+    ticket_title: str,
+    mentioning_agent_id: int,
+    request_origin: Optional[str] = None
+) -> List[str]:
+    try:
+        return await deliver_mention_notifications(
+            db, comment_content, workspace_id, ticket_id, ticket_title, mentioning_agent_id, request_origin
+        )
+    except Exception as e:
+        logger.error(f"Error processing mention notifications for ticket {ticket_id}: {str(e)}", exc_info=True)
+        return []
+
+
 def get_agent_closed_tickets_last_week(db: Session, agent_id: int) -> List[Dict[str, Any]]:
 
     from datetime import datetime, timedelta
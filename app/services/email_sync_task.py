@@ -16,6 +16,7 @@ from sqlalchemy import text
 from app.database.session import get_async_driver
 from app.models.microsoft import EmailSyncConfig, MicrosoftIntegration, MicrosoftToken
 from app.services.cache_service import cache_service
+from app.services.contact_resolver import backfill_company_domains
 from app.services.microsoft_service import MicrosoftGraphService
 from app.utils.logger import logger
 from app.core.config import settings
@@ -50,6 +51,8 @@ class EmailSyncCircuitBreaker:
             logger.warning(f"🚨 Email sync circuit breaker: OPENED after {self.failure_count} failures. Will retry in {self.recovery_timeout} seconds")
 
 email_sync_circuit_breaker = EmailSyncCircuitBreaker()
+# Companies created before email_domain_normalized existed are filled in once per process
+_company_domains_backfilled = False
 
 def reset_email_sync_circuit_breaker():
     global email_sync_circuit_breaker
@@ -82,6 +85,17 @@ async def sync_emails_job():
                 email_sync_circuit_breaker.record_success()
                 return
 
+            global _company_domains_backfilled
+            if not _company_domains_backfilled:
+                try:
+                    backfilled = await backfill_company_domains(db)
+                    if backfilled:
+                        logger.info(f"🏢 Normalized email domain of {backfilled} companies")
+                    _company_domains_backfilled = True
+                except Exception as e:
+                    await db.rollback()
+                    logger.warning(f"⚠️ Could not backfill normalized company domains: {e}")
+
             successful_syncs, failed_syncs, total_tickets = 0, 0, 0
             logger.info(f"📧 Starting email sync for {len(configs)} configs")
 
@@ -193,6 +207,22 @@ def start_scheduler(loop: asyncio.AbstractEventLoop):
     # Schedule jobs to run in the provided event loop
     schedule.every(sync_frequency).seconds.do(run_scheduler_job, loop, sync_emails_job)
     schedule.every(3).hours.do(run_scheduler_job, loop, refresh_tokens_job)
+    if settings.ENABLE_BLOB_MAINTENANCE:
+        from app.services.blob_maintenance import blob_maintenance_job
+        schedule.every(settings.BLOB_MAINTENANCE_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, blob_maintenance_job)
+    if settings.ENABLE_REPORT_ROLLUP_JOB:
+        from app.services.report_rollups import report_rollup_job
+        schedule.every(settings.REPORT_ROLLUP_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, report_rollup_job)
+    from app.services.notification_feed import notification_retention_job
+    schedule.every(settings.NOTIFICATION_RETENTION_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, notification_retention_job)
+    from app.services.outbox import outbox_retention_job
+    schedule.every(settings.OUTBOX_RETENTION_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, outbox_retention_job)
+    if settings.ENABLE_TICKET_ARCHIVE:
+        from app.services.ticket_archive import ticket_archive_job
+        schedule.every(settings.TICKET_ARCHIVE_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, ticket_archive_job)
+    if settings.ENABLE_ANALYTICS_EXPORT:
+        from app.services.analytics_export import analytics_export_job
+        schedule.every(settings.ANALYTICS_EXPORT_INTERVAL_MINUTES).minutes.do(run_scheduler_job, loop, analytics_export_job)
     
     def run_scheduler_pending():
         while True:
@@ -210,3 +240,13 @@ def start_scheduler(loop: asyncio.AbstractEventLoop):
     logger.info("📅 Scheduler started with jobs:")
     logger.info(f"  - Email sync: every {sync_frequency} seconds")
     logger.info("  - Token refresh: every 3 hours")
+    if settings.ENABLE_BLOB_MAINTENANCE:
+        logger.info(f"  - Blob maintenance: every {settings.BLOB_MAINTENANCE_INTERVAL_MINUTES} minutes")
+    if settings.ENABLE_REPORT_ROLLUP_JOB:
+        logger.info(f"  - Report rollups: every {settings.REPORT_ROLLUP_INTERVAL_MINUTES} minutes")
+    logger.info(f"  - Notification retention: every {settings.NOTIFICATION_RETENTION_INTERVAL_MINUTES} minutes")
+    logger.info(f"  - Outbox retention: every {settings.OUTBOX_RETENTION_INTERVAL_MINUTES} minutes")
+    if settings.ENABLE_TICKET_ARCHIVE:
+        logger.info(f"  - Ticket archive: every {settings.TICKET_ARCHIVE_INTERVAL_MINUTES} minutes")
+    if settings.ENABLE_ANALYTICS_EXPORT:
+        logger.info(f"  - Analytics export: every {settings.ANALYTICS_EXPORT_INTERVAL_MINUTES} minutes")
@@ -2,7 +2,6 @@ import re
 import logging
 from typing import List, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from app.schemas.workflow import MessageAnalysisResult, MessageAnalysisRule
 
 logger = logging.getLogger(__name__)
@@ -101,12 +100,9 @@ class MessageAnalysisService:
         
         if db and workspace_id:
             try:
-                from app.models.category import Category
-                
-                result = await db.execute(
-                    select(Category).filter(Category.workspace_id == workspace_id)
-                )
-                workspace_categories = result.scalars().all()
+                from app.services.workspace_config import workspace_config
+
+                workspace_categories = (await workspace_config.get(db, workspace_id)).categories
                 
                 for category in workspace_categories:
                     category_name = category.name.lower()
@@ -228,11 +224,8 @@ class MessageAnalysisService:
                     
                     if db and workspace_id:
                         try:
-                            from app.models.category import Category
-                            result = await db.execute(
-                                select(Category).filter(Category.workspace_id == workspace_id)
-                            )
-                            workspace_categories = result.scalars().all()
+                            from app.services.workspace_config import workspace_config
+                            workspace_categories = (await workspace_config.get(db, workspace_id)).categories
                             
                             for category in workspace_categories:
                                 category_safe_name = category.name.lower().replace(' ', '_').replace('-', '_')
@@ -1,9 +1,10 @@
+import asyncio
 import base64
 import re
 import httpx
 import requests
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from bs4 import BeautifulSoup
 from sqlalchemy.orm import Session, joinedload
@@ -11,6 +12,7 @@ from sqlalchemy import select
 from app.models.activity import Activity
 from app.models.agent import Agent
 from app.models.comment import Comment
+from app.services.outbox import enqueue
 from app.models.microsoft import (EmailSyncConfig, EmailTicketMapping,
                                   MailboxConnection, MicrosoftToken,
                                   mailbox_team_assignments)
@@ -22,18 +24,21 @@ from app.schemas.task import TaskStatus
 from app.models.workspace import Workspace
 from app.schemas.microsoft import EmailAddress, EmailAttachment, EmailData
 from app.services.microsoft_graph_client import MicrosoftGraphClient
+from app.services.contact_resolver import contact_resolver
 from app.services.utils import get_or_create_user
-from app.utils.image_processor import extract_base64_images
+from app.services.workspace_config import workspace_config
+from app.utils.image_processor import extract_base64_images_async
 from app.utils.logger import logger
 from app.core.exceptions import DatabaseException, MicrosoftAPIException
 
+GRAPH_BATCH_MAX_REQUESTS = 20  # Graph's limit of requests per JSON $batch call
 
 class MicrosoftEmailService:
     def __init__(self, db: Session, graph_client: MicrosoftGraphClient):
         self.db = db
         self.graph_client = graph_client
 
-    def _process_html_body(self, html_content: str, attachments: List[EmailAttachment], context: str = "email") -> str:
+    async def _process_html_body(self, html_content: str, attachments: List[EmailAttachment], context: str = "email") -> str:
         """Process HTML content to handle things like CID-referenced images."""
         if not html_content:
             return html_content
@@ -67,7 +72,7 @@ class MicrosoftEmailService:
                 if match:
                     ticket_id = int(match.group(1))
             if ticket_id:
-                processed_html, extracted_images = extract_base64_images(processed_html, ticket_id)
+                processed_html, extracted_images = await extract_base64_images_async(processed_html, ticket_id, db=self.db)
                 if extracted_images:
                     logger.info(f"Extracted {len(extracted_images)} base64 images from {context} for ticket {ticket_id}")
             
@@ -249,14 +254,7 @@ class MicrosoftEmailService:
         # 3. Obtener mailboxes activos del workspace para identificarlos
         mailbox_emails = set()
         try:
-            from app.models.microsoft import MailboxConnection
-            mailboxes_stmt = select(MailboxConnection).filter(
-                MailboxConnection.workspace_id == workspace_id,
-                MailboxConnection.is_active == True
-            )
-            mailboxes_result = await self.db.execute(mailboxes_stmt)
-            mailboxes = mailboxes_result.scalars().all()
-            mailbox_emails = {mb.email.lower() for mb in mailboxes if mb.email}
+            mailbox_emails = set((await workspace_config.get(self.db, workspace_id)).mailbox_emails)
             logger.info(f"[REPLY CONTACT] Known mailboxes: {mailbox_emails}")
         except Exception as e:
             logger.warning(f"[REPLY CONTACT] Could not get mailbox emails: {e}")
@@ -309,6 +307,22 @@ class MicrosoftEmailService:
                 logger.error(f"[MAIL SYNC] Could not get or create 'Enque Processed' folder for {user_email}. Emails will not be moved.")
             else:
                 pass  
+            # Resolver de una vez todos los remitentes externos del lote (un SELECT + un upsert)
+            try:
+                ws_config = await workspace_config.get(self.db, sync_config.workspace_id)
+                batch_senders = []
+                for email_data in emails:
+                    sender = email_data.get("from", {}).get("emailAddress", {})
+                    address = (sender.get("address") or "").lower()
+                    if address and address != user_email.lower() and address not in ws_config.mailbox_emails \
+                            and not any(domain in address for domain in ws_config.system_domains):
+                        batch_senders.append((sender.get("address"), sender.get("name")))
+                if batch_senders:
+                    await contact_resolver.resolve_many(self.db, sync_config.workspace_id, batch_senders)
+            except Exception as e:
+                await self.db.rollback()
+                logger.warning(f"[MAIL SYNC] Could not pre-resolve senders for {user_email}: {e}")
+
             system_agent_result = await self.db.execute(
                 select(Agent).filter(Agent.email == "system@enque.cc")
             )
@@ -332,7 +346,7 @@ class MicrosoftEmailService:
 
 
             system_domains = await self._get_system_domains_for_workspace(sync_config.workspace_id)
-            
+
             for email_data in emails:
                 email_id = email_data.get("id")
                 email_subject = email_data.get("subject", "")
@@ -418,7 +432,7 @@ class MicrosoftEmailService:
                         )
                         workspace = workspace_result.scalar_one_or_none()
                         if not workspace: logger.error(f"Workspace ID {sync_config.workspace_id} not found for reply. Skipping comment creation."); continue
-                        processed_reply_html = self._process_html_body(email.body_content, email.attachments, f"reply email {email.id}")
+                        processed_reply_html = await self._process_html_body(email.body_content, email.attachments, f"reply email {email.id}")
                         
                         processed_reply_html = re.sub(r'^<p><strong>From:</strong>.*?</p>', '', processed_reply_html, flags=re.DOTALL | re.IGNORECASE)
                         
@@ -429,20 +443,20 @@ class MicrosoftEmailService:
                         
                         try:
                             if content_to_store and content_to_store.strip():
-                                from app.services.s3_service import get_s3_service
-                                s3_service = get_s3_service()
+                                from app.services.storage import get_storage
+                                storage = get_storage()
                                 
                                 content_length = len(content_to_store)
                                 should_migrate_to_s3 = (
                                     content_length > 65000 or 
-                                    s3_service.should_store_html_in_s3(content_to_store)
+                                    storage.should_store_html_in_s3(content_to_store)
                                 )
                                 
                                 if should_migrate_to_s3:
                                     import uuid
                                     temp_id = str(uuid.uuid4())
                                     
-                                    s3_url = s3_service.upload_html_content(
+                                    s3_url = await storage.upload_html_content(
                                         html_content=content_to_store,
                                         filename=f"temp-comment-{temp_id}.html",
                                         folder="comments"
@@ -472,18 +486,18 @@ class MicrosoftEmailService:
                                         decoded_bytes = base64.b64decode(att.contentBytes)
                                         
                                         s3_url = None
+                                        blob_id = None
                                         try:
-                                            from app.services.s3_service import get_s3_service
-                                            s3_service = get_s3_service()
+                                            from app.services.blob_store import blob_store
                                             
-                                            folder = "images" if att.content_type.startswith("image/") else "documents"
-                                            
-                                            s3_url = s3_service.upload_file(
-                                                file_content=decoded_bytes,
+                                            # Content-addressed: repeated logos/signatures reuse the stored object
+                                            blob = await blob_store.put(
+                                                self.db, decoded_bytes,
                                                 filename=att.name,
-                                                content_type=att.content_type,
-                                                folder=folder
+                                                content_type=att.content_type
                                             )
+                                            s3_url = blob_store.url_for(blob)
+                                            blob_id = blob.id
                                             
                                             logger.info(f"📎 Adjunto '{att.name}' subido a S3: {s3_url}")
                                             
@@ -496,6 +510,7 @@ class MicrosoftEmailService:
                                             content_type=att.content_type,
                                             file_size=att.size,
                                             s3_url=s3_url,  
+                                            blob_id=blob_id,
                                             content_bytes=decoded_bytes if not s3_url else None  # Solo bytes si S3 falló
                                         )
                                         new_comment.attachments.append(db_attachment) # SQLAlchemy manejará el comment_id
@@ -509,12 +524,12 @@ class MicrosoftEmailService:
                             try:
                                 await self.db.flush()
                                 
-                                from app.services.s3_service import get_s3_service
-                                s3_service = get_s3_service()
+                                from app.services.storage import get_storage
+                                storage = get_storage()
                                 
                                 original_content = special_metadata + processed_reply_html
                                 
-                                final_s3_url = s3_service.store_comment_html(new_comment.id, original_content)
+                                final_s3_url = await storage.store_comment_html(new_comment.id, original_content)
                                 
                                 new_comment.s3_html_url = final_s3_url
                                 new_comment.content = f"[MIGRATED_TO_S3] Content moved to S3: {final_s3_url}"
@@ -587,58 +602,11 @@ class MicrosoftEmailService:
                             self.db.add(ticket_to_update)
                             logger.info(f"[MAIL SYNC] Updated last_update for ticket {existing_mapping_by_conv.ticket_id} after user reply")
                         
+                        await self.db.flush()
+                        enqueue(self.db, "socketio.comment_updated", {"comment_id": new_comment.id}, workspace_id=workspace.id)
                         await self.db.commit()
                         added_comments_count += 1
 
-                        comment_with_attachments = None
-                        try:
-                            # Refresh comment with attachments loaded to avoid lazy loading issues
-                            comment_with_attachments_result = await self.db.execute(
-                                select(Comment).options(joinedload(Comment.attachments))
-                                .filter(Comment.id == new_comment.id)
-                            )
-                            comment_with_attachments = comment_with_attachments_result.unique().scalar_one_or_none()
-
-                            if not comment_with_attachments:
-                                logger.warning(f"[MAIL SYNC] Could not reload comment {new_comment.id} for Socket.IO event")
-                                comment_with_attachments = new_comment
-
-                            full_content = ""
-                            if comment_with_attachments.s3_html_url:
-                                full_content = special_metadata + processed_reply_html
-                            else:
-                                full_content = comment_with_attachments.content or ""
-                            attachments_data = []
-                            for attachment in (comment_with_attachments.attachments if hasattr(comment_with_attachments, 'attachments') else []):
-                                attachments_data.append({
-                                    'id': attachment.id,
-                                    'file_name': attachment.file_name,
-                                    'content_type': attachment.content_type,
-                                    'file_size': attachment.file_size,
-                                    'download_url': attachment.s3_url  
-                                })
-                            
-                            comment_data = {
-                                'id': comment_with_attachments.id,
-                                'ticket_id': existing_mapping_by_conv.ticket_id,
-                                'agent_id': None,
-                                'user_id': reply_user.id,
-                                'user_name': reply_user.name,
-                                'content': full_content,
-                                'is_private': False,
-                                'created_at': comment_with_attachments.created_at.isoformat() if comment_with_attachments.created_at else None,
-                                'attachments': attachments_data
-                            }
-                            from app.core.socketio import emit_comment_update_sync
-                            emit_comment_update_sync(
-                                workspace_id=workspace.id,
-                                comment_data=comment_data
-                            )
-                            
-                            logger.info(f"📤 [MAIL SYNC] Socket.IO comment_updated event queued for workspace {workspace.id}")
-                        except Exception as e:
-                            logger.error(f"❌ [MAIL SYNC] Error emitting Socket.IO event for comment {comment_with_attachments.id if comment_with_attachments else new_comment.id}: {str(e)}")
-                        
                         if processed_folder_id: 
                             new_reply_id = self.graph_client.move_email_to_folder(user_access_token, user_email, email_id, processed_folder_id)
                             if new_reply_id and new_reply_id != email_id:
@@ -1135,14 +1103,7 @@ class MicrosoftEmailService:
                 # 🔒 FIX: Get workspace mailboxes to filter them from recipients
                 mailbox_emails = set()
                 try:
-                    from app.models.microsoft import MailboxConnection
-                    mailboxes_stmt = select(MailboxConnection).filter(
-                        MailboxConnection.workspace_id == workspace_id,
-                        MailboxConnection.is_active == True
-                    )
-                    mailboxes_result = await self.db.execute(mailboxes_stmt)
-                    mailboxes = mailboxes_result.scalars().all()
-                    mailbox_emails = {mb.email.lower() for mb in mailboxes if mb.email}
+                    mailbox_emails = set((await workspace_config.get(self.db, workspace_id)).mailbox_emails)
                     logger.info(f"[CREATE TICKET] Known mailboxes to filter: {mailbox_emails}")
                 except Exception as e:
                     logger.warning(f"[CREATE TICKET] Could not get mailbox emails for filtering: {e}")
@@ -1168,8 +1129,6 @@ class MicrosoftEmailService:
             
             if not user: logger.error(f"Could not get or create user for email: {email.sender.address} in workspace {workspace_id}"); return None
             # Cache user properties to avoid lazy loading issues later
-            user_name = user.name if user else 'Unknown'
-            user_email = user.email if user else ''
             company_id = user.company_id; assigned_agent = None
             if config.auto_assign and config.default_assignee_id:
                 agent_stmt = select(Agent).filter(Agent.id == config.default_assignee_id)
@@ -1236,16 +1195,16 @@ class MicrosoftEmailService:
                     try:
                         decoded_bytes = base64.b64decode(att.contentBytes)
                         s3_url = None
+                        blob_id = None
                         try:
-                            from app.services.s3_service import get_s3_service
-                            s3_service = get_s3_service()
-                            folder = "images" if att.content_type.startswith("image/") else "documents"
-                            s3_url = s3_service.upload_file(
-                                file_content=decoded_bytes,
+                            from app.services.blob_store import blob_store
+                            blob = await blob_store.put(
+                                self.db, decoded_bytes,
                                 filename=att.name,
-                                content_type=att.content_type,
-                                folder=folder
+                                content_type=att.content_type
                             )
+                            s3_url = blob_store.url_for(blob)
+                            blob_id = blob.id
                             
                             logger.info(f"📎 Adjunto inicial '{att.name}' subido a S3: {s3_url}")
                             
@@ -1257,12 +1216,13 @@ class MicrosoftEmailService:
                             content_type=att.content_type,
                             file_size=att.size,
                             s3_url=s3_url, 
+                            blob_id=blob_id,
                             content_bytes=decoded_bytes if not s3_url else None 
                         )
                         attachments_for_comment.append(db_attachment)
                     except Exception as e:
                         logger.error(f"Error al procesar adjunto '{att.name}' para ticket {task.id}: {e}", exc_info=True)
-            processed_html = self._process_html_body(email.body_content, email.attachments, f"new ticket {task.id}")
+            processed_html = await self._process_html_body(email.body_content, email.attachments, f"new ticket {task.id}")
             processed_html = re.sub(r'^<p><strong>From:</strong>.*?</p>', '', processed_html, flags=re.DOTALL | re.IGNORECASE)
             if original_email and original_name:
                 forward_sender_name = email.sender.name or "Unknown Forwarder"
@@ -1275,17 +1235,17 @@ class MicrosoftEmailService:
             s3_html_url = None    
             try:
                 if content_to_store and content_to_store.strip():
-                    from app.services.s3_service import get_s3_service
-                    s3_service = get_s3_service()
+                    from app.services.storage import get_storage
+                    storage = get_storage()
                     content_length = len(content_to_store)
                     should_migrate_to_s3 = (
                         content_length > 65000 or  
-                        s3_service.should_store_html_in_s3(content_to_store)
+                        storage.should_store_html_in_s3(content_to_store)
                                         )              
                     if should_migrate_to_s3:
                         import uuid
                         temp_id = str(uuid.uuid4())
-                        s3_url = s3_service.upload_html_content(
+                        s3_url = await storage.upload_html_content(
                             html_content=content_to_store,
                             filename=f"temp-initial-comment-{temp_id}.html",
                             folder="comments"
@@ -1311,13 +1271,13 @@ class MicrosoftEmailService:
             if s3_html_url and not s3_html_url.endswith(f"comment-{initial_comment.id}.html"):
                 try:
                     await self.db.flush()
-                    from app.services.s3_service import get_s3_service
-                    s3_service = get_s3_service()
+                    from app.services.storage import get_storage
+                    storage = get_storage()
                     if '[MIGRATED_TO_S3] Content moved to S3: ' in content_to_store:
                         original_content = special_metadata + processed_html
                     else:
                         original_content = content_to_store
-                    final_s3_url = s3_service.store_comment_html(initial_comment.id, original_content)
+                    final_s3_url = await storage.store_comment_html(initial_comment.id, original_content)
                     
                     # Actualizar la URL en el comentario
                     initial_comment.s3_html_url = final_s3_url
@@ -1326,47 +1286,8 @@ class MicrosoftEmailService:
                     logger.warning(f"⚠️ [MAIL SYNC] Could not rename S3 file for initial comment {initial_comment.id}: {str(e)}")
             ticket_body = TicketBody(ticket_id=task.id, email_body="")
             self.db.add(ticket_body)
+            enqueue(self.db, "socketio.new_ticket", {"ticket_id": task.id}, workspace_id=task.workspace_id)
             await self.db.commit()
-            try:
-                # Refresh task to avoid lazy loading issues
-                task_refreshed_result = await self.db.execute(
-                    select(Task).filter(Task.id == task.id)
-                )
-                task_refreshed = task_refreshed_result.scalar_one_or_none()
-
-                if task_refreshed:
-                    task_data = {
-                        'id': task_refreshed.id,
-                        'title': task_refreshed.title,
-                        'status': task_refreshed.status,
-                        'priority': task_refreshed.priority,
-                        'workspace_id': task_refreshed.workspace_id,
-                        'assignee_id': task_refreshed.assignee_id,
-                        'team_id': task_refreshed.team_id,
-                        'user_id': task_refreshed.user_id,
-                        'created_at': task_refreshed.created_at.isoformat() if task_refreshed.created_at else None,
-                        'user_name': user_name,
-                        'user_email': user_email
-                    }
-                else:
-                    task_data = {
-                        'id': task.id,
-                        'title': task.title,
-                        'status': task.status,
-                        'priority': task.priority,
-                        'workspace_id': task.workspace_id,
-                        'assignee_id': task.assignee_id,
-                        'team_id': task.team_id,
-                        'user_id': task.user_id,
-                        'created_at': task.created_at.isoformat() if task.created_at else None,
-                        'user_name': user_name,
-                        'user_email': user_email
-                    }
-                # Use task_refreshed.workspace_id directly to avoid lazy loading issues with workspace object
-                from app.core.socketio import emit_new_ticket_sync
-                emit_new_ticket_sync(task_refreshed.workspace_id if task_refreshed else task.workspace_id, task_data)
-            except Exception as e:
-                logger.error(f"❌ [MAIL SYNC] Error emitting Socket.IO event for new ticket {task.id}: {str(e)}")
             try:
                 from app.services.automation_service import execute_automations_for_ticket
                 from sqlalchemy.orm import joinedload
@@ -1487,37 +1408,30 @@ class MicrosoftEmailService:
                         agents_result = await self.db.execute(agents_stmt)
                         active_agents = agents_result.scalars().all()
                     
-                        # Preparar variables de plantilla para notificaciones de agentes
-                        agent_template_vars = {
-                            "ticket_id": task.id,
-                            "ticket_title": task.title,
-                            "user_name": user.name if user else "Unknown User"
-                        }
-                        
-                        # Notificar a cada agente activo
-                        for agent in active_agents:
-                            # Si el agente es el asignado, añadir información adicional
-                            if assigned_agent and agent.id == assigned_agent.id:
-                                agent_template_vars["agent_name"] = agent.name
-                            else:
-                                agent_template_vars["agent_name"] = agent.name
-
-                            # Solo enviar si el agente no está en un dominio del sistema
-                            if not any(domain in agent.email.lower() for domain in system_domains):
-                                try:
-                                    await send_notification(
-                                        db=self.db,
-                                        workspace_id=workspace_id,
-                                        category="agents",
-                                        notification_type="new_ticket_created_agent",  # Corregir tipo para agentes
-                                        recipient_email=agent.email,
-                                        recipient_name=agent.name,
-                                        template_vars=agent_template_vars,
-                                        task_id=task.id
-                                    )
-                                    logger.info(f"Notification for new ticket {task.id} sent to agent {agent.name}")
-                                except Exception as agent_notify_err:
-                                    logger.warning(f"Failed to send notification to agent {agent.name}: {str(agent_notify_err)}")
+                        # Una sola notificación para todos los agentes activos (fuera de dominios del sistema)
+                        from app.services.notification_service import NotificationRecipient, send_notifications
+                        agent_recipients = [
+                            NotificationRecipient(agent.email, agent.name, {
+                                "ticket_id": task.id,
+                                "ticket_title": task.title,
+                                "user_name": user.name if user else "Unknown User",
+                                "agent_name": agent.name
+                            })
+                            for agent in active_agents
+                            if not any(domain in agent.email.lower() for domain in system_domains)
+                        ]
+                        try:
+                            results = await send_notifications(
+                                db=self.db,
+                                workspace_id=workspace_id,
+                                category="agents",
+                                notification_type="new_ticket_created_agent",  # Corregir tipo para agentes
+                                recipients=agent_recipients,
+                                task_id=task.id
+                            )
+                            logger.info(f"Notification for new ticket {task.id} sent to {sum(results.values())}/{len(agent_recipients)} agents")
+                        except Exception as agent_notify_err:
+                            logger.warning(f"Failed to send notifications to agents for ticket {task.id}: {str(agent_notify_err)}")
                     
                 except Exception as e:
                     logger.error(f"Error sending notifications for ticket {task.id} created from email: {str(e)}", exc_info=True)
@@ -2123,9 +2037,8 @@ class MicrosoftEmailService:
                         logger.info(f"Using content_bytes for attachment {attachment.file_name} (ID: {attachment_id}) in new email")
                     elif attachment.s3_url:
                         logger.info(f"Downloading attachment {attachment.file_name} from S3: {attachment.s3_url} for new email")
-                        from app.services.s3_service import get_s3_service
-                        s3_service = get_s3_service()
-                        file_content = s3_service._download_file_from_s3(attachment.s3_url)
+                        from app.services.storage import get_storage_backend
+                        file_content = get_storage_backend().download_file(attachment.s3_url)
                         if not file_content:
                             logger.error(f"Failed to download attachment {attachment.file_name} from S3 for new email")
                             continue
@@ -2310,9 +2223,8 @@ class MicrosoftEmailService:
                                 logger.info(f"Using content_bytes for attachment {attachment.file_name} (ID: {attachment_id}) in reply")
                             elif attachment.s3_url:
                                 logger.info(f"Downloading attachment {attachment.file_name} from S3: {attachment.s3_url} for reply")
-                                from app.services.s3_service import get_s3_service
-                                s3_service = get_s3_service()
-                                file_content = s3_service._download_file_from_s3(attachment.s3_url)
+                                from app.services.storage import get_storage_backend
+                                file_content = get_storage_backend().download_file(attachment.s3_url)
                                 if not file_content:
                                     logger.error(f"Failed to download attachment {attachment.file_name} from S3 for reply")
                                     continue
@@ -2410,13 +2322,9 @@ class MicrosoftEmailService:
             )
             return False
 
-    async def send_email_with_user_token(
-        self, user_access_token: str, sender_mailbox_email: str, recipient_email: str, 
-        subject: str, html_body: str, task_id: Optional[int] = None
-    ) -> bool:
-        if not user_access_token:
-            logger.error("Token is None or empty. Cannot send email.")
-            return False
+    def _build_send_mail_payload(
+        self, recipient_email: str, subject: str, html_body: str, task_id: Optional[int] = None
+    ) -> Dict:
         html_body = self._process_html_for_email(html_body)
         if not html_body.strip().lower().startswith('<html'):
             html_body = f"<html><head><style>body {{ font-family: sans-serif; font-size: 10pt; }} p {{ margin: 0 0 16px 0; padding: 4px 0; min-height: 16px; line-height: 1.5; }}</style></head><body>{html_body}</body></html>"
@@ -2429,11 +2337,20 @@ class MicrosoftEmailService:
                 subject = new_subject
             else:
                 logger.info(f"Subject already contains ticket ID tag: '{original_subject}'")
-        
-        email_payload = {
+
+        return {
             "message": {"subject": subject, "body": {"contentType": "HTML", "content": html_body},
                         "toRecipients": [{"emailAddress": {"address": recipient_email}}]},
             "saveToSentItems": "true"}
+
+    async def send_email_with_user_token(
+        self, user_access_token: str, sender_mailbox_email: str, recipient_email: str, 
+        subject: str, html_body: str, task_id: Optional[int] = None
+    ) -> bool:
+        if not user_access_token:
+            logger.error("Token is None or empty. Cannot send email.")
+            return False
+        email_payload = self._build_send_mail_payload(recipient_email, subject, html_body, task_id)
         try:
             send_mail_endpoint = f"{self.graph_client.graph_url}/users/{sender_mailbox_email}/sendMail"
             headers = {"Authorization": f"Bearer {user_access_token}", "Content-Type": "application/json"}
@@ -2482,32 +2399,98 @@ class MicrosoftEmailService:
             )
             return False
 
-    async def _get_system_domains_for_workspace(self, workspace_id: int) -> List[str]:
-
-        try:
-            core_system_domains = ["enque.cc", "microsoftexchange"]
-
-
-            mailbox_stmt = select(MailboxConnection).filter(
-                MailboxConnection.workspace_id == workspace_id,
-                MailboxConnection.is_active == True
-            )
-            mailbox_result = await self.db.execute(mailbox_stmt)
-            mailbox_connections = mailbox_result.scalars().all()
+    async def send_emails_with_user_token(
+        self, user_access_token: str, sender_mailbox_email: str,
+        messages: Sequence[Tuple[str, str, str]], task_id: Optional[int] = None
+    ) -> List[bool]:
+        """
+        Send several ``(recipient, subject, html_body)`` messages from one mailbox
+        through Graph JSON batching: up to GRAPH_BATCH_MAX_REQUESTS sendMail calls
+        per HTTP request instead of one request per recipient. Throttled items are
+        retried once after the advertised Retry-After. Returns one flag per message.
+        """
+        if not user_access_token:
+            logger.error("Token is None or empty. Cannot send email.")
+            return [False] * len(messages)
+        if len(messages) == 1:
+            recipient_email, subject, html_body = messages[0]
+            return [await self.send_email_with_user_token(user_access_token, sender_mailbox_email, recipient_email, subject, html_body, task_id)]
+
+        sent = [False] * len(messages)
+        pending = {
+            str(index): {
+                "id": str(index),
+                "method": "POST",
+                "url": f"/users/{sender_mailbox_email}/sendMail",
+                "headers": {"Content-Type": "application/json"},
+                "body": self._build_send_mail_payload(recipient_email, subject, html_body, task_id),
+            }
+            for index, (recipient_email, subject, html_body) in enumerate(messages)
+        }
+        headers = {"Authorization": f"Bearer {user_access_token}", "Content-Type": "application/json"}
+        batch_endpoint = f"{self.graph_client.graph_url}/$batch"
+
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            for attempt in range(2):
+                throttled: Dict[str, Dict] = {}
+                retry_after = 0
+                items = list(pending.values())
+                for start in range(0, len(items), GRAPH_BATCH_MAX_REQUESTS):
+                    chunk = items[start:start + GRAPH_BATCH_MAX_REQUESTS]
+                    # A failed chunk only fails its own messages; the next chunks still go out
+                    try:
+                        response = await client.post(batch_endpoint, headers=headers, json={"requests": chunk})
+                        response.raise_for_status()
+                        responses = response.json().get("responses", [])
+                    except httpx.HTTPStatusError as e:
+                        if e.response.status_code in (429, 503, 504) and attempt == 0:
+                            throttled.update((item["id"], item) for item in chunk)
+                            try:
+                                retry_after = max(retry_after, int(e.response.headers.get("Retry-After", 1)))
+                            except (TypeError, ValueError):
+                                retry_after = max(retry_after, 1)
+                            continue
+                        logger.error(f"HTTP error sending batched emails from {sender_mailbox_email}. Status: {e.response.status_code}. Details: {e.response.text}")
+                        continue
+                    except httpx.TimeoutException as e:
+                        logger.error(f"Timeout error sending batched emails from {sender_mailbox_email}: {str(e)}")
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error sending batched emails from {sender_mailbox_email}: {e}", exc_info=True)
+                        continue
+                    for item in responses:
+                        request_id = str(item.get("id"))
+                        status_code = item.get("status")
+                        if status_code in (200, 202):
+                            sent[int(request_id)] = True
+                        elif status_code in (429, 503, 504) and attempt == 0:
+                            throttled[request_id] = pending[request_id]
+                            item_headers = item.get("headers") or {}
+                            try:
+                                retry_after = max(retry_after, int(item_headers.get("Retry-After", 1)))
+                            except (TypeError, ValueError):
+                                retry_after = max(retry_after, 1)
+                        else:
+                            recipient_email = messages[int(request_id)][0]
+                            logger.error(f"Failed to send email from {sender_mailbox_email} to {recipient_email} in batch. Status: {status_code}. Details: {item.get('body')}")
+                if not throttled:
+                    break
+                logger.warning(f"Graph throttled {len(throttled)} batched emails from {sender_mailbox_email}; retrying in {retry_after}s")
+                await asyncio.sleep(min(retry_after, 10))
+                pending = throttled
 
-            workspace_domains = set()
-            for mailbox in mailbox_connections:
-                if mailbox.email and '@' in mailbox.email:
-                    domain = mailbox.email.split('@')[-1].lower()
-                    workspace_domains.add(domain)
+        failed = [messages[index][0] for index, ok in enumerate(sent) if not ok]
+        if failed:
+            logger.error(f"❌ Batched emails from {sender_mailbox_email} not sent to: {', '.join(failed)}")
+        logger.info(f"📧 Batched emails sent: {sum(sent)}/{len(messages)} from {sender_mailbox_email}")
+        return sent
 
+    async def _get_system_domains_for_workspace(self, workspace_id: int) -> List[str]:
 
-            all_system_domains = core_system_domains + list(workspace_domains)
-            
+        try:
+            # Core domains plus the domains of the workspace's active mailboxes
+            return list((await workspace_config.get(self.db, workspace_id)).system_domains)
 
-            
-            return all_system_domains
-            
         except Exception as e:
             logger.error(f"Error detecting system domains for workspace {workspace_id}: {str(e)}")
             return ["enque.cc", "microsoftexchange"]
@@ -77,6 +77,12 @@ class MicrosoftGraphService:
     ) -> bool:
         return await self.email_service.send_email_with_user_token(user_access_token, sender_mailbox_email, recipient_email, subject, html_body, task_id)
 
+    async def send_emails_with_user_token(
+        self, user_access_token: str, sender_mailbox_email: str,
+        messages: List[Tuple[str, str, str]], task_id: Optional[int] = None
+    ) -> List[bool]:
+        return await self.email_service.send_emails_with_user_token(user_access_token, sender_mailbox_email, messages, task_id)
+
     async def send_teams_activity_notification(self, agent_id: int, title: str, message: str, link_to_ticket: str, subdomain: str):
         result = await self.db.execute(select(Agent).filter(Agent.id == agent_id))
         agent = result.scalars().first()
@@ -110,20 +110,15 @@ class MicrosoftUserService:
         """
         Sube la foto de perfil a S3 y retorna la URL pública.
         """
-        def _sync_upload():
-            from app.services.s3_service import get_s3_service
-            s3_service = get_s3_service()
-            filename = f"agent_{agent_id}_avatar.jpg"
-            folder = "avatars"
-            return s3_service.upload_file(
+        from app.services.storage import get_storage
+
+        try:
+            avatar_url = await get_storage().upload_file(
                 file_content=photo_bytes,
-                filename=filename,
-                folder=folder,
+                filename=f"agent_{agent_id}_avatar.jpg",
+                folder="avatars",
                 content_type="image/jpeg"
             )
-
-        try:
-            avatar_url = await asyncio.to_thread(_sync_upload)
             logger.info(f"✅ Avatar uploaded to S3 for agent {agent_id}: {avatar_url}")
             return avatar_url
         except Exception as e:
@@ -0,0 +1,153 @@
+"""
+Notification feed over ``activities``.
+
+Whether an activity belongs in the feed, and who the external creator is,
+is decided once when the row is inserted (``before_insert`` below) and
+stored on the row:
+
+- a ``Ticket`` activity is a notification when the ticket came in by email;
+  the creator is the ticket's user;
+- a ``Comment`` activity is a notification when a user replied by email
+  (``"<name> replied via email"`` / ``"<name> commented on ticket"``).
+
+The feed is then a single range read on ``ix_activities_feed``
+``(workspace_id, is_notification, created_at)``. Ticket and comment
+activities older than ``NOTIFICATION_RETENTION_DAYS`` are purged by a
+scheduled job in small batches instead of one DELETE per feed read.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.database.session import get_async_driver
+from app.models.activity import Activity
+from app.models.task import Task
+from app.models.user import User
+from app.services.retention import delete_in_batches
+from app.utils.logger import logger
+
+FEED_SOURCE_TYPES = ("Ticket", "Comment")
+_USER_REPLY_SUFFIXES = (" replied via email", " commented on ticket")
+_NAME_MAX_LENGTH = 255
+
+
+def _reply_author(action: Optional[str]) -> Optional[str]:
+    """Name of the user in an email-reply comment action, None for any other action."""
+    if not action or not any(suffix in action for suffix in _USER_REPLY_SUFFIXES):
+        return None
+    name = action
+    for suffix in _USER_REPLY_SUFFIXES:
+        name = name.replace(suffix, "")
+    return name[:_NAME_MAX_LENGTH]
+
+
+def _ticket_creator_query(ticket_ids):
+    return (
+        select(Task.id, Task.email_sender, User.id.label("user_id"), User.name, User.email)
+        .join(User, User.id == Task.user_id)
+        .where(Task.id.in_(ticket_ids))
+    )
+
+
+def _feed_values(activity_source_type: str, action: Optional[str], ticket_row: Any) -> Dict[str, Any]:
+    if activity_source_type == "Ticket":
+        if ticket_row is not None and ticket_row.email_sender:
+            return {
+                "is_notification": True,
+                "creator_user_id": ticket_row.user_id,
+                "creator_user_name": ticket_row.name,
+                "creator_user_email": ticket_row.email,
+            }
+    elif activity_source_type == "Comment":
+        author = _reply_author(action)
+        if author is not None:
+            return {"is_notification": True, "creator_user_name": author}
+    return {"is_notification": False}
+
+
+@event.listens_for(Activity, "before_insert")
+def _denormalize_feed_fields(mapper, connection, target: Activity) -> None:
+    if target.is_notification is not None:
+        return
+    ticket_row = None
+    if target.source_type == "Ticket" and target.source_id:
+        # The ticket is already flushed: activities are logged after it has an id
+        ticket_row = connection.execute(_ticket_creator_query([target.source_id])).first()
+    for name, value in _feed_values(target.source_type, target.action, ticket_row).items():
+        setattr(target, name, value)
+
+
+class NotificationFeedMaintenance:
+    def __init__(self):
+        self.purged = 0
+        self.backfilled = 0
+        self.backfill_done = False
+
+    async def purge(self, db: AsyncSession, retention_days: int, batch_size: int, max_batches: int = 100) -> int:
+        """Delete ticket and comment activities older than the retention, ``batch_size`` rows per transaction."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = await delete_in_batches(
+            db, Activity,
+            Activity.source_type.in_(FEED_SOURCE_TYPES), Activity.created_at < cutoff,
+            order_by=Activity.created_at, batch_size=batch_size, max_batches=max_batches,
+        )
+        self.purged += deleted
+        return deleted
+
+    async def backfill(self, db: AsyncSession, batch_size: int) -> int:
+        """Classify up to ``batch_size`` feed activities written before the denormalised columns existed."""
+        rows = (await db.execute(
+            select(Activity.id, Activity.source_type, Activity.source_id, Activity.action)
+            .where(Activity.source_type.in_(FEED_SOURCE_TYPES), Activity.is_notification.is_(None))
+            .limit(batch_size)
+        )).all()
+        if not rows:
+            self.backfill_done = True
+            return 0
+
+        ticket_ids = {row.source_id for row in rows if row.source_type == "Ticket"}
+        tickets = {}
+        if ticket_ids:
+            tickets = {row.id: row for row in (await db.execute(_ticket_creator_query(ticket_ids))).all()}
+        for row in rows:
+            values = _feed_values(row.source_type, row.action, tickets.get(row.source_id))
+            await db.execute(
+                update(Activity).where(Activity.id == row.id).values(**values, updated_at=Activity.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        self.backfilled += len(rows)
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"purged": self.purged, "backfilled": self.backfilled, "backfill_done": self.backfill_done}
+
+
+notification_feed = NotificationFeedMaintenance()
+
+
+async def notification_retention_job():
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            deleted = await notification_feed.purge(
+                db, settings.NOTIFICATION_RETENTION_DAYS, settings.NOTIFICATION_RETENTION_BATCH_SIZE
+            )
+            if deleted:
+                logger.info(f"🧹 Purged {deleted} notifications older than {settings.NOTIFICATION_RETENTION_DAYS} days")
+            if not notification_feed.backfill_done:
+                backfilled = await notification_feed.backfill(db, settings.NOTIFICATION_RETENTION_BATCH_SIZE)
+                if backfilled:
+                    logger.info(f"🔔 Classified {backfilled} existing activities for the notification feed")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error in notification retention job: {e}", exc_info=True)
+        finally:
+            await local_engine.dispose()
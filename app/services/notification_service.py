@@ -1,11 +1,12 @@
+import asyncio
 import json
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_, or_, func, select
 from app.models.notification import NotificationTemplate, NotificationSetting
-from app.models.workspace import Workspace
 from app.models.microsoft import MailboxConnection, MicrosoftToken
 from app.models.agent import Agent
 from app.schemas.notification import (
@@ -19,11 +20,20 @@ from app.schemas.notification import (
     UserEmailNotificationsConfig,
 )
 from app.services.microsoft_service import MicrosoftGraphService
+from app.core.exceptions import MicrosoftAPIException
+from app.services.workspace_config import WorkspaceConfig, workspace_config
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class NotificationRecipient:
+    email: str
+    name: str
+    template_vars: Dict[str, Any] = field(default_factory=dict)
+
+
 async def get_notification_templates(db: AsyncSession, workspace_id: int) -> List[NotificationTemplate]:
     """Get all notification templates for a workspace."""
     result = await db.execute(
@@ -203,27 +213,82 @@ async def is_team_notification_enabled(db: AsyncSession, workspace_id: int) -> b
     Check if team notifications are enabled for a workspace.
     """
     try:
-        result = await db.execute(
-            select(NotificationSetting).filter(
-                NotificationSetting.workspace_id == workspace_id,
-                NotificationSetting.category == "agents",
-                NotificationSetting.type == "new_ticket_for_team",
-                NotificationSetting.is_enabled == True
-            )
-        )
-        notification_setting = result.scalars().first()
-        
-        if not notification_setting:
-            return False
-        
-        channels = json.loads(notification_setting.channels) if isinstance(notification_setting.channels, str) else notification_setting.channels
-        return "email" in channels
+        config = await workspace_config.get(db, workspace_id)
+        notification_setting = config.enabled_setting("agents", "new_ticket_for_team")
+        return notification_setting is not None and "email" in notification_setting.channels
         
     except Exception as e:
         logger.error(f"Error checking team notification setting for workspace {workspace_id}: {str(e)}")
         return False
 
 
+async def resolve_notification_sender(
+    db: AsyncSession,
+    workspace_id: int,
+    mailbox_connection_id: Optional[int] = None,
+    graph_service: Optional[MicrosoftGraphService] = None,
+) -> Optional[Tuple[MailboxConnection, str]]:
+    """
+    Mailbox and a valid access token to send notifications from: the ticket's
+    own mailbox when it has a usable token, otherwise one connected by an
+    admin or manager of the workspace. Expired tokens are refreshed. Resolve
+    once per event and reuse it for every recipient.
+    """
+    preferred_mailbox = None
+    preferred_token = None
+
+    if mailbox_connection_id:
+        result = await db.execute(
+            select(MailboxConnection, MicrosoftToken)
+            .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)
+            .filter(
+                MailboxConnection.id == mailbox_connection_id,
+                MailboxConnection.is_active == True,
+                MicrosoftToken.access_token.isnot(None)
+            )
+        )
+        mailbox_token_info = result.first()
+        if mailbox_token_info:
+            preferred_mailbox, preferred_token = mailbox_token_info
+            logger.info(f"[NOTIFY] Usando mailbox específico del ticket: {preferred_mailbox.email}")
+        else:
+            logger.warning(f"[NOTIFY] No se encontró token válido para el mailbox {mailbox_connection_id}")
+
+    if not preferred_mailbox or not preferred_token:
+        result = await db.execute(
+            select(MailboxConnection, MicrosoftToken)
+            .join(Agent, Agent.id == MailboxConnection.created_by_agent_id)
+            .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)
+            .filter(
+                Agent.workspace_id == workspace_id,
+                Agent.role.in_(['admin', 'manager']),
+                MailboxConnection.is_active == True,
+                MicrosoftToken.access_token.isnot(None)
+            ).order_by(Agent.role.desc())
+        )
+        admin_sender_info = result.first()
+        if not admin_sender_info:
+            logger.warning(f"[NOTIFY] No se encontró admin con acceso al mailbox para workspace {workspace_id}")
+            return None
+        preferred_mailbox, preferred_token = admin_sender_info
+        logger.info(f"[NOTIFY] Usando mailbox fallback: {preferred_mailbox.email}")
+
+    current_access_token = preferred_token.access_token
+    if preferred_token.expires_at < datetime.utcnow():
+        try:
+            logger.info(f"[NOTIFY] Refrescando token para mailbox {preferred_mailbox.email}")
+            if graph_service is None:
+                graph_service = MicrosoftGraphService(db=db)
+                await graph_service.initialize()
+            refreshed_ms_token = await graph_service.auth_service.refresh_token_async(preferred_token)
+            current_access_token = refreshed_ms_token.access_token
+        except Exception as token_error:
+            logger.error(f"[NOTIFY] Error refrescando token: {str(token_error)}", exc_info=True)
+            return None
+
+    return preferred_mailbox, current_access_token
+
+
 async def send_notification(
     db: AsyncSession,
     workspace_id: int,
@@ -251,225 +316,166 @@ async def send_notification(
     Returns:
         bool: Whether the notification was sent successfully
     """
-    try:
-        logger.info(f"[NOTIFY] Iniciando envío de notificación: {category}/{notification_type} para {recipient_email} en workspace {workspace_id}")
-        
-        result = await db.execute(
-            select(NotificationSetting).filter(
-                NotificationSetting.workspace_id == workspace_id,
-                NotificationSetting.category == category,
-                NotificationSetting.type == notification_type,
-                NotificationSetting.is_enabled == True
-            )
-        )
-        notification_setting = result.scalars().first()
-        
-        if not notification_setting:
-            logger.warning(f"[NOTIFY] Notificación {notification_type} para {category} no está habilitada en workspace {workspace_id}")
-            return False
-        
-        logger.info(f"[NOTIFY] Configuración de notificación encontrada: ID={notification_setting.id}, template_id={notification_setting.template_id}")
-        
-        channels = json.loads(notification_setting.channels) if isinstance(notification_setting.channels, str) else notification_setting.channels
-        logger.info(f"[NOTIFY] Canales configurados: {channels}")
-        
-        if "email" not in channels:
-            logger.warning(f"[NOTIFY] Canal de email no habilitado para notificación {notification_type} en workspace {workspace_id}")
-            return False
-        
-        template = None
-        if notification_setting.template_id:
-            result = await db.execute(
-                select(NotificationTemplate).filter(
-                    NotificationTemplate.id == notification_setting.template_id,
-                    NotificationTemplate.is_enabled == True
-                )
-            )
-            template = result.scalars().first()
-            logger.info(f"[NOTIFY] Plantilla encontrada: ID={template.id if template else 'None'}")
-        
-        if not template:
-            logger.warning(f"[NOTIFY] No se encontró plantilla para notificación {notification_type} en workspace {workspace_id}")
-            return False
-        
-        success_email = False
-        success_teams = False
-        
-        if "email" in channels:
-            logger.info(f"[NOTIFY] Enviando notificación por EMAIL")
-            success_email = await _send_email_notification(
-                db, workspace_id, template, template_vars, 
-                recipient_email, task_id
-            )
+    results = await send_notifications(
+        db, workspace_id, category, notification_type,
+        [NotificationRecipient(recipient_email, recipient_name, template_vars)],
+        task_id=task_id
+    )
+    return results.get(recipient_email.lower(), False)
 
-        if category == "agents":
-            result = await db.execute(
-                select(Agent).filter(
-                    Agent.email == recipient_email,
-                    Agent.workspace_id == workspace_id
-                )
-            )
-            agent = result.scalars().first()
-
-            if agent and agent.teams_notifications_enabled:
-                logger.info(f"[NOTIFY] Enviando notificación por TEAMS al agente {agent.id}")
-                try:
-                    result = await db.execute(select(Workspace).filter(Workspace.id == workspace_id))
-                    workspace = result.scalars().first()
-                    if workspace and task_id:
-                        link_to_ticket = f"https://{workspace.subdomain}.enque.cc/tickets/{task_id}"
-                        
-                        title = template.subject
-                        for var_name, var_value in template_vars.items():
-                            placeholder = "{{" + var_name + "}}"
-                            title = title.replace(placeholder, str(var_value))
-                        
-                        preview_message = f"Ticket #{task_id}: {template_vars.get('ticket_title', '')}"
-
-                        graph_service = MicrosoftGraphService(db=db)
-                        await graph_service.initialize()
-                        await graph_service.send_teams_activity_notification(
-                            agent_id=agent.id,
-                            title=title,
-                            message=preview_message,
-                            link_to_ticket=link_to_ticket,
-                            subdomain=workspace.subdomain
-                        )
-                        success_teams = True
-                    else:
-                        logger.warning(f"No se pudo enviar notificación de Teams para el agente {agent.id} porque falta workspace o task_id.")
-
-                except Exception as teams_error:
-                    logger.error(f"Error al enviar notificación de Teams: {str(teams_error)}", exc_info=True)
-        
-        # Considerar exitoso si al menos uno de los canales funcionó
-        return success_email or success_teams
-            
+
+async def send_notifications(
+    db: AsyncSession,
+    workspace_id: int,
+    category: str,
+    notification_type: str,
+    recipients: Sequence[NotificationRecipient],
+    task_id: Optional[int] = None
+) -> Dict[str, bool]:
+    """
+    Send one notification event to many recipients.
+
+    Settings and the precompiled template come from the workspace snapshot,
+    the sender mailbox and token are resolved once, every email goes out in
+    Graph batches from that mailbox and Teams recipients are looked up in a
+    single query. Returns ``{lowercased email: sent on at least one channel}``.
+    """
+    try:
+        return await deliver_notifications(db, workspace_id, category, notification_type, recipients, task_id)
     except Exception as e:
         logger.error(f"[NOTIFY] Error enviando notificación: {str(e)}", exc_info=True)
-        return False
+        return {recipient.email.lower(): False for recipient in recipients if recipient.email}
 
 
-async def _send_email_notification(
+async def deliver_notifications(
     db: AsyncSession,
     workspace_id: int,
-    template: NotificationTemplate,
-    template_vars: Dict[str, Any],
-    recipient_email: str,
+    category: str,
+    notification_type: str,
+    recipients: Sequence[NotificationRecipient],
     task_id: Optional[int] = None
-) -> bool:
-    """Envía notificación por email"""
-    try:
-        
-        # Intentar usar el mailbox específico del ticket primero
-        preferred_mailbox = None
-        preferred_token = None
-        
-        if task_id:
-            from app.models.task import Task
-            result = await db.execute(select(Task).filter(Task.id == task_id))
-            task = result.scalars().first()
-            
-            if task and task.mailbox_connection_id:
-                logger.info(f"[NOTIFY] Ticket {task_id} tiene mailbox específico ID: {task.mailbox_connection_id}")
-                
-                result = await db.execute(
-                    select(MailboxConnection, MicrosoftToken)
-                    .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)
-                    .filter(
-                        MailboxConnection.id == task.mailbox_connection_id,
-                        MailboxConnection.is_active == True,
-                        MicrosoftToken.access_token.isnot(None)
-                    )
-                )
-                mailbox_token_info = result.first()
-                
-                if mailbox_token_info:
-                    preferred_mailbox, preferred_token = mailbox_token_info
-                    logger.info(f"[NOTIFY] Usando mailbox específico del ticket: {preferred_mailbox.email}")
-                else:
-                    logger.warning(f"[NOTIFY] No se encontró token válido para el mailbox específico del ticket {task_id}")
-
-        if not preferred_mailbox or not preferred_token:
-            logger.info(f"[NOTIFY] Buscando mailbox fallback para workspace {workspace_id}")
-            
-            try:
-                result = await db.execute(
-                    select(Agent, MailboxConnection, MicrosoftToken)
-                    .join(MailboxConnection, Agent.id == MailboxConnection.created_by_agent_id)
-                    .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)
-                    .filter(
-                        Agent.workspace_id == workspace_id,
-                        Agent.role.in_(['admin', 'manager']),
-                        MailboxConnection.is_active == True,
-                        MicrosoftToken.access_token.isnot(None)
-                    ).order_by(Agent.role.desc())
-                )
-                admin_sender_info = result.first()
-                
-                logger.info(f"[NOTIFY] Admin con acceso al mailbox encontrado: {admin_sender_info is not None}")
-                
-                if not admin_sender_info:
-                    logger.warning(f"[NOTIFY] No se encontró admin con acceso al mailbox para workspace {workspace_id}")
-                    return False
-                    
-                admin, preferred_mailbox, preferred_token = admin_sender_info
-                logger.info(f"[NOTIFY] Usando mailbox fallback: {preferred_mailbox.email}")
-                
-            except Exception as admin_error:
-                logger.error(f"[NOTIFY] Error al buscar admin con acceso al mailbox: {str(admin_error)}", exc_info=True)
-                return False
-        
-        # Apply template variables including mailbox-specific ones
-        subject = template.subject
-        html_body = template.template
-        
-        # Add mailbox display name to template variables if available
-        if preferred_mailbox and preferred_mailbox.display_name:
-            template_vars["mailbox_name"] = preferred_mailbox.display_name
-            template_vars["sender_name"] = preferred_mailbox.display_name
-        
-        # Replace variables in subject and body
-        for var_name, var_value in template_vars.items():
-            placeholder = "{{" + var_name + "}}"
-            subject = subject.replace(placeholder, str(var_value))
-            html_body = html_body.replace(placeholder, str(var_value))
-        
-        logger.info(f"[NOTIFY] Plantilla renderizada con variables: {list(template_vars.keys())}")
-        
-        # Get current access token (refresh if needed)
-        current_access_token = preferred_token.access_token
-        
-        if preferred_token.expires_at < datetime.utcnow():
-            try:
-                logger.info(f"[NOTIFY] Refrescando token para mailbox {preferred_mailbox.email}")
-                graph_service = MicrosoftGraphService(db=db)
-                refreshed_ms_token = await graph_service.refresh_token_async(preferred_token)
-                current_access_token = refreshed_ms_token.access_token
-                logger.info("[NOTIFY] Token refrescado exitosamente")
-            except Exception as token_error:
-                logger.error(f"[NOTIFY] Error refrescando token: {str(token_error)}", exc_info=True)
-                return False
-        
-        # Send the email using the correct mailbox
-        logger.info(f"[NOTIFY] Intentando enviar email desde {preferred_mailbox.email} a {recipient_email}")
-        graph_service = MicrosoftGraphService(db=db)
-        success = await graph_service.send_email_with_user_token(
-            user_access_token=current_access_token,
-            sender_mailbox_email=preferred_mailbox.email,
-            recipient_email=recipient_email,
-            subject=subject,
-            html_body=html_body,
+) -> Dict[str, bool]:
+    """
+    ``send_notifications`` for the outbox: errors propagate, and so does a
+    send where every recipient failed, so the event is retried. A partial
+    failure is only logged, as a retry would notify the others again.
+    """
+    unique: Dict[str, NotificationRecipient] = {}
+    for recipient in recipients:
+        if recipient.email:
+            unique.setdefault(recipient.email.lower(), recipient)
+    results: Dict[str, bool] = {email: False for email in unique}
+    if not unique:
+        return results
+
+    logger.info(f"[NOTIFY] Iniciando envío de notificación: {category}/{notification_type} para {len(unique)} destinatarios en workspace {workspace_id}")
+
+    config = await workspace_config.get(db, workspace_id)
+    notification_setting = config.enabled_setting(category, notification_type)
+
+    if not notification_setting:
+        logger.warning(f"[NOTIFY] Notificación {notification_type} para {category} no está habilitada en workspace {workspace_id}")
+        return results
+
+    channels = notification_setting.channels
+    logger.info(f"[NOTIFY] Configuración de notificación encontrada: ID={notification_setting.id}, template_id={notification_setting.template_id}, canales={channels}")
+
+    if "email" not in channels:
+        logger.warning(f"[NOTIFY] Canal de email no habilitado para notificación {notification_type} en workspace {workspace_id}")
+        return results
+
+    template = config.enabled_template(notification_setting.template_id)
+    if not template:
+        logger.warning(f"[NOTIFY] No se encontró plantilla para notificación {notification_type} en workspace {workspace_id}")
+        return results
+
+    mailbox_connection_id = None
+    if task_id:
+        from app.models.task import Task
+        mailbox_connection_id = (await db.execute(
+            select(Task.mailbox_connection_id).filter(Task.id == task_id)
+        )).scalar()
+
+    graph_service = MicrosoftGraphService(db=db)
+    await graph_service.initialize()
+    sender = await resolve_notification_sender(db, workspace_id, mailbox_connection_id, graph_service)
+
+    # Render each recipient once; the Teams title reuses the email subject
+    rendered: Dict[str, Tuple[str, str]] = {}
+    for email, recipient in unique.items():
+        variables = dict(recipient.template_vars)
+        if sender and sender[0].display_name:
+            variables["mailbox_name"] = sender[0].display_name
+            variables["sender_name"] = sender[0].display_name
+        rendered[email] = template.render(variables)
+
+    if sender:
+        mailbox, access_token = sender
+        emails = list(unique)
+        logger.info(f"[NOTIFY] Enviando {len(emails)} notificaciones por EMAIL desde {mailbox.email}")
+        sent = await graph_service.send_emails_with_user_token(
+            access_token, mailbox.email,
+            [(unique[email].email, *rendered[email]) for email in emails],
             task_id=task_id
         )
-        
-        if success:
-            logger.info(f"[NOTIFY] Notificación {notification_type} enviada exitosamente a {recipient_email} desde {preferred_mailbox.email}")
+        for email, ok in zip(emails, sent):
+            results[email] = ok
+        logger.info(f"[NOTIFY] Notificación {notification_type} enviada a {sum(sent)}/{len(emails)} destinatarios desde {mailbox.email}")
+
+    if category == "agents":
+        for email in await _send_teams_notifications(db, graph_service, config, unique, rendered, task_id):
+            results[email] = True
+
+    if sender and not any(results.values()):
+        raise MicrosoftAPIException(f"{notification_type} notification failed for all {len(results)} recipients")
+    return results
+
+
+async def _send_teams_notifications(
+    db: AsyncSession,
+    graph_service: MicrosoftGraphService,
+    config: WorkspaceConfig,
+    recipients: Dict[str, NotificationRecipient],
+    rendered: Dict[str, Tuple[str, str]],
+    task_id: Optional[int],
+) -> List[str]:
+    """Teams activity notifications for the recipients that are agents with Teams enabled."""
+    result = await db.execute(
+        select(Agent.id, Agent.email, Agent.microsoft_id).filter(
+            Agent.workspace_id == config.workspace_id,
+            Agent.email.in_([recipient.email for recipient in recipients.values()]),
+            Agent.teams_notifications_enabled == True,
+            Agent.microsoft_id.isnot(None)
+        )
+    )
+    agents = result.all()
+    if not agents:
+        return []
+    if not config.subdomain or not task_id:
+        logger.warning(f"No se pudo enviar notificación de Teams para ticket {task_id} porque falta workspace o task_id.")
+        return []
+
+    try:
+        access_token = await graph_service.auth_service.get_application_token()
+    except Exception as e:
+        logger.error(f"Could not obtain a valid application token to send Teams notifications: {str(e)}")
+        return []
+
+    link_to_ticket = f"https://{config.subdomain}.enque.cc/tickets/{task_id}"
+    agents = [agent for agent in agents if agent.email and agent.email.lower() in recipients]
+
+    async def send(agent) -> bool:
+        email = agent.email.lower()
+        preview_message = f"Ticket #{task_id}: {recipients[email].template_vars.get('ticket_title', '')}"
+        try:
+            await graph_service.graph_client.send_teams_activity_notification(
+                access_token, agent.microsoft_id, rendered[email][0], preview_message, link_to_ticket, config.subdomain
+            )
             return True
-        else:
-            logger.error(f"[NOTIFY] Falló el envío de notificación {notification_type} a {recipient_email}")
+        except Exception as teams_error:
+            logger.error(f"Error al enviar notificación de Teams al agente {agent.id}: {str(teams_error)}")
             return False
-            
-    except Exception as e:
-        logger.error(f"[NOTIFY] Error enviando notificación: {str(e)}", exc_info=True)
-        return False
+
+    logger.info(f"[NOTIFY] Enviando {len(agents)} notificaciones por TEAMS")
+    sent = await asyncio.gather(*(send(agent) for agent in agents))
+    return [agent.email.lower() for agent, ok in zip(agents, sent) if ok]
@@ -0,0 +1,259 @@
+"""
+Transactional outbox.
+
+Request handlers and the mail sync record their side effects (Socket.IO
+events, notification emails, workflow runs, report rollup deltas) with
+``enqueue`` in the same session, so they are committed together with the
+change or not at all. The relay, a task on the application's event loop,
+publishes them afterwards:
+
+- it is woken as soon as a transaction with outbox rows commits, and polls
+  every ``OUTBOX_POLL_INTERVAL_SECONDS`` in case a wake-up was missed;
+- it reads pending rows in id order, ``OUTBOX_BATCH_SIZE`` at a time, and
+  hands each event type to its handler (``app.services.outbox_handlers``).
+  Batched handlers get all events of their type at once, which is where
+  repeated Socket.IO updates of one ticket collapse into one;
+- ``socketio.*`` events are read by a loop of their own, so a backlog of
+  emails or workflows never holds up live updates;
+- a handler still running after ``OUTBOX_HANDLER_TIMEOUT_SECONDS`` fails the
+  attempt. A failed event is retried with exponential backoff, and given up
+  after ``OUTBOX_MAX_ATTEMPTS`` (kept with its ``last_error``). Due times are
+  compared in DB time.
+
+Delivery is at least once: an event whose handler ran but whose row was not
+marked before a crash runs again, so handlers read current state by id
+rather than trusting the payload to be the latest. The API runs as a single
+process, so there is one relay (with one loop per lane); the pending-row
+query takes no locks.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, insert, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal, get_async_driver
+from app.models.outbox_event import OutboxEvent
+from app.services.retention import delete_in_batches
+from app.utils.logger import logger
+
+# event type -> (handler, batched). Batched handlers take a list of payloads.
+_HANDLERS: Dict[str, Tuple[Callable[[Any], Awaitable[None]], bool]] = {}
+_PENDING_KEY = "outbox_pending"
+_MAX_ERROR_LENGTH = 2000
+# Socket.IO events have a relay loop of their own, so slow emails or workflows never delay them
+SOCKETIO_EVENT_PREFIX = "socketio."
+SOCKETIO_LANE = "socketio"
+DEFAULT_LANE = "default"
+LANES = (SOCKETIO_LANE, DEFAULT_LANE)
+
+
+def handler(event_type: str, batched: bool = False):
+    """Register the coroutine that publishes ``event_type`` events."""
+    def register(func):
+        _HANDLERS[event_type] = (func, batched)
+        return func
+    return register
+
+
+def enqueue(db: AsyncSession, event_type: str, payload: Dict[str, Any], workspace_id: Optional[int] = None) -> OutboxEvent:
+    """Add an event to the caller's transaction; it is published once that commits."""
+    outbox_event = OutboxEvent(event_type=event_type, workspace_id=workspace_id, payload=payload)
+    db.add(outbox_event)
+    return outbox_event
+
+
+def enqueue_in_flush(session: Session, event_type: str, payload: Dict[str, Any], workspace_id: Optional[int] = None) -> None:
+    """``enqueue`` for flush event listeners, which can't add objects to the session."""
+    session.connection().execute(
+        insert(OutboxEvent).values(event_type=event_type, workspace_id=workspace_id, payload=payload)
+    )
+    session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _note_outbox_rows(session: Session, flush_context) -> None:
+    if any(isinstance(obj, OutboxEvent) for obj in session.new):
+        session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relay(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        outbox_relay.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_outbox_rows(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _lane_filter(lane: str) -> Any:
+    socketio = OutboxEvent.event_type.like(f"{SOCKETIO_EVENT_PREFIX}%")
+    return socketio if lane == SOCKETIO_LANE else ~socketio
+
+
+class OutboxRelay:
+    def __init__(self, batch_size: int, poll_interval: float, handler_timeout: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.handler_timeout = handler_timeout
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self.published = 0
+        self.retried = 0
+        self.given_up = 0
+        self.timed_out = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for lane in LANES:
+            task = self._tasks.get(lane)
+            if task is None or task.done():
+                self._wakeups[lane] = asyncio.Event()
+                self._tasks[lane] = self._loop.create_task(self._run(lane))
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = {}
+
+    def wake(self) -> None:
+        # Commits also happen on worker threads with their own loops
+        if self._loop is not None and not self._loop.is_closed():
+            for wakeup in self._wakeups.values():
+                self._loop.call_soon_threadsafe(wakeup.set)
+
+    async def _run(self, lane: str) -> None:
+        # Registers the handlers
+        import app.services.outbox_handlers  # noqa: F401
+
+        wakeup = self._wakeups[lane]
+        while True:
+            wakeup.clear()
+            try:
+                processed = await self.process_batch(lane)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in outbox relay ({lane} lane): {e}", exc_info=True)
+                processed = 0
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _failed(self, outbox_event: OutboxEvent, error: Exception, now: datetime) -> None:
+        outbox_event.attempts = (outbox_event.attempts or 0) + 1
+        outbox_event.last_error = f"{type(error).__name__}: {error}"[:_MAX_ERROR_LENGTH]
+        if outbox_event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            outbox_event.processed_at = now
+            self.given_up += 1
+            logger.error(f"❌ Outbox event {outbox_event.id} ({outbox_event.event_type}) given up after {outbox_event.attempts} attempts: {error}")
+        else:
+            delay = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (outbox_event.attempts - 1)
+            # DB time, like the available_at default and the pending-row query
+            outbox_event.available_at = func.date_add(func.now(), literal_column(f"INTERVAL {int(delay)} SECOND"))
+            self.retried += 1
+            logger.warning(f"⚠️ Outbox event {outbox_event.id} ({outbox_event.event_type}) failed, retrying in {delay}s: {error}")
+
+    async def _call(self, publish: Callable[[Any], Awaitable[None]], argument: Any, event_type: str) -> None:
+        """Run a handler, failing it after ``handler_timeout`` so one stuck call can't stall its lane."""
+        try:
+            await asyncio.wait_for(publish(argument), timeout=self.handler_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise TimeoutError(f"{event_type} handler timed out after {self.handler_timeout}s")
+
+    async def process_batch(self, lane: str = DEFAULT_LANE) -> int:
+        """Publish up to ``batch_size`` pending events of ``lane``. Returns how many were read."""
+        if AsyncSessionLocal is None:
+            return 0
+        async with AsyncSessionLocal() as db:
+            events = (await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.processed_at.is_(None), OutboxEvent.available_at <= func.now(), _lane_filter(lane))
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+            )).scalars().all()
+            if not events:
+                return 0
+
+            by_type: Dict[str, List[OutboxEvent]] = {}
+            for outbox_event in events:
+                by_type.setdefault(outbox_event.event_type, []).append(outbox_event)
+
+            for event_type, group in by_type.items():
+                publish, batched = _HANDLERS.get(event_type, (None, False))
+                if publish is None:
+                    for outbox_event in group:
+                        self._failed(outbox_event, LookupError(f"No outbox handler for {event_type}"), datetime.utcnow())
+                elif batched:
+                    try:
+                        await self._call(publish, [outbox_event.payload for outbox_event in group], event_type)
+                        for outbox_event in group:
+                            outbox_event.processed_at = datetime.utcnow()
+                        self.published += len(group)
+                    except Exception as e:
+                        for outbox_event in group:
+                            self._failed(outbox_event, e, datetime.utcnow())
+                else:
+                    for outbox_event in group:
+                        try:
+                            await self._call(publish, outbox_event.payload, event_type)
+                            outbox_event.processed_at = datetime.utcnow()
+                            self.published += 1
+                        except Exception as e:
+                            self._failed(outbox_event, e, datetime.utcnow())
+
+            await db.commit()
+            self.batches += 1
+            return len(events)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": {lane: not task.done() for lane, task in self._tasks.items()},
+            "published": self.published,
+            "retried": self.retried,
+            "given_up": self.given_up,
+            "timed_out": self.timed_out,
+            "batches": self.batches,
+        }
+
+
+outbox_relay = OutboxRelay(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL_SECONDS,
+    handler_timeout=settings.OUTBOX_HANDLER_TIMEOUT_SECONDS,
+)
+
+
+async def outbox_retention_job():
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+            deleted = await delete_in_batches(
+                db, OutboxEvent, OutboxEvent.processed_at < cutoff, batch_size=settings.OUTBOX_BATCH_SIZE * 10
+            )
+            if deleted:
+                logger.info(f"🧹 Purged {deleted} processed outbox events")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error in outbox retention job: {e}", exc_info=True)
+        finally:
+            await local_engine.dispose()
@@ -0,0 +1,262 @@
+"""
+Publishers for outbox events (see ``app.services.outbox``).
+
+Socket.IO events carry only ids: the handlers load the current rows when
+they publish, so a redelivered or coalesced event still sends the latest
+state, and several updates of one ticket in a batch become one emit.
+
+Every handler lets errors propagate, which is what makes the relay retry
+the event; Socket.IO handlers emit right away rather than through the
+coalescing window, so a failed emit reaches the relay too. Each notification is its own event, so a failed email is retried
+without running workflows or other notifications again.
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.core.config import settings
+from app.core.socketio import (
+    broadcast_comment_updates, broadcast_new_tickets, broadcast_ticket_updates, broadcast_tickets_deleted,
+)
+from app.database.session import AsyncSessionLocal
+from app.models.comment import Comment
+from app.models.task import Task
+from app.models.user import User
+from app.services.comment_html_hydrator import comment_html_hydrator
+from app.services.outbox import handler
+
+
+def _avatar_url(agent=None, user=None):
+    if agent is not None:
+        return agent.avatar_url
+    if user is not None:
+        if user.avatar_url:
+            return user.avatar_url
+        if user.company and user.company.logo_url:
+            return user.company.logo_url
+    return None
+
+
+def _ids(payloads: List[Dict[str, Any]], key: str) -> List[int]:
+    """Ids of ``key`` across the payloads; bulk changes carry a ``<key>s`` list instead."""
+    ids = []
+    for payload in payloads:
+        ids.extend(payload[f"{key}s"] if f"{key}s" in payload else [payload[key]])
+    return list(dict.fromkeys(ids))
+
+
+@handler("socketio.ticket_updated", batched=True)
+async def publish_ticket_updates(payloads: List[Dict[str, Any]]) -> None:
+    async with AsyncSessionLocal() as db:
+        tasks = (await db.execute(select(Task).where(Task.id.in_(_ids(payloads, "ticket_id"))))).scalars().all()
+    by_workspace: Dict[int, List[Dict[str, Any]]] = {}
+    for task in tasks:
+        by_workspace.setdefault(task.workspace_id, []).append({
+            'id': task.id,
+            'title': task.title,
+            'status': task.status,
+            'priority': task.priority,
+            'workspace_id': task.workspace_id,
+            'assignee_id': task.assignee_id,
+            'team_id': task.team_id,
+            'user_id': task.user_id,
+            'updated_at': task.updated_at.isoformat() if task.updated_at else None
+        })
+    for workspace_id, tickets in by_workspace.items():
+        await broadcast_ticket_updates(workspace_id, tickets)
+
+
+@handler("socketio.ticket_deleted", batched=True)
+async def publish_ticket_deletions(payloads: List[Dict[str, Any]]) -> None:
+    by_workspace: Dict[int, List[int]] = {}
+    for payload in payloads:
+        by_workspace.setdefault(payload["workspace_id"], []).extend(_ids([payload], "ticket_id"))
+    for workspace_id, ticket_ids in by_workspace.items():
+        await broadcast_tickets_deleted(workspace_id, list(dict.fromkeys(ticket_ids)))
+
+
+@handler("socketio.new_ticket", batched=True)
+async def publish_new_tickets(payloads: List[Dict[str, Any]]) -> None:
+    async with AsyncSessionLocal() as db:
+        tasks = (await db.execute(
+            select(Task).options(joinedload(Task.user)).where(Task.id.in_(_ids(payloads, "ticket_id")))
+        )).scalars().all()
+    by_workspace: Dict[int, List[Dict[str, Any]]] = {}
+    for task in tasks:
+        by_workspace.setdefault(task.workspace_id, []).append({
+            'id': task.id,
+            'title': task.title,
+            'status': task.status,
+            'priority': task.priority,
+            'workspace_id': task.workspace_id,
+            'assignee_id': task.assignee_id,
+            'team_id': task.team_id,
+            'user_id': task.user_id,
+            'created_at': task.created_at.isoformat() if task.created_at else None,
+            'user_name': task.user.name if task.user else None,
+            'user_email': task.user.email if task.user else None
+        })
+    for workspace_id, tickets in by_workspace.items():
+        await broadcast_new_tickets(workspace_id, tickets)
+
+
+@handler("socketio.comment_updated", batched=True)
+async def publish_comment_updates(payloads: List[Dict[str, Any]]) -> None:
+    async with AsyncSessionLocal() as db:
+        comments = (await db.execute(
+            select(Comment).options(
+                joinedload(Comment.agent),
+                joinedload(Comment.user).joinedload(User.company),
+                joinedload(Comment.ticket).joinedload(Task.user).joinedload(User.company),
+                selectinload(Comment.attachments)
+            ).where(Comment.id.in_(_ids(payloads, "comment_id")))
+        )).unique().scalars().all()
+    contents = await asyncio.gather(*(comment_html_hydrator.resolve(comment.content) for comment in comments))
+
+    by_workspace: Dict[int, List[Dict[str, Any]]] = {}
+    for comment, content in zip(comments, contents):
+        # Agent replies show the ticket's contact; email replies the contact who wrote them
+        user = comment.user or (comment.ticket.user if comment.ticket else None)
+        agent = comment.agent
+        by_workspace.setdefault(comment.workspace_id, []).append({
+            'id': comment.id,
+            'ticket_id': comment.ticket_id,
+            'agent_id': comment.agent_id,
+            'agent_name': agent.name if agent else None,
+            'agent_email': agent.email if agent else None,
+            'agent_avatar': _avatar_url(agent=agent),
+            'user_id': user.id if user else None,
+            'user_name': user.name if user else None,
+            'user_email': user.email if user else None,
+            'user_avatar': _avatar_url(user=user),
+            'content': content or "",
+            'other_destinaries': comment.other_destinaries,
+            'bcc_recipients': comment.bcc_recipients,
+            'is_private': comment.is_private,
+            'created_at': comment.created_at.isoformat() if comment.created_at else None,
+            'attachments': [
+                {
+                    'id': att.id,
+                    'file_name': att.file_name,
+                    'content_type': att.content_type,
+                    'file_size': att.file_size,
+                    'download_url': att.s3_url
+                } for att in comment.attachments
+            ]
+        })
+    for workspace_id, comment_updates in by_workspace.items():
+        await broadcast_comment_updates(workspace_id, comment_updates)
+
+
+@handler("ticket.updated")
+async def run_ticket_update_side_effects(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import run_ticket_update_side_effects
+    await run_ticket_update_side_effects(payload)
+
+
+@handler("tickets.bulk_updated")
+async def run_bulk_update_side_effects(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import run_bulk_update_side_effects
+    await run_bulk_update_side_effects(payload)
+
+
+@handler("notification.ticket_assigned")
+async def send_assignment_notification(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import deliver_assignment_notification
+    async with AsyncSessionLocal() as db:
+        task = (await db.execute(
+            select(Task).options(joinedload(Task.assignee)).where(Task.id == payload["ticket_id"], Task.is_deleted == False)
+        )).scalar_one_or_none()
+        if task:
+            await deliver_assignment_notification(db, task, payload.get("request_origin"))
+
+
+@handler("notification.team_ticket")
+async def send_team_notification(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import deliver_team_notification
+    async with AsyncSessionLocal() as db:
+        task = (await db.execute(
+            select(Task).where(Task.id == payload["ticket_id"], Task.is_deleted == False)
+        )).scalar_one_or_none()
+        if task:
+            await deliver_team_notification(db, task, payload.get("request_origin"))
+
+
+async def _bulk_tasks(db, payload: Dict[str, Any]) -> List[Task]:
+    return (await db.execute(
+        select(Task).options(joinedload(Task.assignee))
+        .where(Task.id.in_(payload["ticket_ids"]), Task.workspace_id == payload["workspace_id"], Task.is_deleted == False)
+        .order_by(Task.id)
+    )).scalars().all()
+
+
+@handler("notification.bulk_assigned")
+async def send_bulk_assignment_notifications(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import deliver_bulk_assignment_notifications
+    async with AsyncSessionLocal() as db:
+        tasks = await _bulk_tasks(db, payload)
+        if tasks:
+            await deliver_bulk_assignment_notifications(db, tasks, payload.get("request_origin"))
+
+
+@handler("notification.bulk_team")
+async def send_bulk_team_notifications(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import deliver_bulk_team_notifications
+    async with AsyncSessionLocal() as db:
+        tasks = await _bulk_tasks(db, payload)
+        if tasks:
+            await deliver_bulk_team_notifications(db, tasks, payload.get("request_origin"))
+
+
+@handler("notification.ticket_closed")
+async def send_closure_notification(payload: Dict[str, Any]) -> None:
+    from app.services.task_service import deliver_closure_notification
+    async with AsyncSessionLocal() as db:
+        await deliver_closure_notification(db, payload["ticket_id"])
+
+
+@handler("comment.created")
+async def run_comment_workflows(payload: Dict[str, Any]) -> None:
+    from app.api.endpoints.comments import run_comment_workflows
+    async with AsyncSessionLocal() as db:
+        await run_comment_workflows(db, payload["comment_id"], payload["agent_id"])
+
+
+@handler("notification.new_response")
+async def send_new_response_notifications(payload: Dict[str, Any]) -> None:
+    from app.api.endpoints.comments import send_new_response_notifications
+    async with AsyncSessionLocal() as db:
+        await send_new_response_notifications(db, payload["comment_id"], payload["agent_id"])
+
+
+@handler("notification.mentions")
+async def send_mention_notifications(payload: Dict[str, Any]) -> None:
+    from app.api.endpoints.comments import send_comment_mention_notifications
+    async with AsyncSessionLocal() as db:
+        await send_comment_mention_notifications(db, payload["comment_id"], payload["agent_id"], payload.get("request_origin"))
+
+
+@handler("comment.email")
+async def send_comment_email(payload: Dict[str, Any]) -> None:
+    from app.api.endpoints.comments import send_email_in_background
+    async with AsyncSessionLocal() as db:
+        content = (await db.execute(select(Comment.content).where(Comment.id == payload["comment_id"]))).scalar_one_or_none()
+    if content is None:
+        return
+    # The Graph client is synchronous
+    await asyncio.to_thread(
+        send_email_in_background,
+        comment_content=await comment_html_hydrator.resolve(content),
+        db_path=str(settings.DATABASE_URI),
+        **payload
+    )
+
+
+@handler("reports.rollup_delta", batched=True)
+async def apply_report_rollup_deltas(payloads: List[Dict[str, Any]]) -> None:
+    from app.services.report_rollups import report_rollups
+    async with AsyncSessionLocal() as db:
+        await report_rollups.apply(db, payloads)
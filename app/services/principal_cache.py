@@ -0,0 +1,125 @@
+"""
+Process-local cache of verified access tokens.
+
+A token seen before maps straight to its ``AgentPrincipal`` without decoding
+the JWT or touching Redis. Entries live at most ``AUTH_PRINCIPAL_CACHE_TTL``
+seconds and never past the token's own expiry. When an agent is updated,
+deactivated or deleted, ``revoke_agent`` drops their entries here and
+publishes the agent id on Redis so every other worker drops them too; the
+TTL bounds staleness should a worker miss the message.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from cachetools import TLRUCache
+
+from app.core.config import settings
+from app.core.principal import AgentPrincipal
+from app.services.cache_service import cache_service
+from app.utils.logger import logger
+
+REVOCATION_CHANNEL = "auth:agent_revoked"
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.ttl = ttl
+        # Values are (principal, token exp as a unix timestamp)
+        self._cache: TLRUCache = TLRUCache(maxsize=maxsize, ttu=self._time_to_use)
+        # Bumped on every revocation, so a lookup that raced a revocation is not cached
+        self._generations: Dict[int, int] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _time_to_use(self, token: str, value: Tuple[AgentPrincipal, Optional[float]], now: float) -> float:
+        lifetime = self.ttl
+        exp = value[1]
+        if exp is not None:
+            lifetime = min(lifetime, exp - time.time())
+        return now + lifetime
+
+    def get(self, token: str) -> Optional[AgentPrincipal]:
+        entry = self._cache.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def generation(self, agent_id: int) -> int:
+        return self._generations.get(agent_id, 0)
+
+    def put(self, token: str, principal: AgentPrincipal, exp: Optional[float], generation: int) -> None:
+        """Cache a principal loaded while the agent was at ``generation``."""
+        if self._generations.get(principal.id, 0) != generation:
+            return
+        self._cache[token] = (principal, exp)
+
+    def evict_agent(self, agent_id: int) -> int:
+        self._generations[agent_id] = self._generations.get(agent_id, 0) + 1
+        tokens = [token for token, (principal, _) in list(self._cache.items()) if principal.id == agent_id]
+        for token in tokens:
+            self._cache.pop(token, None)
+        return len(tokens)
+
+    async def revoke_agent(self, agent_id: int) -> None:
+        """Forget every cached principal of an agent, in this and every other worker."""
+        self.evict_agent(agent_id)
+        await cache_service.delete(f"user_agent:{agent_id}")
+        if cache_service.is_redis_connected and cache_service.redis_client:
+            try:
+                await cache_service.redis_client.publish(REVOCATION_CHANNEL, str(agent_id))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not publish auth revocation for agent {agent_id}: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            client = cache_service.redis_client
+            if not (cache_service.is_redis_connected and client):
+                await asyncio.sleep(30)
+                continue
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(REVOCATION_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        agent_id = int(message["data"])
+                        evicted = self.evict_agent(agent_id)
+                        logger.info(f"🔐 Auth revocation for agent {agent_id}: {evicted} cached tokens dropped")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Auth revocation listener error: {e}; resubscribing")
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    close = getattr(pubsub, "aclose", None) or pubsub.close
+                    await close()
+                except Exception:
+                    pass
+
+    def start_listener(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE,
+    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+)
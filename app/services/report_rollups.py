@@ -0,0 +1,317 @@
+"""
+Hourly ticket rollups for the reports endpoints.
+
+``ticket_report_rollups`` counts tickets per creation hour, workspace, team,
+status and priority, with the sums behind average first-response and
+resolution times (from the SLA timestamps kept by ``ticket_lifecycle``).
+Every ORM ticket write records its bucket deltas in its own transaction:
+before a flush, the buckets of changed or deleted tickets are read from their
+stored rows (to subtract); after it, the buckets of new and changed tickets
+are read from the rows just written (to add), so bucket keys always come from
+the database values (including ``created_at`` defaults). The reads take no
+locks; the net deltas go to the outbox as one ``reports.rollup_delta`` event
+per flush. The relay merges pending events and applies them in one short
+transaction, with buckets in a fixed order, so ticket transactions never hold
+locks on the hot buckets and rollup writers can't deadlock on them.
+
+Writes that bypass the ORM (bulk ``update()``, manual SQL, ``ON DELETE``
+cascades) and deltas applied twice by an outbox redelivery are caught by
+``report_rollup_job``, which recounts the most recent buckets on every run
+and backfills older history a chunk at a time.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, event, func, inspect, literal_column, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.database.session import get_async_driver
+from app.models.report_rollup import TicketReportRollup
+from app.models.task import Task
+from app.services.cache_service import cache_service
+from app.services.outbox import enqueue_in_flush
+from app.services.ticket_lifecycle import fill_sla_timestamps
+from app.utils.logger import logger
+
+# v2: buckets gained first-response and resolution sums
+BACKFILL_WATERMARK_KEY = "reports:rollup:v2:backfilled_until"
+BACKFILL_WATERMARK_TTL = 30 * 24 * 3600
+REBUILD_BATCH_SIZE = 1000
+# Ticket columns that decide a ticket's bucket or its measures
+_BUCKET_ATTRIBUTES = (
+    "workspace_id", "created_at", "team_id", "mailbox_connection_id", "status", "priority",
+    "first_response_at", "resolved_at",
+)
+_CHANGED_KEY = "report_rollup_changed"
+_DELTAS_KEY = "report_rollup_deltas"
+ROLLUP_DELTA_EVENT = "reports.rollup_delta"
+
+_DIMENSION_COLUMNS = ["bucket_start", "workspace_id", "team_id", "mailbox_connection_id", "status", "priority"]
+_MEASURE_COLUMNS = ["ticket_count", "first_response_count", "first_response_seconds", "resolved_count", "resolution_seconds"]
+_ROLLUP_COLUMNS = _DIMENSION_COLUMNS + _MEASURE_COLUMNS
+
+_bucket_start = func.date_format(Task.created_at, "%Y-%m-%d %H:00:00")
+_team = func.coalesce(Task.team_id, 0)
+_mailbox = case((Task.team_id.is_(None), func.coalesce(Task.mailbox_connection_id, 0)), else_=0)
+_dimensions = (_bucket_start, Task.workspace_id, _team, _mailbox, Task.status, Task.priority)
+
+_resolved_at = case((Task.status == "Closed", Task.resolved_at))
+_measures = (
+    func.count(Task.id),
+    func.count(Task.first_response_at),
+    func.coalesce(func.sum(func.timestampdiff(literal_column("SECOND"), Task.created_at, Task.first_response_at)), 0),
+    func.count(_resolved_at),
+    func.coalesce(func.sum(func.timestampdiff(literal_column("SECOND"), Task.created_at, _resolved_at)), 0),
+)
+
+
+def hour_floor(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _lock_order(row: Dict[str, Any]) -> Tuple:
+    """
+    Sort key for rollup rows written in one statement, following the unique
+    key: every writer locks buckets in this order.
+    """
+    return (
+        row["workspace_id"], str(row["bucket_start"]), row["team_id"], row["mailbox_connection_id"],
+        row["status"], row["priority"],
+    )
+
+
+def team_filter(team_id: int, mailbox_ids) -> Any:
+    """Rollup rows counted for ``team_id``: its own tickets plus team-less ones from its mailboxes."""
+    return or_(
+        TicketReportRollup.team_id == team_id,
+        and_(TicketReportRollup.team_id == 0, TicketReportRollup.mailbox_connection_id.in_(mailbox_ids)),
+    )
+
+
+class ReportRollupService:
+    def __init__(self):
+        self.incremental_flushes = 0
+        self.tickets_added = 0
+        self.tickets_removed = 0
+        self.buckets_applied = 0
+        self.hours_rebuilt = 0
+        self.backfilled_until: Optional[datetime] = None
+        self.backfill_done = False
+
+    # --- incremental maintenance (sync session events) ----------------------------
+
+    def _collect(self, session: Session, sign: int, ticket_ids: List[int]) -> None:
+        """Add ``sign`` × the current buckets of ``ticket_ids`` to the session's pending deltas."""
+        deltas: Dict[Tuple, List[int]] = session.info.setdefault(_DELTAS_KEY, {})
+        size = len(_DIMENSION_COLUMNS)
+        rows = session.connection().execute(
+            select(*_dimensions, *_measures).where(Task.id.in_(ticket_ids)).group_by(*_dimensions)
+        ).all()
+        for row in rows:
+            # bucket_start as text, so the key survives the JSON payload
+            totals = deltas.setdefault((str(row[0]), *row[1:size]), [0] * len(_MEASURE_COLUMNS))
+            for index, value in enumerate(row[size:]):
+                totals[index] += sign * int(value)
+
+    def remove(self, session: Session, ticket_ids: Iterable[int]) -> None:
+        ids = list(ticket_ids)
+        if ids:
+            self._collect(session, -1, ids)
+            self.tickets_removed += len(ids)
+
+    def add(self, session: Session, ticket_ids: Iterable[int]) -> None:
+        """Count ``ticket_ids`` in, then hand the net deltas of this step to the outbox."""
+        ids = list(ticket_ids)
+        if ids:
+            self._collect(session, 1, ids)
+            self.tickets_added += len(ids)
+        deltas: Dict[Tuple, List[int]] = session.info.pop(_DELTAS_KEY, {})
+        buckets = [[*key, *measures] for key, measures in deltas.items() if any(measures)]
+        if buckets:
+            enqueue_in_flush(session, ROLLUP_DELTA_EVENT, {"buckets": buckets})
+            self.incremental_flushes += 1
+
+    async def apply(self, db: AsyncSession, payloads: List[Dict[str, Any]]) -> int:
+        """
+        Apply the deltas of several ``reports.rollup_delta`` events, merged, in
+        one transaction. Returns how many buckets changed.
+        """
+        size = len(_DIMENSION_COLUMNS)
+        merged: Dict[Tuple, List[int]] = {}
+        for payload in payloads:
+            for bucket in payload["buckets"]:
+                totals = merged.setdefault(tuple(bucket[:size]), [0] * len(_MEASURE_COLUMNS))
+                for index, value in enumerate(bucket[size:]):
+                    totals[index] += value
+        rows = sorted(
+            (dict(zip(_ROLLUP_COLUMNS, (*key, *measures))) for key, measures in merged.items() if any(measures)),
+            key=_lock_order,
+        )
+        for offset in range(0, len(rows), REBUILD_BATCH_SIZE):
+            stmt = mysql_insert(TicketReportRollup).values(rows[offset:offset + REBUILD_BATCH_SIZE])
+            await db.execute(stmt.on_duplicate_key_update({
+                name: getattr(TicketReportRollup, name) + getattr(stmt.inserted, name) for name in _MEASURE_COLUMNS
+            }))
+        await db.commit()
+        self.buckets_applied += len(rows)
+        return len(rows)
+
+    # --- rebuilds ---------------------------------------------------------------
+
+    async def rebuild(self, db: AsyncSession, start: datetime, end: datetime) -> int:
+        """
+        Recount every bucket in ``[start, end)`` from ``tickets`` (after filling
+        in SLA timestamps older tickets lack) and write the buckets that differ. Both sides are read with plain (non-locking)
+        selects so ticket writes are never blocked; an increment racing the
+        rebuild is fixed by the next one. Returns how many buckets changed.
+        """
+        start, end = hour_floor(start), hour_floor(end)
+        await fill_sla_timestamps(db, start, end)
+        size = len(_DIMENSION_COLUMNS)
+        actual = {
+            (datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0], *row[1:size]):
+                tuple(int(value) for value in row[size:])
+            for row in (await db.execute(
+                select(*_dimensions, *_measures)
+                .where(Task.created_at >= start, Task.created_at < end)
+                .group_by(*_dimensions)
+            )).all()
+        }
+        stored = {
+            tuple(row[:size]): tuple(row[size:])
+            for row in (await db.execute(
+                select(*(getattr(TicketReportRollup, name) for name in _ROLLUP_COLUMNS))
+                .where(TicketReportRollup.bucket_start >= start, TicketReportRollup.bucket_start < end)
+            )).all()
+        }
+
+        empty = (0,) * len(_MEASURE_COLUMNS)
+        rows = sorted(
+            (
+                dict(zip(_ROLLUP_COLUMNS, (*key, *actual.get(key, empty))))
+                for key in actual.keys() | stored.keys()
+                if actual.get(key, empty) != stored.get(key, empty)
+            ),
+            key=_lock_order,
+        )
+        for offset in range(0, len(rows), REBUILD_BATCH_SIZE):
+            stmt = mysql_insert(TicketReportRollup).values(rows[offset:offset + REBUILD_BATCH_SIZE])
+            await db.execute(stmt.on_duplicate_key_update({name: getattr(stmt.inserted, name) for name in _MEASURE_COLUMNS}))
+        await db.commit()
+        self.hours_rebuilt += int((end - start).total_seconds() // 3600)
+        return len(rows)
+
+    async def backfill(self, db: AsyncSession, until: datetime, days: int) -> Optional[datetime]:
+        """
+        Rebuild up to ``days`` days of history before ``until``, one day per
+        transaction. Returns the new low watermark, or None once no older
+        ticket is left.
+        """
+        oldest = (await db.execute(select(func.min(Task.created_at)).where(Task.created_at < until))).scalar()
+        if oldest is None:
+            return None
+        stop = max(hour_floor(oldest), until - timedelta(days=days))
+        while until > stop:
+            start = max(stop, until - timedelta(days=1))
+            await self.rebuild(db, start, until)
+            until = start
+        return until
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "incremental_flushes": self.incremental_flushes,
+            "tickets_added": self.tickets_added,
+            "tickets_removed": self.tickets_removed,
+            "buckets_applied": self.buckets_applied,
+            "hours_rebuilt": self.hours_rebuilt,
+            "backfill_done": self.backfill_done,
+            "backfilled_until": self.backfilled_until.isoformat() if self.backfilled_until else None,
+        }
+
+
+report_rollups = ReportRollupService()
+
+
+# --- Session events -----------------------------------------------------------
+
+def _bucket_changed(task: Task) -> bool:
+    attrs = inspect(task).attrs
+    return any(attrs[name].history.has_changes() for name in _BUCKET_ATTRIBUTES)
+
+
+@event.listens_for(Session, "before_flush")
+def _before_flush(session: Session, flush_context, instances) -> None:
+    removed: Set[int] = set()
+    for obj in session.deleted:
+        if isinstance(obj, Task) and obj.id is not None:
+            removed.add(obj.id)
+    changed: Set[int] = set()
+    for obj in session.dirty:
+        if isinstance(obj, Task) and obj.id is not None and obj.id not in removed and _bucket_changed(obj):
+            changed.add(obj.id)
+    if removed or changed:
+        # The rows still hold their old values here
+        report_rollups.remove(session, removed | changed)
+    if changed:
+        session.info.setdefault(_CHANGED_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    added: Set[int] = session.info.pop(_CHANGED_KEY, set())
+    for obj in session.new:
+        if isinstance(obj, Task) and obj.id is not None:
+            added.add(obj.id)
+    report_rollups.add(session, added)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+    session.info.pop(_DELTAS_KEY, None)
+
+
+# --- Scheduled job --------------------------------------------------------------
+
+async def _load_watermark() -> Optional[datetime]:
+    if report_rollups.backfilled_until is not None:
+        return report_rollups.backfilled_until
+    value = await cache_service.get(BACKFILL_WATERMARK_KEY)
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def report_rollup_job():
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            # Recent buckets are where non-ORM writes (and racing rebuilds) leave drift
+            now = datetime.utcnow()
+            recent_start = now - timedelta(hours=settings.REPORT_ROLLUP_RECONCILE_HOURS)
+            corrected = await report_rollups.rebuild(db, recent_start, now + timedelta(hours=1))
+            if corrected:
+                logger.info(f"📊 Corrected {corrected} recent report rollup buckets")
+
+            if not report_rollups.backfill_done:
+                until = await _load_watermark() or hour_floor(recent_start)
+                watermark = await report_rollups.backfill(db, until, settings.REPORT_ROLLUP_BACKFILL_DAYS_PER_RUN)
+                if watermark is None:
+                    report_rollups.backfill_done = True
+                    logger.info("✅ Report rollups backfilled")
+                else:
+                    report_rollups.backfilled_until = watermark
+                    await cache_service.set(BACKFILL_WATERMARK_KEY, watermark.isoformat(), ttl=BACKFILL_WATERMARK_TTL)
+                    logger.info(f"📊 Report rollups backfilled down to {watermark.isoformat()}")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error in report rollup job: {e}", exc_info=True)
+        finally:
+            await local_engine.dispose()
@@ -0,0 +1,178 @@
+"""
+Response cache for polled ticket endpoints.
+
+Cached bodies are keyed by workspace, scope, normalised query params and a
+generation counter. Socket.IO emitters bump the generation of the workspace
+(lists, counts) or the ticket (detail, html-content) whenever they announce a
+change, so stale entries are never read again and simply expire.
+"""
+
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.core.http_cache import compute_etag, encode_json, json_response_with_etag
+from app.services.cache_service import cache_service
+from app.utils.logger import logger
+
+try:
+    import redis as sync_redis
+except ImportError:
+    sync_redis = None
+
+# Generations outlive every cached body so a bump can never be "forgotten"
+# while an entry built against the previous generation is still alive
+GENERATION_TTL = 24 * 60 * 60
+
+# Query params whose comma-separated values are order-insensitive filters
+MULTI_VALUE_PARAMS = {
+    "statuses", "assignee_ids", "priorities", "user_ids",
+    "company_ids", "category_ids", "team_ids",
+}
+
+
+def _workspace_generation_key(workspace_id: int) -> str:
+    return f"resp_gen:ws:{workspace_id}"
+
+
+def _ticket_generation_key(ticket_id: int) -> str:
+    return f"resp_gen:ticket:{ticket_id}"
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """Drop unset params and canonicalise multi-value filters."""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name in MULTI_VALUE_PARAMS and isinstance(value, str):
+            parts = sorted({part.strip() for part in value.split(",") if part.strip()})
+            if not parts:
+                continue
+            value = ",".join(parts)
+        normalized[name] = str(value)
+    return normalized
+
+
+class ResponseCache:
+    """Stores pre-encoded JSON bodies plus their ETag in the shared cache."""
+
+    def __init__(self):
+        self._sync_client = None
+        self._sync_lock = threading.Lock()
+
+    async def generation(self, workspace_id: int, ticket_id: Optional[int] = None) -> int:
+        key = _ticket_generation_key(ticket_id) if ticket_id is not None else _workspace_generation_key(workspace_id)
+        value = await cache_service.get(key)
+        return int(value or 0)
+
+    def build_key(self, scope: str, workspace_id: int, params: Dict[str, Any], generation: int) -> str:
+        return cache_service._generate_cache_key(
+            f"resp:{scope}", ws=workspace_id, gen=generation, **normalize_params(params)
+        )
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        cached = await cache_service.get(key)
+        if not cached:
+            return None
+        return cached["etag"], cached["body"].encode("utf-8")
+
+    async def set(self, key: str, etag: str, body: bytes, ttl: Optional[int] = None) -> None:
+        if len(body) > settings.RESPONSE_CACHE_MAX_BODY_BYTES:
+            return
+        await cache_service.set(
+            key,
+            {"etag": etag, "body": body.decode("utf-8")},
+            ttl=ttl or settings.RESPONSE_CACHE_TTL,
+            # Without Redis the generations restart from 0 in memory, and could
+            # match a body cached in memory before the failover
+            memory=False,
+        )
+
+    async def invalidate_workspace(self, workspace_id: int) -> None:
+        await cache_service.incr(_workspace_generation_key(workspace_id), ttl=GENERATION_TTL)
+
+    async def invalidate_ticket(self, workspace_id: int, ticket_id: Optional[int]) -> None:
+        await self.invalidate_workspace(workspace_id)
+        if ticket_id is not None:
+            await cache_service.incr(_ticket_generation_key(ticket_id), ttl=GENERATION_TTL)
+
+    async def invalidate_tickets(self, workspace_id: int, ticket_ids: Iterable[int]) -> None:
+        """Bulk changes: the workspace generation is bumped once, not once per ticket."""
+        await self.invalidate_workspace(workspace_id)
+        for ticket_id in ticket_ids:
+            await cache_service.incr(_ticket_generation_key(ticket_id), ttl=GENERATION_TTL)
+
+    def _get_sync_client(self):
+        if not settings.REDIS_URL or sync_redis is None:
+            return None
+        with self._sync_lock:
+            if self._sync_client is None:
+                self._sync_client = sync_redis.Redis.from_url(
+                    settings.REDIS_URL, decode_responses=True,
+                    socket_timeout=5, socket_connect_timeout=5
+                )
+            return self._sync_client
+
+    def _incr_sync(self, key: str) -> None:
+        client = self._get_sync_client()
+        if client is not None:
+            pipe = client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, GENERATION_TTL)
+            pipe.execute()
+            return
+        cache_service.memory_cache[key] = int(cache_service.memory_cache.get(key) or 0) + 1
+
+    def invalidate_ticket_sync(self, workspace_id: int, ticket_id: Optional[int]) -> None:
+        """Invalidate from synchronous code (email sync threads, sync emitters)."""
+        try:
+            self._incr_sync(_workspace_generation_key(workspace_id))
+            if ticket_id is not None:
+                self._incr_sync(_ticket_generation_key(ticket_id))
+        except Exception as e:
+            logger.warning(f"Response cache sync invalidation failed for workspace {workspace_id}: {e}")
+
+
+response_cache = ResponseCache()
+
+
+async def cached_json_response(
+    request: Request,
+    *,
+    scope: str,
+    workspace_id: int,
+    build: Callable[[], Awaitable[Any]],
+    params: Optional[Dict[str, Any]] = None,
+    ticket_id: Optional[int] = None,
+    ttl: Optional[int] = None,
+) -> Response:
+    """
+    Serve a JSON payload from the response cache, building and storing it on a
+    miss. Ticket-scoped entries (``ticket_id`` given) follow the ticket's
+    generation; everything else follows the workspace generation.
+    """
+    if not settings.ENABLE_RESPONSE_CACHE:
+        return json_response_with_etag(request, encode_json(await build()))
+
+    key = None
+    try:
+        generation = await response_cache.generation(workspace_id, ticket_id)
+        key = response_cache.build_key(scope, workspace_id, params or {}, generation)
+        cached = await response_cache.get(key)
+        if cached:
+            etag, body = cached
+            return json_response_with_etag(request, body, etag=etag, headers={"X-Cache": "HIT"})
+    except Exception as e:
+        logger.warning(f"Response cache lookup failed for {scope}: {e}")
+
+    body = encode_json(await build())
+    etag = compute_etag(body)
+    if key is not None:
+        try:
+            await response_cache.set(key, etag, body, ttl)
+        except Exception as e:
+            logger.warning(f"Response cache store failed for {scope}: {e}")
+    return json_response_with_etag(request, body, etag=etag, headers={"X-Cache": "MISS"})
@@ -0,0 +1,41 @@
+"""
+Throttled bulk deletes for the retention jobs.
+
+Rows are removed a small batch per transaction, each batch found with a
+plain select and deleted by primary key, so no statement holds range locks
+for long and replicas and request traffic keep up between batches.
+"""
+
+import asyncio
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+async def delete_in_batches(
+    db: AsyncSession,
+    model: Any,
+    *where: Any,
+    order_by: Any = None,
+    batch_size: int = 1000,
+    max_batches: int = 100,
+) -> int:
+    """Delete rows of ``model`` matching ``where``, oldest first. Returns how many."""
+    deleted = 0
+    for batch in range(max_batches):
+        if batch and settings.RETENTION_BATCH_PAUSE_SECONDS:
+            await asyncio.sleep(settings.RETENTION_BATCH_PAUSE_SECONDS)
+        ids = (await db.execute(
+            select(model.id).where(*where).order_by(order_by if order_by is not None else model.id).limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            break
+        await db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+        await db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+    return deleted
@@ -1,17 +1,19 @@
 import os
-import uuid
-import mimetypes
-from typing import Optional, Dict, List
-from io import BytesIO
+from typing import Any, Dict, List, Optional
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from botocore.config import Config
-from fastapi import HTTPException, UploadFile
 import logging
 
+from app.services.storage import StorageBackend
+
 logger = logging.getLogger(__name__)
 
-class S3Service:
+class S3Service(StorageBackend):
+    """S3 storage backend. Use it through ``app.services.storage.get_storage()``."""
+
+    name = "s3"
+
     def __init__(self):
         """Initialize S3 service with credentials from environment variables"""
         logger.debug("🔧 Initializing S3Service...")
@@ -72,7 +74,10 @@ class S3Service:
         except Exception as e:
             logger.error(f"❌ Error creating S3 client: {e}")
             raise
-        self._test_connection()
+        # No head_bucket probe here: credentials/bucket problems surface on the
+        # first real request instead of blocking whoever created the client.
+        # check_connection() remains available for diagnostics.
+        self.base_url = f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com"
     
     def __enter__(self):
         return self
@@ -84,7 +89,7 @@ class S3Service:
         except Exception as e:
             logger.warning(f"Error during S3Service cleanup: {e}")
     
-    def _test_connection(self):
+    def check_connection(self):
         try:
             logger.debug("🔍 Testing S3 connection...")
             self.s3_client.head_bucket(Bucket=self.bucket_name)
@@ -108,221 +113,103 @@ class S3Service:
             logger.error(error_msg)
             raise
     
-    def upload_file(
-        self, 
-        file_content: bytes, 
-        filename: str, 
-        folder: str = "", 
-        content_type: Optional[str] = None
-    ) -> str:
-        try:
-            logger.debug(f"📤 Starting S3 upload:")
-            logger.debug(f"   - Original filename: {filename}")
-            logger.debug(f"   - File size: {len(file_content)} bytes")
-            logger.debug(f"   - Folder: {folder}")
-            logger.debug(f"   - Content type: {content_type}")
-            
-            file_extension = os.path.splitext(filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            s3_key = f"{folder.rstrip('/')}/{unique_filename}" if folder else unique_filename
-            logger.debug(f"   - S3 key: {s3_key}")
+    def put_object(self, key: str, body: bytes, content_type: str) -> None:
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=body,
+            ContentType=content_type
+        )
 
-            if not content_type:
-                content_type, _ = mimetypes.guess_type(filename)
-                if not content_type:
-                    content_type = "application/octet-stream"
-            
-            logger.debug(f"   - Final content type: {content_type}")
-            
-            # Upload to S3
-            logger.debug("🚀 Uploading to S3...")
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=content_type
-            )
-            public_url = f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{s3_key}"
-            
-            logger.debug(f"✅ File uploaded successfully to S3!")
-            logger.debug(f"   - Public URL: {public_url}")
-            return public_url
-            
-        except ClientError as e:
-            error_msg = f"❌ AWS S3 ClientError: {e.response['Error']['Code']} - {e.response['Error']['Message']}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
-        except Exception as e:
-            error_msg = f"❌ Unexpected error uploading file to S3: {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
-    
-    async def upload_from_upload_file(
-        self, 
-        upload_file: UploadFile, 
-        folder: str = "",
-        max_size: int = 10 * 1024 * 1024 
-    ) -> str:
+    def get_object(self, key: str) -> Optional[bytes]:
         try:
-            logger.debug(f"📁 Processing UploadFile:")
-            logger.debug(f"   - Filename: {upload_file.filename}")
-            logger.debug(f"   - Content type: {upload_file.content_type}")
-            logger.debug(f"   - Folder: {folder}")
-            logger.debug(f"   - Max size: {max_size / 1024 / 1024:.1f}MB")
-            logger.debug("📖 Reading file content...")
-            file_content = await upload_file.read()
-            actual_size = len(file_content)
-            logger.debug(f"   - Actual file size: {actual_size} bytes ({actual_size / 1024:.1f} KB)")
-            if actual_size > max_size:
-                error_msg = f"❌ File size {actual_size / 1024 / 1024:.1f}MB exceeds maximum of {max_size / 1024 / 1024:.1f}MB"
-                logger.error(error_msg)
-                raise HTTPException(
-                    status_code=413,
-                    detail=error_msg
-                )
-            return self.upload_file(
-                file_content=file_content,
-                filename=upload_file.filename or "unnamed_file",
-                folder=folder,
-                content_type=upload_file.content_type
-            )
-            
-        except HTTPException:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
             raise
-        except Exception as e:
-            error_msg = f"❌ Error processing upload file: {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
-    
-    def upload_html_content(self, html_content: str, filename: str, folder: str = "conversations") -> str:
-        try:
-            logger.debug(f"📄 Uploading HTML content:")
-            logger.debug(f"   - Filename: {filename}")
-            logger.debug(f"   - Content length: {len(html_content)} characters")
-            logger.debug(f"   - Folder: {folder}")
-            html_bytes = html_content.encode('utf-8')
-            if not filename.endswith('.html'):
-                filename += '.html'
-            
-            return self.upload_file(
-                file_content=html_bytes,
-                filename=filename,
-                folder=folder,
-                content_type="text/html; charset=utf-8"
+        return response['Body'].read()
+
+    def delete_object(self, key: str) -> None:
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def list_objects(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        # A single call returns at most 1000 keys
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        objects = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, PaginationConfig={'MaxItems': limit}):
+            objects.extend(
+                {'key': obj['Key'], 'size': obj['Size'], 'last_modified': obj['LastModified']}
+                for obj in page.get('Contents', [])
             )
-            
-        except Exception as e:
-            error_msg = f"❌ Error uploading HTML content: {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
-    
-    def delete_file(self, s3_key: str) -> bool:
-        try:
-            logger.debug(f"🗑️ Deleting file from S3: {s3_key}")
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
-            logger.debug(f"✅ Successfully deleted file from S3: {s3_key}")
-            return True
-        except ClientError as e:
-            logger.error(f"❌ Error deleting file from S3: {e}")
-            return False
-    
+        return objects[:limit]
+
     def get_file_url(self, s3_key: str) -> str:
-        return f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/{s3_key}"
-    
-    def list_files(self, folder: str = "", limit: int = 100) -> List[Dict]:
+        return f"{self.base_url}/{s3_key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.base_url}/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+    # --- direct (presigned) transfers ---
+
+    supports_direct_upload = True
+
+    def head_object(self, key: str) -> Optional[Dict[str, Any]]:
         try:
-            logger.debug(f"📋 Listing files in S3:")
-            logger.debug(f"   - Folder: {folder}")
-            logger.debug(f"   - Limit: {limit}")
-            
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=folder,
-                MaxKeys=limit
-            )
-            
-            files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    files.append({
-                        'key': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat(),
-                        'url': self.get_file_url(obj['Key'])
-                    })
-            
-            logger.debug(f"✅ Found {len(files)} files in S3")
-            return files
-            
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
         except ClientError as e:
-            error_msg = f"❌ Error listing files from S3: {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
-    
-    def should_store_html_in_s3(self, html_content: str) -> bool:
-        if not html_content:
-            logger.debug("📝 Empty content - skipping S3")
-            return False
-        content_length = len(html_content)
-        logger.debug(f"📤 Content length: {content_length} chars - ALWAYS storing in S3")
-        return True
-    
-    def store_comment_html(self, comment_id: int, html_content: str) -> str:
-        try:
-            logger.debug(f"📄 Storing comment {comment_id} HTML in S3")
-            filename = f"comment-{comment_id}.html"
-            s3_url = self.upload_html_content(
-                html_content=html_content,
-                filename=filename,
-                folder="comments"
-            )
-            
-            logger.debug(f"✅ Comment {comment_id} HTML stored in S3: {s3_url}")
-            return s3_url
-            
-        except Exception as e:
-            logger.error(f"❌ Error storing comment {comment_id} HTML in S3: {str(e)}")
-            raise
-    
-    def get_comment_html(self, s3_url: str) -> Optional[str]:
-        try:
-            logger.debug(f"📥 Fast retrieving comment HTML from S3: {s3_url}")
-            file_content = self._download_file_from_s3(s3_url)
-            if not file_content:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
                 return None
-            html_content = file_content.decode('utf-8')
-            logger.debug(f"✅ Fast retrieved {len(html_content)} characters from S3")
-            return html_content
-            
-        except Exception as e:
-            logger.error(f"❌ Error retrieving comment HTML from S3: {str(e)}")
-            return None
+            raise
+        return {'size': response['ContentLength'], 'content_type': response.get('ContentType')}
 
-    def _download_file_from_s3(self, s3_url: str) -> Optional[bytes]:
-        try:
-            if not s3_url.startswith(f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/"):
-                logger.error(f"❌ Invalid S3 URL format: {s3_url}")
-                return None
-                
-            s3_key = s3_url.replace(f"https://{self.bucket_name}.s3.{self.aws_region}.amazonaws.com/", "")
-            logger.debug(f"📥 Fast downloading file from S3: {s3_key}")
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
-            file_content = response['Body'].read()
-            
-            logger.debug(f"✅ Fast downloaded {len(file_content)} bytes from S3")
-            return file_content
-            
-        except ClientError as e:
-            logger.error(f"❌ Error downloading file from S3: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"❌ Unexpected error downloading file from S3: {e}")
-            return None
-s3_service = None
+    def generate_presigned_get(self, key: str, expires_in: int, content_disposition: Optional[str] = None) -> str:
+        params = {'Bucket': self.bucket_name, 'Key': key}
+        if content_disposition:
+            params['ResponseContentDisposition'] = content_disposition
+        return self.s3_client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+
+    def generate_presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        return self.s3_client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size],
+            ],
+            ExpiresIn=expires_in
+        )
+
+    def create_multipart_upload(self, key: str, content_type: str) -> str:
+        response = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=key,
+            ContentType=content_type
+        )
+        return response['UploadId']
+
+    def generate_presigned_part_urls(self, key: str, upload_id: str, part_count: int, expires_in: int) -> List[str]:
+        return [
+            self.s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': self.bucket_name, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+                ExpiresIn=expires_in
+            )
+            for part_number in range(1, part_count + 1)
+        ]
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                for part in sorted(parts, key=lambda part: part['part_number'])
+            ]}
+        )
 
-def get_s3_service() -> S3Service:
-    global s3_service
-    if s3_service is None:
-        logger.debug("🏗️ Creating new S3Service instance...")
-        s3_service = S3Service()
-    return s3_service 
\ No newline at end of file
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
@@ -15,6 +15,8 @@ from app.models.agent import Agent as AgentModel
 from app.models.user import User
 from app.utils.logger import logger
 from app.services.microsoft_service import get_microsoft_service
+from app.services.comment_html_hydrator import extract_s3_url
+from app.services.storage import get_storage
 
 
 async def get_content_from_s3_if_needed(content: str, scheduled_comment_id: int) -> str:
@@ -34,27 +36,18 @@ async def get_content_from_s3_if_needed(content: str, scheduled_comment_id: int)
     
     logger.info(f"🔍 Content for scheduled comment {scheduled_comment_id} is migrated to S3, extracting...")
 
-    import re
-    s3_url_match = re.search(r'https://[^\s]+\.html', content)
-    if not s3_url_match:
+    s3_url = extract_s3_url(content)
+    if not s3_url:
         logger.warning(f"⚠️ No S3 URL found in migrated content for scheduled comment {scheduled_comment_id}")
         logger.warning(f"   Content: {content[:200]}...")  # Log first 200 chars for debugging
         return content
     
-    s3_url = s3_url_match.group()
-    try:
-        import httpx
-        async with httpx.AsyncClient() as client:
-            response = await client.get(s3_url)
-            if response.status_code == 200:
-                logger.info(f"✅ Retrieved content from S3 for scheduled comment {scheduled_comment_id}")
-                return response.text
-            else:
-                logger.warning(f"⚠️ Failed to retrieve S3 content for scheduled comment {scheduled_comment_id}: {response.status_code}")
-                return content
-    except Exception as s3_error:
-        logger.error(f"❌ Error retrieving S3 content for scheduled comment {scheduled_comment_id}: {str(s3_error)}")
+    html_content = await get_storage().get_comment_html(s3_url)
+    if html_content is None:
+        logger.warning(f"⚠️ Failed to retrieve S3 content for scheduled comment {scheduled_comment_id}")
         return content
+    logger.info(f"✅ Retrieved content from S3 for scheduled comment {scheduled_comment_id}")
+    return html_content
 
 
 async def send_scheduled_comment(scheduled_comment_id: int, db: Session) -> Dict[str, Any]:
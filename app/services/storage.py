@@ -0,0 +1,411 @@
+"""
+Object storage abstraction.
+
+``StorageBackend`` holds the blocking primitives of an object store (S3 in
+production, the local filesystem for tests and development) plus the helpers
+built on top of them. ``AsyncStorage`` wraps a backend for use from async
+code: every call runs on a dedicated thread pool whose size bounds the number
+of concurrent object-store requests, so storage latency never blocks the
+event loop.
+
+Async code uses ``get_storage()``; code that already runs on a worker thread
+(sync endpoints, background threads) may call ``get_storage_backend()``
+directly.
+"""
+
+import abc
+import asyncio
+import mimetypes
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.utils.logger import logger
+
+
+class StorageBackend(abc.ABC):
+    """Blocking object-store primitives shared by every backend."""
+
+    name = "base"
+
+    # --- primitives, implemented by each backend ---
+
+    @abc.abstractmethod
+    def put_object(self, key: str, body: bytes, content_type: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_object(self, key: str) -> Optional[bytes]:
+        """Return the object body, or None if it does not exist."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_object(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_objects(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Return ``{"key", "size", "last_modified"}`` dicts, at most ``limit``."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_file_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Return the object key of a URL produced by this backend, else None."""
+        raise NotImplementedError
+
+    # --- direct (presigned) transfers; every backend serves downloads, only
+    # backends with supports_direct_upload implement the upload half ---
+
+    supports_direct_upload = False
+
+    @abc.abstractmethod
+    def head_object(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return ``{"size", "content_type"}`` for an object, or None if it does not exist."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def generate_presigned_get(self, key: str, expires_in: int, content_disposition: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+    def generate_presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        """Return ``{"url", "fields"}`` for a browser form POST straight to the store."""
+        raise NotImplementedError
+
+    def create_multipart_upload(self, key: str, content_type: str) -> str:
+        """Start a multipart upload and return its upload id."""
+        raise NotImplementedError
+
+    def generate_presigned_part_urls(self, key: str, upload_id: str, part_count: int, expires_in: int) -> List[str]:
+        """Presigned PUT URLs for parts 1..part_count."""
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        """``parts`` are ``{"part_number", "etag"}`` dicts as reported by the client."""
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        raise NotImplementedError
+
+    # --- helpers ---
+
+    def upload_file(
+        self,
+        file_content: bytes,
+        filename: str,
+        folder: str = "",
+        content_type: Optional[str] = None
+    ) -> str:
+        try:
+            file_extension = os.path.splitext(filename)[1]
+            unique_filename = f"{uuid.uuid4()}{file_extension}"
+            key = f"{folder.rstrip('/')}/{unique_filename}" if folder else unique_filename
+
+            if not content_type:
+                content_type, _ = mimetypes.guess_type(filename)
+                if not content_type:
+                    content_type = "application/octet-stream"
+
+            logger.debug(f"📤 Uploading {len(file_content)} bytes to {self.name}: {key} ({content_type})")
+            self.put_object(key, file_content, content_type)
+            return self.get_file_url(key)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error uploading file to {self.name}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+
+    def upload_html_content(self, html_content: str, filename: str, folder: str = "conversations") -> str:
+        if not filename.endswith('.html'):
+            filename += '.html'
+        return self.upload_file(
+            file_content=html_content.encode('utf-8'),
+            filename=filename,
+            folder=folder,
+            content_type="text/html; charset=utf-8"
+        )
+
+    def should_store_html_in_s3(self, html_content: str) -> bool:
+        # All non-empty comment HTML lives in object storage
+        return bool(html_content)
+
+    def store_comment_html(self, comment_id: int, html_content: str) -> str:
+        try:
+            return self.upload_html_content(
+                html_content=html_content,
+                filename=f"comment-{comment_id}.html",
+                folder="comments"
+            )
+        except Exception as e:
+            logger.error(f"❌ Error storing comment {comment_id} HTML in {self.name}: {str(e)}")
+            raise
+
+    def download_file(self, url: str) -> Optional[bytes]:
+        key = self.key_from_url(url)
+        if key is None:
+            logger.error(f"❌ Invalid {self.name} URL format: {url}")
+            return None
+        try:
+            return self.get_object(key)
+        except Exception as e:
+            logger.error(f"❌ Error downloading file from {self.name}: {e}")
+            return None
+
+    def get_comment_html(self, url: str) -> Optional[str]:
+        file_content = self.download_file(url)
+        if not file_content:
+            return None
+        try:
+            return file_content.decode('utf-8')
+        except UnicodeDecodeError as e:
+            logger.error(f"❌ Error decoding comment HTML from {self.name}: {str(e)}")
+            return None
+
+    def delete_file(self, key: str) -> bool:
+        try:
+            self.delete_object(key)
+            logger.debug(f"🗑️ Deleted file from {self.name}: {key}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error deleting file from {self.name}: {e}")
+            return False
+
+    def list_files(self, folder: str = "", limit: int = 100) -> List[Dict]:
+        try:
+            return [
+                {
+                    'key': obj['key'],
+                    'size': obj['size'],
+                    'last_modified': obj['last_modified'].isoformat(),
+                    'url': self.get_file_url(obj['key'])
+                }
+                for obj in self.list_objects(folder, limit)
+            ]
+        except Exception as e:
+            error_msg = f"❌ Error listing files from {self.name}: {str(e)}"
+            logger.error(error_msg)
+            raise HTTPException(status_code=500, detail=error_msg)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Filesystem backend for tests and local development."""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.base_url = (base_url or f"file://{self.root}").rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put_object(self, key: str, body: bytes, content_type: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def get_object(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete_object(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list_objects(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        objects = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if key.startswith(prefix) and not key.endswith(".tmp"):
+                    stat = os.stat(path)
+                    objects.append({
+                        "key": key,
+                        "size": stat.st_size,
+                        "last_modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                    })
+        objects.sort(key=lambda obj: obj["key"])
+        return objects[:limit]
+
+    def get_file_url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = f"{self.base_url}/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+    def head_object(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            size = os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            return None
+        content_type, _ = mimetypes.guess_type(key)
+        return {"size": size, "content_type": content_type or "application/octet-stream"}
+
+    def generate_presigned_get(self, key: str, expires_in: int, content_disposition: Optional[str] = None) -> str:
+        # Nothing to sign on the filesystem
+        return self.get_file_url(key)
+
+
+class AsyncStorage:
+    """
+    Async facade over a ``StorageBackend``. Calls run on a dedicated thread
+    pool of ``max_workers`` threads, which is also the cap on concurrent
+    object-store requests from the event loop.
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def get_file_url(self, key: str) -> str:
+        return self.backend.get_file_url(key)
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        return self.backend.key_from_url(url)
+
+    def should_store_html_in_s3(self, html_content: str) -> bool:
+        return self.backend.should_store_html_in_s3(html_content)
+
+    async def put_object(self, key: str, body: bytes, content_type: str) -> None:
+        await self._run(self.backend.put_object, key, body, content_type)
+
+    async def get_object(self, key: str) -> Optional[bytes]:
+        return await self._run(self.backend.get_object, key)
+
+    async def delete_object(self, key: str) -> None:
+        await self._run(self.backend.delete_object, key)
+
+    async def upload_file(
+        self,
+        file_content: bytes,
+        filename: str,
+        folder: str = "",
+        content_type: Optional[str] = None
+    ) -> str:
+        return await self._run(self.backend.upload_file, file_content, filename, folder, content_type)
+
+    async def upload_html_content(self, html_content: str, filename: str, folder: str = "conversations") -> str:
+        return await self._run(self.backend.upload_html_content, html_content, filename, folder)
+
+    async def store_comment_html(self, comment_id: int, html_content: str) -> str:
+        return await self._run(self.backend.store_comment_html, comment_id, html_content)
+
+    async def download_file(self, url: str) -> Optional[bytes]:
+        return await self._run(self.backend.download_file, url)
+
+    async def get_comment_html(self, url: str) -> Optional[str]:
+        return await self._run(self.backend.get_comment_html, url)
+
+    async def delete_file(self, key: str) -> bool:
+        return await self._run(self.backend.delete_file, key)
+
+    async def list_files(self, folder: str = "", limit: int = 100) -> List[Dict]:
+        return await self._run(self.backend.list_files, folder, limit)
+
+    @property
+    def supports_direct_upload(self) -> bool:
+        return self.backend.supports_direct_upload
+
+    def generate_presigned_get(self, key: str, expires_in: int, content_disposition: Optional[str] = None) -> str:
+        # Presigning is a local signature computation, no request is made
+        return self.backend.generate_presigned_get(key, expires_in, content_disposition)
+
+    def generate_presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        return self.backend.generate_presigned_post(key, content_type, max_size, expires_in)
+
+    def generate_presigned_part_urls(self, key: str, upload_id: str, part_count: int, expires_in: int) -> List[str]:
+        return self.backend.generate_presigned_part_urls(key, upload_id, part_count, expires_in)
+
+    async def head_object(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.backend.head_object, key)
+
+    async def create_multipart_upload(self, key: str, content_type: str) -> str:
+        return await self._run(self.backend.create_multipart_upload, key, content_type)
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> None:
+        await self._run(self.backend.complete_multipart_upload, key, upload_id, parts)
+
+    async def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        await self._run(self.backend.abort_multipart_upload, key, upload_id)
+
+    async def read_upload(self, upload_file: UploadFile, max_size: int) -> bytes:
+        """Read an UploadFile, rejecting it with 413 once it exceeds ``max_size``."""
+        file_content = await upload_file.read(max_size + 1)
+        if len(file_content) > max_size:
+            error_msg = f"❌ File size exceeds maximum of {max_size / 1024 / 1024:.1f}MB"
+            logger.error(error_msg)
+            raise HTTPException(status_code=413, detail=error_msg)
+        return file_content
+
+    async def upload_from_upload_file(
+        self,
+        upload_file: UploadFile,
+        folder: str = "",
+        max_size: int = 10 * 1024 * 1024
+    ) -> str:
+        try:
+            file_content = await self.read_upload(upload_file, max_size)
+            return await self.upload_file(
+                file_content=file_content,
+                filename=upload_file.filename or "unnamed_file",
+                folder=folder,
+                content_type=upload_file.content_type
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            error_msg = f"❌ Error processing upload file: {str(e)}"
+            logger.error(error_msg)
+            raise HTTPException(status_code=500, detail=error_msg)
+
+
+_backend: Optional[StorageBackend] = None
+_storage: Optional[AsyncStorage] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """Blocking backend; only for code that is already off the event loop."""
+    global _backend
+    if _backend is None:
+        if settings.STORAGE_BACKEND == "local":
+            _backend = LocalStorageBackend(settings.LOCAL_STORAGE_PATH, settings.LOCAL_STORAGE_BASE_URL)
+        else:
+            from app.services.s3_service import S3Service
+            _backend = S3Service()
+        logger.info(f"🗄️ Storage backend: {_backend.name}")
+    return _backend
+
+
+def get_storage() -> AsyncStorage:
+    global _storage
+    if _storage is None:
+        _storage = AsyncStorage(get_storage_backend(), max_workers=settings.STORAGE_MAX_CONCURRENCY)
+    return _storage
@@ -0,0 +1,60 @@
+"""
+Precompiled encoders for ticket list responses.
+
+The list endpoints start from ``select_task_list()``, which projects only the
+columns of ``app.schemas.task.TicketListItem`` (no description, no recipient
+lists) and pulls the assignee/contact/team/category names through outer joins
+instead of loading the related entities. The Row tuples are encoded directly
+with orjson; ``benchmarks/bench_task_serialization.py`` checks the bytes
+against the Pydantic path.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app.core.serialization import RowEncoder
+from app.models.agent import Agent
+from app.models.category import Category
+from app.models.task import Task
+from app.models.team import Team
+from app.models.user import User
+from app.schemas.task import TicketListItem
+
+# Aliased so the endpoints can still join Agent/User themselves for filtering
+ListAssignee = aliased(Agent, name="list_assignee")
+ListContact = aliased(User, name="list_contact")
+ListTeam = aliased(Team, name="list_team")
+ListCategory = aliased(Category, name="list_category")
+
+# The list views never load the email mappings or merge details, so these
+# always serialise as their defaults
+TASK_LIST_CONSTANTS = {
+    "is_from_email": False,
+    "email_info": None,
+    "merge_info": None,
+}
+
+TASK_LIST_ENCODER = RowEncoder(
+    TicketListItem,
+    Task,
+    constants=TASK_LIST_CONSTANTS,
+    column_overrides={
+        "assignee_name": ListAssignee.name,
+        "user_name": ListContact.name,
+        "user_email": ListContact.email,
+        "team_name": ListTeam.name,
+        "category_name": ListCategory.name,
+    },
+)
+
+
+def select_task_list():
+    """Base SELECT for ticket list views; add filters, ordering and paging on top."""
+    return (
+        select(*TASK_LIST_ENCODER.columns)
+        .select_from(Task)
+        .outerjoin(ListAssignee, Task.assignee_id == ListAssignee.id)
+        .outerjoin(ListContact, Task.user_id == ListContact.id)
+        .outerjoin(ListTeam, Task.team_id == ListTeam.id)
+        .outerjoin(ListCategory, Task.category_id == ListCategory.id)
+    )
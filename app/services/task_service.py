@@ -3,14 +3,13 @@ from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from sqlalchemy.future import select
+from sqlalchemy import case, insert, null, update
 from datetime import datetime
-import threading
 import re
-import asyncio
-import logging
 from uuid import UUID
 
 from app.models.task import Task, TicketBody
+from app.models.ticket_event import TicketEvent
 from app.models.microsoft import EmailTicketMapping
 from app.schemas.task import TicketCreate, TicketUpdate
 from app.schemas.microsoft import EmailInfo
@@ -18,22 +17,11 @@ from app.utils.logger import logger, log_important
 from app.database.session import AsyncSessionLocal, get_background_db_session
 from app.core.exceptions import DatabaseException, MicrosoftAPIException
 from app.models.agent import Agent
-from app.models.microsoft import MailboxConnection, MicrosoftToken
 from app.core.config import settings
-from app.services.email_service import send_ticket_assignment_email, send_team_ticket_notification_email
-from app.services.microsoft_service import MicrosoftGraphService
-
-
-def _run_async_in_new_loop(coro_func, *args):
-    """
-    Wrapper to run a coroutine in a new thread with its own event loop.
-    This is a synchronous function intended to be the target of a threading.Thread.
-    """
-    try:
-        asyncio.run(coro_func(*args))
-    except Exception as e:
-        # Using a generic logger as this is a top-level function
-        logging.getLogger(__name__).error(f"Error in background task {coro_func.__name__}: {e}", exc_info=True)
+from app.services.email_service import send_ticket_assignment_email, send_team_ticket_notification_emails, send_ticket_digest_emails
+from app.services.outbox import enqueue
+from app.services.report_rollups import report_rollups
+from app.services.ticket_lifecycle import CLOSED, status_event_type
 
 
 async def get_tasks(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Task]:
@@ -148,35 +136,28 @@ async def update_task(db: AsyncSession, task_id: int, task_in: TicketUpdate, req
     for field, value in update_data.items():
         setattr(task, field, value)
 
-    # ✅ OPTIMIZACIÓN: Commit inmediato para respuesta rápida
+    # Workflows, notifications and the Socket.IO update are published by the
+    # outbox relay once this commit lands; each is its own event, so a failed
+    # email is retried without running the workflows again
+    enqueue(db, "ticket.updated", {
+        "ticket_id": task_id,
+        "old_assignee_id": old_assignee_id,
+        "old_status": getattr(old_status, "value", old_status),
+        "old_priority": getattr(old_priority, "value", old_priority),
+        "changed_fields": list(update_data),
+    }, workspace_id=task.workspace_id)
+    if 'assignee_id' in update_data and old_assignee_id != task.assignee_id and task.assignee_id is not None:
+        enqueue(db, "notification.ticket_assigned", {"ticket_id": task_id, "request_origin": request_origin}, workspace_id=task.workspace_id)
+    if ('team_id' in update_data or 'assignee_id' in update_data) and task.team_id and not task.assignee_id:
+        enqueue(db, "notification.team_ticket", {"ticket_id": task_id, "request_origin": request_origin}, workspace_id=task.workspace_id)
+    if 'status' in update_data and old_status != task.status and task.status == 'Closed':
+        enqueue(db, "notification.ticket_closed", {"ticket_id": task_id}, workspace_id=task.workspace_id)
+    enqueue(db, "socketio.ticket_updated", {"ticket_id": task_id}, workspace_id=task.workspace_id)
+
     await db.commit()
     await db.refresh(task)
     await db.refresh(task, attribute_names=['user', 'assignee', 'sent_from', 'sent_to', 'team', 'company', 'workspace', 'body', 'category']) 
     
-    # ✅ OPTIMIZACIÓN: Ejecutar procesos pesados en background usando threading.Thread
-    try:
-        # Ejecutar workflows en un hilo separado
-        threading.Thread(target=_run_async_in_new_loop, args=(_execute_workflows_thread, task_id, task.workspace_id, old_assignee_id, old_status, old_priority, update_data)).start()
-
-        # Las notificaciones también pueden ser pesadas, las movemos a hilos
-        if 'assignee_id' in update_data and old_assignee_id != task.assignee_id and task.assignee_id is not None:
-            threading.Thread(target=_run_async_in_new_loop, args=(_send_assignment_notification_thread, task_id, request_origin)).start()
-        
-        if ('team_id' in update_data or 'assignee_id' in update_data) and task.team_id and not task.assignee_id:
-            threading.Thread(target=_run_async_in_new_loop, args=(_send_team_notification_thread, task_id, request_origin)).start()
-        
-        if 'status' in update_data and old_status != task.status and task.status == 'Closed':
-            threading.Thread(target=_run_async_in_new_loop, args=(_send_closure_notification_thread, task_id)).start()
-            
-        logger.info(f"🚀 Background workflow processes queued for ticket {task_id}")
-            
-    except Exception as e:
-        logger.error(
-            f"Error starting background processes for ticket {task_id}: {e}",
-            extra={"task_id": task_id},
-            exc_info=True
-        )
-    
     # ✅ RESPUESTA RÁPIDA: Procesar solo la información esencial para la respuesta
     stmt = select(EmailTicketMapping).filter(EmailTicketMapping.ticket_id == task.id)
     result = await db.execute(stmt)
@@ -200,125 +181,78 @@ async def update_task(db: AsyncSession, task_id: int, task_in: TicketUpdate, req
     return task_dict
 
 
-async def _execute_workflows_thread(task_id: int, workspace_id: int, old_assignee_id, old_status, old_priority, update_data):
-    """Ejecutar workflows en background"""
-    try:
-        from app.services.workflow_service import WorkflowService
-        async with get_background_db_session() as background_db:
-            stmt = select(Task).filter(Task.id == task_id)
-            result = await background_db.execute(stmt)
-            task = result.scalars().first()
-            if not task:
-                return
-                
-            context = {'ticket': task, 'old_values': {'assignee_id': old_assignee_id, 'status': old_status, 'priority': old_priority}}
-            executed_workflows = []
-            
-            # Execute workflows for ticket updates
-            executed_workflows.extend(await WorkflowService.execute_workflows(
-                db=background_db, trigger='ticket.updated', workspace_id=workspace_id, context=context
-            ))
-            if 'status' in update_data and old_status != task.status:
-                executed_workflows.extend(await WorkflowService.execute_workflows(
-                    db=background_db, trigger='ticket.status_changed', workspace_id=workspace_id, context=context
-                ))
-            if 'priority' in update_data and old_priority != task.priority:
-                executed_workflows.extend(await WorkflowService.execute_workflows(
-                    db=background_db, trigger='ticket.priority_changed', workspace_id=workspace_id, context=context
-                ))
-            if 'assignee_id' in update_data:
-                if old_assignee_id != task.assignee_id:
-                    if task.assignee_id is not None:
-                        executed_workflows.extend(await WorkflowService.execute_workflows(
-                            db=background_db, trigger='ticket.assigned', workspace_id=workspace_id, context=context
-                        ))
-                    else:
-                        executed_workflows.extend(await WorkflowService.execute_workflows(
-                            db=background_db, trigger='ticket.unassigned', workspace_id=workspace_id, context=context
-                        ))
-            
-            if executed_workflows:
-                logger.info(f"✅ Background workflows executed for ticket {task_id}: {executed_workflows}")
-                await background_db.commit()
-                
-    except Exception as e:
-        logger.error(
-            f"Error in background workflows for ticket {task_id}: {e}",
-            extra={"task_id": task_id, "workspace_id": workspace_id},
-            exc_info=True
+async def run_ticket_update_side_effects(payload: Dict[str, Any]):
+    """Workflows of a ticket update (a ``ticket.updated`` outbox event); errors propagate so the event is retried."""
+    async with AsyncSessionLocal() as db:
+        await execute_ticket_update_workflows(
+            db, payload["ticket_id"], payload["old_assignee_id"], payload["old_status"], payload["old_priority"],
+            dict.fromkeys(payload["changed_fields"])
         )
 
 
-async def _send_closure_notification_thread(task_id: int):
-    """Enviar notificación de cierre en background"""
-    try:
-        from app.services.notification_service import send_notification
-        async with get_background_db_session() as background_db:
-            stmt = select(Task).options(joinedload(Task.user)).filter(Task.id == task_id)
-            result = await background_db.execute(stmt)
-            task_with_user = result.scalars().first()
-            
-            if task_with_user and task_with_user.user and task_with_user.user.email:
-                template_vars = {
-                    "user_name": task_with_user.user.name,
-                    "ticket_id": task_with_user.id,
-                    "ticket_title": task_with_user.title
-                }
-                await send_notification(
-                    db=background_db,
-                    workspace_id=task_with_user.workspace_id,
-                    category="users",
-                    notification_type="ticket_closed",
-                    recipient_email=task_with_user.user.email,
-                    recipient_name=task_with_user.user.name,
-                    template_vars=template_vars,
-                    task_id=task_with_user.id
-                )
-                logger.info(f"✅ Background notification sent for closed ticket {task_id} to user {task_with_user.user.name}")
-    except Exception as e:
-        logger.error(
-            f"Error sending background closure notification for ticket {task_id}: {e}",
-            extra={"task_id": task_id},
-            exc_info=True
-        )
+async def execute_ticket_update_workflows(db: AsyncSession, task_id: int, old_assignee_id, old_status, old_priority, update_data):
+    """Ejecutar los workflows de una actualización de ticket"""
+    from app.services.workflow_service import WorkflowService
+    task = (await db.execute(select(Task).filter(Task.id == task_id))).scalars().first()
+    if not task:
+        return
+    workspace_id = task.workspace_id
+
+    context = {'ticket': task, 'old_values': {'assignee_id': old_assignee_id, 'status': old_status, 'priority': old_priority}}
+    executed_workflows = []
+
+    # Execute workflows for ticket updates
+    executed_workflows.extend(await WorkflowService.execute_workflows(
+        db=db, trigger='ticket.updated', workspace_id=workspace_id, context=context
+    ))
+    if 'status' in update_data and old_status != task.status:
+        executed_workflows.extend(await WorkflowService.execute_workflows(
+            db=db, trigger='ticket.status_changed', workspace_id=workspace_id, context=context
+        ))
+    if 'priority' in update_data and old_priority != task.priority:
+        executed_workflows.extend(await WorkflowService.execute_workflows(
+            db=db, trigger='ticket.priority_changed', workspace_id=workspace_id, context=context
+        ))
+    if 'assignee_id' in update_data and old_assignee_id != task.assignee_id:
+        trigger = 'ticket.assigned' if task.assignee_id is not None else 'ticket.unassigned'
+        executed_workflows.extend(await WorkflowService.execute_workflows(
+            db=db, trigger=trigger, workspace_id=workspace_id, context=context
+        ))
+
+    if executed_workflows:
+        logger.info(f"✅ Background workflows executed for ticket {task_id}: {executed_workflows}")
+        await db.commit()
 
 
-async def _send_assignment_notification_thread(task_id: int, request_origin: Optional[str] = None):
-    """Enviar notificación de asignación en background"""
+async def _execute_workflows_thread(task_id: int, workspace_id: int, old_assignee_id, old_status, old_priority, update_data):
+    """Ejecutar workflows en background"""
     try:
         async with get_background_db_session() as background_db:
-            stmt = select(Task).options(joinedload(Task.assignee)).filter(Task.id == task_id)
-            result = await background_db.execute(stmt)
-            task = result.scalars().first()
-            if not task:
-                return
-            await send_assignment_notification(background_db, task, request_origin)
-            logger.info(f"✅ Background assignment notification sent for ticket {task_id}")
+            await execute_ticket_update_workflows(background_db, task_id, old_assignee_id, old_status, old_priority, update_data)
     except Exception as e:
         logger.error(
-            f"Error sending background assignment notification for ticket {task_id}: {e}",
-            extra={"task_id": task_id},
+            f"Error in background workflows for ticket {task_id}: {e}",
+            extra={"task_id": task_id, "workspace_id": workspace_id},
             exc_info=True
         )
 
 
-async def _send_team_notification_thread(task_id: int, request_origin: Optional[str] = None):
-    """Enviar notificación de equipo en background"""
-    try:
-        async with get_background_db_session() as background_db:
-            stmt = select(Task).filter(Task.id == task_id)
-            result = await background_db.execute(stmt)
-            task = result.scalars().first()
-            if not task:
-                return
-            await send_team_notification(background_db, task, request_origin)
-            logger.info(f"✅ Background team notification sent for ticket {task_id}")
-    except Exception as e:
-        logger.error(
-            f"Error sending background team notification for ticket {task_id}: {e}",
-            extra={"task_id": task_id},
-            exc_info=True
-        )
+async def deliver_closure_notification(db: AsyncSession, task_id: int):
+    """Notify a closed ticket's contact; errors propagate so the outbox retries."""
+    from app.services.notification_service import NotificationRecipient, deliver_notifications
+    task = (await db.execute(select(Task).options(joinedload(Task.user)).filter(Task.id == task_id))).scalars().first()
+    if not task or not task.user or not task.user.email:
+        return
+    await deliver_notifications(
+        db, task.workspace_id, "users", "ticket_closed",
+        [NotificationRecipient(task.user.email, task.user.name, {
+            "user_name": task.user.name,
+            "ticket_id": task.id,
+            "ticket_title": task.title
+        })],
+        task_id=task.id
+    )
+    logger.info(f"✅ Background notification sent for closed ticket {task_id} to user {task.user.name}")
 
 
 async def delete_task(db: AsyncSession, task_id: int) -> Optional[Task]:
@@ -337,6 +271,162 @@ async def delete_task(db: AsyncSession, task_id: int) -> Optional[Task]:
     return task
 
 
+# Ticket columns that decide a ticket's report rollup bucket
+_ROLLUP_FIELDS = {"team_id", "status", "priority", "resolved_at"}
+
+
+async def bulk_update_tasks(
+    db: AsyncSession, workspace_id: int, ticket_ids: List[int], update_data: Dict[str, Any],
+    request_origin: Optional[str] = None
+) -> List[int]:
+    """
+    Apply one change set to many tickets of a workspace in a single
+    transaction: the rows are locked in id order (so concurrent bulk updates
+    cannot deadlock), written with one ``UPDATE``, and their workflows,
+    notifications and Socket.IO updates queued as outbox events, one per
+    effect. Bulk writes bypass the ORM hooks, so the status events,
+    ``resolved_at`` and report rollups are kept here. Returns the ids of the
+    tickets that changed.
+    """
+    update_data = {field: getattr(value, "value", value) for field, value in update_data.items()}
+    rows = (await db.execute(
+        select(Task.id, Task.assignee_id, Task.status, Task.priority, Task.team_id)
+        .filter(Task.id.in_(ticket_ids), Task.workspace_id == workspace_id, Task.is_deleted == False)
+        .order_by(Task.id)
+        .with_for_update()
+    )).all()
+    changed = [row for row in rows if any(getattr(row, field) != value for field, value in update_data.items())]
+    if not changed:
+        await db.rollback()
+        return []
+
+    ids = [row.id for row in changed]
+    now = datetime.utcnow()
+    values = dict(update_data)
+    new_status = update_data.get("status")
+    status_changed = [row for row in changed if new_status is not None and row.status != new_status]
+    if status_changed:
+        values["resolved_at"] = case(
+            (Task.id.in_([row.id for row in status_changed]), now if new_status == CLOSED else null()),
+            else_=Task.resolved_at,
+        )
+
+    moves_buckets = bool(_ROLLUP_FIELDS & set(values))
+    if moves_buckets:
+        # The rows still hold their old values here
+        await db.run_sync(lambda session: report_rollups.remove(session, ids))
+    await db.execute(update(Task).where(Task.id.in_(ids)).values(**values).execution_options(synchronize_session=False))
+    if moves_buckets:
+        await db.run_sync(lambda session: report_rollups.add(session, ids))
+    if status_changed:
+        await db.execute(insert(TicketEvent), [
+            {
+                "ticket_id": row.id, "workspace_id": workspace_id, "event_type": status_event_type(row.status, new_status),
+                "from_status": row.status, "to_status": new_status, "occurred_at": now,
+            }
+            for row in status_changed
+        ])
+
+    assigned, team_tickets = [], []
+    for row in changed:
+        assignee_id = update_data.get("assignee_id", row.assignee_id)
+        team_id = update_data.get("team_id", row.team_id)
+        if "assignee_id" in update_data and row.assignee_id != assignee_id and assignee_id is not None:
+            assigned.append(row.id)
+        if ("team_id" in update_data or "assignee_id" in update_data) and team_id and not assignee_id:
+            team_tickets.append(row.id)
+
+    enqueue(db, "tickets.bulk_updated", {
+        "workspace_id": workspace_id,
+        "tickets": [
+            {"ticket_id": row.id, "old_assignee_id": row.assignee_id, "old_status": row.status, "old_priority": row.priority}
+            for row in changed
+        ],
+        "changed_fields": list(update_data),
+    }, workspace_id=workspace_id)
+    if assigned:
+        enqueue(db, "notification.bulk_assigned", {
+            "workspace_id": workspace_id, "ticket_ids": assigned, "request_origin": request_origin,
+        }, workspace_id=workspace_id)
+    if team_tickets:
+        enqueue(db, "notification.bulk_team", {
+            "workspace_id": workspace_id, "ticket_ids": team_tickets, "request_origin": request_origin,
+        }, workspace_id=workspace_id)
+    if new_status == CLOSED:
+        # Closure notices go to each ticket's contact, from the workspace template for one ticket
+        for row in status_changed:
+            enqueue(db, "notification.ticket_closed", {"ticket_id": row.id}, workspace_id=workspace_id)
+    enqueue(db, "socketio.ticket_updated", {"ticket_ids": ids}, workspace_id=workspace_id)
+    await db.commit()
+    return ids
+
+
+async def bulk_delete_tasks(db: AsyncSession, workspace_id: int, ticket_ids: List[int]) -> List[int]:
+    """Soft delete many tickets of a workspace with one ``UPDATE``. Returns the ids deleted."""
+    ids = (await db.execute(
+        select(Task.id)
+        .filter(Task.id.in_(ticket_ids), Task.workspace_id == workspace_id, Task.is_deleted == False)
+        .order_by(Task.id)
+        .with_for_update()
+    )).scalars().all()
+    if not ids:
+        await db.rollback()
+        return []
+
+    await db.execute(
+        update(Task).where(Task.id.in_(ids))
+        .values(is_deleted=True, deleted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    enqueue(db, "socketio.ticket_deleted", {"workspace_id": workspace_id, "ticket_ids": ids}, workspace_id=workspace_id)
+    await db.commit()
+    return ids
+
+
+async def run_bulk_update_side_effects(payload: Dict[str, Any]):
+    """
+    Workflows of a bulk update (a ``tickets.bulk_updated`` outbox event): each
+    trigger's workflows are loaded once for all the tickets. Errors propagate
+    so the event is retried.
+    """
+    workspace_id = payload["workspace_id"]
+    old_values = {ticket["ticket_id"]: ticket for ticket in payload["tickets"]}
+    async with AsyncSessionLocal() as db:
+        tasks = (await db.execute(
+            select(Task)
+            .filter(Task.id.in_(list(old_values)), Task.workspace_id == workspace_id, Task.is_deleted == False)
+            .order_by(Task.id)
+        )).scalars().all()
+        if tasks:
+            await _execute_bulk_workflows(db, workspace_id, tasks, old_values, set(payload["changed_fields"]))
+
+
+async def _execute_bulk_workflows(db: AsyncSession, workspace_id: int, tasks: List[Task], old_values: Dict[int, Dict[str, Any]], changed_fields):
+    """Ejecutar los workflows de una actualización masiva, una vez por trigger"""
+    from app.services.workflow_service import WorkflowService
+    contexts_by_trigger: Dict[str, List[Dict[str, Any]]] = {}
+    for task in tasks:
+        old = old_values[task.id]
+        context = {'ticket': task, 'old_values': {'assignee_id': old["old_assignee_id"], 'status': old["old_status"], 'priority': old["old_priority"]}}
+        triggers = ['ticket.updated']
+        if 'status' in changed_fields and old["old_status"] != task.status:
+            triggers.append('ticket.status_changed')
+        if 'priority' in changed_fields and old["old_priority"] != task.priority:
+            triggers.append('ticket.priority_changed')
+        if 'assignee_id' in changed_fields and old["old_assignee_id"] != task.assignee_id:
+            triggers.append('ticket.assigned' if task.assignee_id is not None else 'ticket.unassigned')
+        for trigger in triggers:
+            contexts_by_trigger.setdefault(trigger, []).append(context)
+
+    executed_workflows = []
+    for trigger, contexts in contexts_by_trigger.items():
+        executed_workflows.extend(await WorkflowService.execute_workflows_batch(
+            db=db, trigger=trigger, workspace_id=workspace_id, contexts=contexts
+        ))
+    if executed_workflows:
+        logger.info(f"✅ Bulk workflows executed for {len(tasks)} tickets: {executed_workflows}")
+
+
 async def get_user_tasks(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100) -> List[Task]:
     """Get tasks for a specific user"""
     stmt = select(Task).filter(
@@ -373,97 +463,54 @@ async def send_assignment_notification(db: AsyncSession, task: Task, request_ori
     Usa el mailbox específico del ticket si está disponible.
     """
     try:
-        if not task.assignee_id:
-            logger.warning(f"Could not send notification for the ticket {task.id}")
-            return
+        await deliver_assignment_notification(db, task, request_origin)
+    except Exception as e:
+        logger.error(f"Unexpected error sending assignment notification for ticket {task.id}: {e}", exc_info=True)
 
-        preferred_mailbox = None
-        preferred_token = None
-        
-        if task.mailbox_connection_id:
-            logger.info(f"Ticket {task.id} tiene mailbox específico ID: {task.mailbox_connection_id}")
-            stmt = select(MailboxConnection, MicrosoftToken)\
-                .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)\
-                .filter(
-                    MailboxConnection.id == task.mailbox_connection_id,
-                    MailboxConnection.is_active == True,
-                    MicrosoftToken.access_token.isnot(None)
-                )
-            result = await db.execute(stmt)
-            mailbox_token_info = result.first()
-            
-            if mailbox_token_info:
-                preferred_mailbox, preferred_token = mailbox_token_info
-                logger.info(f"Usando mailbox específico del ticket: {preferred_mailbox.email}")
-            else:
-                logger.warning(f"No se encontró token válido para el mailbox específico del ticket {task.id}")
-
-        if not preferred_mailbox or not preferred_token:
-            logger.info(f"Buscando mailbox fallback para ticket {task.id}")
-            stmt = select(Agent, MailboxConnection, MicrosoftToken)\
-                .join(MailboxConnection, Agent.id == MailboxConnection.created_by_agent_id)\
-                .join(MicrosoftToken, MicrosoftToken.mailbox_connection_id == MailboxConnection.id)\
-                .filter(
-                    Agent.workspace_id == task.workspace_id,
-                    Agent.role.in_(['admin', 'manager']),
-                    MailboxConnection.is_active == True,
-                    MicrosoftToken.access_token.isnot(None)
-                ).order_by(Agent.role.desc())
-            result = await db.execute(stmt)
-            admin_sender_info = result.first()
-            
-            if not admin_sender_info:
-                logger.warning(f"No hay administradores con buzón conectado para enviar notificación del ticket {task.id}")
-                return
-                
-            admin, preferred_mailbox, preferred_token = admin_sender_info
-            logger.info(f"Usando mailbox fallback: {preferred_mailbox.email}")
-
-        if not request_origin:
-            stmt = select(Agent).filter(
-                Agent.workspace_id == task.workspace_id,
-                Agent.last_login_origin.isnot(None)
-            ).order_by(Agent.last_login.desc())
-            result = await db.execute(stmt)
-            workspace_domain_info = result.scalars().first()
-            
-            if workspace_domain_info and workspace_domain_info.last_login_origin:
-                request_origin = workspace_domain_info.last_login_origin
-                logger.info(f"Usando último dominio de login para la notificación: {request_origin}")
-            else:
-                request_origin = settings.FRONTEND_URL
-                logger.info(f"Usando dominio predeterminado para la notificación: {request_origin}")
-
-        current_access_token = preferred_token.access_token
-        if preferred_token.expires_at < datetime.utcnow():
-            try:
-                logger.info(f"Refrescando token para el buzón {preferred_mailbox.email}")
-                graph_service = MicrosoftGraphService(db=db)
-                refreshed_ms_token = await graph_service.refresh_token_async(preferred_token)
-                current_access_token = refreshed_ms_token.access_token
-            except Exception as e:
-                logger.error(f"Error refreshing token for notification: {e}", exc_info=True)
-                return
-
-        sent = await send_ticket_assignment_email(
-            db=db,
-            to_email=task.assignee.email,
-            agent_name=task.assignee.name,
-            ticket_id=task.id,
-            ticket_title=task.title,
-            sender_mailbox_email=preferred_mailbox.email,
-            sender_mailbox_display_name=preferred_mailbox.display_name,
-            user_access_token=current_access_token,
-            request_origin=request_origin
-        )
+
+async def deliver_assignment_notification(db: AsyncSession, task: Task, request_origin: Optional[str] = None):
+    """``send_assignment_notification`` for the outbox: a failed send raises so the event is retried."""
+    if not task.assignee_id:
+        logger.warning(f"Could not send notification for the ticket {task.id}")
+        return
+
+    from app.services.notification_service import resolve_notification_sender
+    sender = await resolve_notification_sender(db, task.workspace_id, task.mailbox_connection_id)
+    if not sender:
+        logger.warning(f"No hay administradores con buzón conectado para enviar notificación del ticket {task.id}")
+        return
+    preferred_mailbox, current_access_token = sender
+
+    if not request_origin:
+        stmt = select(Agent).filter(
+            Agent.workspace_id == task.workspace_id,
+            Agent.last_login_origin.isnot(None)
+        ).order_by(Agent.last_login.desc())
+        result = await db.execute(stmt)
+        workspace_domain_info = result.scalars().first()
         
-        if sent:
-            logger.info(f"Notificación enviada al agente {task.assignee.name} ({task.assignee.email}) para el ticket {task.id} desde {preferred_mailbox.email}")
+        if workspace_domain_info and workspace_domain_info.last_login_origin:
+            request_origin = workspace_domain_info.last_login_origin
+            logger.info(f"Usando último dominio de login para la notificación: {request_origin}")
         else:
-            logger.error(f"Error al enviar notificación para el ticket {task.id} al agente {task.assignee.email}")
-            
-    except Exception as e:
-        logger.error(f"Unexpected error sending assignment notification for ticket {task.id}: {e}", exc_info=True)
+            request_origin = settings.FRONTEND_URL
+            logger.info(f"Usando dominio predeterminado para la notificación: {request_origin}")
+
+    sent = await send_ticket_assignment_email(
+        db=db,
+        to_email=task.assignee.email,
+        agent_name=task.assignee.name,
+        ticket_id=task.id,
+        ticket_title=task.title,
+        sender_mailbox_email=preferred_mailbox.email,
+        sender_mailbox_display_name=preferred_mailbox.display_name,
+        user_access_token=current_access_token,
+        request_origin=request_origin
+    )
+    
+    if not sent:
+        raise MicrosoftAPIException(f"Error al enviar notificación para el ticket {task.id} al agente {task.assignee.email}")
+    logger.info(f"Notificación enviada al agente {task.assignee.name} ({task.assignee.email}) para el ticket {task.id} desde {preferred_mailbox.email}")
 
 
 async def send_team_notification(db: AsyncSession, task: Task, request_origin: Optional[str] = None):
@@ -472,93 +519,179 @@ async def send_team_notification(db: AsyncSession, task: Task, request_origin: O
     asignado al equipo pero sin agente específico asignado.
     """
     try:
-        if not task.team_id or task.assignee_id:
-            return
-            
-        from app.services.notification_service import is_team_notification_enabled
-        if not await is_team_notification_enabled(db, task.workspace_id): # Assuming this becomes async
-            logger.info(f"Team notifications are disabled for workspace {task.workspace_id}, skipping notification for ticket {task.id}")
-            return
-            
-        from app.models.team import TeamMember
-        stmt = select(TeamMember).join(Agent).filter(
-            TeamMember.team_id == task.team_id,
-            Agent.is_active == True,
-            Agent.email.isnot(None),
-            Agent.email != ""
-        )
-        result = await db.execute(stmt)
-        team_members = result.scalars().all()
+        await deliver_team_notification(db, task, request_origin)
+    except Exception as e:
+        logger.error(f"Unexpected error sending team notifications for ticket {task.id}: {e}", exc_info=True)
+
+
+async def deliver_team_notification(db: AsyncSession, task: Task, request_origin: Optional[str] = None):
+    """
+    ``send_team_notification`` for the outbox: raises when every email failed,
+    so the event is retried. A partial failure is only logged, as a retry
+    would email the other members again.
+    """
+    if not task.team_id or task.assignee_id:
+        return
         
-        if not team_members:
-            logger.info(f"No active team members found for team {task.team_id}")
-            return
-            
-        from app.models.team import Team
-        stmt = select(Team).filter(Team.id == task.team_id)
-        result = await db.execute(stmt)
-        team = result.scalars().first()
-        team_name = team.name if team else f"Team {task.team_id}"
+    from app.services.notification_service import is_team_notification_enabled
+    if not await is_team_notification_enabled(db, task.workspace_id): # Assuming this becomes async
+        logger.info(f"Team notifications are disabled for workspace {task.workspace_id}, skipping notification for ticket {task.id}")
+        return
         
-        logger.info(f"Sending team notification for ticket {task.id} to {len(team_members)} members of team '{team_name}'")
+    from app.models.team import Team, TeamMember
+    stmt = select(Agent.email, Agent.name).join(TeamMember, TeamMember.agent_id == Agent.id).filter(
+        TeamMember.team_id == task.team_id,
+        Agent.is_active == True,
+        Agent.email.isnot(None),
+        Agent.email != ""
+    )
+    result = await db.execute(stmt)
+    members = [(row.email, row.name) for row in result.all()]
+    
+    if not members:
+        logger.info(f"No active team members found for team {task.team_id}")
+        return
         
-        from app.models.microsoft import MailboxConnection
-        stmt = select(MailboxConnection).filter(
-            MailboxConnection.workspace_id == task.workspace_id,
-            MailboxConnection.is_active == True
+    team_name = (await db.execute(select(Team.name).filter(Team.id == task.team_id))).scalar() or f"Team {task.team_id}"
+    
+    logger.info(f"Sending team notification for ticket {task.id} to {len(members)} members of team '{team_name}'")
+    
+    # Un solo remitente y token para todo el equipo
+    from app.services.notification_service import resolve_notification_sender
+    sender = await resolve_notification_sender(db, task.workspace_id, task.mailbox_connection_id)
+    if not sender:
+        logger.error(f"No mailbox available to send team notifications for workspace {task.workspace_id}")
+        return
+    preferred_mailbox, current_access_token = sender
+    
+    results = await send_team_ticket_notification_emails(
+        db=db,
+        members=members,
+        team_name=team_name,
+        ticket_id=task.id,
+        ticket_title=task.title,
+        sender_mailbox_email=preferred_mailbox.email,
+        user_access_token=current_access_token,
+        request_origin=request_origin,
+        sender_mailbox_display_name=preferred_mailbox.display_name
+    )
+    
+    for (email, name), sent in zip(members, results):
+        if not sent:
+            logger.error(f"Failed to send team notification to {email} for ticket {task.id}")
+    if not any(results):
+        raise MicrosoftAPIException(f"Team notification failed for all {len(members)} members for ticket {task.id}")
+    logger.info(f"Team notification sent to {sum(results)}/{len(members)} members for ticket {task.id}")
+
+
+async def deliver_bulk_assignment_notifications(db: AsyncSession, tasks: List[Task], request_origin: Optional[str] = None):
+    """
+    Envía un solo correo a cada agente asignado con todos los tickets que
+    acaba de recibir en una actualización masiva. Raises when every email
+    failed, so the outbox retries.
+    """
+    tasks_by_assignee: Dict[int, List[Task]] = {}
+    for task in tasks:
+        if task.assignee_id and task.assignee and task.assignee.email:
+            tasks_by_assignee.setdefault(task.assignee_id, []).append(task)
+    if not tasks_by_assignee:
+        return
+
+    from app.services.notification_service import resolve_notification_sender
+    sender = await resolve_notification_sender(db, tasks[0].workspace_id, tasks[0].mailbox_connection_id)
+    if not sender:
+        logger.warning(f"No hay administradores con buzón conectado para enviar notificaciones de asignación en el workspace {tasks[0].workspace_id}")
+        return
+    preferred_mailbox, current_access_token = sender
+
+    messages = []
+    for assigned in tasks_by_assignee.values():
+        agent = assigned[0].assignee
+        if len(assigned) == 1:
+            subject = f"[ID:{assigned[0].id}] New ticket assigned: {assigned[0].title}"
+            intro = "You have been assigned a new ticket in Enque:"
+        else:
+            subject = f"{len(assigned)} new tickets assigned to you"
+            intro = f"You have been assigned {len(assigned)} tickets in Enque:"
+        messages.append((agent.email, agent.name, subject, intro, [(task.id, task.title) for task in assigned]))
+
+    results = await send_ticket_digest_emails(
+        db=db,
+        messages=messages,
+        sender_mailbox_email=preferred_mailbox.email,
+        user_access_token=current_access_token,
+        request_origin=request_origin,
+        sender_mailbox_display_name=preferred_mailbox.display_name
+    )
+    if not any(results):
+        raise MicrosoftAPIException(f"Bulk assignment notifications failed for all {len(messages)} agents")
+    logger.info(f"Bulk assignment notifications sent to {sum(results)}/{len(messages)} agents for {len(tasks)} tickets")
+
+
+async def deliver_bulk_team_notifications(db: AsyncSession, tasks: List[Task], request_origin: Optional[str] = None):
+    """
+    Envía un solo correo a cada miembro de los equipos con todos los tickets
+    que una actualización masiva dejó en sus equipos sin agente asignado.
+    Raises when every email failed, so the outbox retries.
+    """
+    tasks_by_team: Dict[int, List[Task]] = {}
+    for task in tasks:
+        if task.team_id and not task.assignee_id:
+            tasks_by_team.setdefault(task.team_id, []).append(task)
+    if not tasks_by_team:
+        return
+
+    workspace_id = tasks[0].workspace_id
+    from app.services.notification_service import is_team_notification_enabled
+    if not await is_team_notification_enabled(db, workspace_id):
+        logger.info(f"Team notifications are disabled for workspace {workspace_id}, skipping bulk notification")
+        return
+
+    from app.models.team import Team, TeamMember
+    team_names = dict((await db.execute(select(Team.id, Team.name).filter(Team.id.in_(list(tasks_by_team))))).all())
+    result = await db.execute(
+        select(TeamMember.team_id, Agent.email, Agent.name).join(TeamMember, TeamMember.agent_id == Agent.id).filter(
+            TeamMember.team_id.in_(list(tasks_by_team)),
+            Agent.is_active == True,
+            Agent.email.isnot(None),
+            Agent.email != ""
         )
-        result = await db.execute(stmt)
-        preferred_mailbox = result.scalars().first()
-        
-        if not preferred_mailbox:
-            logger.error(f"No active mailbox found for workspace {task.workspace_id}")
-            return
-            
-        from app.models.microsoft import MicrosoftToken
-        stmt = select(MicrosoftToken).filter(
-            MicrosoftToken.mailbox_connection_id == preferred_mailbox.id
-        ).order_by(MicrosoftToken.created_at.desc())
-        result = await db.execute(stmt)
-        preferred_token = result.scalars().first()
-        
-        if not preferred_token:
-            logger.error(f"No token found for mailbox {preferred_mailbox.email}")
-            return
-            
-        current_access_token = preferred_token.access_token
-        
-        if preferred_token.expires_at < datetime.utcnow():
-            try:
-                logger.info(f"Refrescando token para el buzón {preferred_mailbox.email}")
-                graph_service = MicrosoftGraphService(db=db)
-                refreshed_ms_token = await graph_service.refresh_token_async(preferred_token)
-                current_access_token = refreshed_ms_token.access_token
-            except Exception as e:
-                logger.error(f"Error refreshing token for team notification: {e}", exc_info=True)
-                return
-        
-        for team_member in team_members:
-            try:
-                sent = await send_team_ticket_notification_email(
-                    db=db,
-                    to_email=team_member.agent.email,
-                    agent_name=team_member.agent.name,
-                    team_name=team_name,
-                    ticket_id=task.id,
-                    ticket_title=task.title,
-                    sender_mailbox_email=preferred_mailbox.email,
-                    sender_mailbox_display_name=preferred_mailbox.display_name,
-                    user_access_token=current_access_token,
-                    request_origin=request_origin
-                )
-                
-                if sent:
-                    logger.info(f"Team notification sent to {team_member.agent.name} ({team_member.agent.email}) for ticket {task.id}")
-                else:
-                    logger.error(f"Failed to send team notification to {team_member.agent.email} for ticket {task.id}")
-                    
-            except Exception as e:
-                logger.error(f"Error sending team notification to {team_member.agent.email}: {e}", exc_info=True)
-                
-    except Exception as e:
-        logger.error(f"Unexpected error sending team notifications for ticket {task.id}: {e}", exc_info=True)
+    )
+    # A member of several of the teams gets all their tickets in one email
+    recipients: Dict[str, Tuple[str, List[str], List[Task]]] = {}
+    for team_id, email, name in result.all():
+        _, teams, team_tasks = recipients.setdefault(email, (name, [], []))
+        teams.append(team_names.get(team_id) or f"Team {team_id}")
+        team_tasks.extend(tasks_by_team[team_id])
+    if not recipients:
+        logger.info(f"No active team members found for teams {list(tasks_by_team)}")
+        return
+
+    from app.services.notification_service import resolve_notification_sender
+    sender = await resolve_notification_sender(db, workspace_id, tasks[0].mailbox_connection_id)
+    if not sender:
+        logger.error(f"No mailbox available to send team notifications for workspace {workspace_id}")
+        return
+    preferred_mailbox, current_access_token = sender
+
+    messages = []
+    for email, (name, teams, team_tasks) in recipients.items():
+        team_label = ", ".join(teams)
+        if len(team_tasks) == 1:
+            subject = f"[ID:{team_tasks[0].id}] New ticket for team {team_label}: {team_tasks[0].title}"
+        else:
+            subject = f"{len(team_tasks)} new tickets for team {team_label}"
+        intro = f"These tickets were assigned to your team <strong>{team_label}</strong> without a specific agent, so any team member can take them:"
+        messages.append((email, name, subject, intro, [(task.id, task.title) for task in team_tasks]))
+
+    results = await send_ticket_digest_emails(
+        db=db,
+        messages=messages,
+        sender_mailbox_email=preferred_mailbox.email,
+        user_access_token=current_access_token,
+        request_origin=request_origin,
+        sender_mailbox_display_name=preferred_mailbox.display_name
+    )
+    if not any(results):
+        raise MicrosoftAPIException(f"Bulk team notifications failed for all {len(messages)} members")
+    logger.info(f"Bulk team notifications sent to {sum(results)}/{len(messages)} members for {len(tasks)} tickets")
@@ -0,0 +1,240 @@
+"""
+Archive of long-closed ticket conversations.
+
+Once a ticket has been closed for ``TICKET_ARCHIVE_AFTER_DAYS`` its comments
+are written to one gzip-compressed JSON file in storage,
+
+    <TICKET_ARCHIVE_PREFIX>/workspace_id=<id>/ticket-<id>.json.gz
+
+and then deleted from ``comments``, so the hot tables only hold recent and
+open conversations. Comments with attachments stay in place: attachment rows
+(and downloads) reference them. ``email_ticket_mapping`` is left alone: mail
+sync deduplicates on every message's ``email_id`` and replies thread off the
+newest mapping. ``tickets.archived_at`` marks tickets with an archive file;
+``load_comments`` reads it back for the conversation view.
+
+Tickets are picked up in ``resolved_at`` order from a watermark, so a ticket
+that is reopened and closed again is archived again later; new comments are
+merged into its existing file.
+"""
+
+import asyncio
+import gzip
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.database.session import get_async_driver
+from app.models.agent import Agent
+from app.models.comment import Comment
+from app.models.task import Task
+from app.models.ticket_attachment import TicketAttachment
+from app.services.cache_service import cache_service
+from app.services.storage import get_storage
+from app.utils.logger import logger
+
+WATERMARK_KEY = "tickets:archive:archived_until"
+WATERMARK_TTL = 30 * 24 * 3600
+EPOCH = datetime(1970, 1, 1)
+
+_ARCHIVED_COLUMNS = (
+    "id", "agent_id", "user_id", "content", "s3_html_url", "is_private",
+    "to_recipients", "other_destinaries", "bcc_recipients", "created_at",
+)
+
+
+@dataclass
+class ArchivedComment:
+    """An archived comment, shaped like the ``Comment`` attributes the conversation view reads."""
+    id: int
+    agent_id: Optional[int]
+    user_id: Optional[int]
+    content: Optional[str]
+    is_private: bool
+    created_at: Optional[datetime]
+    agent: Optional[Agent] = None
+
+    @property
+    def attachments(self) -> list:
+        return []
+
+
+def archive_key(workspace_id: int, ticket_id: int) -> str:
+    return f"{settings.TICKET_ARCHIVE_PREFIX.rstrip('/')}/workspace_id={workspace_id}/ticket-{ticket_id}.json.gz"
+
+
+def _encode(records: List[Dict[str, Any]]) -> bytes:
+    """CPU-bound: run on a worker thread."""
+    return gzip.compress(json.dumps({"comments": records}, default=str).encode("utf-8"))
+
+
+def _decode(body: bytes) -> List[Dict[str, Any]]:
+    """CPU-bound: run on a worker thread."""
+    return json.loads(gzip.decompress(body))["comments"]
+
+
+def _no_attachments():
+    return ~exists().where(TicketAttachment.comment_id == Comment.id)
+
+
+class TicketArchive:
+    def __init__(self):
+        self.archived_tickets = 0
+        self.archived_comments = 0
+        self.reads = 0
+        self.watermark: Optional[Tuple[datetime, int]] = None  # (resolved_at, id) of the last ticket done
+
+    async def _read(self, workspace_id: int, ticket_id: int) -> List[Dict[str, Any]]:
+        body = await get_storage().get_object(archive_key(workspace_id, ticket_id))
+        if not body:
+            return []
+        return await asyncio.to_thread(_decode, body)
+
+    async def archive_ticket(self, db: AsyncSession, ticket_id: int, workspace_id: int) -> int:
+        """Move one ticket's attachment-less comments into its archive file. Returns how many."""
+        rows = (await db.execute(
+            select(*[getattr(Comment, name) for name in _ARCHIVED_COLUMNS])
+            .where(Comment.ticket_id == ticket_id, _no_attachments())
+            .order_by(Comment.id)
+        )).all()
+        if not rows:
+            return 0
+
+        # File first, then the delete: a failure in between leaves the rows live and the next run merges by id
+        merged = {record["id"]: record for record in await self._read(workspace_id, ticket_id)}
+        merged.update({row.id: dict(row._mapping) for row in rows})
+        records = sorted(merged.values(), key=lambda record: record["id"])
+        body = await asyncio.to_thread(_encode, records)
+        await get_storage().put_object(archive_key(workspace_id, ticket_id), body, "application/gzip")
+
+        await db.execute(
+            delete(Comment)
+            .where(Comment.id.in_([row.id for row in rows]), _no_attachments())
+            .execution_options(synchronize_session=False)
+        )
+        # fill_sla_timestamps derives this from comments, which are about to be gone
+        agent_replies = [row.created_at for row in rows if row.agent_id and not row.is_private and row.created_at]
+        await db.execute(
+            update(Task).where(Task.id == ticket_id)
+            .values(
+                archived_at=datetime.utcnow(),
+                first_response_at=func.coalesce(Task.first_response_at, min(agent_replies, default=None)),
+                sla_updated_at=func.now(),  # Picked up by the analytics export
+                updated_at=Task.updated_at,  # Keep updated_at as it was
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        self.archived_comments += len(rows)
+        return len(rows)
+
+    async def archive_closed(
+        self, db: AsyncSession, since: Tuple[datetime, int], cutoff: datetime, limit: int
+    ) -> Optional[Tuple[datetime, int]]:
+        """
+        Archive up to ``limit`` tickets closed after ``since`` and before
+        ``cutoff``, one transaction each. Returns the new watermark, or None
+        when no ticket was due.
+        """
+        since_at, since_id = since
+        tickets = (await db.execute(
+            select(Task.id, Task.workspace_id, Task.resolved_at)
+            .where(
+                Task.status == "Closed", Task.is_deleted == False,
+                Task.resolved_at < cutoff,
+                or_(Task.resolved_at > since_at, and_(Task.resolved_at == since_at, Task.id > since_id)),
+            )
+            .order_by(Task.resolved_at, Task.id)
+            .limit(limit)
+        )).all()
+        if not tickets:
+            return None
+
+        for index, ticket in enumerate(tickets):
+            if index and settings.RETENTION_BATCH_PAUSE_SECONDS:
+                await asyncio.sleep(settings.RETENTION_BATCH_PAUSE_SECONDS)
+            try:
+                if await self.archive_ticket(db, ticket.id, ticket.workspace_id):
+                    self.archived_tickets += 1
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"❌ Error archiving ticket {ticket.id}: {e}")
+                # Stop here so the watermark does not pass a ticket that was not archived
+                return (tickets[index - 1].resolved_at, tickets[index - 1].id) if index else None
+        return tickets[-1].resolved_at, tickets[-1].id
+
+    async def load_comments(self, db: AsyncSession, task: Task) -> List[ArchivedComment]:
+        """Archived comments of ``task``, with their agents loaded; empty if it was never archived."""
+        if task.archived_at is None:
+            return []
+        records = await self._read(task.workspace_id, task.id)
+        self.reads += 1
+        agent_ids = {record["agent_id"] for record in records if record.get("agent_id")}
+        agents = {}
+        if agent_ids:
+            agents = {agent.id: agent for agent in (await db.execute(select(Agent).where(Agent.id.in_(agent_ids)))).scalars()}
+        return [
+            ArchivedComment(
+                id=record["id"],
+                agent_id=record.get("agent_id"),
+                user_id=record.get("user_id"),
+                content=record.get("content"),
+                is_private=bool(record.get("is_private")),
+                created_at=datetime.fromisoformat(record["created_at"]) if record.get("created_at") else None,
+                agent=agents.get(record.get("agent_id")),
+            )
+            for record in records
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.ENABLE_TICKET_ARCHIVE,
+            "archived_tickets": self.archived_tickets,
+            "archived_comments": self.archived_comments,
+            "reads": self.reads,
+            "archived_until": self.watermark[0].isoformat() if self.watermark else None,
+        }
+
+
+ticket_archive = TicketArchive()
+
+
+async def _load_watermark() -> Tuple[datetime, int]:
+    if ticket_archive.watermark is not None:
+        return ticket_archive.watermark
+    value = await cache_service.get(WATERMARK_KEY)
+    try:
+        return datetime.fromisoformat(value[0]), int(value[1])
+    except (TypeError, ValueError, IndexError):
+        return EPOCH, 0
+
+
+async def ticket_archive_job():
+    local_engine = create_async_engine(get_async_driver(settings.DATABASE_URI), pool_pre_ping=True)
+    JobSessionLocal = sessionmaker(bind=local_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+    async with JobSessionLocal() as db:
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=settings.TICKET_ARCHIVE_AFTER_DAYS)
+            archived_before = ticket_archive.archived_comments
+            watermark = await ticket_archive.archive_closed(
+                db, await _load_watermark(), cutoff, settings.TICKET_ARCHIVE_TICKETS_PER_RUN
+            )
+            if watermark is not None:
+                ticket_archive.watermark = watermark
+                await cache_service.set(WATERMARK_KEY, [watermark[0].isoformat(), watermark[1]], ttl=WATERMARK_TTL)
+                logger.info(
+                    f"🗄️ Archived {ticket_archive.archived_comments - archived_before} comments of tickets "
+                    f"closed up to {watermark[0].isoformat()}"
+                )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error in ticket archive job: {e}", exc_info=True)
+        finally:
+            await local_engine.dispose()
@@ -0,0 +1,142 @@
+"""
+Ticket lifecycle events and SLA timestamps.
+
+A ``before_flush`` hook turns ORM ticket writes into ``TicketEvent`` rows and
+keeps the per-ticket SLA columns current, all inside the flush that makes the
+change:
+
+- a new ticket logs ``created``;
+- a status change logs ``status_changed`` (``closed`` / ``reopened`` when it
+  enters / leaves Closed) and sets or clears ``tickets.resolved_at``;
+- the first public comment by an agent sets ``tickets.first_response_at`` and
+  logs ``first_response``.
+
+The hook is registered ahead of the report rollup hooks, so the rollups'
+first-response and resolution sums see the timestamps it sets.
+Bulk status changes bypass the ORM (``task_service.bulk_update_tasks``), so
+they set ``resolved_at`` and write the same events themselves, using
+``status_event_type``.
+``fill_sla_timestamps`` derives them for tickets written before this existed.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import and_, event, func, inspect, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.comment import Comment
+from app.models.task import Task
+from app.models.ticket_event import TicketEvent
+
+CLOSED = "Closed"
+
+
+def _status_value(status) -> Optional[str]:
+    # Endpoints assign either plain strings or TaskStatus members
+    return getattr(status, "value", status)
+
+
+def _status_change(task: Task):
+    history = inspect(task).attrs.status.history
+    if not history.has_changes() or not history.added:
+        return None
+    old = _status_value(history.deleted[0]) if history.deleted else None
+    new = _status_value(history.added[0])
+    return (old, new) if old != new else None
+
+
+def status_event_type(old: Optional[str], new: str) -> str:
+    if new == CLOSED:
+        return "closed"
+    if old == CLOSED:
+        return "reopened"
+    return "status_changed"
+
+
+@event.listens_for(Session, "before_flush", insert=True)
+def _record_lifecycle(session: Session, flush_context, instances) -> None:
+    now = datetime.utcnow()
+    new_events = []
+
+    for obj in session.new:
+        if isinstance(obj, Task):
+            status = _status_value(obj.status) or "Unread"
+            if status == CLOSED and obj.resolved_at is None:
+                obj.resolved_at = now
+            new_events.append(TicketEvent(
+                ticket=obj, workspace_id=obj.workspace_id, event_type="created",
+                to_status=status, agent_id=obj.sent_from_id, occurred_at=now,
+            ))
+
+    for obj in session.dirty:
+        if isinstance(obj, Task) and obj.id is not None:
+            change = _status_change(obj)
+            if change is None:
+                continue
+            old, new = change
+            obj.resolved_at = now if new == CLOSED else None
+            new_events.append(TicketEvent(
+                ticket_id=obj.id, workspace_id=obj.workspace_id, event_type=status_event_type(old, new),
+                from_status=old, to_status=new, occurred_at=now,
+            ))
+
+    # First public agent reply per ticket
+    first_replies: Dict[Task, Comment] = {}
+    for obj in session.new:
+        if isinstance(obj, Comment) and obj.agent_id and not obj.is_private:
+            # Usually already in the identity map: the endpoint loaded the ticket to comment on it
+            ticket = obj.__dict__.get("ticket") or (session.get(Task, obj.ticket_id) if obj.ticket_id else None)
+            if ticket is not None:
+                first_replies.setdefault(ticket, obj)
+    for ticket, comment in first_replies.items():
+        if ticket.first_response_at is not None:
+            continue
+        ticket.first_response_at = now
+        new_events.append(TicketEvent(
+            ticket=ticket, workspace_id=ticket.workspace_id, event_type="first_response",
+            agent_id=comment.agent_id, occurred_at=now,
+        ))
+
+    if new_events:
+        session.add_all(new_events)
+
+
+async def fill_sla_timestamps(db: AsyncSession, start: datetime, end: datetime, batch_size: int = 1000) -> None:
+    """
+    Derive SLA timestamps for tickets created in ``[start, end)`` that predate
+    the event log: the first public agent comment, and for closed tickets the
+    last update (the closest record of when they were closed). Candidates are
+    found with a plain select and updated by primary key, so only their rows
+    are locked. Bulk updates: the caller recounts the affected rollup buckets.
+    ``updated_at`` is kept; ``sla_updated_at`` marks the rows for the analytics
+    export.
+    """
+    ids = (await db.execute(
+        select(Task.id).where(
+            Task.created_at >= start, Task.created_at < end,
+            or_(Task.first_response_at.is_(None), and_(Task.status == CLOSED, Task.resolved_at.is_(None))),
+        )
+    )).scalars().all()
+
+    first_reply = (
+        select(func.min(Comment.created_at))
+        .where(Comment.ticket_id == Task.id, Comment.agent_id.isnot(None), Comment.is_private == False)
+        .scalar_subquery()
+    )
+    for offset in range(0, len(ids), batch_size):
+        batch = ids[offset:offset + batch_size]
+        await db.execute(
+            update(Task)
+            .where(Task.id.in_(batch), Task.first_response_at.is_(None), first_reply.isnot(None))
+            .values(first_response_at=first_reply, sla_updated_at=func.now(), updated_at=Task.updated_at)  # Keep updated_at as it was
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            update(Task)
+            .where(Task.id.in_(batch), Task.status == CLOSED, Task.resolved_at.is_(None))
+            .values(resolved_at=Task.updated_at, sla_updated_at=func.now(), updated_at=Task.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
@@ -1,10 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from typing import Optional
 from app.models.user import User, UnassignedUser
 from app.models.workspace import Workspace
-from app.models.company import Company 
+from app.services.contact_resolver import contact_resolver
 
 
 async def get_or_create_user(db: AsyncSession, email: str, name: Optional[str] = None, workspace_id: Optional[int] = None) -> Optional[User]:
@@ -21,6 +21,11 @@ async def get_or_create_user(db: AsyncSession, email: str, name: Optional[str] =
     Returns:
         User object or None if creation failed due to missing workspace_id.
     """
+    if workspace_id:
+        cached_user = await contact_resolver.load_user(db, workspace_id, email)
+        if cached_user:
+            return cached_user
+
     # Construir query usando select() en lugar de db.query()
     stmt = select(User).filter(User.email == email)
     if workspace_id:
@@ -33,6 +38,7 @@ async def get_or_create_user(db: AsyncSession, email: str, name: Optional[str] =
         if workspace_id and user.workspace_id != workspace_id:
             print(f"Warning: Found user {email} but belongs to workspace {user.workspace_id}, expected {workspace_id}")
             return None
+        contact_resolver.remember_user(user)
         return user
 
     if not workspace_id:
@@ -49,17 +55,8 @@ async def get_or_create_user(db: AsyncSession, email: str, name: Optional[str] =
             company_id=None
         )
 
-        user_email_domain = email.split('@')[-1].lower() if '@' in email else None
-        if user_email_domain and workspace_id:
-            company_stmt = select(Company).filter(
-                Company.workspace_id == workspace_id,
-                func.lower(Company.email_domain) == user_email_domain
-            )
-            company_result = await db.execute(company_stmt)
-            company_to_assign = company_result.scalar_one_or_none()
-
-            if company_to_assign:
-                new_user_obj.company_id = company_to_assign.id
+        # Dominio -> compañía vía la columna normalizada e indexada (con caché)
+        new_user_obj.company_id = await contact_resolver.company_for_email(db, workspace_id, email)
 
         db.add(new_user_obj)
 
@@ -83,6 +80,7 @@ async def get_or_create_user(db: AsyncSession, email: str, name: Optional[str] =
         # Single commit for both user and unassigned_user
         await db.commit()
         await db.refresh(new_user_obj)
+        contact_resolver.remember_user(new_user_obj)
         return new_user_obj
 
     except IntegrityError as e:
@@ -375,7 +375,48 @@ class WorkflowService:
                     exc_info=True
                 )
                 continue
-        
+
+        if executed_workflows:
+            await db.commit()
+        return executed_workflows
+
+    @staticmethod
+    async def execute_workflows_batch(db: AsyncSession, trigger: str, workspace_id: int, contexts: List[Dict[str, Any]]) -> List[str]:
+        """
+        Ejecutar los workflows del trigger para varios tickets, cargándolos una sola vez
+        y confirmando todos los cambios en un único commit
+        """
+        if not contexts:
+            return []
+        executed_workflows = []
+
+        result = await db.execute(
+            select(Workflow).filter(
+                and_(
+                    Workflow.workspace_id == workspace_id,
+                    Workflow.is_enabled == True,
+                    Workflow.trigger == trigger
+                )
+            )
+        )
+        workflows = result.scalars().all()
+
+        for workflow in workflows:
+            for context in contexts:
+                try:
+                    if WorkflowService._evaluate_conditions(workflow.conditions or [], context):
+                        await WorkflowService._execute_actions(db, workflow.actions or [], context)
+                        executed_workflows.append(workflow.name)
+                except Exception as e:
+                    logger.error(
+                        f"Error executing workflow {workflow.name}: {e}",
+                        extra={"workflow_id": workflow.id, "workspace_id": workspace_id, "trigger": trigger},
+                        exc_info=True
+                    )
+        if executed_workflows:
+            await db.commit()
+            logger.info(f"Executed {len(executed_workflows)} workflow runs for trigger: {trigger} on {len(contexts)} tickets")
+
         return executed_workflows
 
     @staticmethod
@@ -466,7 +507,7 @@ class WorkflowService:
         
         if ticket and new_priority:
             ticket.priority = new_priority
-            await db.commit()
+            await db.flush()
             logger.info(f"Ticket {ticket.id} priority changed to {new_priority}")
 
     async def process_message_for_workflows(self, message_content: str, workspace_id: int, context: Dict[str, Any] = None) -> List[Dict[str, Any]]:
@@ -0,0 +1,313 @@
+"""
+Per-workspace configuration snapshots.
+
+Notification settings and templates, active mailboxes and categories change
+rarely but are read on every email sync, notification and automation run. A
+``WorkspaceConfig`` holds all of them for one workspace: it is loaded in one
+go, immutable, and shared by every request of the worker.
+
+Each workspace has a version counter in Redis (``wsconfig:ver:<id>``). Any
+ORM commit that inserts, updates or deletes one of the tables a snapshot is
+built from bumps it (see the session listeners at the bottom), and a worker
+re-reads the counter at most every ``WORKSPACE_CONFIG_CHECK_SECONDS`` before
+trusting its snapshot. ``WORKSPACE_CONFIG_MAX_AGE_SECONDS`` bounds staleness
+for writes that bypass the ORM (bulk ``update()`` statements, manual SQL).
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Set, Tuple
+
+from cachetools import LRUCache
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.category import Category
+from app.models.microsoft import MailboxConnection
+from app.models.notification import NotificationSetting, NotificationTemplate
+from app.models.workspace import Workspace
+from app.services.cache_service import cache_service
+from app.utils.logger import logger
+from app.utils.template_renderer import CompiledTemplate
+
+VERSION_KEY = "wsconfig:ver:{workspace_id}"
+CORE_SYSTEM_DOMAINS: Tuple[str, ...] = ("enque.cc", "microsoftexchange")
+_CHANGED_KEY = "workspace_config_changed"
+
+
+@dataclass(frozen=True)
+class NotificationSettingSnapshot:
+    id: int
+    category: str
+    type: str
+    is_enabled: bool
+    channels: Tuple[str, ...]
+    template_id: Optional[int]
+
+
+@dataclass(frozen=True)
+class NotificationTemplateSnapshot:
+    id: int
+    type: str
+    name: str
+    subject: str
+    template: str
+    is_enabled: bool
+    # Compiled once per snapshot, shared by every notification rendered from it
+    compiled_subject: CompiledTemplate = field(init=False, repr=False, compare=False)
+    compiled_body: CompiledTemplate = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "compiled_subject", CompiledTemplate(self.subject))
+        object.__setattr__(self, "compiled_body", CompiledTemplate(self.template))
+
+    def render(self, variables: Mapping[str, Any]) -> Tuple[str, str]:
+        """(subject, html body) with ``{{name}}`` placeholders filled in."""
+        return self.compiled_subject.render(variables), self.compiled_body.render(variables)
+
+
+@dataclass(frozen=True)
+class MailboxSnapshot:
+    id: int
+    email: str
+    display_name: Optional[str]
+
+
+@dataclass(frozen=True)
+class CategorySnapshot:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class WorkspaceConfig:
+    workspace_id: int
+    version: int
+    subdomain: Optional[str]
+    # (category, type) -> settings in id order; a type may have one row per channel
+    notification_settings: Mapping[Tuple[str, str], Tuple[NotificationSettingSnapshot, ...]]
+    templates: Mapping[int, NotificationTemplateSnapshot]
+    mailboxes: Tuple[MailboxSnapshot, ...]
+    categories: Tuple[CategorySnapshot, ...]
+    mailbox_emails: FrozenSet[str]
+    system_domains: Tuple[str, ...]
+
+    def first_setting(self, category: str, type: str) -> Optional[NotificationSettingSnapshot]:
+        matches = self.notification_settings.get((category, type))
+        return matches[0] if matches else None
+
+    def enabled_setting(self, category: str, type: str) -> Optional[NotificationSettingSnapshot]:
+        for setting in self.notification_settings.get((category, type), ()):
+            if setting.is_enabled:
+                return setting
+        return None
+
+    def enabled_template(self, template_id: Optional[int]) -> Optional[NotificationTemplateSnapshot]:
+        template = self.templates.get(template_id) if template_id else None
+        return template if template is not None and template.is_enabled else None
+
+    def category_by_name(self, name: str) -> Optional[CategorySnapshot]:
+        # Case-insensitive, like the column's MySQL collation
+        wanted = (name or "").strip().casefold()
+        for category in self.categories:
+            if category.name.strip().casefold() == wanted:
+                return category
+        return None
+
+
+def _parse_channels(channels: Any) -> Tuple[str, ...]:
+    if isinstance(channels, str):
+        try:
+            channels = json.loads(channels)
+        except ValueError:
+            return ()
+    return tuple(channels or ())
+
+
+async def load_workspace_config(db: AsyncSession, workspace_id: int, version: int) -> WorkspaceConfig:
+    """Read everything a snapshot holds; plain column selects, no ORM identities."""
+    subdomain = (await db.execute(
+        select(Workspace.subdomain).where(Workspace.id == workspace_id)
+    )).scalar()
+
+    setting_rows = (await db.execute(
+        select(
+            NotificationSetting.id, NotificationSetting.category, NotificationSetting.type,
+            NotificationSetting.is_enabled, NotificationSetting.channels, NotificationSetting.template_id,
+        )
+        .where(NotificationSetting.workspace_id == workspace_id)
+        .order_by(NotificationSetting.id)
+    )).all()
+    grouped: Dict[Tuple[str, str], list] = {}
+    for row in setting_rows:
+        grouped.setdefault((row.category, row.type), []).append(NotificationSettingSnapshot(
+            id=row.id, category=row.category, type=row.type, is_enabled=bool(row.is_enabled),
+            channels=_parse_channels(row.channels), template_id=row.template_id,
+        ))
+
+    template_rows = (await db.execute(
+        select(
+            NotificationTemplate.id, NotificationTemplate.type, NotificationTemplate.name,
+            NotificationTemplate.subject, NotificationTemplate.template, NotificationTemplate.is_enabled,
+        ).where(NotificationTemplate.workspace_id == workspace_id)
+    )).all()
+    templates = {
+        row.id: NotificationTemplateSnapshot(
+            id=row.id, type=row.type, name=row.name, subject=row.subject,
+            template=row.template, is_enabled=bool(row.is_enabled),
+        )
+        for row in template_rows
+    }
+
+    mailbox_rows = (await db.execute(
+        select(MailboxConnection.id, MailboxConnection.email, MailboxConnection.display_name)
+        .where(MailboxConnection.workspace_id == workspace_id, MailboxConnection.is_active == True)
+        .order_by(MailboxConnection.id)
+    )).all()
+    mailboxes = tuple(MailboxSnapshot(id=row.id, email=row.email, display_name=row.display_name) for row in mailbox_rows)
+
+    category_rows = (await db.execute(
+        select(Category.id, Category.name).where(Category.workspace_id == workspace_id).order_by(Category.id)
+    )).all()
+
+    mailbox_emails = frozenset(mb.email.lower() for mb in mailboxes if mb.email)
+    mailbox_domains = dict.fromkeys(email.split("@")[-1] for email in sorted(mailbox_emails) if "@" in email)
+
+    return WorkspaceConfig(
+        workspace_id=workspace_id,
+        version=version,
+        subdomain=subdomain,
+        notification_settings=MappingProxyType({key: tuple(value) for key, value in grouped.items()}),
+        templates=MappingProxyType(templates),
+        mailboxes=mailboxes,
+        categories=tuple(CategorySnapshot(id=row.id, name=row.name) for row in category_rows),
+        mailbox_emails=mailbox_emails,
+        system_domains=CORE_SYSTEM_DOMAINS + tuple(d for d in mailbox_domains if d not in CORE_SYSTEM_DOMAINS),
+    )
+
+
+class _Entry:
+    __slots__ = ("config", "loaded_at", "checked_at")
+
+    def __init__(self, config: WorkspaceConfig, now: float):
+        self.config = config
+        self.loaded_at = now
+        self.checked_at = now
+
+
+class WorkspaceConfigCache:
+    def __init__(self, maxsize: int, check_seconds: float, max_age_seconds: float):
+        self.check_seconds = check_seconds
+        self.max_age_seconds = max_age_seconds
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        self.hits = 0
+        self.loads = 0
+        self.bumps = 0
+
+    async def _current_version(self, workspace_id: int) -> int:
+        value = await cache_service.get(VERSION_KEY.format(workspace_id=workspace_id))
+        try:
+            return int(value or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    async def get(self, db: AsyncSession, workspace_id: int) -> WorkspaceConfig:
+        """The workspace's current snapshot, loading it through ``db`` when stale."""
+        now = time.monotonic()
+        entry: Optional[_Entry] = self._entries.get(workspace_id)
+        if entry is not None and now - entry.loaded_at < self.max_age_seconds:
+            if now - entry.checked_at < self.check_seconds:
+                self.hits += 1
+                return entry.config
+            version = await self._current_version(workspace_id)
+            if version == entry.config.version:
+                entry.checked_at = now
+                self.hits += 1
+                return entry.config
+        else:
+            version = await self._current_version(workspace_id)
+
+        # The version is read before the rows: a bump racing the load only costs a reload
+        config = await load_workspace_config(db, workspace_id, version)
+        self._entries[workspace_id] = _Entry(config, time.monotonic())
+        self.loads += 1
+        return config
+
+    def evict(self, workspace_id: int) -> None:
+        self._entries.pop(workspace_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def bump(self, workspace_id: int) -> None:
+        """Invalidate the workspace's snapshot here and, through Redis, in every other worker."""
+        self.evict(workspace_id)
+        self.bumps += 1
+        await cache_service.incr(VERSION_KEY.format(workspace_id=workspace_id))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workspaces": len(self._entries),
+            "hits": self.hits,
+            "loads": self.loads,
+            "bumps": self.bumps,
+        }
+
+
+workspace_config = WorkspaceConfigCache(
+    maxsize=settings.WORKSPACE_CONFIG_CACHE_SIZE,
+    check_seconds=settings.WORKSPACE_CONFIG_CHECK_SECONDS,
+    max_age_seconds=settings.WORKSPACE_CONFIG_MAX_AGE_SECONDS,
+)
+
+
+# --- Version bumps on commit -------------------------------------------------
+
+_WATCHED_MODELS = (NotificationSetting, NotificationTemplate, MailboxConnection, Category, Workspace)
+
+
+def _record_change(mapper, connection, target) -> None:
+    workspace_id = target.id if isinstance(target, Workspace) else getattr(target, "workspace_id", None)
+    session = Session.object_session(target)
+    if workspace_id is not None and session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(workspace_id)
+
+
+for _model in _WATCHED_MODELS:
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _record_change)
+
+
+def _bump_all(workspace_ids: Iterable[int]) -> None:
+    for workspace_id in workspace_ids:
+        workspace_config.evict(workspace_id)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Sync session outside the event loop: other workers catch up through max age
+        return
+    for workspace_id in workspace_ids:
+        task = loop.create_task(workspace_config.bump(workspace_id))
+        task.add_done_callback(_log_bump_failure)
+
+
+def _log_bump_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"⚠️ Could not bump workspace config version: {task.exception()}")
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    changed: Optional[Set[int]] = session.info.pop(_CHANGED_KEY, None)
+    if changed:
+        _bump_all(list(changed))
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
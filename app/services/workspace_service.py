@@ -7,7 +7,7 @@ from fastapi import HTTPException, status
 from app.models.workspace import Workspace
 from app.models.agent import Agent
 from app.schemas.workspace import WorkspaceCreate, WorkspaceUpdate, WorkspaceSetupCreate, WorkspaceSetupResponse
-from app.core.security import get_password_hash, create_access_token
+from app.core.security import get_password_hash_async, create_access_token
 from app.core.config import settings
 
 async def create_workspace(db: AsyncSession, workspace_in: WorkspaceCreate) -> Workspace:
@@ -98,7 +98,7 @@ async def setup_workspace(db: AsyncSession, setup_data: WorkspaceSetupCreate) ->
         admin = Agent(
             name=setup_data.admin_name,
             email=setup_data.admin_email,
-            password=get_password_hash(setup_data.admin_password),
+            password=await get_password_hash_async(setup_data.admin_password),
             role="admin",
             is_active=True,
             workspace_id=workspace.id
@@ -3,24 +3,83 @@ Utilities for processing images in emails.
 This module handles extraction of base64 images and conversions to file attachments.
 """
 
+import asyncio
 import re
 import base64
 import uuid
 from typing import List, Dict, Tuple, Optional
 import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
 from app.core.config import settings
-from app.services.s3_service import get_s3_service
+from app.services.storage import get_storage, get_storage_backend
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-def extract_base64_images(html_content: str, ticket_id: int) -> Tuple[str, List[Dict]]:
+# Pattern for finding data URIs in img tags
+IMG_PATTERN = re.compile(r'<img[^>]*src="data:image/([^;]+);base64,([^"]+)"[^>]*>')
+ERROR_IMG_TAG = '<img src="https://via.placeholder.com/100x100?text=Error" alt="Image processing error" />'
+
+
+def _decode_image(match: re.Match, ticket_id: int) -> Tuple[str, str, bytes]:
+    """Return (filename, content_type, bytes) for a data-URI image match."""
+    img_type = match.group(1)
+    img_filename = f"ticket_{ticket_id}_{uuid.uuid4()}.{img_type}"
+    return img_filename, f"image/{img_type}", base64.b64decode(match.group(2))
+
+
+def _extracted_image_tag(match: re.Match, img_filename: str, content_type: str, file_size: int, s3_url: str, extracted_images: List[Dict]) -> str:
+    """Record the uploaded image and build the <img> tag that replaces the data URI."""
+    # Get any additional attributes from the original img tag
+    img_tag = match.group(0)
+    width_match = re.search(r'width=["\']\s*(\d+)\s*["\']', img_tag)
+    height_match = re.search(r'height=["\']\s*(\d+)\s*["\']', img_tag)
+
+    # Format file size
+    size_kb = file_size / 1024
+    size_text = f"{size_kb:.1f} KB"
+
+    # Store image info with metadata needed for attachments
+    extracted_images.append({
+        "filename": img_filename,
+        "url": s3_url,
+        "content_type": content_type,
+        "size": file_size,
+        "size_text": size_text,
+        "is_image": True,
+        "is_extracted": True,
+        "s3_url": s3_url  # Include S3 URL for consistency
+    })
+
+    # Create new img tag with the same attributes but updated src with S3 URL and special class
+    new_img = f'<img src="{s3_url}" class="email-extracted-image" data-filename="{img_filename}"'
+    if width_match:
+        new_img += f' width="{width_match.group(1)}"'
+    if height_match:
+        new_img += f' height="{height_match.group(1)}"'
+
+    # Add data attributes for frontend to handle as attachment
+    new_img += f' data-attachment-url="{s3_url}" data-attachment-size="{size_text}"'
+
+    # Close the tag
+    new_img += ' />'
+    return new_img
+
+
+def extract_base64_images(html_content: str, ticket_id: int, db: Optional[Session] = None) -> Tuple[str, List[Dict]]:
     """
     Extracts base64 encoded images from HTML content and uploads them to S3.
+    Blocking; async callers should use ``extract_base64_images_async``.
+    With a ``db`` session the images go through the blob store without taking
+    a reference, as this renders stored content on read: an image seen
+    before is served from its existing object instead of uploaded again.
     
     Args:
         html_content: The HTML content containing base64 images
         ticket_id: The ID of the ticket associated with these images
+        db: Optional session for the content-addressed blob store
         
     Returns:
         Tuple containing:
@@ -29,82 +88,112 @@ def extract_base64_images(html_content: str, ticket_id: int) -> Tuple[str, List[
     """
     if not html_content:
         return html_content, []
-    
-    # Get S3 service instance
-    s3_service = get_s3_service()
-    
-    # Pattern for finding data URIs in img tags
-    img_pattern = r'<img[^>]*src="data:image/([^;]+);base64,([^"]+)"[^>]*>'
+
+    blob_urls: Dict[int, str] = {}
+    if db is not None:
+        decoded = []
+        for match in IMG_PATTERN.finditer(html_content):
+            try:
+                decoded.append((match.start(), _decode_image(match, ticket_id)))
+            except Exception:
+                pass  # Reported by replace_image below
+        if decoded:
+            from app.services.blob_store import blob_store
+            try:
+                urls = blob_store.store_unreferenced_sync(
+                    db, [(img_bytes, filename, content_type) for _, (filename, content_type, img_bytes) in decoded]
+                )
+                blob_urls = {start: url for (start, _), url in zip(decoded, urls)}
+            except Exception as e:
+                logger.error(f"Error storing email images in the blob store: {str(e)}")
+
+    storage = get_storage_backend()
     extracted_images = []
     
     def replace_image(match):
         try:
-            # Extract image type and base64 data
-            img_type = match.group(1)
-            base64_data = match.group(2)
-            
-            # Generate unique filename
-            img_filename = f"ticket_{ticket_id}_{uuid.uuid4()}.{img_type}"
-            
-            # Decode image
-            img_bytes = base64.b64decode(base64_data)
-            file_size = len(img_bytes)
-            
-            # Upload to S3
-            s3_url = s3_service.upload_file(
-                file_content=img_bytes,
-                filename=img_filename,
-                folder="email_images",
-                content_type=f"image/{img_type}"
-            )
-            
-            # Get any additional attributes from the original img tag
-            img_tag = match.group(0)
-            width_match = re.search(r'width=["\']\s*(\d+)\s*["\']', img_tag)
-            height_match = re.search(r'height=["\']\s*(\d+)\s*["\']', img_tag)
-            
-            # Format file size
-            size_kb = file_size / 1024
-            size_text = f"{size_kb:.1f} KB"
-            
-            # Store image info with metadata needed for attachments
-            extracted_images.append({
-                "filename": img_filename,
-                "url": s3_url,
-                "content_type": f"image/{img_type}",
-                "size": file_size,
-                "size_text": size_text,
-                "is_image": True,
-                "is_extracted": True,
-                "s3_url": s3_url  # Include S3 URL for consistency
-            })
-            
-            # Create new img tag with the same attributes but updated src with S3 URL and special class
-            new_img = f'<img src="{s3_url}" class="email-extracted-image" data-filename="{img_filename}"'
-            if width_match:
-                new_img += f' width="{width_match.group(1)}"'
-            if height_match:
-                new_img += f' height="{height_match.group(1)}"'
-            
-            # Add data attributes for frontend to handle as attachment
-            new_img += f' data-attachment-url="{s3_url}" data-attachment-size="{size_text}"'
-            
-            # Close the tag
-            new_img += ' />'
-            
-            # Image extracted and uploaded to S3
-            return new_img
-            
+            img_filename, content_type, img_bytes = _decode_image(match, ticket_id)
+            if db is not None:
+                s3_url = blob_urls[match.start()]
+            else:
+                s3_url = storage.upload_file(
+                    file_content=img_bytes,
+                    filename=img_filename,
+                    folder="email_images",
+                    content_type=content_type
+                )
+            return _extracted_image_tag(match, img_filename, content_type, len(img_bytes), s3_url, extracted_images)
         except Exception as e:
             logger.error(f"Error processing image in email: {str(e)}")
-            # Return a placeholder or the original
-            return f'<img src="https://via.placeholder.com/100x100?text=Error" alt="Image processing error" />'
+            return ERROR_IMG_TAG
     
     # Replace all base64 images in the HTML
-    processed_html = re.sub(img_pattern, replace_image, html_content)
+    processed_html = IMG_PATTERN.sub(replace_image, html_content)
     
     return processed_html, extracted_images
 
+
+async def extract_base64_images_async(html_content: str, ticket_id: int, db: Optional[AsyncSession] = None) -> Tuple[str, List[Dict]]:
+    """
+    Same as ``extract_base64_images``, uploading all images of the document
+    concurrently. With a ``db`` session the images go through the
+    content-addressed blob store, so an image already stored (a signature
+    logo, say) is referenced instead of uploaded again.
+    """
+    if not html_content:
+        return html_content, []
+
+    matches = list(IMG_PATTERN.finditer(html_content))
+    if not matches:
+        return html_content, []
+
+    decoded = []
+    for match in matches:
+        try:
+            decoded.append(_decode_image(match, ticket_id))
+        except Exception as e:
+            decoded.append(e)
+    valid = [item for item in decoded if not isinstance(item, Exception)]
+
+    urls: Dict[int, object] = {}
+    if valid:
+        try:
+            if db is not None:
+                from app.services.blob_store import blob_store
+                blobs = await blob_store.put_many(db, [(img_bytes, filename, content_type) for filename, content_type, img_bytes in valid])
+                uploaded = [blob_store.url_for(blob) for blob in blobs]
+            else:
+                storage = get_storage()
+                uploaded = await asyncio.gather(*(
+                    storage.upload_file(
+                        file_content=img_bytes,
+                        filename=filename,
+                        folder="email_images",
+                        content_type=content_type
+                    )
+                    for filename, content_type, img_bytes in valid
+                ), return_exceptions=True)
+        except Exception as e:
+            uploaded = [e] * len(valid)
+        urls = {id(item): url for item, url in zip(valid, uploaded)}
+
+    extracted_images = []
+    parts = []
+    position = 0
+    for match, item in zip(matches, decoded):
+        parts.append(html_content[position:match.start()])
+        s3_url = urls.get(id(item), item)
+        if isinstance(s3_url, Exception):
+            logger.error(f"Error processing image in email: {str(s3_url)}")
+            parts.append(ERROR_IMG_TAG)
+        else:
+            filename, content_type, img_bytes = item
+            parts.append(_extracted_image_tag(match, filename, content_type, len(img_bytes), s3_url, extracted_images))
+        position = match.end()
+    parts.append(html_content[position:])
+
+    return "".join(parts), extracted_images
+
 # Legacy function for backward compatibility
 def ensure_upload_dir(base_path: str = None) -> str:
     """
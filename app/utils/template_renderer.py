@@ -0,0 +1,43 @@
+"""
+Precompiled ``{{variable}}`` templates.
+
+Notification subjects and bodies used to be rendered with one ``str.replace``
+pass per variable, rescanning the whole HTML body every time. A
+``CompiledTemplate`` splits the text once into literals and placeholder names;
+rendering is then a single join. As before, placeholders without a value are
+left in the output untouched.
+"""
+
+import re
+from typing import Any, Mapping, Tuple
+
+_PLACEHOLDER = re.compile(r"\{\{([^{}]+?)\}\}")
+
+
+class CompiledTemplate:
+    __slots__ = ("source", "_literals", "_names")
+
+    def __init__(self, source: str):
+        self.source = source or ""
+        parts = _PLACEHOLDER.split(self.source)
+        # split() alternates literal, name, literal, ... and always ends on a literal
+        self._literals: Tuple[str, ...] = tuple(parts[0::2])
+        self._names: Tuple[str, ...] = tuple(parts[1::2])
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        return self._names
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        if not self._names:
+            return self.source
+        literals = self._literals
+        out = [literals[0]]
+        for index, name in enumerate(self._names, start=1):
+            value = variables.get(name)
+            if value is None and name not in variables:
+                out.append("{{" + name + "}}")
+            else:
+                out.append(str(value))
+            out.append(literals[index])
+        return "".join(out)
@@ -0,0 +1,218 @@
+"""
+Benchmark: per-request overhead of the HTTP middleware stack.
+
+Drives an ASGI app in-process through httpx's ASGITransport (no sockets, no
+server) and reports p50/p99 latency and requests per second per endpoint.
+
+Two targets:
+
+``--target stack`` (default)
+    A small FastAPI app with representative endpoints (the /health probe, a
+    small JSON payload, a ~60KB ticket-list-sized JSON page with an ETag and
+    a streamed HTML body), wrapped once in the previous BaseHTTPMiddleware
+    stack (reproduced below) and once in the current pure ASGI stack. Needs
+    no database.
+
+``--target app``
+    The real ``app.main.app`` with whatever DATABASE_URI is configured (e.g. a
+    local MySQL container loaded with a dump). Pass the endpoints with
+    ``--path`` and an access token with ``--token``; run it on two checkouts
+    to compare before and after a change.
+
+Usage:
+    python -m benchmarks.bench_middleware --requests 2000 --concurrency 32
+    python -m benchmarks.bench_middleware --target app --token $TOKEN \\
+        --path /health --path "/v1/tasks/?limit=50"
+"""
+
+import argparse
+import asyncio
+import gzip
+import io
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("JWT_SECRET", "benchmark")
+os.environ.setdefault("ENCRYPTION_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import Response, StreamingResponse  # noqa: E402
+
+from app.core.compression import BROTLI_AVAILABLE, SmartCompressionMiddleware  # noqa: E402
+from app.core.http_cache import encode_json, json_response_with_etag  # noqa: E402
+from app.core.middleware import HealthMiddleware  # noqa: E402
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+STACK_PATHS = ["/health", "/small", "/tasks", "/html"]
+
+
+# --- Previous middleware stack, kept here as the baseline -------------------
+
+class LegacyHealthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path == "/health":
+            return Response("OK", status_code=200)
+        return await call_next(request)
+
+
+class LegacyCompressionMiddleware(BaseHTTPMiddleware):
+    """The buffering BaseHTTPMiddleware compression, trimmed to its hot path."""
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        super().__init__(app)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        accept_encoding = request.headers.get("accept-encoding", "").lower()
+        use_brotli = BROTLI_AVAILABLE and "br" in accept_encoding
+        if not (use_brotli or "gzip" in accept_encoding) or "content-encoding" in response.headers:
+            return response
+
+        response_body = b""
+        async for chunk in response.body_iterator:
+            response_body += chunk
+        headers = dict(response.headers)
+        if len(response_body) < self.minimum_size:
+            return Response(content=response_body, status_code=response.status_code, headers=headers)
+
+        if use_brotli:
+            compressed, encoding = brotli.compress(response_body, quality=self.brotli_quality, mode=brotli.MODE_TEXT), "br"
+        else:
+            buffer = io.BytesIO()
+            with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=self.gzip_level) as gz:
+                gz.write(response_body)
+            compressed, encoding = buffer.getvalue(), "gzip"
+        headers["content-encoding"] = encoding
+        headers["content-length"] = str(len(compressed))
+        headers["vary"] = "Accept-Encoding"
+        return Response(content=compressed, status_code=response.status_code, headers=headers)
+
+
+# --- Synthetic app -----------------------------------------------------------
+
+def build_stack_app(legacy: bool) -> FastAPI:
+    app = FastAPI()
+    tasks_page = encode_json([
+        {
+            "id": i, "title": f"Ticket {i} – printer on floor {i % 7} is on fire again",
+            "status": "Open", "priority": "High", "assignee_id": 3, "team_id": 1,
+            "created_at": "2024-01-01T09:30:00", "updated_at": "2024-01-01T10:30:00",
+            "user_name": f"Contact {i}", "user_email": f"contact{i}@example.com",
+            "assignee_name": "Agent 3", "team_name": "Support", "category_name": "Billing",
+        }
+        for i in range(200)
+    ])
+    html_chunk = ("<p>" + "Hola, adjunto el detalle de la incidencia. " * 40 + "</p>\n").encode()
+
+    @app.get("/health")
+    async def health():
+        return Response("OK")
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok", "workspace_id": 1}
+
+    @app.get("/tasks")
+    async def tasks(request: Request):
+        return json_response_with_etag(request, tasks_page)
+
+    @app.get("/html")
+    async def html():
+        async def body():
+            for _ in range(32):
+                yield html_chunk
+        return StreamingResponse(body(), media_type="text/html")
+
+    cors = dict(allow_origin_regex=r"https://.*\.example\.com", allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+    app.add_middleware(CORSMiddleware, **cors)
+    if legacy:
+        app.add_middleware(LegacyCompressionMiddleware)
+        app.add_middleware(LegacyHealthMiddleware)
+    else:
+        app.add_middleware(SmartCompressionMiddleware, cache_max_bytes=8 * 1024 * 1024)
+        app.add_middleware(HealthMiddleware)
+    return app
+
+
+# --- Driver ------------------------------------------------------------------
+
+async def run_endpoint(app, path: str, requests: int, concurrency: int, headers: Dict[str, str]) -> Dict[str, float]:
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        # Warm-up (route compilation, caches)
+        for _ in range(min(20, requests)):
+            await client.get(path)
+
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{path} answered {response.status_code}: {response.text[:200]}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def print_row(label: str, path: str, result: Dict[str, float]) -> None:
+    print(f"{label:<8} {path:<32} p50 {result['p50']:8.3f} ms   p99 {result['p99']:8.3f} ms   {result['rps']:9.0f} req/s")
+
+
+async def main_async(args) -> None:
+    headers = {"accept-encoding": args.accept_encoding}
+
+    if args.target == "stack":
+        apps = [("before", build_stack_app(legacy=True)), ("after", build_stack_app(legacy=False))]
+        paths = args.path or STACK_PATHS
+    else:
+        from app.main import app as real_app
+        if args.token:
+            headers["authorization"] = f"Bearer {args.token}"
+        apps = [("app", real_app)]
+        paths = args.path or ["/health"]
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}, accept-encoding: {args.accept_encoding!r}")
+    for path in paths:
+        for label, app in apps:
+            print_row(label, path, await run_endpoint(app, path, args.requests, args.concurrency, headers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["stack", "app"], default="stack")
+    parser.add_argument("--path", action="append", help="Endpoint to measure (repeatable)")
+    parser.add_argument("--token", help="Bearer token for --target app")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--accept-encoding", default="gzip, deflate, br")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
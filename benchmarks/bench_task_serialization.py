@@ -0,0 +1,129 @@
+"""
+Benchmark: ticket list serialisation, Pydantic response_model path vs the
+orjson RowEncoder path used by the /tasks list endpoints.
+
+Verifies that both paths produce byte-for-byte identical JSON for the same
+page of tickets, then reports the time per page for each.
+
+Usage:
+    python -m benchmarks.bench_task_serialization --rows 100 --iterations 200
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("JWT_SECRET", "benchmark")
+os.environ.setdefault("ENCRYPTION_KEY", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registers every mapper)
+from app.schemas.task import TicketListItem  # noqa: E402
+from app.services.task_serializer import TASK_LIST_ENCODER  # noqa: E402
+
+STATUSES = ["Unread", "Open", "With User", "In Progress", "Closed"]
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+
+
+def make_tasks(count: int):
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1, 9, 30)
+    tasks = []
+    for i in range(count):
+        created = base + timedelta(minutes=i * 17, microseconds=rng.randint(0, 999999))
+        assignee_id = rng.choice([None, 3, 7])
+        team_id = rng.choice([None, 1, 2])
+        category_id = rng.choice([None, 9])
+        user_id = rng.randint(1, 50)
+        tasks.append(SimpleNamespace(
+            id=i + 1,
+            title=f"Ticket {i + 1} – «Ünïcode» subject with \"quotes\"",
+            status=rng.choice(STATUSES),
+            priority=rng.choice(PRIORITIES),
+            assignee_id=assignee_id,
+            team_id=team_id,
+            due_date=None,
+            created_at=created,
+            updated_at=created + timedelta(hours=1),
+            last_update=rng.choice([None, created + timedelta(hours=2)]),
+            deleted_at=None,
+            sent_from_id=None,
+            sent_to_id=None,
+            user_id=user_id,
+            company_id=rng.choice([None, 4]),
+            workspace_id=1,
+            category_id=category_id,
+            merged_to_ticket_id=None,
+            is_merged=rng.choice([False, True]),
+            merged_at=None,
+            merged_by_agent_id=None,
+            assignee_name=f"Agent {assignee_id}" if assignee_id else None,
+            user_name=f"Contact {user_id}",
+            user_email=f"contact{user_id}@example.com",
+            team_name=f"Team {team_id}" if team_id else None,
+            category_name="Billing" if category_id else None,
+        ))
+    return tasks
+
+
+def pydantic_path(tasks) -> bytes:
+    """What FastAPI does for response_model=List[TicketListItem] with attribute objects."""
+    models = [TicketListItem.model_validate(task) for task in tasks]
+    content = jsonable_encoder(models)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def row_path(rows) -> bytes:
+    return TASK_LIST_ENCODER.encode_many(rows)
+
+
+def to_rows(tasks):
+    return [tuple(getattr(task, key) for key in TASK_LIST_ENCODER.keys) for task in tasks]
+
+
+def timed(fn, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.rows)
+    rows = to_rows(tasks)
+
+    expected = pydantic_path(tasks)
+    actual = row_path(rows)
+    if expected != actual:
+        for index, (a, b) in enumerate(zip(expected, actual)):
+            if a != b:
+                print(f"MISMATCH at byte {index}:")
+                print(f"  pydantic: {expected[max(0, index - 80):index + 80]!r}")
+                print(f"  orjson:   {actual[max(0, index - 80):index + 80]!r}")
+                break
+        else:
+            print(f"MISMATCH: lengths differ ({len(expected)} vs {len(actual)})")
+        sys.exit(1)
+
+    print(f"Output identical ({len(actual):,} bytes for {args.rows} rows)")
+    slow = timed(pydantic_path, tasks, args.iterations)
+    fast = timed(row_path, rows, args.iterations)
+    print(f"pydantic + jsonable_encoder: {slow * 1000:8.3f} ms/page")
+    print(f"RowEncoder + orjson:         {fast * 1000:8.3f} ms/page")
+    print(f"speedup:                     {slow / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()